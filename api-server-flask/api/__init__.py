@@ -11,6 +11,8 @@ from flask_restx import Api
 from .common.models import db
 from .common.logging_config import setup_logger
 from .common.metrics_collector import init_metrics
+from .common.database_context import end_request_session
+from .common.database import get_request_query_stats
 
 # Set up the logger
 logger = setup_logger(__name__, 'api_init.log')
@@ -33,6 +35,9 @@ init_metrics(metrics_domain=metrics_domain)
 # Using new organized structure
 from .routes import *
 
+# Expose per-request SQL statistics as response headers (always on in debug mode)
+DB_QUERY_STATS_HEADER = os.environ.get('DB_QUERY_STATS_HEADER', 'false').lower() == 'true'
+
 # Setup database
 @app.before_first_request
 def initialize_database():
@@ -48,6 +53,9 @@ def initialize_database():
         logger.error('Database initialization failed, exiting application')
         sys.exit(1)  # Exit with error code 1 to indicate failure
 
+# Release the request-scoped database session, if the endpoint opened one
+app.teardown_request(end_request_session)
+
 """
    Custom responses
 """
@@ -68,4 +76,8 @@ def after_request(response):
         except json.JSONDecodeError:
             # If response is not valid JSON, don't try to modify it
             pass
+    if app.debug or DB_QUERY_STATS_HEADER:
+        query_count, query_seconds = get_request_query_stats()
+        response.headers['X-DB-Query-Count'] = str(query_count)
+        response.headers['X-DB-Query-Time-Ms'] = f"{query_seconds * 1000:.1f}"
     return response
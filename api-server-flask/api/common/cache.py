@@ -0,0 +1,135 @@
+"""
+Small in-process caches shared by the API routes.
+
+Each gunicorn worker holds its own copy, so these are only suitable for
+data where a few seconds of staleness across workers is acceptable.
+"""
+
+import threading
+import time
+from collections import OrderedDict
+
+
+class TTLCache:
+    """
+    Thread-safe mapping whose entries expire `ttl` seconds after being set.
+
+    At most `max_entries` keys are kept; the least recently used key is
+    evicted first when the cache is full.
+    """
+
+    _MISSING = object()
+
+    def __init__(self, ttl, max_entries=1024):
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self._data = OrderedDict()  # key -> (expires_at, value)
+        self._lock = threading.Lock()
+
+    def get(self, key, default=None):
+        """Return the cached value for key, or default if missing or expired"""
+        now = time.monotonic()
+        with self._lock:
+            entry = self._data.get(key, self._MISSING)
+            if entry is self._MISSING:
+                return default
+            expires_at, value = entry
+            if expires_at <= now:
+                del self._data[key]
+                return default
+            self._data.move_to_end(key)
+            return value
+
+    def set(self, key, value, ttl=None):
+        """Store value under key for ttl seconds (defaults to the cache ttl)"""
+        expires_at = time.monotonic() + (self.ttl if ttl is None else ttl)
+        with self._lock:
+            self._data[key] = (expires_at, value)
+            self._data.move_to_end(key)
+            while len(self._data) > self.max_entries:
+                self._data.popitem(last=False)
+
+    def delete(self, key):
+        """Drop key from the cache if present"""
+        with self._lock:
+            self._data.pop(key, None)
+
+    def clear(self):
+        """Drop every entry"""
+        with self._lock:
+            self._data.clear()
+
+    def __len__(self):
+        with self._lock:
+            return len(self._data)
+
+
+class SizedLRUCache:
+    """
+    Thread-safe LRU mapping bounded by the total size of its values.
+
+    Values are stored with an explicit size in bytes; entries larger than
+    `max_entry_bytes` are never cached, and least recently used entries are
+    evicted until the total fits in `max_bytes`.
+    """
+
+    def __init__(self, max_bytes, max_entry_bytes=None):
+        self.max_bytes = max_bytes
+        self.max_entry_bytes = max_bytes if max_entry_bytes is None else max_entry_bytes
+        self._data = OrderedDict()  # key -> (size, value)
+        self._total = 0
+        self._lock = threading.Lock()
+
+    def get(self, key, default=None):
+        """Return the cached value for key, or default if missing"""
+        with self._lock:
+            entry = self._data.get(key)
+            if entry is None:
+                return default
+            self._data.move_to_end(key)
+            return entry[1]
+
+    def set(self, key, value, size):
+        """
+        Store value under key if it fits
+
+        Returns:
+            True if the value was cached
+        """
+        if size > self.max_entry_bytes or size > self.max_bytes:
+            return False
+        with self._lock:
+            previous = self._data.pop(key, None)
+            if previous is not None:
+                self._total -= previous[0]
+            self._data[key] = (size, value)
+            self._total += size
+            while self._total > self.max_bytes:
+                _, (evicted_size, _) = self._data.popitem(last=False)
+                self._total -= evicted_size
+        return True
+
+    def delete(self, key):
+        """Drop key from the cache if present"""
+        with self._lock:
+            entry = self._data.pop(key, None)
+            if entry is not None:
+                self._total -= entry[0]
+
+    def clear(self):
+        """Drop every entry"""
+        with self._lock:
+            self._data.clear()
+            self._total = 0
+
+    @property
+    def total_bytes(self):
+        with self._lock:
+            return self._total
+
+    def __len__(self):
+        with self._lock:
+            return len(self._data)
+
+
+__all__ = ['TTLCache', 'SizedLRUCache']
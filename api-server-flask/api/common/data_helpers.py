@@ -5,6 +5,7 @@ from psycopg2.extras import Json
 from .database import get_db_connection, execute_sql
 from .database_context import database_cursor, database_transaction, db
 from .logging_config import setup_logger
+from .cache import TTLCache
 from .models import PaymentStatus, PaymentType, Currency
 from .payment_helpers import calc_invoice
 
@@ -13,6 +14,11 @@ logger = setup_logger(__name__, 'data_helpers.log')
 
 stripe.api_key = os.environ.get('STRIPE_API_KEY')
 
+# Positive entitlement lookups are cached per worker; misses always hit the
+# database so a purchase is downloadable as soon as its payment completes
+ENTITLEMENT_CACHE_TTL = int(os.getenv('ENTITLEMENT_CACHE_TTL', '60'))
+_entitlement_cache = TTLCache(ttl=ENTITLEMENT_CACHE_TTL, max_entries=4096)
+
 def get_searchableIds_by_user(user_id): # reviewed
     """
     Retrieves all searchable IDs for a specific user
@@ -455,6 +461,69 @@ def check_payment(session_id):
         logger.error(f"Error checking payment status: {str(e)}")
         return {"error": str(e)}
 
+def record_stripe_payment(session_id, payment_status, amount_total):
+    """
+    Mark the payment for a paid Stripe checkout session as complete
+    
+    Args:
+        session_id: Stripe checkout session ID (the invoice external_id)
+        payment_status: Stripe payment_status of the session
+        amount_total: Amount Stripe charged, in cents
+        
+    Returns:
+        bool: True if the session belongs to an invoice
+    """
+    # Get the invoice record from our database using external_id
+    invoice_records = get_invoices(external_id=session_id)
+    if not invoice_records:
+        return False
+    invoice_record = invoice_records[0]
+    
+    # Check if payment already exists
+    existing_payments = get_payments(invoice_id=invoice_record['id'])
+    
+    if existing_payments:
+        # Update existing payment record
+        payment_record = existing_payments[0]
+        payment_metadata = {
+            **payment_record['metadata'],  # Preserve existing metadata
+            "stripe_status": payment_status,
+            "timestamp": int(time.time()),
+            "address": invoice_record['metadata'].get('address', ''),
+            "tel": invoice_record['metadata'].get('tel', ''),
+            "description": invoice_record['metadata'].get('description', ''),
+            "stripe_session_id": session_id,
+            "amount_total": amount_total,
+        }
+        
+        update_payment_status(
+            payment_id=payment_record['id'],
+            status=PaymentStatus.COMPLETE.value,
+            metadata=payment_metadata
+        )
+    else:
+        # Fallback: Create payment record if none exists (shouldn't happen with new flow)
+        logger.warning(f"No payment record found for invoice {invoice_record['id']}, creating new payment record")
+        payment_metadata = {
+            "stripe_status": payment_status,
+            "timestamp": int(time.time()),
+            "address": invoice_record['metadata'].get('address', ''),
+            "tel": invoice_record['metadata'].get('tel', ''),
+            "description": invoice_record['metadata'].get('description', ''),
+            "stripe_session_id": session_id,
+            "amount_total": amount_total,
+        }
+        
+        create_payment(
+            invoice_id=invoice_record['id'],
+            amount=invoice_record['amount'],
+            currency=Currency.USD.value,
+            payment_type=PaymentType.STRIPE.value,
+            external_id=session_id,
+            metadata=payment_metadata
+        )
+    return True
+
 def refresh_stripe_payment(session_id):
     """
     Checks the status of a Stripe payment session and updates the payment status accordingly
@@ -470,59 +539,12 @@ def refresh_stripe_payment(session_id):
         
         # If payment is successful, update the payment status in our database
         if payment_status == 'paid' or payment_status == 'complete':
-            # Get the invoice record from our database using external_id
-            invoice_records = get_invoices(external_id=session_id)
-            
-            if invoice_records:
-                invoice_record = invoice_records[0]
-                
-                # Check if payment already exists
-                existing_payments = get_payments(invoice_id=invoice_record['id'])
-                
-                if existing_payments:
-                    # Update existing payment record
-                    payment_record = existing_payments[0]
-                    payment_metadata = {
-                        **payment_record['metadata'],  # Preserve existing metadata
-                        "stripe_status": payment_status,
-                        "timestamp": int(time.time()),
-                        "address": invoice_record['metadata'].get('address', ''),
-                        "tel": invoice_record['metadata'].get('tel', ''),
-                        "description": invoice_record['metadata'].get('description', ''),
-                        "stripe_session_id": session_id,
-                        "amount_total": checkout_session.amount_total,
-                    }
-                    
-                    update_payment_status(
-                        payment_id=payment_record['id'],
-                        status=PaymentStatus.COMPLETE.value,
-                        metadata=payment_metadata
-                    )
-                else:
-                    # Fallback: Create payment record if none exists (shouldn't happen with new flow)
-                    logger.warning(f"No payment record found for invoice {invoice_record['id']}, creating new payment record")
-                    payment_metadata = {
-                        "stripe_status": payment_status,
-                        "timestamp": int(time.time()),
-                        "address": invoice_record['metadata'].get('address', ''),
-                        "tel": invoice_record['metadata'].get('tel', ''),
-                        "description": invoice_record['metadata'].get('description', ''),
-                        "stripe_session_id": session_id,
-                        "amount_total": checkout_session.amount_total,
-                    }
-                    
-                    create_payment(
-                        invoice_id=invoice_record['id'],
-                        amount=invoice_record['amount'],
-                        currency=Currency.USD.value,
-                        payment_type=PaymentType.STRIPE.value,
-                        external_id=session_id,
-                        metadata=payment_metadata
-                    )
+            record_stripe_payment(session_id, payment_status, checkout_session.amount_total)
         
         # Return the payment status information
         return {
             "status": payment_status,
+            "session_status": checkout_session.status,
             "session_id": session_id,
             "amount_total": checkout_session.amount_total,
             "currency": Currency.USD.value
@@ -536,144 +558,248 @@ def refresh_stripe_payment(session_id):
         return {"error": str(e)}
 
 
+def complete_stripe_deposit(session_id):
+    """
+    Mark the pending deposit paid through a Stripe checkout session as complete
+    
+    Returns:
+        bool: True if a pending deposit was completed
+    """
+    with database_transaction() as (cur, conn):
+        execute_sql(cur, """
+            UPDATE deposit
+            SET status = 'complete',
+                metadata = metadata || %s
+            WHERE external_id = %s AND type = 'stripe' AND status = 'pending'
+        """, params=(Json({'completed_at': time.strftime('%Y-%m-%dT%H:%M:%S', time.gmtime()),
+                           'payment_status': 'paid'}), session_id))
+        return cur.rowcount > 0
+
+def expire_stripe_checkout(session_id):
+    """
+    Close out the pending payment or deposit of an expired Stripe checkout session
+    
+    Returns:
+        bool: True if a pending payment or deposit was closed
+    """
+    with database_transaction() as (cur, conn):
+        execute_sql(cur, """
+            UPDATE payment
+            SET status = %s,
+                metadata = metadata || %s
+            WHERE external_id = %s AND type = 'stripe' AND status = %s
+        """, params=(PaymentStatus.ERROR.value, Json({'stripe_status': 'expired', 'timestamp': int(time.time())}),
+                     session_id, PaymentStatus.PENDING.value))
+        updated = cur.rowcount
+        execute_sql(cur, """
+            UPDATE deposit
+            SET status = 'failed',
+                metadata = metadata || %s
+            WHERE external_id = %s AND type = 'stripe' AND status = 'pending'
+        """, params=(Json({'error': 'Payment session expired',
+                           'expired_at': time.strftime('%Y-%m-%dT%H:%M:%S', time.gmtime())}), session_id))
+        return (updated + cur.rowcount) > 0
+
+def apply_stripe_checkout_event(event_type, checkout_session):
+    """
+    Apply a checkout.session.* webhook event to the matching invoice or deposit
+    
+    Args:
+        event_type: Stripe event type
+        checkout_session: The event's data.object (a checkout session dict)
+        
+    Returns:
+        str: What the event changed ('invoice', 'deposit', 'expired') or 'ignored'
+    """
+    session_id = checkout_session.get('id')
+    if not session_id:
+        return 'ignored'
+    
+    if event_type in ('checkout.session.completed', 'checkout.session.async_payment_succeeded'):
+        payment_status = checkout_session.get('payment_status')
+        if payment_status != 'paid':
+            # Delayed payment methods complete later via async_payment_succeeded
+            return 'ignored'
+        if record_stripe_payment(session_id, payment_status, checkout_session.get('amount_total')):
+            return 'invoice'
+        if complete_stripe_deposit(session_id):
+            return 'deposit'
+        return 'ignored'
+    
+    if event_type == 'checkout.session.expired':
+        return 'expired' if expire_stripe_checkout(session_id) else 'ignored'
+    
+    return 'ignored'
+
+def process_stripe_event(event):
+    """
+    Record a verified Stripe webhook event and apply it exactly once
+    
+    Stripe delivers events at least once, so the event is stored by its ID
+    first; a redelivery of an event that was already applied does nothing.
+    An event that failed to apply is applied again when redelivered.
+    
+    Args:
+        event: Verified event dict (id, type, data.object)
+        
+    Returns:
+        str: Result of apply_stripe_checkout_event, or 'duplicate'
+    """
+    event_id = event['id']
+    event_type = event['type']
+    checkout_session = event.get('data', {}).get('object', {}) or {}
+    
+    row = db.execute_insert("""
+        INSERT INTO stripe_event (event_id, type, session_id, payload)
+        VALUES (%s, %s, %s, %s)
+        ON CONFLICT (event_id) DO UPDATE SET event_id = EXCLUDED.event_id
+        RETURNING processed_at
+    """, (event_id, event_type, checkout_session.get('id'), Json(event)))
+    if row is None:
+        raise RuntimeError(f"Failed to record Stripe event {event_id}")
+    if row[0] is not None:
+        return 'duplicate'
+    
+    # Applying is idempotent, so a concurrent redelivery applying it too is harmless
+    try:
+        result = apply_stripe_checkout_event(event_type, checkout_session)
+    except Exception as e:
+        db.execute_update("UPDATE stripe_event SET error = %s WHERE event_id = %s", (str(e), event_id))
+        raise
+    
+    db.execute_update("""
+        UPDATE stripe_event SET processed_at = CURRENT_TIMESTAMP, error = NULL WHERE event_id = %s
+    """, (event_id,))
+    return result
+
+
 def get_user_paid_files(user_id, searchable_id):
     """
     Get the specific files that a user has paid for in a searchable item
-    Returns a set of file IDs that the user can download
+    Returns a set of file IDs that the user can download (each selection's
+    fileId; the alternate ids also accepted for downloads are left out)
     """
     try:
-        # Get all completed payments by this user for this searchable item
-        query = """
-            SELECT i.metadata
-            FROM invoice i 
-            JOIN payment p ON i.id = p.invoice_id 
-            WHERE i.buyer_id = %s
-            AND i.searchable_id = %s
-            AND p.status = %s
-        """
-        
-        results = db.fetch_all(query, (user_id, searchable_id, 'complete'))
-        
-        paid_file_ids = set()
-        
-        for result in results:
-            invoice_metadata = result[0]
-            if invoice_metadata and 'selections' in invoice_metadata:
-                selections = invoice_metadata['selections']
-                for selection in selections:
-                    # Handle both old format (type) and new format (component)
-                    if selection.get('type') == 'downloadable' or selection.get('component') == 'downloadable':
-                        paid_file_ids.add(str(selection.get('fileId')))
-        
-        return paid_file_ids
+        rows = db.fetch_all("""
+            SELECT file_id
+            FROM entitlement
+            WHERE user_id = %s AND searchable_id = %s AND listed
+        """, (user_id, searchable_id))
+        return {row[0] for row in rows}
         
     except Exception as e:
         logger.error(f"Error retrieving user paid files: {str(e)}")
         return set()
 
+def get_file_entitlement(user_id, searchable_id, file_id):
+    """
+    Check whether a user has paid for one downloadable file
+    
+    Args:
+        user_id: The buyer's user ID
+        searchable_id: The searchable item the file belongs to
+        file_id: The file ID as requested (numeric ID or UUID)
+        
+    Returns:
+        Dict with fileId and fileName if the user is entitled, otherwise None
+    """
+    cache_key = (int(user_id), int(searchable_id), str(file_id))
+    cached = _entitlement_cache.get(cache_key)
+    if cached is not None:
+        return dict(cached)
+
+    row = db.fetch_one("""
+        SELECT file_id, file_name
+        FROM entitlement
+        WHERE user_id = %s AND searchable_id = %s AND file_id = %s
+    """, (user_id, searchable_id, str(file_id)))
+    if not row:
+        return None
+
+    entitlement = {'fileId': row[0], 'fileName': row[1]}
+    _entitlement_cache.set(cache_key, entitlement)
+    return dict(entitlement)
+
 def get_balance_by_currency(user_id):
     """
-    Get user balance from payments and withdrawals using new table structure
+    Get user balance from the user_balance ledger.
+    
+    The ledger is maintained by triggers on payment, rewards, deposit and
+    withdrawal in the same transaction as each change, so this is a single
+    primary-key lookup. calculate_balance_from_history() recomputes the same
+    figure from the underlying rows.
     """
     try:
-        logger.info(f"Calculating balance for user_id: {user_id}")
-        
-        # Single query to calculate the entire balance
-        query = """
-        WITH balance_sources AS (
-            -- Income from sales (seller earnings after fees)
-            SELECT 
-                'sale' as source_type,
-                (i.amount - i.fee) as net_amount,
-                i.currency
-            FROM invoice i
-            JOIN payment p ON i.id = p.invoice_id
-            WHERE i.seller_id = %s
-            AND p.status = %s
-            AND i.currency = 'usd'
-            
-            UNION ALL
-            
-            -- Rewards
-            SELECT 
-                'reward' as source_type,
-                r.amount as net_amount,
-                r.currency
-            FROM rewards r
-            WHERE r.user_id = %s
-            AND r.currency = 'usd'
-            
-            UNION ALL
-            
-            -- Completed deposits
-            SELECT 
-                'deposit' as source_type,
-                d.amount as net_amount,
-                d.currency
-            FROM deposit d
-            WHERE d.user_id = %s
-            AND d.status = 'complete'
-            AND d.currency = 'usd'
-            
-            UNION ALL
-            
-            -- Withdrawals (negative amounts)
-            SELECT 
-                'withdrawal' as source_type,
-                -w.amount as net_amount,
-                w.currency
-            FROM withdrawal w
-            WHERE w.user_id = %s
-            AND w.status IN (%s, %s, %s)
-            AND w.currency = 'usd'
-            
-            UNION ALL
-            
-            -- Balance payments (negative amounts) - purchases made with balance
-            SELECT 
-                'balance_payment' as source_type,
-                -i.amount as net_amount,
-                i.currency
-            FROM invoice i
-            JOIN payment p ON i.id = p.invoice_id
-            WHERE i.buyer_id = %s
-            AND p.type = 'balance'
-            AND p.status = %s
-            AND i.currency = 'usd'
-        )
-        SELECT 
-            COALESCE(SUM(net_amount), 0) as total_balance
-        FROM balance_sources
-        """
-        
         with database_cursor() as (cur, conn):
-            execute_sql(cur, query, params=(
-                user_id,  # for sales
-                PaymentStatus.COMPLETE.value,
-                user_id,  # for rewards
-                user_id,  # for deposits
-                user_id,  # for withdrawals
-                PaymentStatus.COMPLETE.value,
-                PaymentStatus.PENDING.value,
-                PaymentStatus.DELAYED.value,
-                user_id,  # for balance payments (buyer_id)
-                PaymentStatus.COMPLETE.value  # for balance payments status
-            ))
-            
+            execute_sql(cur, "SELECT balance FROM user_balance WHERE user_id = %s", params=(user_id,))
             result = cur.fetchone()
-            total_balance = float(result[0]) if result and result[0] else 0.0
+        total_balance = float(result[0]) if result and result[0] else 0.0
         
         balance_by_currency = {
             'usd': total_balance
         }
         
-        logger.info(f"Final balance for user {user_id}: {balance_by_currency}")
+        logger.info(f"Balance for user {user_id}: {balance_by_currency}")
         return balance_by_currency
         
     except Exception as e:
         logger.error(f"Error calculating balance for user {user_id}: {str(e)}")
         raise e
 
+def calculate_balance_from_history(user_id):
+    """
+    Recompute a user's USD balance from sales, rewards, deposits, withdrawals
+    and balance payments (the user_balance_sources view).
+    
+    Returns:
+        float: Balance implied by the transaction history
+    """
+    with database_cursor() as (cur, conn):
+        execute_sql(cur, """
+            SELECT COALESCE(SUM(net_amount), 0)
+            FROM user_balance_sources
+            WHERE user_id = %s
+        """, params=(user_id,))
+        result = cur.fetchone()
+        return float(result[0]) if result and result[0] else 0.0
+
+def find_user_balance_drift(limit=100):
+    """
+    Compare the user_balance ledger with the transaction history.
+    
+    Args:
+        limit: Maximum number of drifted users to return
+        
+    Returns:
+        list: [{'user_id', 'ledger_balance', 'expected_balance', 'drift'}], largest drift first
+    """
+    with database_cursor() as (cur, conn):
+        execute_sql(cur, """
+            WITH expected AS (
+                SELECT user_id, SUM(net_amount) AS balance
+                FROM user_balance_sources
+                GROUP BY user_id
+            )
+            SELECT COALESCE(e.user_id, b.user_id) AS user_id,
+                   COALESCE(b.balance, 0) AS ledger_balance,
+                   COALESCE(e.balance, 0) AS expected_balance
+            FROM expected e
+            FULL OUTER JOIN user_balance b ON b.user_id = e.user_id
+            WHERE COALESCE(b.balance, 0) <> COALESCE(e.balance, 0)
+            ORDER BY ABS(COALESCE(b.balance, 0) - COALESCE(e.balance, 0)) DESC
+            LIMIT %s
+        """, params=(limit,))
+        
+        return [
+            {
+                'user_id': user_id,
+                'ledger_balance': float(ledger_balance),
+                'expected_balance': float(expected_balance),
+                'drift': float(ledger_balance - expected_balance)
+            }
+            for user_id, ledger_balance, expected_balance in cur.fetchall()
+        ]
+
 def get_ratings(invoice_id=None, user_id=None):
     """
     Retrieves ratings from the rating table
@@ -789,6 +915,24 @@ def create_rating(user_id, invoice_id, rating_value, review=None, metadata=None)
         with database_transaction() as (cur, conn):
             execute_sql(cur, query, params=(invoice_id, user_id, rating_value, review, Json(metadata)))
             rating_id = cur.fetchone()[0]
+            
+            # Fold the new rating into the precomputed aggregates in the same transaction
+            execute_sql(cur, """
+                INSERT INTO searchable_rating_stats (searchable_id, rating_sum, rating_count)
+                SELECT searchable_id, %s, 1 FROM invoice WHERE id = %s
+                ON CONFLICT (searchable_id) DO UPDATE SET
+                    rating_sum = searchable_rating_stats.rating_sum + EXCLUDED.rating_sum,
+                    rating_count = searchable_rating_stats.rating_count + 1,
+                    updated_at = CURRENT_TIMESTAMP
+            """, params=(rating_value, invoice_id))
+            execute_sql(cur, """
+                INSERT INTO seller_rating_stats (seller_id, rating_sum, rating_count)
+                SELECT seller_id, %s, 1 FROM invoice WHERE id = %s
+                ON CONFLICT (seller_id) DO UPDATE SET
+                    rating_sum = seller_rating_stats.rating_sum + EXCLUDED.rating_sum,
+                    rating_count = seller_rating_stats.rating_count + 1,
+                    updated_at = CURRENT_TIMESTAMP
+            """, params=(rating_value, invoice_id))
         
         logger.info(f"Rating created with ID: {rating_id}")
         return {
@@ -1387,10 +1531,18 @@ __all__ = [
     'create_withdrawal',
     'check_payment',
     'refresh_stripe_payment',
+    'record_stripe_payment',
+    'complete_stripe_deposit',
+    'expire_stripe_checkout',
+    'apply_stripe_checkout_event',
+    'process_stripe_event',
     'get_receipts',
     'get_balance_by_currency',
+    'calculate_balance_from_history',
+    'find_user_balance_drift',
     'get_ratings',
     'get_user_paid_files',
+    'get_file_entitlement',
     'can_user_rate_invoice',
     'create_rating',
     'get_invoice_notes',
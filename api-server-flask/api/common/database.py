@@ -1,42 +1,387 @@
 import os
+import re
+import time
+import random
+import hashlib
+import threading
 import psycopg2
+from flask import g, has_app_context
+from psycopg2.extensions import TRANSACTION_STATUS_IDLE, TRANSACTION_STATUS_UNKNOWN
 from psycopg2.extras import Json
 from .logging_config import setup_logger
+from .metrics import (
+    db_pool_connections_in_use,
+    db_pool_connections_idle,
+    db_pool_checkout_waits,
+    db_pool_checkout_timeouts,
+    db_pool_checkout_latency,
+    db_pool_discarded_connections,
+    db_query_latency,
+    db_query_rows,
+    db_slow_queries,
+)
 
 # Create a logger for this file
 logger = setup_logger(__name__, 'database.log')
 
+# Connection pool configuration
+DB_POOL_MIN_SIZE = int(os.getenv('DB_POOL_MIN_SIZE', '1'))
+DB_POOL_MAX_SIZE = int(os.getenv('DB_POOL_MAX_SIZE', '10'))
+DB_POOL_TIMEOUT = float(os.getenv('DB_POOL_TIMEOUT', '10'))
+# Connections idle for longer than this are pinged with SELECT 1 before reuse
+DB_POOL_HEALTHCHECK_IDLE_SECONDS = float(os.getenv('DB_POOL_HEALTHCHECK_IDLE_SECONDS', '30'))
+
+# Query instrumentation configuration
+DB_SLOW_QUERY_MS = float(os.getenv('DB_SLOW_QUERY_MS', '500'))
+# Fraction of slow queries written to the slow-query log (metrics always count all of them)
+DB_SLOW_QUERY_SAMPLE_RATE = float(os.getenv('DB_SLOW_QUERY_SAMPLE_RATE', '1.0'))
+
+
+class PoolTimeoutError(psycopg2.OperationalError):
+    """Raised when no pooled connection becomes available within the timeout"""
+
+
 def get_db_connection():
-    """Get database connection"""
-    conn = psycopg2.connect(
+    """Get a new, unpooled database connection"""
+    return psycopg2.connect(
         host=os.getenv('DB_HOST', ''),
         port=os.getenv('DB_PORT', ''),
         dbname=os.getenv('DB_NAME', ''),
         user=os.getenv('DB_USERNAME', ''),
         password=os.getenv('DB_PASS', '')
     )
-    
-    # Log connection details
-    with conn.cursor() as cursor:
-        cursor.execute("SELECT current_database(), current_user, inet_client_addr(), inet_client_port()")
-        connection_details = cursor.fetchone()
-        print(f"Connected to database: {connection_details[0]}")
-        print(f"Connected as user: {connection_details[1]}")
-        print(f"Client address: {connection_details[2]}")
-        print(f"Client port: {connection_details[3]}")
-    return conn
+
+
+class ConnectionPool:
+    """
+    Thread-safe, bounded pool of psycopg2 connections.
+
+    Checkout blocks for at most `timeout` seconds when all `max_size` connections
+    are in use. Idle connections are health-checked before being handed out and
+    replaced transparently when they turn out to be broken.
+    """
+
+    def __init__(self, min_size=DB_POOL_MIN_SIZE, max_size=DB_POOL_MAX_SIZE,
+                 timeout=DB_POOL_TIMEOUT, connection_factory=get_db_connection,
+                 healthcheck_idle_seconds=DB_POOL_HEALTHCHECK_IDLE_SECONDS):
+        if max_size < 1:
+            raise ValueError("max_size must be at least 1")
+        self.min_size = max(0, min(min_size, max_size))
+        self.max_size = max_size
+        self.timeout = timeout
+        self.healthcheck_idle_seconds = healthcheck_idle_seconds
+        self._connection_factory = connection_factory
+        self._condition = threading.Condition()
+        self._idle = []  # list of (connection, returned_at)
+        self._in_use = set()
+        self._opening = 0
+        self._closed = False
+
+        for _ in range(self.min_size):
+            try:
+                self._idle.append((self._connection_factory(), time.monotonic()))
+            except Exception as e:
+                logger.error(f"Failed to pre-open pooled connection: {str(e)}")
+                break
+        self._update_gauges()
+
+    @property
+    def size(self):
+        """Total number of connections currently owned by the pool"""
+        with self._condition:
+            return len(self._idle) + len(self._in_use) + self._opening
+
+    def stats(self):
+        """Return a snapshot of pool usage"""
+        with self._condition:
+            return {
+                'in_use': len(self._in_use),
+                'idle': len(self._idle),
+                'max_size': self.max_size,
+            }
+
+    def getconn(self, timeout=None):
+        """
+        Check a connection out of the pool.
+
+        Args:
+            timeout: Seconds to wait for a free connection (defaults to the pool timeout)
+
+        Returns:
+            A healthy psycopg2 connection
+
+        Raises:
+            PoolTimeoutError: If no connection became available in time
+        """
+        timeout = self.timeout if timeout is None else timeout
+        started = time.monotonic()
+        deadline = started + timeout
+        waited = False
+
+        while True:
+            with self._condition:
+                if self._closed:
+                    raise psycopg2.InterfaceError("connection pool is closed")
+
+                while not self._idle and len(self._in_use) + self._opening >= self.max_size:
+                    remaining = deadline - time.monotonic()
+                    if remaining <= 0:
+                        db_pool_checkout_timeouts.inc()
+                        raise PoolTimeoutError(
+                            f"Timed out after {timeout}s waiting for a database connection "
+                            f"({len(self._in_use)}/{self.max_size} in use)"
+                        )
+                    if not waited:
+                        waited = True
+                        db_pool_checkout_waits.inc()
+                    self._condition.wait(remaining)
+
+                if self._idle:
+                    conn, returned_at = self._idle.pop()
+                    self._in_use.add(conn)
+                    fresh = False
+                else:
+                    self._opening += 1
+                    conn, returned_at = None, None
+                    fresh = True
+
+            if fresh:
+                try:
+                    conn = self._connection_factory()
+                except Exception:
+                    with self._condition:
+                        self._opening -= 1
+                        self._condition.notify()
+                    raise
+                with self._condition:
+                    self._opening -= 1
+                    self._in_use.add(conn)
+            elif not self._is_healthy(conn, returned_at):
+                # Broken connection: drop it and try again without consuming the wait budget
+                self._discard(conn)
+                continue
+
+            db_pool_checkout_latency.observe(time.monotonic() - started)
+            self._update_gauges()
+            return conn
+
+    def putconn(self, conn, discard=False):
+        """
+        Return a connection to the pool.
+
+        Args:
+            conn: Connection previously obtained from getconn()
+            discard: Close the connection instead of keeping it for reuse
+        """
+        if not discard and not conn.closed:
+            try:
+                if conn.get_transaction_status() != TRANSACTION_STATUS_IDLE:
+                    conn.rollback()
+                if conn.autocommit:
+                    conn.autocommit = False
+            except Exception as e:
+                logger.warning(f"Discarding connection that failed to reset: {str(e)}")
+                discard = True
+
+        if discard or conn.closed:
+            self._discard(conn)
+            return
+
+        with self._condition:
+            self._in_use.discard(conn)
+            if self._closed:
+                self._close_quietly(conn)
+            else:
+                self._idle.append((conn, time.monotonic()))
+            self._condition.notify()
+        self._update_gauges()
+
+    def closeall(self):
+        """Close every idle connection and refuse further checkouts"""
+        with self._condition:
+            self._closed = True
+            idle, self._idle = self._idle, []
+            self._condition.notify_all()
+        for conn, _ in idle:
+            self._close_quietly(conn)
+        self._update_gauges()
+
+    def _is_healthy(self, conn, returned_at):
+        if conn.closed or conn.get_transaction_status() == TRANSACTION_STATUS_UNKNOWN:
+            return False
+        if time.monotonic() - returned_at < self.healthcheck_idle_seconds:
+            return True
+        try:
+            with conn.cursor() as cursor:
+                cursor.execute("SELECT 1")
+            conn.rollback()
+            return True
+        except Exception as e:
+            logger.warning(f"Pooled connection failed health check: {str(e)}")
+            return False
+
+    def _discard(self, conn):
+        with self._condition:
+            self._in_use.discard(conn)
+            self._condition.notify()
+        self._close_quietly(conn)
+        db_pool_discarded_connections.inc()
+        self._update_gauges()
+
+    @staticmethod
+    def _close_quietly(conn):
+        try:
+            if not conn.closed:
+                conn.close()
+        except Exception:
+            pass
+
+    def _update_gauges(self):
+        with self._condition:
+            in_use, idle = len(self._in_use), len(self._idle)
+        db_pool_connections_in_use.set(in_use)
+        db_pool_connections_idle.set(idle)
+
+
+_pool = None
+_pool_pid = None
+_pool_lock = threading.Lock()
+
+
+def get_connection_pool():
+    """
+    Return the process-wide connection pool, creating it on first use.
+
+    The pool is rebuilt after a fork so gunicorn workers never share sockets
+    inherited from the master process.
+    """
+    global _pool, _pool_pid
+    pid = os.getpid()
+    if _pool is not None and _pool_pid == pid:
+        return _pool
+    with _pool_lock:
+        if _pool is None or _pool_pid != pid:
+            _pool = ConnectionPool()
+            _pool_pid = pid
+            logger.info(f"Created database connection pool (min={_pool.min_size}, max={_pool.max_size}) for pid {pid}")
+    return _pool
+
+
+def checkout_connection(timeout=None):
+    """Check a connection out of the process-wide pool"""
+    return get_connection_pool().getconn(timeout)
+
+
+def release_connection(conn, discard=False):
+    """Return a connection obtained from checkout_connection() to the pool"""
+    pool = _pool if _pool_pid == os.getpid() else None
+    if pool is None:
+        ConnectionPool._close_quietly(conn)
+        return
+    pool.putconn(conn, discard=discard)
+
+
+_STRING_LITERAL = re.compile(r"'(?:[^']|'')*'")
+_NUMBER_LITERAL = re.compile(r"\b\d+(?:\.\d+)?\b")
+_PLACEHOLDER_LIST = re.compile(r"\(\s*\?(?:\s*,\s*\?)*\s*\)")
+_WHITESPACE = re.compile(r"\s+")
+_seen_fingerprints = set()
+
+
+def normalize_sql(sql):
+    """
+    Reduce a statement to its shape so that calls differing only in
+    parameters or literal values share one fingerprint.
+
+    Args:
+        sql: SQL text as passed to cursor.execute
+
+    Returns:
+        str: Normalized SQL with placeholders and literals replaced by '?'
+    """
+    if isinstance(sql, bytes):
+        sql = sql.decode('utf-8', 'replace')
+    elif not isinstance(sql, str):
+        # psycopg2.sql.Composed and friends
+        sql = str(sql)
+    normalized = sql.replace('%s', '?')
+    normalized = re.sub(r"%\(\w+\)s", '?', normalized)
+    normalized = _STRING_LITERAL.sub('?', normalized)
+    normalized = _NUMBER_LITERAL.sub('?', normalized)
+    normalized = _WHITESPACE.sub(' ', normalized).strip()
+    normalized = _PLACEHOLDER_LIST.sub('(?)', normalized)
+    return normalized
+
+
+def sql_fingerprint(sql):
+    """
+    Compute a stable, low-cardinality identifier for a statement.
+
+    Returns:
+        tuple: (operation, fingerprint, normalized_sql)
+    """
+    normalized = normalize_sql(sql)
+    operation = normalized.split(' ', 1)[0].upper() if normalized else 'UNKNOWN'
+    fingerprint = hashlib.sha1(normalized.encode('utf-8')).hexdigest()[:12]
+    return operation, fingerprint, normalized
+
+
+def get_request_query_stats():
+    """Return (query_count, total_seconds) for the current request"""
+    if not has_app_context():
+        return 0, 0.0
+    return g.get('_db_query_count', 0), g.get('_db_query_seconds', 0.0)
+
+
+def _record_query(operation, fingerprint, normalized, elapsed, rows):
+    db_query_latency.labels(operation, fingerprint).observe(elapsed)
+    if isinstance(rows, int) and rows >= 0:
+        db_query_rows.labels(operation, fingerprint).observe(rows)
+
+    if fingerprint not in _seen_fingerprints:
+        _seen_fingerprints.add(fingerprint)
+        logger.info(f"SQL fingerprint {fingerprint}: {normalized[:500]}")
+
+    elapsed_ms = elapsed * 1000
+    if elapsed_ms >= DB_SLOW_QUERY_MS:
+        db_slow_queries.labels(operation, fingerprint).inc()
+        if random.random() < DB_SLOW_QUERY_SAMPLE_RATE:
+            logger.warning(f"Slow query [{fingerprint}] took {elapsed_ms:.1f}ms (rows={rows}): {normalized[:1000]}")
+
+    if has_app_context():
+        g._db_query_count = g.get('_db_query_count', 0) + 1
+        g._db_query_seconds = g.get('_db_query_seconds', 0.0) + elapsed
+
 
 def execute_sql(cursor, sql, params=None, commit=False, connection=None):
-    """Execute SQL with logging and return results if applicable"""
-    if params:
-        print(f"Executing SQL: {sql.replace(chr(10), ' ')} with params: {params}")
-        cursor.execute(sql, params)
-    else:
-        print(f"Executing SQL: {sql.replace(chr(10), ' ')}")
-        cursor.execute(sql)
+    """Execute SQL, recording latency, row counts and slow queries per statement fingerprint"""
+    operation, fingerprint, normalized = sql_fingerprint(sql)
+    logger.debug(f"Executing SQL [{fingerprint}]: {normalized}")
+    started = time.perf_counter()
+    rows = None
+    try:
+        if params:
+            cursor.execute(sql, params)
+        else:
+            cursor.execute(sql)
+        rows = cursor.rowcount
+    finally:
+        _record_query(operation, fingerprint, normalized, time.perf_counter() - started, rows)
     if commit and connection:
         connection.commit()
     return cursor
 
 # Re-export Json for convenience
-__all__ = ['get_db_connection', 'execute_sql', 'Json'] 
\ No newline at end of file
+__all__ = [
+    'get_db_connection',
+    'get_connection_pool',
+    'checkout_connection',
+    'release_connection',
+    'ConnectionPool',
+    'PoolTimeoutError',
+    'execute_sql',
+    'normalize_sql',
+    'sql_fingerprint',
+    'get_request_query_stats',
+    'Json',
+]
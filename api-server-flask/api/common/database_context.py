@@ -3,7 +3,8 @@ Database Context Manager for Searchable API
 
 This module provides context managers to eliminate the repetitive database connection
 boilerplate code found throughout the codebase. It ensures proper resource cleanup
-and consistent error handling.
+and consistent error handling. Connections are checked out of the process-wide
+pool in database.py and handed back to it when the block exits.
 
 Before: 149 instances of manual connection management
 After: Clean, reusable context managers
@@ -11,13 +12,103 @@ After: Clean, reusable context managers
 
 import logging
 from contextlib import contextmanager
+from functools import wraps
 from typing import Generator, Optional, Tuple, List, Any
-from .database import get_db_connection, execute_sql
+from flask import g, has_app_context
+from .database import checkout_connection, release_connection, execute_sql
 from .logging_config import setup_logger
 
 logger = setup_logger(__name__, 'database_context.log')
 
 
+def _safe_rollback(conn) -> bool:
+    """Roll back, reporting whether the connection is still usable"""
+    try:
+        conn.rollback()
+        return not conn.closed
+    except Exception as e:
+        logger.error(f"Rollback failed, discarding connection: {str(e)}")
+        return False
+
+
+class RequestSession:
+    """
+    A single pooled connection shared by every read in one Flask request.
+
+    The connection runs a REPEATABLE READ, READ ONLY transaction so all
+    helpers called while handling the request see the same snapshot. It is
+    checked out lazily on first use and released by end_request_session().
+    """
+
+    SNAPSHOT_SQL = "SET TRANSACTION ISOLATION LEVEL REPEATABLE READ READ ONLY"
+
+    def __init__(self):
+        self.conn = None
+        self._in_transaction = False
+
+    def cursor(self):
+        """Return a new cursor on the shared snapshot connection"""
+        if self.conn is None:
+            self.conn = checkout_connection()
+        if not self._in_transaction:
+            with self.conn.cursor() as cur:
+                cur.execute(self.SNAPSHOT_SQL)
+            self._in_transaction = True
+        return self.conn.cursor()
+
+    def reset(self):
+        """Abort the snapshot after a failed statement; the next read starts a new one"""
+        self._in_transaction = False
+        if self.conn is not None and not _safe_rollback(self.conn):
+            release_connection(self.conn, discard=True)
+            self.conn = None
+
+    def close(self):
+        """Hand the connection back to the pool"""
+        if self.conn is not None:
+            release_connection(self.conn)
+            self.conn = None
+        self._in_transaction = False
+
+
+def get_request_session() -> Optional[RequestSession]:
+    """Return the session bound to the current request, if one was started"""
+    if not has_app_context():
+        return None
+    return g.get('_db_request_session')
+
+
+def begin_request_session() -> RequestSession:
+    """
+    Bind a read-only snapshot session to the current request.
+
+    Subsequent database_cursor() blocks reuse its connection instead of
+    checking out their own. Writes through database_transaction() are not
+    affected and still run on their own connection.
+    """
+    session = get_request_session()
+    if session is None:
+        session = RequestSession()
+        g._db_request_session = session
+    return session
+
+
+def end_request_session(exc: Optional[BaseException] = None) -> None:
+    """Release the request session; registered as an app teardown hook"""
+    session = g.pop('_db_request_session', None) if has_app_context() else None
+    if session is not None:
+        session.close()
+
+
+def request_db_session(f):
+    """Decorator opting a read-only endpoint into a shared request session"""
+    @wraps(f)
+    def decorated(*args, **kwargs):
+        begin_request_session()
+        return f(*args, **kwargs)
+    return decorated
+
+
 @contextmanager
 def database_cursor(auto_commit: bool = False) -> Generator[tuple, None, None]:
     """
@@ -29,16 +120,35 @@ def database_cursor(auto_commit: bool = False) -> Generator[tuple, None, None]:
     Yields:
         tuple: (cursor, connection) for database operations
         
+    When the current request has a session from begin_request_session(),
+    read-only blocks (auto_commit=False) run on its shared connection.
+        
     Example:
         with database_cursor() as (cur, conn):
             execute_sql(cur, "SELECT * FROM users WHERE id = %s", (user_id,))
             result = cur.fetchone()
     """
+    session = None if auto_commit else get_request_session()
+    if session is not None:
+        cur = None
+        try:
+            cur = session.cursor()
+            yield cur, session.conn
+        except Exception as e:
+            session.reset()
+            logger.error(f"Database operation failed in request session: {str(e)}")
+            raise
+        finally:
+            if cur and not cur.closed:
+                cur.close()
+        return
+
     conn = None
     cur = None
+    broken = False
     
     try:
-        conn = get_db_connection()
+        conn = checkout_connection()
         cur = conn.cursor()
         
         yield cur, conn
@@ -48,14 +158,14 @@ def database_cursor(auto_commit: bool = False) -> Generator[tuple, None, None]:
             
     except Exception as e:
         if conn:
-            conn.rollback()
+            broken = not _safe_rollback(conn)
         logger.error(f"Database operation failed: {str(e)}")
         raise
     finally:
-        if cur:
+        if cur and not cur.closed:
             cur.close()
         if conn:
-            conn.close()
+            release_connection(conn, discard=broken)
 
 
 @contextmanager
@@ -74,9 +184,10 @@ def database_transaction() -> Generator[tuple, None, None]:
     """
     conn = None
     cur = None
+    broken = False
     
     try:
-        conn = get_db_connection()
+        conn = checkout_connection()
         cur = conn.cursor()
         
         yield cur, conn
@@ -86,14 +197,14 @@ def database_transaction() -> Generator[tuple, None, None]:
         
     except Exception as e:
         if conn:
-            conn.rollback()
+            broken = not _safe_rollback(conn)
             logger.error(f"Transaction rolled back due to error: {str(e)}")
         raise
     finally:
-        if cur:
+        if cur and not cur.closed:
             cur.close()
         if conn:
-            conn.close()
+            release_connection(conn, discard=broken)
 
 
 class DatabaseOperations:
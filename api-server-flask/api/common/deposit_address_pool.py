@@ -0,0 +1,155 @@
+"""
+Pool of pre-generated USDT deposit addresses.
+
+Deriving a fresh zero-balance address takes the USDT service one or more
+on-chain balance lookups. Instead of doing that inside the deposit request,
+the background service keeps deposit_address_pool topped up: whenever fewer
+than DEPOSIT_ADDRESS_POOL_LOW_WATER addresses are available it derives new
+ones up to DEPOSIT_ADDRESS_POOL_TARGET. Creating a deposit then only claims
+the oldest available address with SKIP LOCKED, in the same transaction as the
+deposit, so a rolled back deposit gives its address back.
+
+If the pool runs dry, deposits fall back to deriving their address
+synchronously, as before.
+"""
+
+import os
+from concurrent.futures import ThreadPoolExecutor
+
+from psycopg2.extras import execute_values
+
+from .database import execute_sql
+from .database_context import database_cursor, database_transaction
+from .http_client import get_http_client
+from .logging_config import setup_logger
+from .metrics import deposit_address_pool_available, deposit_address_pool_claims
+
+# Set up the logger
+logger = setup_logger(__name__, 'deposit_address_pool.log')
+
+USDT_SERVICE_URL = os.getenv('USDT_SERVICE_URL', 'http://usdt-api:3100')
+# The pool is refilled to the target once fewer addresses than the low-water mark are available
+DEPOSIT_ADDRESS_POOL_LOW_WATER = int(os.getenv('DEPOSIT_ADDRESS_POOL_LOW_WATER', '20'))
+DEPOSIT_ADDRESS_POOL_TARGET = int(os.getenv('DEPOSIT_ADDRESS_POOL_TARGET', '100'))
+# Addresses derived at once while refilling
+DEPOSIT_ADDRESS_POOL_CONCURRENCY = int(os.getenv('DEPOSIT_ADDRESS_POOL_CONCURRENCY', '4'))
+
+
+def generate_deposit_address(deposit_id=None):
+    """
+    Ask the USDT service for a fresh zero-balance address
+
+    Args:
+        deposit_id: Deposit the address is for, if already known (for the service's logs)
+
+    Returns:
+        (address, address_index)
+
+    Raises:
+        Exception: If the service could not be reached or returned an error
+    """
+    # Only picks an unused address, so it is safe to retry
+    response = get_http_client('usdt_api').post(
+        f"{USDT_SERVICE_URL}/zero-balance-address",
+        json={'deposit_id': deposit_id},
+        timeout=10,
+        idempotent=True
+    )
+    if response.status_code != 200:
+        raise Exception(f"USDT service error: {response.text}")
+    data = response.json()
+    return data['address'], data['index']
+
+
+def claim_deposit_address(cur, deposit_id):
+    """
+    Assign the oldest available pool address to a deposit
+
+    Runs on the caller's cursor, so the claim commits or rolls back with the deposit.
+
+    Args:
+        cur: Cursor of the transaction creating the deposit
+        deposit_id: ID of the new deposit
+
+    Returns:
+        (address, address_index), or None if the pool is empty
+    """
+    execute_sql(cur, """
+        UPDATE deposit_address_pool p
+        SET status = 'assigned', deposit_id = %s, assigned_at = CURRENT_TIMESTAMP
+        FROM (
+            SELECT id
+            FROM deposit_address_pool
+            WHERE status = 'available'
+            ORDER BY id
+            LIMIT 1
+            FOR UPDATE SKIP LOCKED
+        ) claimed
+        WHERE p.id = claimed.id
+        RETURNING p.address, p.address_index
+    """, params=(deposit_id,))
+    row = cur.fetchone()
+    deposit_address_pool_claims.labels('hit' if row else 'miss').inc()
+    return (row[0], row[1]) if row else None
+
+
+def count_available_addresses():
+    """Number of addresses waiting in the pool, also reported as a gauge"""
+    with database_cursor() as (cur, conn):
+        execute_sql(cur, "SELECT COUNT(*) FROM deposit_address_pool WHERE status = 'available'")
+        available = cur.fetchone()[0]
+    deposit_address_pool_available.set(available)
+    return available
+
+
+def replenish_deposit_address_pool():
+    """
+    Refill the pool to DEPOSIT_ADDRESS_POOL_TARGET once it is below the low-water mark
+
+    Returns:
+        Number of addresses added
+    """
+    available = count_available_addresses()
+    if available >= DEPOSIT_ADDRESS_POOL_LOW_WATER:
+        return 0
+
+    wanted = DEPOSIT_ADDRESS_POOL_TARGET - available
+    logger.info(f"Deposit address pool has {available} addresses, deriving {wanted} more")
+
+    def derive(_):
+        try:
+            return generate_deposit_address()
+        except Exception as e:
+            logger.error(f"Error deriving a deposit address: {str(e)}")
+            return None
+
+    with ThreadPoolExecutor(max_workers=DEPOSIT_ADDRESS_POOL_CONCURRENCY) as executor:
+        addresses = [address for address in executor.map(derive, range(wanted)) if address]
+    if not addresses:
+        raise Exception("Could not derive any deposit address")
+
+    with database_transaction() as (cur, conn):
+        # Random indexes can repeat; skip addresses already pooled or given to a deposit
+        execute_values(cur, """
+            INSERT INTO deposit_address_pool (address, address_index)
+            SELECT v.address, v.address_index
+            FROM (VALUES %s) AS v(address, address_index)
+            WHERE NOT EXISTS (SELECT 1 FROM deposit d WHERE d.external_id = v.address)
+            ON CONFLICT DO NOTHING
+        """, addresses, page_size=len(addresses))
+        added = cur.rowcount
+    deposit_address_pool_available.set(available + added)
+
+    if added < wanted:
+        logger.warning(f"Deposit address pool refilled with {added} of {wanted} addresses")
+    else:
+        logger.info(f"Deposit address pool refilled with {added} addresses")
+    return added
+
+
+__all__ = [
+    'claim_deposit_address',
+    'generate_deposit_address',
+    'replenish_deposit_address_pool',
+    'count_available_addresses',
+]
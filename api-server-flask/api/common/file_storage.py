@@ -0,0 +1,299 @@
+"""
+Content-addressed, deduplicated file storage used by the file server.
+
+Layout under the storage root:
+
+    blobs/ab/cd/<sha256>     one immutable copy of each distinct content
+    refs/12/34/<file_id>     hard link to the blob holding that file's bytes
+    .tmp/                    uploads being written before they are hashed
+
+A file_id is a reference to a blob. Because references are hard links, the
+blob's link count is its reference count (st_nlink - 1), kept by the
+filesystem itself, and every reference is a regular file that send_file or
+nginx can serve directly. A blob is removed when its last reference goes.
+
+The layout is shared with the API server, which builds X-Accel-Redirect
+paths from ref_relpath().
+"""
+
+import errno
+import hashlib
+import os
+import uuid
+
+from werkzeug.utils import secure_filename
+
+BLOBS_DIR = 'blobs'
+REFS_DIR = 'refs'
+TMP_DIR = '.tmp'
+HASH_CHUNK_SIZE = 1024 * 1024
+
+
+def _fan_out(name):
+    """Two levels of two-character subdirectories, so no directory gets huge"""
+    padded = (name + '____')[:4]
+    return padded[:2], padded[2:4]
+
+
+def stored_name(file_id):
+    """Name a file_id is stored under (the same rule the flat store used)"""
+    return secure_filename(str(file_id))
+
+
+def ref_relpath(file_id):
+    """Path of a file_id's reference relative to the storage root, or None if invalid"""
+    name = stored_name(file_id)
+    if not name:
+        return None
+    return os.path.join(REFS_DIR, *_fan_out(name), name)
+
+
+def blob_relpath(digest):
+    """Path of a blob relative to the storage root"""
+    return os.path.join(BLOBS_DIR, *_fan_out(digest), digest)
+
+
+def file_digest(path):
+    """SHA-256 hex digest of a file's contents"""
+    digest = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for chunk in iter(lambda: f.read(HASH_CHUNK_SIZE), b''):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+class ContentStore:
+    """
+    Content-addressed store rooted at a directory.
+
+    All operations are safe across processes: new names only ever appear via
+    atomic link/rename, and a reference keeps its bytes alive even if the
+    blob name is removed concurrently.
+    """
+
+    def __init__(self, root):
+        self.root = root
+
+    def ref_path(self, file_id):
+        relpath = ref_relpath(file_id)
+        return os.path.join(self.root, relpath) if relpath else None
+
+    def blob_path(self, digest):
+        return os.path.join(self.root, blob_relpath(digest))
+
+    def legacy_path(self, file_id):
+        """Where the pre-content-addressed flat store kept file_id"""
+        name = stored_name(file_id)
+        return os.path.join(self.root, name) if name else None
+
+    def temp_path(self):
+        """A fresh path for writing an upload before it is ingested"""
+        tmp_dir = os.path.join(self.root, TMP_DIR)
+        os.makedirs(tmp_dir, exist_ok=True)
+        return os.path.join(tmp_dir, uuid.uuid4().hex)
+
+    def locate(self, file_id):
+        """
+        Path to read file_id from, or None if it is not stored
+
+        Falls back to the flat layout for stores not yet migrated.
+        """
+        for path in (self.ref_path(file_id), self.legacy_path(file_id)):
+            if path and os.path.isfile(path):
+                return path
+        return None
+
+    def write_stream(self, stream, chunk_size=HASH_CHUNK_SIZE):
+        """
+        Copy a readable stream to a temp file, hashing it on the way
+
+        Returns:
+            Tuple of (temp path, sha256 hex digest, size in bytes)
+        """
+        tmp_path = self.temp_path()
+        digest = hashlib.sha256()
+        size = 0
+        try:
+            with open(tmp_path, 'wb') as f:
+                for chunk in iter(lambda: stream.read(chunk_size), b''):
+                    digest.update(chunk)
+                    f.write(chunk)
+                    size += len(chunk)
+        except BaseException:
+            self._discard(tmp_path)
+            raise
+        return tmp_path, digest.hexdigest(), size
+
+    def ingest(self, tmp_path, digest, file_id):
+        """
+        Store the already-hashed file at tmp_path as file_id
+
+        The temp file becomes the blob if this content is new, and is
+        discarded otherwise. An existing reference for file_id is replaced.
+
+        Returns:
+            Path of the reference for file_id
+        """
+        ref_path = self.ref_path(file_id)
+        if not ref_path:
+            self._discard(tmp_path)
+            raise ValueError(f"Invalid file_id: {file_id!r}")
+
+        blob_path = self.blob_path(digest)
+        os.makedirs(os.path.dirname(blob_path), exist_ok=True)
+        os.makedirs(os.path.dirname(ref_path), exist_ok=True)
+
+        # Build the new reference under a temp name, then rename it into place
+        new_ref = f"{ref_path}.{uuid.uuid4().hex}.tmp"
+        try:
+            while True:
+                try:
+                    os.link(blob_path, new_ref)
+                    break
+                except FileNotFoundError:
+                    pass
+                except OSError as e:
+                    if e.errno != errno.EMLINK:
+                        raise
+                    # Blob hit the filesystem's link limit: keep a private copy
+                    os.link(tmp_path, new_ref)
+                    break
+                try:
+                    # New content: the temp file becomes the blob
+                    os.link(tmp_path, blob_path)
+                except FileExistsError:
+                    pass  # Another upload stored it first; link to theirs
+
+            previous_digest = self._digest_of_ref(ref_path)
+            os.replace(new_ref, ref_path)
+        finally:
+            self._discard(new_ref)
+            self._discard(tmp_path)
+
+        if previous_digest and previous_digest != digest:
+            self._collect_blob(previous_digest)
+        return ref_path
+
+    def delete(self, file_id, digest=None):
+        """
+        Drop the reference for file_id, and its blob if nothing else uses it
+
+        Returns:
+            True if a stored file was removed
+        """
+        path = self.locate(file_id)
+        if not path:
+            return False
+        if path == self.legacy_path(file_id):
+            os.unlink(path)
+            return True
+
+        digest = digest or self._digest_of_ref(path)
+        os.unlink(path)
+        if digest:
+            self._collect_blob(digest)
+        return True
+
+    def refcount(self, digest):
+        """Number of file_ids referencing a blob (0 if the blob does not exist)"""
+        try:
+            return os.stat(self.blob_path(digest)).st_nlink - 1
+        except FileNotFoundError:
+            return 0
+
+    def collect_garbage(self):
+        """
+        Remove every blob that no reference points at
+
+        Returns:
+            Number of blobs removed
+        """
+        removed = 0
+        for dirpath, _, filenames in os.walk(os.path.join(self.root, BLOBS_DIR)):
+            for name in filenames:
+                path = os.path.join(dirpath, name)
+                try:
+                    if os.stat(path).st_nlink <= 1:
+                        os.unlink(path)
+                        removed += 1
+                except FileNotFoundError:
+                    continue
+        return removed
+
+    def migrate_flat_store(self, dry_run=False):
+        """
+        Convert files stored flat as <root>/<file_id> into blobs and references
+
+        Safe to re-run: files already migrated are no longer in the flat layout.
+
+        Returns:
+            Dict with counts of files seen, migrated, bytes stored and bytes saved
+        """
+        stats = {'files': 0, 'migrated': 0, 'bytes': 0, 'bytes_deduplicated': 0}
+        seen_digests = set()
+        for name in sorted(os.listdir(self.root)):
+            path = os.path.join(self.root, name)
+            if name.startswith('.') or name in (BLOBS_DIR, REFS_DIR) or not os.path.isfile(path):
+                continue
+            stats['files'] += 1
+            size = os.path.getsize(path)
+            digest = file_digest(path)
+            if digest in seen_digests or self.refcount(digest) > 0:
+                stats['bytes_deduplicated'] += size
+            else:
+                stats['bytes'] += size
+            seen_digests.add(digest)
+            if dry_run:
+                continue
+
+            # Move (not copy) the file aside so the migration needs no extra space
+            tmp_path = self.temp_path()
+            os.replace(path, tmp_path)
+            self.ingest(tmp_path, digest, name)
+            stats['migrated'] += 1
+        return stats
+
+    def _digest_of_ref(self, ref_path):
+        """
+        Find the blob a reference points at, or None
+
+        References carry no digest of their own, so this hashes the file and
+        checks the blob shares its inode.
+        """
+        try:
+            ref_stat = os.stat(ref_path)
+        except FileNotFoundError:
+            return None
+        digest = file_digest(ref_path)
+        try:
+            blob_stat = os.stat(self.blob_path(digest))
+        except FileNotFoundError:
+            return None
+        if (blob_stat.st_dev, blob_stat.st_ino) != (ref_stat.st_dev, ref_stat.st_ino):
+            return None
+        return digest
+
+    def _collect_blob(self, digest):
+        """Remove a blob if no reference is left"""
+        path = self.blob_path(digest)
+        try:
+            if os.stat(path).st_nlink <= 1:
+                os.unlink(path)
+        except FileNotFoundError:
+            pass
+
+    @staticmethod
+    def _discard(path):
+        try:
+            os.unlink(path)
+        except FileNotFoundError:
+            pass
+
+
+__all__ = [
+    'ContentStore',
+    'ref_relpath',
+    'blob_relpath',
+    'stored_name',
+    'file_digest',
+]
@@ -0,0 +1,283 @@
+"""
+Pooled HTTP client for calls to internal services (file server, usdt-api,
+metrics service).
+
+One HTTPClient per upstream keeps a requests.Session with its own connection
+pool, so calls reuse keep-alive connections instead of opening a new TCP
+connection each time. Every call gets a default (connect, read) timeout,
+idempotent calls are retried with jittered exponential backoff, and a circuit
+breaker fails calls fast while an upstream is down. Latency, errors, retries
+and breaker state are exported per upstream.
+
+Errors are the usual requests exceptions (CircuitOpenError is a
+ConnectionError), so existing `except requests.exceptions.RequestException`
+handlers keep working.
+"""
+
+import os
+import random
+import threading
+import time
+
+import requests
+from requests.adapters import HTTPAdapter
+
+from .logging_config import setup_logger
+from .metrics import (
+    upstream_request_latency,
+    upstream_requests,
+    upstream_request_errors,
+    upstream_request_retries,
+    upstream_circuit_open,
+)
+
+# Set up the logger
+logger = setup_logger(__name__, 'http_client.log')
+
+HTTP_CONNECT_TIMEOUT = float(os.getenv('HTTP_CONNECT_TIMEOUT', '3.05'))
+HTTP_READ_TIMEOUT = float(os.getenv('HTTP_READ_TIMEOUT', '30'))
+# Connections kept alive per upstream host (and per gunicorn worker)
+HTTP_POOL_MAXSIZE = int(os.getenv('HTTP_POOL_MAXSIZE', '20'))
+# Extra attempts for idempotent calls that fail with a transport error or RETRY_STATUSES
+HTTP_RETRIES = int(os.getenv('HTTP_RETRIES', '2'))
+HTTP_RETRY_BACKOFF = float(os.getenv('HTTP_RETRY_BACKOFF', '0.1'))
+HTTP_RETRY_BACKOFF_MAX = float(os.getenv('HTTP_RETRY_BACKOFF_MAX', '2'))
+# Consecutive failures that open an upstream's circuit, and how long it stays open
+HTTP_CIRCUIT_FAILURE_THRESHOLD = int(os.getenv('HTTP_CIRCUIT_FAILURE_THRESHOLD', '5'))
+HTTP_CIRCUIT_RESET_SECONDS = float(os.getenv('HTTP_CIRCUIT_RESET_SECONDS', '30'))
+
+IDEMPOTENT_METHODS = frozenset(['GET', 'HEAD', 'OPTIONS', 'PUT', 'DELETE'])
+# Statuses that mean the upstream (or a proxy in front of it) is unavailable
+RETRY_STATUSES = frozenset([502, 503, 504])
+
+
+class CircuitOpenError(requests.exceptions.ConnectionError):
+    """Raised instead of calling an upstream whose circuit is open"""
+
+
+class CircuitBreaker:
+    """
+    Consecutive-failure circuit breaker.
+
+    After `failure_threshold` failures in a row the circuit opens and calls
+    are rejected for `reset_timeout` seconds. Then a single trial call is let
+    through (half-open): success closes the circuit, failure re-opens it.
+    """
+
+    CLOSED = 'closed'
+    OPEN = 'open'
+    HALF_OPEN = 'half_open'
+
+    def __init__(self, failure_threshold=HTTP_CIRCUIT_FAILURE_THRESHOLD, reset_timeout=HTTP_CIRCUIT_RESET_SECONDS):
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self.state = self.CLOSED
+        self._failures = 0
+        self._opened_at = 0.0
+        self._trial_in_flight = False
+        self._lock = threading.Lock()
+
+    def allow(self):
+        """True if a call may go ahead now"""
+        with self._lock:
+            if self.state == self.CLOSED:
+                return True
+            if self.state == self.OPEN:
+                if time.monotonic() - self._opened_at < self.reset_timeout:
+                    return False
+                self.state = self.HALF_OPEN
+                self._trial_in_flight = False
+            # Half-open: only one trial call at a time
+            if self._trial_in_flight:
+                return False
+            self._trial_in_flight = True
+            return True
+
+    def record_success(self):
+        with self._lock:
+            self.state = self.CLOSED
+            self._failures = 0
+            self._trial_in_flight = False
+
+    def release(self):
+        """Forget a call that ended without reaching the upstream"""
+        with self._lock:
+            self._trial_in_flight = False
+
+    def record_failure(self):
+        """Count a failure; returns True if this opened the circuit"""
+        with self._lock:
+            self._failures += 1
+            self._trial_in_flight = False
+            if self.state == self.HALF_OPEN or (
+                    self.state == self.CLOSED and self._failures >= self.failure_threshold):
+                self.state = self.OPEN
+                self._opened_at = time.monotonic()
+                return True
+            return False
+
+
+def _replayable(kwargs):
+    """False if the request body is a stream that cannot be sent twice"""
+    data = kwargs.get('data')
+    if data is not None and hasattr(data, 'read'):
+        return False
+    for value in (kwargs.get('files') or {}).values():
+        content = value[1] if isinstance(value, (tuple, list)) else value
+        if hasattr(content, 'read'):
+            return False
+    return True
+
+
+class HTTPClient:
+    """
+    Client for one upstream service.
+
+    Use it like the requests module: client.get(url, ...), client.post(...).
+    Extra keyword arguments to request():
+        idempotent: Override whether the call may be retried (defaults to
+            True for IDEMPOTENT_METHODS with a replayable body)
+    """
+
+    def __init__(self, name, headers=None, timeout=None, retries=HTTP_RETRIES,
+                 pool_maxsize=HTTP_POOL_MAXSIZE, breaker=None):
+        self.name = name
+        self.headers = dict(headers or {})
+        self.timeout = timeout or (HTTP_CONNECT_TIMEOUT, HTTP_READ_TIMEOUT)
+        self.retries = retries
+        self.pool_maxsize = pool_maxsize
+        self.breaker = breaker or CircuitBreaker()
+        self._session = None
+        self._session_pid = None
+        self._session_lock = threading.Lock()
+
+    @property
+    def session(self):
+        """
+        The pooled session, created on first use
+
+        Rebuilt after a fork so gunicorn workers never share sockets inherited
+        from the master process.
+        """
+        pid = os.getpid()
+        if self._session is not None and self._session_pid == pid:
+            return self._session
+        with self._session_lock:
+            if self._session is None or self._session_pid != pid:
+                session = requests.Session()
+                # Retries are handled here, not by urllib3, so they are counted and jittered
+                adapter = HTTPAdapter(pool_connections=4, pool_maxsize=self.pool_maxsize, max_retries=0)
+                session.mount('http://', adapter)
+                session.mount('https://', adapter)
+                session.headers.update(self.headers)
+                self._session = session
+                self._session_pid = pid
+        return self._session
+
+    def request(self, method, url, idempotent=None, **kwargs):
+        """
+        Send a request through the pool
+
+        Returns:
+            requests.Response (including error statuses, as with requests)
+
+        Raises:
+            CircuitOpenError: The upstream's circuit is open
+            requests.exceptions.RequestException: The last attempt failed
+        """
+        method = method.upper()
+        kwargs.setdefault('timeout', self.timeout)
+        if idempotent is None:
+            idempotent = method in IDEMPOTENT_METHODS and _replayable(kwargs)
+        attempts = 1 + (self.retries if idempotent else 0)
+
+        for attempt in range(attempts):
+            if not self.breaker.allow():
+                upstream_request_errors.labels(self.name, 'circuit_open').inc()
+                raise CircuitOpenError(f"Circuit open for upstream '{self.name}'")
+
+            started = time.time()
+            try:
+                response = self.session.request(method, url, **kwargs)
+            except (requests.exceptions.ConnectionError, requests.exceptions.Timeout) as e:
+                upstream_request_latency.labels(self.name, method).observe(time.time() - started)
+                reason = 'timeout' if isinstance(e, requests.exceptions.Timeout) else 'connection'
+                upstream_requests.labels(self.name, method, 'error').inc()
+                upstream_request_errors.labels(self.name, reason).inc()
+                self._record_failure()
+                if attempt + 1 >= attempts:
+                    raise
+                logger.warning(f"{self.name}: {method} {url} failed ({reason}: {str(e)}), retrying")
+            except Exception:
+                self.breaker.release()
+                raise
+            else:
+                upstream_request_latency.labels(self.name, method).observe(time.time() - started)
+                upstream_requests.labels(self.name, method, response.status_code).inc()
+                if response.status_code not in RETRY_STATUSES:
+                    self.breaker.record_success()
+                    upstream_circuit_open.labels(self.name).set(0)
+                    return response
+                upstream_request_errors.labels(self.name, f"status_{response.status_code}").inc()
+                self._record_failure()
+                if attempt + 1 >= attempts:
+                    return response
+                response.close()
+                logger.warning(f"{self.name}: {method} {url} returned {response.status_code}, retrying")
+
+            upstream_request_retries.labels(self.name).inc()
+            time.sleep(self._backoff(attempt))
+
+    def get(self, url, **kwargs):
+        return self.request('GET', url, **kwargs)
+
+    def head(self, url, **kwargs):
+        return self.request('HEAD', url, **kwargs)
+
+    def post(self, url, **kwargs):
+        return self.request('POST', url, **kwargs)
+
+    def put(self, url, **kwargs):
+        return self.request('PUT', url, **kwargs)
+
+    def delete(self, url, **kwargs):
+        return self.request('DELETE', url, **kwargs)
+
+    def _record_failure(self):
+        if self.breaker.record_failure():
+            logger.error(f"Circuit opened for upstream '{self.name}' for {self.breaker.reset_timeout}s")
+        upstream_circuit_open.labels(self.name).set(1 if self.breaker.state != CircuitBreaker.CLOSED else 0)
+
+    @staticmethod
+    def _backoff(attempt):
+        """Full-jitter exponential backoff, so retrying workers do not synchronise"""
+        return random.uniform(0, min(HTTP_RETRY_BACKOFF_MAX, HTTP_RETRY_BACKOFF * (2 ** attempt)))
+
+
+_clients = {}
+_clients_lock = threading.Lock()
+
+
+def get_http_client(name):
+    """
+    Return the process-wide client for an upstream, creating it on first use
+
+    Args:
+        name: Upstream name used for pooling, the circuit breaker and metric labels
+              (e.g. 'file_server', 'usdt_api')
+    """
+    client = _clients.get(name)
+    if client is None:
+        with _clients_lock:
+            client = _clients.get(name)
+            if client is None:
+                client = _clients[name] = HTTPClient(name)
+    return client
+
+
+__all__ = [
+    'HTTPClient',
+    'CircuitBreaker',
+    'CircuitOpenError',
+    'get_http_client',
+]
@@ -0,0 +1,126 @@
+"""
+Resized/re-encoded variants of uploaded images.
+
+Variants are produced by the file server next to the original and stored in
+the content store under a derived file_id, so they are generated once (at
+upload or on first request) and then served like any other file.
+
+Pillow is optional: without it variants_supported() is False and callers
+serve the original image.
+"""
+
+import io
+
+try:
+    from PIL import Image, ImageOps
+except ImportError:  # pragma: no cover - depends on the deployment image
+    Image = None
+    ImageOps = None
+
+# Named sizes (longest side in px) accepted by ?variant=
+VARIANT_WIDTHS = {
+    'thumb': 64,
+    'small': 256,
+    'medium': 1024,
+}
+VARIANT_FORMATS = ('webp', 'jpeg', 'png')
+WEBP_QUALITY = 80
+JPEG_QUALITY = 85
+
+# Refuse to decode images whose pixel count suggests a decompression bomb
+MAX_SOURCE_PIXELS = 50_000_000
+
+
+class VariantError(ValueError):
+    """The source cannot be turned into the requested variant"""
+
+
+def variants_supported():
+    """True if the image library is installed"""
+    return Image is not None
+
+
+def resolve_width(width=None, variant=None):
+    """
+    Map a ?w= or ?variant= request onto one of the fixed variant widths
+
+    Arbitrary widths are rounded up to the next fixed size so the number of
+    stored variants per image stays bounded.
+
+    Returns:
+        Width in px, or None if the original should be served
+    """
+    if variant:
+        if variant not in VARIANT_WIDTHS:
+            raise VariantError(f"Unknown variant '{variant}'")
+        return VARIANT_WIDTHS[variant]
+    if width is None:
+        return None
+    width = int(width)
+    if width <= 0:
+        raise VariantError("Width must be positive")
+    for size in sorted(VARIANT_WIDTHS.values()):
+        if width <= size:
+            return size
+    return None
+
+
+def variant_file_id(file_id, width, fmt):
+    """file_id a variant is stored under"""
+    return f"{file_id}__w{width}.{fmt}"
+
+
+def generate_variant(source, width, fmt):
+    """
+    Produce a variant of an image
+
+    Args:
+        source: Path or binary file object of the original image
+        width: Longest side of the result in px (never upscaled)
+        fmt: One of VARIANT_FORMATS
+
+    Returns:
+        Tuple of (encoded bytes, mimetype)
+    """
+    if not variants_supported():
+        raise VariantError("Image processing is not available")
+    if fmt not in VARIANT_FORMATS:
+        raise VariantError(f"Unsupported format '{fmt}'")
+
+    try:
+        with Image.open(source) as image:
+            if image.width * image.height > MAX_SOURCE_PIXELS:
+                raise VariantError("Image is too large to resize")
+            # Apply EXIF rotation so phone photos keep their orientation
+            image = ImageOps.exif_transpose(image)
+            image.thumbnail((width, width))
+
+            if fmt == 'jpeg':
+                image = image.convert('RGB')
+            elif image.mode not in ('RGB', 'RGBA', 'L', 'LA'):
+                image = image.convert('RGBA')
+
+            output = io.BytesIO()
+            if fmt == 'webp':
+                image.save(output, 'WEBP', quality=WEBP_QUALITY, method=4)
+            elif fmt == 'jpeg':
+                image.save(output, 'JPEG', quality=JPEG_QUALITY, optimize=True, progressive=True)
+            else:
+                image.save(output, 'PNG', optimize=True)
+    except VariantError:
+        raise
+    except Exception as e:
+        raise VariantError(f"Not a supported image: {str(e)}") from e
+
+    return output.getvalue(), f"image/{fmt}"
+
+
+__all__ = [
+    'VARIANT_WIDTHS',
+    'VARIANT_FORMATS',
+    'VariantError',
+    'variants_supported',
+    'resolve_width',
+    'variant_file_id',
+    'generate_variant',
+]
@@ -0,0 +1,121 @@
+"""
+Wake-ups for background jobs from Postgres LISTEN/NOTIFY.
+
+Triggers on withdrawal, deposit and invoice NOTIFY the background_jobs channel
+with the name of the job that has new work (see
+migrations/add_job_notifications.sql). JobNotificationListener holds one
+dedicated LISTEN connection and sets a per-job event when a notification
+arrives, so a job waiting in wait() starts within milliseconds instead of at
+its next poll. Postgres folds identical notifications sent in one transaction
+into one, so bulk inserts cause a single wake-up.
+
+Notifications sent while the listener is disconnected are lost. On every
+(re)connect all jobs are woken once to catch up, and jobs keep a polling
+interval as a safety net.
+"""
+
+import os
+import select
+import threading
+import time
+
+from psycopg2.extensions import ISOLATION_LEVEL_AUTOCOMMIT
+
+from .database import get_db_connection
+from .logging_config import setup_logger
+
+# Set up the logger
+logger = setup_logger(__name__, 'job_notifications.log')
+
+JOB_NOTIFY_CHANNEL = 'background_jobs'
+# An idle LISTEN connection is pinged this often, so a dead one is noticed
+JOB_LISTEN_KEEPALIVE_SECONDS = int(os.getenv('JOB_LISTEN_KEEPALIVE_SECONDS', '300'))
+JOB_LISTEN_RECONNECT_DELAY = int(os.getenv('JOB_LISTEN_RECONNECT_DELAY', '5'))
+
+
+class JobNotificationListener:
+    """Listens on JOB_NOTIFY_CHANNEL and wakes the jobs named in notifications"""
+
+    def __init__(self, channel=JOB_NOTIFY_CHANNEL, connection_factory=get_db_connection):
+        self.channel = channel
+        self._connection_factory = connection_factory
+        self._events = {}
+        self._lock = threading.Lock()
+        self.listening = False
+
+    def _event(self, job):
+        with self._lock:
+            if job not in self._events:
+                self._events[job] = threading.Event()
+            return self._events[job]
+
+    def notify(self, job):
+        """Wake a job, as a notification for it would"""
+        self._event(job).set()
+
+    def notify_all(self):
+        with self._lock:
+            events = list(self._events.values())
+        for event in events:
+            event.set()
+
+    def wait(self, job, timeout):
+        """
+        Block until the job is notified or the timeout passes
+
+        Args:
+            job: Job name used by the triggers
+            timeout: Longest wait in seconds
+
+        Returns:
+            True if the job was notified, False on timeout
+        """
+        event = self._event(job)
+        notified = event.wait(timeout)
+        event.clear()
+        return notified
+
+    def start(self):
+        """Run the listener on a daemon thread"""
+        thread = threading.Thread(target=self.run, daemon=True, name="job-notifications")
+        thread.start()
+        return thread
+
+    def run(self):
+        """Listen forever, reconnecting after errors"""
+        while True:
+            try:
+                self._listen()
+            except Exception as e:
+                logger.error(f"Job notification listener error: {str(e)}")
+            self.listening = False
+            time.sleep(JOB_LISTEN_RECONNECT_DELAY)
+
+    def _listen(self):
+        conn = self._connection_factory()
+        try:
+            conn.set_isolation_level(ISOLATION_LEVEL_AUTOCOMMIT)
+            with conn.cursor() as cur:
+                cur.execute(f"LISTEN {self.channel};")
+            self.listening = True
+            logger.info(f"Listening for job notifications on '{self.channel}'")
+            # Work may have been queued while nobody was listening
+            self.notify_all()
+
+            while True:
+                if select.select([conn], [], [], JOB_LISTEN_KEEPALIVE_SECONDS) == ([], [], []):
+                    with conn.cursor() as cur:
+                        cur.execute("SELECT 1;")
+                    continue
+                conn.poll()
+                while conn.notifies:
+                    notification = conn.notifies.pop(0)
+                    self.notify(notification.payload)
+        finally:
+            conn.close()
+
+
+__all__ = [
+    'JobNotificationListener',
+    'JOB_NOTIFY_CHANNEL',
+]
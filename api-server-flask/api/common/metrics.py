@@ -1,4 +1,4 @@
-from prometheus_client import Counter, Histogram, Summary, generate_latest, REGISTRY
+from prometheus_client import Counter, Gauge, Histogram, Summary, generate_latest, REGISTRY
 from functools import wraps
 from flask import request
 from .logging_config import setup_logger
@@ -13,6 +13,72 @@ searchable_latency = Histogram('searchable_v1_request_latency_seconds', 'Request
                               ['endpoint', 'origin'])
 search_results_count = Summary('searchable_v1_search_results_count', 'Number of search results returned in v1 API')
 
+# Database connection pool metrics
+db_pool_connections_in_use = Gauge('searchable_db_pool_connections_in_use', 'Database connections currently checked out of the pool')
+db_pool_connections_idle = Gauge('searchable_db_pool_connections_idle', 'Idle database connections held by the pool')
+db_pool_checkout_waits = Counter('searchable_db_pool_checkout_waits_total', 'Checkouts that had to wait for a free connection')
+db_pool_checkout_timeouts = Counter('searchable_db_pool_checkout_timeouts_total', 'Checkouts that gave up waiting for a free connection')
+db_pool_checkout_latency = Histogram('searchable_db_pool_checkout_latency_seconds', 'Time taken to check a connection out of the pool',
+                                     buckets=(0.0005, 0.001, 0.005, 0.01, 0.05, 0.1, 0.5, 1, 5, 10))
+db_pool_discarded_connections = Counter('searchable_db_pool_discarded_connections_total', 'Pooled connections closed because they were broken')
+
+# SQL statement metrics, labelled by normalized statement fingerprint
+db_query_latency = Histogram('searchable_db_query_latency_seconds', 'SQL statement latency in seconds',
+                             ['operation', 'fingerprint'],
+                             buckets=(0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10))
+db_query_rows = Histogram('searchable_db_query_rows', 'Rows returned or affected per SQL statement',
+                          ['operation', 'fingerprint'],
+                          buckets=(0, 1, 5, 10, 50, 100, 500, 1000, 5000))
+db_slow_queries = Counter('searchable_db_slow_queries_total', 'SQL statements slower than the slow-query threshold',
+                          ['operation', 'fingerprint'])
+
+# Internal HTTP client metrics, labelled by upstream service
+upstream_request_latency = Histogram('searchable_upstream_request_latency_seconds', 'Latency of calls to internal services in seconds',
+                                     ['upstream', 'method'],
+                                     buckets=(0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30))
+upstream_requests = Counter('searchable_upstream_requests_total', 'Calls to internal services by response status',
+                            ['upstream', 'method', 'status'])
+upstream_request_errors = Counter('searchable_upstream_request_errors_total', 'Failed calls to internal services',
+                                  ['upstream', 'reason'])
+upstream_request_retries = Counter('searchable_upstream_request_retries_total', 'Retried calls to internal services',
+                                   ['upstream'])
+upstream_circuit_open = Gauge('searchable_upstream_circuit_open', 'Whether the circuit breaker for an internal service is open',
+                              ['upstream'])
+
+# Stripe reconciliation (background service)
+stripe_reconcile_queue_depth = Gauge('searchable_stripe_reconcile_queue_depth', 'Unsettled Stripe checkout sessions being tracked',
+                                     ['kind', 'state'])
+stripe_reconcile_lag = Histogram('searchable_stripe_reconcile_lag_seconds', 'How late a session check ran after it was due',
+                                 buckets=(0.1, 0.5, 1, 2.5, 5, 10, 30, 60, 120, 300, 600))
+stripe_reconcile_checks = Counter('searchable_stripe_reconcile_checks_total', 'Stripe checkout session checks by outcome',
+                                  ['kind', 'result'])
+
+# USDT deposit confirmation metrics
+deposit_check_sweep_duration = Histogram('searchable_deposit_check_sweep_duration_seconds', 'Time taken to check all pending USDT deposits',
+                                         buckets=(0.5, 1, 2.5, 5, 10, 30, 60, 120, 300, 600))
+deposit_confirmation_latency = Histogram('searchable_deposit_confirmation_latency_seconds', 'Time from USDT deposit creation until it was credited',
+                                         buckets=(30, 60, 120, 300, 600, 900, 1800, 3600))
+deposit_checks = Counter('searchable_deposit_checks_total', 'USDT deposit checks by outcome', ['result'])
+
+# Background job scheduler metrics
+background_job_duration = Histogram('searchable_background_job_duration_seconds', 'Duration of background job runs',
+                                    ['job'], buckets=(0.01, 0.05, 0.1, 0.5, 1, 2.5, 5, 10, 30, 60, 300, 900))
+background_job_last_success = Gauge('searchable_background_job_last_success_timestamp_seconds', 'Unix time of the last successful run of a background job',
+                                    ['job'])
+background_job_failures = Counter('searchable_background_job_failures_total', 'Background job runs that raised an error', ['job'])
+background_job_items = Counter('searchable_background_job_items_processed_total', 'Items processed by background job runs', ['job'])
+background_job_skipped = Counter('searchable_background_job_skipped_total', 'Singleton job runs skipped because another replica held the lock', ['job'])
+background_job_timeouts = Counter('searchable_background_job_timeouts_total', 'Background job runs that exceeded their timeout', ['job'])
+
+# USDT service outbox metrics
+usdt_outbox_depth = Gauge('searchable_usdt_outbox_depth', 'Outbox requests to the USDT service not yet answered', ['status'])
+usdt_outbox_dispatches = Counter('searchable_usdt_outbox_dispatches_total', 'Outbox request dispatches by outcome', ['outcome'])
+
+# Deposit address pool metrics
+deposit_address_pool_available = Gauge('searchable_deposit_address_pool_available', 'Pre-generated deposit addresses not yet assigned')
+deposit_address_pool_claims = Counter('searchable_deposit_address_pool_claims_total', 'Deposit address claims from the pool by result (miss: derived synchronously)',
+                                      ['result'])
+
 # Enhanced metrics tracking decorator
 def track_metrics(endpoint):
     def decorator(f):
@@ -57,4 +123,13 @@ def track_metrics(endpoint):
         return decorated
     return decorator
 
-__all__ = ['track_metrics', 'searchable_requests', 'searchable_latency', 'search_results_count', 'generate_latest', 'REGISTRY'] 
\ No newline at end of file
+__all__ = [
+    'track_metrics', 'searchable_requests', 'searchable_latency', 'search_results_count',
+    'db_pool_connections_in_use', 'db_pool_connections_idle', 'db_pool_checkout_waits',
+    'db_pool_checkout_timeouts', 'db_pool_checkout_latency', 'db_pool_discarded_connections',
+    'db_query_latency', 'db_query_rows', 'db_slow_queries',
+    'upstream_request_latency', 'upstream_requests', 'upstream_request_errors',
+    'upstream_request_retries', 'upstream_circuit_open',
+    'stripe_reconcile_queue_depth', 'stripe_reconcile_lag', 'stripe_reconcile_checks',
+    'generate_latest', 'REGISTRY',
+] 
\ No newline at end of file
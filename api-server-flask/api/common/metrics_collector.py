@@ -15,6 +15,8 @@ import threading
 from queue import Queue, Full
 import time
 
+from .http_client import HTTPClient
+
 logger = logging.getLogger(__name__)
 
 class MetricType(Enum):
@@ -88,11 +90,11 @@ class MetricsCollector:
         self._running = False
         self._worker_thread = None
         
-        # Session for HTTP requests
-        self._session = requests.Session()
+        # Pooled client for HTTP requests
+        headers = {'Content-Type': 'application/json'}
         if api_key:
-            self._session.headers['X-API-Key'] = api_key
-        self._session.headers['Content-Type'] = 'application/json'
+            headers['X-API-Key'] = api_key
+        self._session = HTTPClient('metrics', headers=headers)
         
     def start(self):
         """Start the background worker thread"""
@@ -1,6 +1,7 @@
 from .logging_config import setup_logger
 from .models import Currency, PaymentStatus, PaymentType
 from .invoice_calculator import calc_invoice_core
+from .database import execute_sql
 from .database_context import database_transaction, db
 from psycopg2.extras import Json
 import uuid
@@ -38,10 +39,50 @@ def calc_invoice(searchable_data, selections):
         raise ValueError("Invalid searchable data or selections") from e
 
 
+def lock_user_balances(cur, *user_ids):
+    """
+    Lock the user_balance rows of several users until the surrounding transaction ends.
+    
+    Concurrent debits for the same user queue behind this row lock, so the
+    balance read here cannot be spent twice before this transaction commits.
+    Rows are locked in user_id order: a payment's ledger trigger also writes
+    the seller's row, and two users paying each other at once would otherwise
+    take the same two locks in opposite orders and deadlock.
+    
+    Args:
+        cur: Cursor of the open transaction
+        user_ids: Users whose balance rows the transaction will change
+        
+    Returns:
+        dict: Current balance of each user
+    """
+    ordered_ids = sorted({int(user_id) for user_id in user_ids})
+    execute_sql(cur, """
+        INSERT INTO user_balance (user_id)
+        SELECT id FROM unnest(%s::int[]) AS id ORDER BY id
+        ON CONFLICT (user_id) DO NOTHING
+    """, params=(ordered_ids,))
+    execute_sql(cur, """
+        SELECT user_id, balance FROM user_balance
+        WHERE user_id = ANY(%s)
+        ORDER BY user_id
+        FOR UPDATE
+    """, params=(ordered_ids,))
+    balances = {user_id: 0.0 for user_id in ordered_ids}
+    for user_id, balance in cur.fetchall():
+        balances[user_id] = float(balance) if balance is not None else 0.0
+    return balances
+
+
 def create_balance_invoice_and_payment(buyer_id, seller_id, searchable_id, amount, currency, metadata=None):
     """
     Create a balance payment invoice and mark it as complete in one atomic transaction.
     
+    The buyer's and seller's user_balance rows are locked (in user_id order)
+    before the balance check, and the payment insert debits and credits them
+    (via the ledger trigger) in the same transaction, so parallel purchases by
+    one buyer cannot overdraw the balance.
+    
     Args:
         buyer_id: ID of the user making the payment
         seller_id: ID of the user receiving the payment
@@ -57,18 +98,10 @@ def create_balance_invoice_and_payment(buyer_id, seller_id, searchable_id, amoun
         ValueError: If insufficient balance or invalid parameters
         Exception: If database transaction fails
     """
-    # Import here to avoid circular import
-    from .data_helpers import (
-        get_balance_by_currency, 
-        create_invoice as db_create_invoice, 
-        execute_sql
-    )
-    
     try:
         with database_transaction() as (cur, conn):
-            # Check user balance inside transaction to prevent race conditions
-            balance_data = get_balance_by_currency(buyer_id)
-            balance = balance_data.get(currency.lower(), 0)
+            # Check user balance under a row lock to prevent double spending
+            balance = lock_user_balances(cur, buyer_id, seller_id)[int(buyer_id)]
             logger.info(f"User {buyer_id} balance: {balance}, required: {amount}")
             
             if balance < amount:
@@ -77,23 +110,38 @@ def create_balance_invoice_and_payment(buyer_id, seller_id, searchable_id, amoun
             # Create unique external ID for tracking
             external_id = f"balance_{uuid.uuid4()}"
             
-            # Create invoice with type='balance' and fee=0
-            invoice_data = {
-                'buyer_id': buyer_id,
-                'seller_id': seller_id,
-                'searchable_id': searchable_id,
-                'amount': amount,
-                'fee': 0,  # No platform fee for balance payments
-                'currency': currency,
-                'invoice_type': PaymentType.BALANCE.value,  # Changed from 'type' to 'invoice_type'
-                'external_id': external_id,
-                'metadata': metadata or {}
-            }
-            
-            invoice = db_create_invoice(**invoice_data)
+            # Create invoice with type='balance' and fee=0 (no platform fee for balance payments)
+            execute_sql(cur, """
+                INSERT INTO invoice (buyer_id, seller_id, searchable_id, amount, fee, currency, type, external_id, metadata)
+                VALUES (%s, %s, %s, %s, %s, %s, %s, %s, %s)
+                RETURNING id, buyer_id, seller_id, searchable_id, amount, fee, currency, type, external_id, created_at, metadata
+            """, params=(
+                buyer_id,
+                seller_id,
+                searchable_id,
+                amount,
+                0,
+                currency,
+                PaymentType.BALANCE.value,
+                external_id,
+                Json(metadata or {})
+            ))
             
-            if not invoice:
-                raise Exception("Failed to create invoice")
+            row = cur.fetchone()
+            invoice = {
+                'id': row[0],
+                'buyer_id': row[1],
+                'seller_id': row[2],
+                'searchable_id': row[3],
+                'amount': float(row[4]),
+                'fee': float(row[5]),
+                'currency': row[6],
+                'type': row[7],
+                'external_id': row[8],
+                'created_at': row[9].isoformat() if row[9] else None,
+                'metadata': row[10],
+                'status': PaymentStatus.COMPLETE.value
+            }
             
             logger.info(f"Created balance invoice {invoice['id']} for user {buyer_id}")
             
@@ -128,9 +176,6 @@ def create_balance_invoice_and_payment(buyer_id, seller_id, searchable_id, amoun
                 'metadata': row[9]
             }
             
-            if not payment:
-                raise Exception("Failed to create payment")
-            
             logger.info(f"Created balance payment {payment['id']} with status=complete")
             
             # Transaction commits automatically with context manager
@@ -140,6 +185,7 @@ def create_balance_invoice_and_payment(buyer_id, seller_id, searchable_id, amoun
             return {
                 'payment': payment,
                 'invoice': invoice,
+                'balance_remaining': balance - amount,
                 'success': True
             }
         
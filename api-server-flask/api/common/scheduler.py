@@ -0,0 +1,216 @@
+"""
+Scheduler for the periodic jobs of the background service.
+
+Each registered job runs on its own thread, so a job never overlaps itself
+and a slow job never delays the others. Between runs a job sleeps for its
+interval (spread by +/- `jitter` so replicas do not run in lockstep), or
+until the job is woken through a JobNotificationListener.
+
+Singleton jobs take a Postgres advisory lock around every run. With several
+background replicas exactly one of them runs the job at a time, and the
+others skip that run. The lock is session-level on a dedicated connection, so
+it is released by the database if the replica dies mid-run.
+
+Runs that take longer than the job's timeout are reported, but not
+interrupted: a Python thread cannot be stopped safely. The next run waits for
+the slow one to finish.
+"""
+
+import random
+import threading
+import time
+import zlib
+from concurrent.futures import ThreadPoolExecutor, TimeoutError as FutureTimeoutError
+
+from .database import get_db_connection
+from .logging_config import setup_logger
+from .metrics import (
+    background_job_duration,
+    background_job_last_success,
+    background_job_failures,
+    background_job_items,
+    background_job_skipped,
+    background_job_timeouts,
+)
+
+# Set up the logger
+logger = setup_logger(__name__, 'scheduler.log')
+
+# First key of the two-key advisory locks taken for singleton jobs
+SCHEDULER_LOCK_NAMESPACE = 7301
+
+
+def advisory_lock_key(name):
+    """Stable signed 32-bit advisory lock key for a job name"""
+    key = zlib.crc32(name.encode('utf-8'))
+    return key - 2 ** 32 if key >= 2 ** 31 else key
+
+
+class AdvisoryLock:
+    """Session-level pg_try_advisory_lock held on a dedicated connection"""
+
+    def __init__(self, name, connection_factory=get_db_connection):
+        self.key = advisory_lock_key(name)
+        self._connection_factory = connection_factory
+        self._conn = None
+
+    def _execute(self, sql):
+        if self._conn is None or self._conn.closed:
+            self._conn = self._connection_factory()
+            self._conn.autocommit = True
+        try:
+            with self._conn.cursor() as cur:
+                cur.execute(sql, (SCHEDULER_LOCK_NAMESPACE, self.key))
+                return cur.fetchone()[0]
+        except Exception:
+            # Closing the session also drops any lock it held
+            self.close()
+            raise
+
+    def acquire(self):
+        """Take the lock if no other session holds it, without waiting"""
+        return self._execute("SELECT pg_try_advisory_lock(%s, %s)")
+
+    def release(self):
+        return self._execute("SELECT pg_advisory_unlock(%s, %s)")
+
+    def close(self):
+        if self._conn is not None:
+            try:
+                self._conn.close()
+            except Exception:
+                pass
+            self._conn = None
+
+
+class Job:
+    """A registered job and its schedule"""
+
+    def __init__(self, name, func, interval, idle_interval=None, jitter=0.1, timeout=None,
+                 singleton=False, wake=None, busy=None):
+        """
+        Args:
+            name: Job name, used in logs, metrics and the advisory lock key
+            func: Callable run by the job; may return the number of items it processed
+            interval: Seconds between runs
+            idle_interval: Seconds between runs while the job is not busy (defaults to interval)
+            jitter: Fraction of the delay by which each delay is randomly spread
+            timeout: Seconds after which a run is reported as overdue
+            singleton: Run on one replica at a time, under an advisory lock
+            wake: Notification name that starts the next run early
+            busy: Callable taking the run's result that says whether more work is
+                in hand; by default a job is busy unless it processed 0 items
+        """
+        self.name = name
+        self.func = func
+        self.interval = interval
+        self.idle_interval = idle_interval or interval
+        self.jitter = jitter
+        self.timeout = timeout
+        self.wake = wake
+        self.busy = busy or (lambda result: result != 0)
+        self.lock = AdvisoryLock(name) if singleton else None
+
+    def next_delay(self, busy, listening=True):
+        """Seconds until the next run; the idle interval relies on wake-ups, so needs a listener"""
+        delay = self.interval if busy or not (self.wake and listening) else self.idle_interval
+        return delay * random.uniform(1 - self.jitter, 1 + self.jitter)
+
+
+class Scheduler:
+    """Runs registered jobs, each on its own thread"""
+
+    def __init__(self, listener=None):
+        """
+        Args:
+            listener: JobNotificationListener that wakes jobs registered with `wake`
+        """
+        self.listener = listener
+        self.jobs = []
+        self._stopped = threading.Event()
+
+    def register(self, name, func, interval, **options):
+        """Register a job; see Job for the options"""
+        job = Job(name, func, interval, **options)
+        self.jobs.append(job)
+        return job
+
+    def start(self):
+        """Start a thread per job (and the listener, if any)"""
+        threads = []
+        if self.listener is not None:
+            threads.append(self.listener.start())
+        for job in self.jobs:
+            thread = threading.Thread(target=self._loop, args=(job,), daemon=True, name=f"job-{job.name}")
+            thread.start()
+            threads.append(thread)
+        return threads
+
+    def stop(self):
+        self._stopped.set()
+
+    def run_job(self, job, executor=None):
+        """
+        Run a job once, under its advisory lock if it is a singleton
+
+        Returns:
+            (skipped, result): skipped is True if another replica holds the lock
+        """
+        if job.lock is not None:
+            try:
+                if not job.lock.acquire():
+                    background_job_skipped.labels(job.name).inc()
+                    return True, None
+            except Exception as e:
+                logger.error(f"Could not take the lock for job {job.name}: {str(e)}")
+                background_job_failures.labels(job.name).inc()
+                return False, None
+
+        started = time.monotonic()
+        try:
+            if executor is None or not job.timeout:
+                result = job.func()
+            else:
+                future = executor.submit(job.func)
+                try:
+                    result = future.result(timeout=job.timeout)
+                except FutureTimeoutError:
+                    background_job_timeouts.labels(job.name).inc()
+                    logger.error(f"Job {job.name} has been running for over {job.timeout}s")
+                    result = future.result()
+            background_job_last_success.labels(job.name).set_to_current_time()
+            if isinstance(result, int) and not isinstance(result, bool):
+                background_job_items.labels(job.name).inc(result)
+            return False, result
+        except Exception as e:
+            background_job_failures.labels(job.name).inc()
+            logger.error(f"Job {job.name} failed: {str(e)}")
+            return False, None
+        finally:
+            background_job_duration.labels(job.name).observe(time.monotonic() - started)
+            if job.lock is not None:
+                try:
+                    job.lock.release()
+                except Exception as e:
+                    logger.warning(f"Could not release the lock for job {job.name}: {str(e)}")
+
+    def _loop(self, job):
+        executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix=f"job-{job.name}-run") if job.timeout else None
+        while not self._stopped.is_set():
+            skipped, result = self.run_job(job, executor)
+            # A failed run counts as busy, so it is retried on the short interval
+            busy = not skipped and (result is None or job.busy(result))
+            listening = self.listener is not None and self.listener.listening
+            delay = job.next_delay(busy, listening)
+            if job.wake and self.listener is not None:
+                self.listener.wait(job.wake, delay)
+            else:
+                self._stopped.wait(delay)
+
+
+__all__ = [
+    'Scheduler',
+    'Job',
+    'AdvisoryLock',
+    'advisory_lock_key',
+]
@@ -0,0 +1,200 @@
+"""
+Reconciliation of Stripe checkout sessions for invoices and deposits.
+
+The webhook settles sessions as they complete; this sweep catches sessions
+whose events were missed (or every session, when no webhook is configured).
+Each unsettled session gets its own next-check time that backs off with the
+session's age, so fresh sessions are checked often and old ones rarely.
+Sessions are dropped once Stripe has expired them. Due checks run on a small
+thread pool behind one shared rate limit, keeping the sweep well inside
+Stripe's API limits however many sessions are pending.
+"""
+
+import os
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timedelta, timezone
+
+from .data_helpers import refresh_stripe_payment, complete_stripe_deposit, expire_stripe_checkout
+from .database import execute_sql
+from .database_context import database_cursor
+from .logging_config import setup_logger
+from .metrics import stripe_reconcile_queue_depth, stripe_reconcile_lag, stripe_reconcile_checks
+from .models import PaymentStatus
+from .rate_limit import RateLimiter
+
+# Set up the logger
+logger = setup_logger(__name__, 'stripe_reconciliation.log')
+
+STRIPE_RECONCILE_WORKERS = int(os.getenv('STRIPE_RECONCILE_WORKERS', '4'))
+# Stripe allows 25 requests/s in test mode and 100/s live, shared with the API server
+STRIPE_RECONCILE_RATE = float(os.getenv('STRIPE_RECONCILE_RATE', '10'))
+# Delay between checks of one session: half its age, clamped to these bounds
+STRIPE_RECONCILE_MIN_DELAY = float(os.getenv('STRIPE_RECONCILE_MIN_DELAY', '2'))
+STRIPE_RECONCILE_MAX_DELAY = float(os.getenv('STRIPE_RECONCILE_MAX_DELAY', '1800'))
+# Checkout sessions expire 24 hours after creation unless configured otherwise
+STRIPE_SESSION_TTL_HOURS = int(os.getenv('STRIPE_SESSION_TTL_HOURS', '24'))
+
+
+def next_check_delay(age_seconds):
+    """Seconds until a session of this age is checked again"""
+    return min(STRIPE_RECONCILE_MAX_DELAY, max(STRIPE_RECONCILE_MIN_DELAY, age_seconds / 2))
+
+
+class ReconcileItem:
+    """An unsettled checkout session and when it is next due"""
+
+    __slots__ = ('kind', 'record_id', 'session_id', 'created_at', 'next_check_at', 'checks')
+
+    def __init__(self, kind, record_id, session_id, created_at, next_check_at):
+        self.kind = kind
+        self.record_id = record_id
+        self.session_id = session_id
+        self.created_at = created_at
+        self.next_check_at = next_check_at
+        self.checks = 0
+
+
+class StripeReconciler:
+    """
+    Tracks unsettled Stripe sessions and checks the ones that are due.
+
+    run_once() is meant to be called on a short fixed tick; the per-session
+    schedule decides how many Stripe calls that tick actually makes.
+    """
+
+    def __init__(self, min_age_seconds=0, workers=STRIPE_RECONCILE_WORKERS, rate=STRIPE_RECONCILE_RATE):
+        """
+        Args:
+            min_age_seconds: Leave sessions younger than this to the webhook (they
+                are tracked, but not checked until they reach this age)
+            workers: Concurrent Stripe calls
+            rate: Stripe calls per second across all workers
+        """
+        self.min_age_seconds = min_age_seconds
+        self.workers = workers
+        self.limiter = RateLimiter(rate)
+        self._items = {}
+
+    def load_pending(self):
+        """
+        Unsettled Stripe sessions from the database that have not expired yet
+
+        Returns:
+            List of (kind, record_id, session_id, created_at) tuples
+        """
+        # An hour past expiry, so the last check sees Stripe's 'expired' status
+        cutoff_time = datetime.now(timezone.utc) - timedelta(hours=STRIPE_SESSION_TTL_HOURS + 1)
+        with database_cursor() as (cur, conn):
+            # Invoices without a completed (or expired) payment
+            execute_sql(cur, """
+                SELECT 'invoice', i.id, i.external_id, i.created_at
+                FROM invoice i
+                LEFT JOIN payment p ON i.id = p.invoice_id AND p.status IN (%s, %s)
+                WHERE i.type = 'stripe'
+                AND i.created_at >= %s
+                AND p.id IS NULL
+                UNION ALL
+                SELECT 'deposit', d.id, d.external_id, d.created_at
+                FROM deposit d
+                WHERE d.type = 'stripe'
+                AND d.status = 'pending'
+                AND d.external_id IS NOT NULL
+                AND d.created_at >= %s
+            """, params=(PaymentStatus.COMPLETE.value, PaymentStatus.ERROR.value, cutoff_time, cutoff_time))
+            return cur.fetchall()
+
+    def sync(self, pending, now=None):
+        """
+        Start tracking new sessions and forget the ones that were settled
+
+        A newly seen session is due once it is min_age_seconds old; after that
+        its schedule backs off.
+        """
+        now = now or time.time()
+        seen = set()
+        for kind, record_id, session_id, created_at in pending:
+            key = (kind, record_id)
+            seen.add(key)
+            if key not in self._items:
+                created = created_at.timestamp()
+                self._items[key] = ReconcileItem(kind, record_id, session_id, created,
+                                                 max(now, created + self.min_age_seconds))
+        for key in list(self._items):
+            if key not in seen:
+                del self._items[key]
+
+    @property
+    def tracked(self):
+        """Number of unsettled sessions being tracked"""
+        return len(self._items)
+
+    def due(self, now=None):
+        """Tracked sessions whose next check time has passed, most overdue first"""
+        now = now or time.time()
+        return sorted((item for item in self._items.values() if item.next_check_at <= now),
+                      key=lambda item: item.next_check_at)
+
+    def run_once(self):
+        """
+        Reload unsettled sessions and check every one that is due
+
+        Returns:
+            Dict of outcome -> count for the checks made
+        """
+        self.sync(self.load_pending())
+        due = self.due()
+        self._report_depth(len(due))
+        if not due:
+            return {}
+
+        outcomes = {}
+        with ThreadPoolExecutor(max_workers=self.workers) as executor:
+            for item, result in zip(due, executor.map(self._check, due)):
+                outcomes[result] = outcomes.get(result, 0) + 1
+                stripe_reconcile_checks.labels(item.kind, result).inc()
+                item.checks += 1
+                if result in ('paid', 'expired'):
+                    self._items.pop((item.kind, item.record_id), None)
+                else:
+                    now = time.time()
+                    item.next_check_at = now + next_check_delay(now - item.created_at)
+
+        self._report_depth(0)
+        logger.info(f"Checked {len(due)} Stripe session(s): {outcomes}")
+        return outcomes
+
+    def _check(self, item):
+        """Check one session with Stripe and settle it if it is paid or expired"""
+        self.limiter.acquire()
+        stripe_reconcile_lag.observe(max(0.0, time.time() - item.next_check_at))
+        try:
+            payment_data = refresh_stripe_payment(item.session_id)
+            if 'error' in payment_data:
+                logger.error(f"Error checking Stripe session {item.session_id}: {payment_data['error']}")
+                return 'error'
+
+            if payment_data.get('status') == 'paid':
+                # refresh_stripe_payment already recorded invoice payments
+                if item.kind == 'deposit' and complete_stripe_deposit(item.session_id):
+                    logger.info(f"Stripe deposit {item.record_id} completed by reconciliation")
+                return 'paid'
+            if payment_data.get('session_status') == 'expired':
+                expire_stripe_checkout(item.session_id)
+                return 'expired'
+            return 'pending'
+        except Exception as e:
+            logger.error(f"Error reconciling {item.kind} {item.record_id}: {str(e)}")
+            return 'error'
+
+    def _report_depth(self, due_count):
+        for kind in ('invoice', 'deposit'):
+            tracked = sum(1 for key in self._items if key[0] == kind)
+            stripe_reconcile_queue_depth.labels(kind, 'tracked').set(tracked)
+        stripe_reconcile_queue_depth.labels('all', 'due').set(due_count)
+
+
+__all__ = [
+    'StripeReconciler',
+    'next_check_delay',
+]
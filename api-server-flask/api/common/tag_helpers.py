@@ -750,11 +750,12 @@ def search_users_by_tag_ids(tag_ids=None, username_search='', page=1, limit=20):
                            up.metadata->>'display_name' as display_name,
                            up.profile_image_url, 
                            up.introduction,
-                           COALESCE((SELECT AVG(r.rating) FROM rating r JOIN invoice i ON r.invoice_id = i.id WHERE i.seller_id = u.id), 0) as rating,
-                           COALESCE((SELECT COUNT(*) FROM rating r JOIN invoice i ON r.invoice_id = i.id WHERE i.seller_id = u.id), 0) as total_ratings,
+                           COALESCE(srs.rating_sum / NULLIF(srs.rating_count, 0), 0) as rating,
+                           COALESCE(srs.rating_count, 0) as total_ratings,
                            COALESCE((SELECT COUNT(*) FROM searchables s WHERE s.user_id = u.id AND s.removed = FALSE), 0) as searchable_count
                     FROM users u
                     LEFT JOIN user_profile up ON u.id = up.user_id
+                    LEFT JOIN seller_rating_stats srs ON srs.seller_id = u.id
                     JOIN user_tags ut ON u.id = ut.user_id
                     {where_clause}
                     ORDER BY u.id
@@ -783,11 +784,12 @@ def search_users_by_tag_ids(tag_ids=None, username_search='', page=1, limit=20):
                            up.metadata->>'display_name' as display_name,
                            up.profile_image_url, 
                            up.introduction,
-                           COALESCE((SELECT AVG(r.rating) FROM rating r JOIN invoice i ON r.invoice_id = i.id WHERE i.seller_id = u.id), 0) as rating,
-                           COALESCE((SELECT COUNT(*) FROM rating r JOIN invoice i ON r.invoice_id = i.id WHERE i.seller_id = u.id), 0) as total_ratings,
+                           COALESCE(srs.rating_sum / NULLIF(srs.rating_count, 0), 0) as rating,
+                           COALESCE(srs.rating_count, 0) as total_ratings,
                            COALESCE((SELECT COUNT(*) FROM searchables s WHERE s.user_id = u.id AND s.removed = FALSE), 0) as searchable_count
                     FROM users u
                     LEFT JOIN user_profile up ON u.id = up.user_id
+                    LEFT JOIN seller_rating_stats srs ON srs.seller_id = u.id
                     WHERE 1=1
                 """
                 if where_conditions:
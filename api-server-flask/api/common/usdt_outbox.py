@@ -0,0 +1,336 @@
+"""
+Transactional outbox for requests to the USDT service.
+
+A withdrawal's /send request is written to usdt_outbox by a trigger in the
+same transaction that creates the withdrawal, so a withdrawal can never exist
+without its send request. USDTOutboxDispatcher claims due requests with
+SKIP LOCKED (any number of replicas can dispatch), keeps up to `concurrency`
+of them in flight and records each response together with the withdrawal's
+new status in one transaction.
+
+Delivery is at-least-once. A request whose outcome is unknown (timeout,
+connection error, 5xx without a transaction hash, dispatcher crash) is sent
+again with the same request_id, which the USDT service dedupes on: it returns
+the recorded result or finishes the original transaction instead of paying
+twice. Responses are deduped here too: only the dispatcher that still holds
+the claim records one. Only a request the service rejected outright (4xx) is
+given up, so a withdrawal's balance is released only when nothing was sent.
+"""
+
+import os
+import socket
+import time
+from concurrent.futures import ThreadPoolExecutor, wait, FIRST_COMPLETED
+
+import requests
+from psycopg2.extras import Json
+
+from .database import execute_sql
+from .database_context import database_cursor, database_transaction
+from .http_client import get_http_client
+from .logging_config import setup_logger
+from .metrics import usdt_outbox_depth, usdt_outbox_dispatches
+from .models import PaymentStatus
+
+# Set up the logger
+logger = setup_logger(__name__, 'usdt_outbox.log')
+
+USDT_SERVICE_URL = os.getenv('USDT_SERVICE_URL', 'http://usdt-api:3100')
+# Requests in flight per dispatcher
+USDT_OUTBOX_CONCURRENCY = int(os.getenv('USDT_OUTBOX_CONCURRENCY', '4'))
+USDT_SEND_TIMEOUT = int(os.getenv('USDT_SEND_TIMEOUT', '60'))
+# Claims older than this belong to a dispatcher that died, and are retried
+USDT_OUTBOX_STALE_SECONDS = int(os.getenv('USDT_OUTBOX_STALE_SECONDS', '180'))
+# Retry backoff: doubles from the base with each attempt, up to the max
+USDT_OUTBOX_RETRY_BASE = int(os.getenv('USDT_OUTBOX_RETRY_BASE', '5'))
+USDT_OUTBOX_RETRY_MAX = int(os.getenv('USDT_OUTBOX_RETRY_MAX', '600'))
+
+# Fields of withdrawal metadata carried over into every outcome
+PRESERVED_METADATA_FIELDS = ('address', 'original_amount', 'fee_percentage', 'amount_after_fee')
+
+
+def is_valid_tx_hash(txhash):
+    """
+    Check if a transaction hash is valid (0x followed by 64 hex characters)
+
+    Args:
+        txhash: Transaction hash string to validate
+
+    Returns:
+        bool: True if valid, False otherwise
+    """
+    if not txhash or not isinstance(txhash, str):
+        return False
+
+    # Remove 0x prefix if present
+    if txhash.startswith('0x'):
+        txhash = txhash[2:]
+
+    # Check if it's exactly 64 characters
+    if len(txhash) != 64:
+        return False
+
+    # Check if all characters are valid hexadecimal
+    try:
+        int(txhash, 16)
+        return True
+    except ValueError:
+        return False
+
+
+def classify_send_response(status_code, response_data):
+    """
+    Map a /send response to an outcome
+
+    Returns:
+        'complete' (transfer mined), 'delayed' (transaction known but not
+        confirmed), 'rejected' (nothing was sent) or 'retry' (outcome unknown)
+    """
+    tx_hash = response_data.get('txHash')
+    if is_valid_tx_hash(tx_hash):
+        return 'complete' if response_data.get('status') == 'complete' else 'delayed'
+    if 400 <= status_code < 500 and status_code not in (408, 429):
+        return 'rejected'
+    return 'retry'
+
+
+def retry_delay(attempts):
+    """Seconds before the next attempt of a request that has been tried `attempts` times"""
+    return min(USDT_OUTBOX_RETRY_MAX, USDT_OUTBOX_RETRY_BASE * 2 ** max(0, attempts - 1))
+
+
+class USDTOutboxDispatcher:
+    """Dispatches due usdt_outbox requests and records their responses"""
+
+    def __init__(self, decimals, service_url=USDT_SERVICE_URL, concurrency=USDT_OUTBOX_CONCURRENCY, client=None):
+        """
+        Args:
+            decimals: Token decimals used to convert USD amounts for /send
+            service_url: Base URL of the USDT service
+            concurrency: Requests kept in flight
+            client: HTTPClient to send with (defaults to the shared usdt_api client)
+        """
+        self.decimals = decimals
+        self.service_url = service_url
+        self.concurrency = concurrency
+        self.client = client or get_http_client('usdt_api')
+        self.worker_id = f"{socket.gethostname()}:{os.getpid()}"
+        self.backlog = 0
+
+    def reclaim_stale(self):
+        """Make requests claimed by a dispatcher that died due again"""
+        with database_transaction() as (cur, conn):
+            execute_sql(cur, """
+                UPDATE usdt_outbox
+                SET status = 'pending',
+                    claimed_at = NULL,
+                    claimed_by = NULL,
+                    next_attempt_at = CURRENT_TIMESTAMP,
+                    last_error = 'claim by ' || claimed_by || ' expired'
+                WHERE status = 'dispatching'
+                AND claimed_at < CURRENT_TIMESTAMP - make_interval(secs => %s)
+                RETURNING request_id
+            """, params=(USDT_OUTBOX_STALE_SECONDS,))
+            reclaimed = [row[0] for row in cur.fetchall()]
+        if reclaimed:
+            logger.warning(f"Reclaimed stale outbox requests: {reclaimed}")
+        return len(reclaimed)
+
+    def claim(self, limit):
+        """
+        Claim up to `limit` due requests, oldest first, and mark their withdrawals 'sending'
+
+        Returns:
+            List of (id, request_id, withdrawal_id, endpoint, payload, attempts) rows
+        """
+        with database_transaction() as (cur, conn):
+            execute_sql(cur, """
+                UPDATE usdt_outbox o
+                SET status = 'dispatching',
+                    attempts = o.attempts + 1,
+                    claimed_at = CURRENT_TIMESTAMP,
+                    claimed_by = %s
+                FROM (
+                    SELECT id
+                    FROM usdt_outbox
+                    WHERE status = 'pending'
+                    AND next_attempt_at <= CURRENT_TIMESTAMP
+                    ORDER BY next_attempt_at, id
+                    LIMIT %s
+                    FOR UPDATE SKIP LOCKED
+                ) claimed
+                WHERE o.id = claimed.id
+                RETURNING o.id, o.request_id, o.withdrawal_id, o.endpoint, o.payload, o.attempts
+            """, params=(self.worker_id, limit))
+            rows = cur.fetchall()
+
+            withdrawal_ids = [row[2] for row in rows if row[2] is not None]
+            if withdrawal_ids:
+                execute_sql(cur, """
+                    UPDATE withdrawal
+                    SET status = %s, claimed_at = CURRENT_TIMESTAMP, claimed_by = %s
+                    WHERE id = ANY(%s) AND status = %s
+                """, params=(PaymentStatus.SENDING.value, self.worker_id, withdrawal_ids, PaymentStatus.PENDING.value))
+            return rows
+
+    def dispatch(self, row):
+        """
+        Send one claimed request and record the outcome
+
+        Returns:
+            The outcome: 'complete', 'delayed', 'rejected', 'retry' or 'duplicate'
+        """
+        outbox_id, request_id, withdrawal_id, endpoint, payload, attempts = row
+        body = dict(payload, request_id=request_id)
+        if endpoint == '/send':
+            # The outbox stores USD; the service expects token units
+            body['amount'] = float(payload['amount']) * 10 ** self.decimals
+
+        try:
+            response = self.client.post(f"{self.service_url}{endpoint}", json=body, timeout=USDT_SEND_TIMEOUT)
+            try:
+                response_data = response.json()
+            except ValueError:
+                response_data = {'error': response.text[:500]}
+            outcome = classify_send_response(response.status_code, response_data)
+            error = response_data.get('error') or f"HTTP {response.status_code}"
+        except requests.exceptions.RequestException as e:
+            response_data, outcome, error = None, 'retry', str(e)
+
+        try:
+            if outcome == 'retry':
+                recorded = self._schedule_retry(row, error)
+            else:
+                recorded = self._record(row, outcome, response_data)
+        except Exception as e:
+            # The claim expires and the request is sent again
+            logger.error(f"Error recording outcome of {request_id}: {str(e)}")
+            outcome, recorded = 'error', True
+
+        if not recorded:
+            logger.warning(f"Outcome of {request_id} was already recorded by another dispatcher")
+            outcome = 'duplicate'
+        usdt_outbox_dispatches.labels(outcome).inc()
+        return outcome
+
+    def _schedule_retry(self, row, error):
+        outbox_id, request_id, withdrawal_id, endpoint, payload, attempts = row
+        delay = retry_delay(attempts)
+        logger.warning(f"Outbox request {request_id} attempt {attempts} failed ({error}); retrying in {delay}s")
+        with database_transaction() as (cur, conn):
+            execute_sql(cur, """
+                UPDATE usdt_outbox
+                SET status = 'pending',
+                    claimed_at = NULL,
+                    claimed_by = NULL,
+                    last_error = %s,
+                    next_attempt_at = CURRENT_TIMESTAMP + make_interval(secs => %s)
+                WHERE id = %s AND status = 'dispatching' AND claimed_by = %s
+            """, params=(str(error)[:1000], delay, outbox_id, self.worker_id))
+            return cur.rowcount > 0
+
+    def _record(self, row, outcome, response_data):
+        """Record a response and apply it to the withdrawal in one transaction"""
+        outbox_id, request_id, withdrawal_id, endpoint, payload, attempts = row
+        with database_transaction() as (cur, conn):
+            execute_sql(cur, """
+                UPDATE usdt_outbox
+                SET status = %s,
+                    response = %s,
+                    completed_at = CURRENT_TIMESTAMP
+                WHERE id = %s AND status = 'dispatching' AND claimed_by = %s
+            """, params=('failed' if outcome == 'rejected' else 'sent', Json(response_data), outbox_id, self.worker_id))
+            if cur.rowcount == 0:
+                return False
+
+            if withdrawal_id is not None:
+                self._apply_to_withdrawal(cur, withdrawal_id, outcome, response_data)
+
+        tx_hash = response_data.get('txHash')
+        if outcome == 'complete':
+            logger.info(f"✅ Withdrawal {withdrawal_id} sent successfully - txHash: {tx_hash}")
+        elif outcome == 'delayed':
+            logger.error(f"❌ Withdrawal {withdrawal_id} sent but not confirmed: {response_data.get('error', response_data.get('status'))} - txHash: {tx_hash}")
+        else:
+            logger.error(f"❌ Withdrawal {withdrawal_id} rejected by USDT service: {response_data.get('error', 'Unknown error')}")
+        return True
+
+    def _apply_to_withdrawal(self, cur, withdrawal_id, outcome, response_data):
+        execute_sql(cur, "SELECT metadata FROM withdrawal WHERE id = %s FOR UPDATE", params=(withdrawal_id,))
+        found = cur.fetchone()
+        metadata = (found[0] if found else None) or {}
+
+        # Preserve existing metadata and add new fields
+        updated_metadata = dict(metadata)
+        updated_metadata.update({field: metadata.get(field) for field in PRESERVED_METADATA_FIELDS})
+        tx_hash = response_data.get('txHash')
+        if outcome == 'rejected':
+            updated_metadata.update({
+                'error_timestamp': int(time.time()),
+                'error': response_data.get('error', 'Unknown error'),
+            })
+            # The request was refused, nothing was sent: the amount is released
+            execute_sql(cur, """
+                UPDATE withdrawal
+                SET status = %s, metadata = %s
+                WHERE id = %s AND status = %s
+            """, params=(PaymentStatus.ERROR.value, Json(updated_metadata), withdrawal_id, PaymentStatus.SENDING.value))
+            return
+
+        updated_metadata.update({'tx_hash': tx_hash, 'complete_timestamp': int(time.time())})
+        if outcome == 'delayed':
+            # Followed up by the delayed withdrawal checker through /tx-status
+            updated_metadata['error'] = response_data.get('error', 'Transaction not confirmed yet')
+        execute_sql(cur, """
+            UPDATE withdrawal
+            SET status = %s, external_id = %s, metadata = %s
+            WHERE id = %s AND status = %s
+        """, params=(PaymentStatus.COMPLETE.value if outcome == 'complete' else PaymentStatus.DELAYED.value,
+                     tx_hash, Json(updated_metadata), withdrawal_id, PaymentStatus.SENDING.value))
+
+    def run_once(self):
+        """
+        Dispatch every due request, keeping `concurrency` in flight
+
+        A slow request only occupies its own slot; the others keep being
+        claimed and sent as soon as a slot frees up.
+
+        Returns:
+            Number of requests dispatched
+        """
+        self.reclaim_stale()
+        dispatched = 0
+        with ThreadPoolExecutor(max_workers=self.concurrency) as executor:
+            in_flight = set()
+            while True:
+                free = self.concurrency - len(in_flight)
+                rows = self.claim(free) if free > 0 else []
+                in_flight.update(executor.submit(self.dispatch, row) for row in rows)
+                dispatched += len(rows)
+                if not in_flight:
+                    break
+                done, in_flight = wait(in_flight, return_when=FIRST_COMPLETED)
+        self._report_depth()
+        return dispatched
+
+    def _report_depth(self):
+        with database_cursor() as (cur, conn):
+            execute_sql(cur, """
+                SELECT status, COUNT(*)
+                FROM usdt_outbox
+                WHERE status IN ('pending', 'dispatching')
+                GROUP BY status
+            """)
+            counts = dict(cur.fetchall())
+        for status in ('pending', 'dispatching'):
+            usdt_outbox_depth.labels(status).set(counts.get(status, 0))
+        # Requests waiting for a retry keep the dispatcher polling
+        self.backlog = sum(counts.values())
+
+
+__all__ = [
+    'USDTOutboxDispatcher',
+    'classify_send_response',
+    'is_valid_tx_hash',
+    'retry_delay',
+]
@@ -1,8 +1,24 @@
+import io
 import os
+import json
+import time
+import uuid
+import shutil
+import hashlib
 import logging
 from flask import Flask, request, send_file, jsonify
 from flask_cors import CORS
+from werkzeug.exceptions import HTTPException
 from werkzeug.utils import secure_filename
+from .common.cache import TTLCache
+from .common.file_storage import ContentStore
+from .common.image_variants import (
+    VARIANT_WIDTHS,
+    VARIANT_FORMATS,
+    VariantError,
+    generate_variant,
+    variant_file_id
+)
 from .common.logging_config import setup_logger
 
 # Configure logger
@@ -18,6 +34,89 @@ CORS(app)
 app.config['UPLOAD_FOLDER'] = UPLOAD_FOLDER
 app.config['MAX_CONTENT_LENGTH'] = 500 * 1024 * 1024  # 100 MB limit
 
+# Files are stored content-addressed (see common/file_storage.py), so a file's
+# ETag is the SHA-256 of its blob. Digests are cached per inode, which every
+# reference to the same blob shares, and primed whenever a file is stored.
+ETAG_CACHE_TTL = int(os.environ.get('FILE_ETAG_CACHE_TTL', '86400'))
+ETAG_CHUNK_SIZE = 1024 * 1024
+_etag_cache = TTLCache(ttl=ETAG_CACHE_TTL, max_entries=4096)
+
+
+def get_store():
+    """Content store rooted at the configured upload folder"""
+    return ContentStore(app.config['UPLOAD_FOLDER'])
+
+
+def _etag_cache_key(file_path):
+    stat = os.stat(file_path)
+    return (stat.st_dev, stat.st_ino, stat.st_size, stat.st_mtime_ns)
+
+
+def compute_file_etag(file_path):
+    """
+    Strong ETag for a stored file: the SHA-256 of its contents
+    
+    Args:
+        file_path: Path of the stored file
+        
+    Returns:
+        Hex digest used as the (unquoted) ETag value
+    """
+    cache_key = _etag_cache_key(file_path)
+    etag = _etag_cache.get(cache_key)
+    if etag is None:
+        digest = hashlib.sha256()
+        with open(file_path, 'rb') as f:
+            for chunk in iter(lambda: f.read(ETAG_CHUNK_SIZE), b''):
+                digest.update(chunk)
+        etag = digest.hexdigest()
+        _etag_cache.set(cache_key, etag)
+    return etag
+
+
+def store_file(tmp_path, digest, file_id):
+    """
+    Move an already-hashed temp file into the content store as file_id
+    
+    Returns:
+        Path of the stored reference
+    """
+    file_path = get_store().ingest(tmp_path, digest, file_id)
+    _etag_cache.set(_etag_cache_key(file_path), digest)
+    return file_path
+
+
+def ensure_variant(file_id, width, fmt):
+    """
+    Path of an image variant, generating and storing it on first use
+    
+    Args:
+        file_id: The original file's ID
+        width: One of the VARIANT_WIDTHS values
+        fmt: One of VARIANT_FORMATS
+        
+    Returns:
+        Path of the stored variant, or None if the original does not exist
+        
+    Raises:
+        VariantError: If the original cannot be turned into this variant
+    """
+    store = get_store()
+    variant_id = variant_file_id(file_id, width, fmt)
+    variant_path = store.locate(variant_id)
+    if variant_path:
+        return variant_path
+
+    source_path = store.locate(file_id)
+    if not source_path:
+        return None
+
+    content, _ = generate_variant(source_path, width, fmt)
+    tmp_path, digest, _ = store.write_stream(io.BytesIO(content))
+    logger.info(f"Generated {width}px {fmt} variant of {file_id} ({len(content)} bytes)")
+    return store_file(tmp_path, digest, variant_id)
+
+
 @app.route('/api/file/upload', methods=['POST'])
 def upload_file():
     """
@@ -49,17 +148,30 @@ def upload_file():
             logger.error("No file selected for uploading")
             return jsonify({"error": "No file selected for uploading"}), 400
             
-        # Store the file with file_id as filename
         # Use secure_filename for extra safety
-        filename = secure_filename(file_id)
-        file_path = os.path.join(app.config['UPLOAD_FOLDER'], filename)
+        if not secure_filename(file_id):
+            return jsonify({"error": "Invalid file_id"}), 400
+        
+        # Hash while streaming to disk, then store by content; identical
+        # uploads share one blob
+        tmp_path, etag, size = get_store().write_stream(file.stream)
+        store_file(tmp_path, etag, file_id)
+        logger.info(f"File uploaded successfully with ID: {file_id} ({size} bytes, sha256 {etag})")
         
-        file.save(file_path)
-        logger.info(f"File uploaded successfully with ID: {file_id}")
+        # Media uploads ask for their WebP variants up front; failures (not an
+        # image, no image library) just leave them to be made on demand
+        if request.form.get('generate_variants') == '1':
+            for width in VARIANT_WIDTHS.values():
+                try:
+                    ensure_variant(file_id, width, 'webp')
+                except VariantError as e:
+                    logger.info(f"No variants for {file_id}: {str(e)}")
+                    break
         
         return jsonify({
             "success": True,
-            "file_id": file_id
+            "file_id": file_id,
+            "etag": etag
         }), 200
         
     except Exception as e:
@@ -74,8 +186,11 @@ def download_file():
     Requires:
     - file_id: Unique identifier for the file
     
+    Honors Range, If-Range and If-None-Match against a strong content ETag,
+    so interrupted downloads can resume and clients can fetch segments in parallel.
+    
     Returns:
-    - File for download or error response
+    - File for download (200, 206 or 304) or error response
     """
     try:
         # Get file_id from query parameters
@@ -85,27 +200,495 @@ def download_file():
             logger.error("No file_id provided in download request")
             return jsonify({"error": "No file_id provided"}), 400
             
-        # Use secure_filename for consistency with upload
-        filename = secure_filename(file_id)
-        file_path = os.path.join(app.config['UPLOAD_FOLDER'], filename)
+        file_path = get_store().locate(file_id)
         
         # Check if file exists
-        if not os.path.exists(file_path):
+        if not file_path:
             logger.error(f"File with ID {file_id} not found")
             return jsonify({"error": f"File with ID {file_id} not found"}), 404
             
         logger.info(f"File with ID {file_id} downloaded")
         
-        # Return the file
-        return send_file(
+        # Return the file; conditional handling answers Range/If-Range with 206/416
+        # and If-None-Match with 304
+        response = send_file(
             file_path,
             as_attachment=True,
-            download_name=file_id  # This will be the filename when downloaded
+            download_name=file_id,  # This will be the filename when downloaded
+            conditional=True,
+            etag=compute_file_etag(file_path)
         )
+        response.headers['Accept-Ranges'] = 'bytes'
+        return response
         
+    except HTTPException:
+        # 416 Range Not Satisfiable from the conditional handling
+        raise
     except Exception as e:
         logger.exception(f"Error during file download: {str(e)}")
         return jsonify({"error": f"File download failed: {str(e)}"}), 500
 
+@app.route('/api/file/stat', methods=['GET', 'HEAD'])
+def stat_file():
+    """
+    Describe a stored file without transferring it
+    
+    Requires:
+    - file_id: Unique identifier for the file
+    
+    Returns:
+    - JSON with file_id, size, etag and last_modified, or 404
+    """
+    try:
+        file_id = request.args.get('file_id')
+        if not file_id:
+            return jsonify({"error": "No file_id provided"}), 400
+
+        file_path = get_store().locate(file_id)
+        if not file_path:
+            return jsonify({"error": f"File with ID {file_id} not found"}), 404
+
+        stat = os.stat(file_path)
+        etag = compute_file_etag(file_path)
+        response = jsonify({
+            "file_id": file_id,
+            "size": stat.st_size,
+            "etag": etag,
+            "last_modified": int(stat.st_mtime)
+        })
+        response.set_etag(etag)
+        response.headers['X-File-Size'] = str(stat.st_size)
+        return response, 200
+
+    except Exception as e:
+        logger.exception(f"Error during file stat: {str(e)}")
+        return jsonify({"error": f"File stat failed: {str(e)}"}), 500
+
+
+@app.route('/api/file/variant', methods=['GET'])
+def download_variant():
+    """
+    Download a resized/re-encoded variant of an image
+    
+    Requires:
+    - file_id: Unique identifier of the original image
+    - width: One of the fixed variant widths
+    - format: webp, jpeg or png
+    
+    Returns:
+    - The variant (200 or 304), 404 if the original is missing, or 415 if it
+      cannot be converted (callers then fall back to the original)
+    """
+    try:
+        file_id = request.args.get('file_id')
+        fmt = request.args.get('format', 'webp')
+        try:
+            width = int(request.args.get('width', ''))
+        except ValueError:
+            width = None
+        if not file_id or width not in VARIANT_WIDTHS.values() or fmt not in VARIANT_FORMATS:
+            return jsonify({"error": "file_id, a supported width and format are required"}), 400
+
+        try:
+            variant_path = ensure_variant(file_id, width, fmt)
+        except VariantError as e:
+            return jsonify({"error": str(e)}), 415
+        if not variant_path:
+            return jsonify({"error": f"File with ID {file_id} not found"}), 404
+
+        response = send_file(
+            variant_path,
+            mimetype=f"image/{fmt}",
+            conditional=True,
+            etag=compute_file_etag(variant_path)
+        )
+        return response
+
+    except HTTPException:
+        raise
+    except Exception as e:
+        logger.exception(f"Error during variant download: {str(e)}")
+        return jsonify({"error": f"Variant download failed: {str(e)}"}), 500
+
+
+@app.route('/api/file/delete', methods=['DELETE'])
+def delete_file():
+    """
+    Delete a file by its file_id
+    
+    Only the file_id's reference is removed; the stored content is removed
+    once no other file_id references it.
+    
+    Requires:
+    - file_id: Unique identifier for the file
+    
+    Returns:
+    - JSON response with success status
+    """
+    try:
+        file_id = request.args.get('file_id')
+        if not file_id:
+            return jsonify({"error": "No file_id provided"}), 400
+
+        store = get_store()
+        file_path = store.locate(file_id)
+        if not file_path:
+            return jsonify({"error": f"File with ID {file_id} not found"}), 404
+
+        store.delete(file_id, digest=compute_file_etag(file_path))
+        # Variants are derived from the original and go with it
+        for width in VARIANT_WIDTHS.values():
+            for fmt in VARIANT_FORMATS:
+                variant_path = store.locate(variant_file_id(file_id, width, fmt))
+                if variant_path:
+                    store.delete(variant_file_id(file_id, width, fmt), digest=compute_file_etag(variant_path))
+        logger.info(f"File with ID {file_id} deleted")
+        return jsonify({"success": True, "file_id": file_id}), 200
+
+    except Exception as e:
+        logger.exception(f"Error during file delete: {str(e)}")
+        return jsonify({"error": f"File delete failed: {str(e)}"}), 500
+
+
+# ===================================
+# CHUNKED, RESUMABLE UPLOADS
+# ===================================
+#
+# POST   /api/file/uploads                              start a session
+# PUT    /api/file/uploads/<upload_id>/chunks/<index>   raw chunk body, X-Chunk-SHA256 header
+# GET    /api/file/uploads/<upload_id>                  which chunks have been acknowledged
+# POST   /api/file/uploads/<upload_id>/commit           verify and move into storage
+# DELETE /api/file/uploads/<upload_id>                  abort
+#
+# Chunks are verified in a scratch file, then copied into a preallocated
+# part file at index * chunk_size, so they can arrive in any order or in
+# parallel.
+# Session state lives on disk (one marker file per acknowledged chunk)
+# so every gunicorn worker sees the same progress.
+
+UPLOAD_CHUNK_SIZE = int(os.environ.get('UPLOAD_CHUNK_SIZE', str(8 * 1024 * 1024)))
+UPLOAD_MAX_CHUNK_SIZE = 64 * 1024 * 1024
+UPLOAD_MAX_FILE_SIZE = int(os.environ.get('UPLOAD_MAX_FILE_SIZE', str(500 * 1024 * 1024)))
+UPLOAD_SESSION_TTL = int(os.environ.get('UPLOAD_SESSION_TTL', str(24 * 3600)))
+UPLOAD_STREAM_BUFFER = 1024 * 1024
+UPLOAD_SESSIONS_DIR = '.uploads'
+
+
+def _sessions_root():
+    return os.path.join(app.config['UPLOAD_FOLDER'], UPLOAD_SESSIONS_DIR)
+
+
+def _session_dir(upload_id):
+    """Directory holding one upload session, or None for a malformed ID"""
+    try:
+        upload_id = uuid.UUID(str(upload_id)).hex
+    except ValueError:
+        return None
+    return os.path.join(_sessions_root(), upload_id)
+
+
+def _load_session(upload_id):
+    """Read session.json for upload_id, or None if the session does not exist"""
+    session_dir = _session_dir(upload_id)
+    if not session_dir:
+        return None
+    try:
+        with open(os.path.join(session_dir, 'session.json')) as f:
+            session = json.load(f)
+    except FileNotFoundError:
+        return None
+    session['dir'] = session_dir
+    return session
+
+
+def _received_chunks(session):
+    """Sorted indexes of the chunks acknowledged so far"""
+    chunk_dir = os.path.join(session['dir'], 'chunks')
+    return sorted(int(name) for name in os.listdir(chunk_dir) if name.isdigit())
+
+
+def _chunk_span(session, index):
+    """(offset, size) of a chunk within the file"""
+    offset = index * session['chunk_size']
+    return offset, min(session['chunk_size'], session['total_size'] - offset)
+
+
+def _corrupted_chunks(session, part_path):
+    """Indexes of acknowledged chunks whose bytes in data.part no longer match their recorded digest"""
+    corrupted = []
+    with open(part_path, 'rb') as f:
+        for index in _received_chunks(session):
+            offset, size = _chunk_span(session, index)
+            f.seek(offset)
+            digest = hashlib.sha256()
+            remaining = size
+            while remaining > 0:
+                block = f.read(min(UPLOAD_STREAM_BUFFER, remaining))
+                if not block:
+                    break
+                digest.update(block)
+                remaining -= len(block)
+            with open(os.path.join(session['dir'], 'chunks', str(index))) as marker:
+                recorded = marker.read().strip()
+            if remaining or digest.hexdigest() != recorded:
+                corrupted.append(index)
+    return corrupted
+
+
+def _session_status(session):
+    received = _received_chunks(session)
+    missing = sorted(set(range(session['chunk_count'])) - set(received))
+    return {
+        "upload_id": session['upload_id'],
+        "file_id": session['file_id'],
+        "total_size": session['total_size'],
+        "chunk_size": session['chunk_size'],
+        "chunk_count": session['chunk_count'],
+        "received_chunks": received,
+        "next_chunk": missing[0] if missing else None,
+        "complete": not missing
+    }
+
+
+def cleanup_stale_upload_sessions(max_age=None):
+    """
+    Remove upload sessions with no chunk activity for more than max_age seconds
+    
+    Returns:
+        Number of sessions removed
+    """
+    max_age = UPLOAD_SESSION_TTL if max_age is None else max_age
+    root = _sessions_root()
+    if not os.path.isdir(root):
+        return 0
+    removed = 0
+    cutoff = time.time() - max_age
+    for name in os.listdir(root):
+        session_dir = os.path.join(root, name)
+        try:
+            if os.path.getmtime(session_dir) < cutoff:
+                shutil.rmtree(session_dir, ignore_errors=True)
+                removed += 1
+        except OSError:
+            continue
+    if removed:
+        logger.info(f"Removed {removed} stale upload session(s)")
+    return removed
+
+
+@app.route('/api/file/uploads', methods=['POST'])
+def start_chunked_upload():
+    """
+    Start a chunked upload session
+    
+    Requires (JSON):
+    - file_id: Identifier the finished file will be stored under
+    - total_size: Size of the whole file in bytes
+    Optional:
+    - chunk_size: Requested chunk size in bytes (server default otherwise)
+    - metadata: Opaque dict returned unchanged on commit
+    
+    Returns:
+    - JSON session status including upload_id and chunk_size
+    """
+    try:
+        data = request.get_json(silent=True) or {}
+        file_id = data.get('file_id')
+        if not file_id or not secure_filename(str(file_id)):
+            return jsonify({"error": "No file_id provided"}), 400
+
+        try:
+            total_size = int(data.get('total_size'))
+            chunk_size = int(data.get('chunk_size') or UPLOAD_CHUNK_SIZE)
+        except (TypeError, ValueError):
+            return jsonify({"error": "total_size and chunk_size must be integers"}), 400
+
+        if total_size <= 0 or total_size > UPLOAD_MAX_FILE_SIZE:
+            return jsonify({"error": f"total_size must be between 1 and {UPLOAD_MAX_FILE_SIZE} bytes"}), 400
+        if chunk_size <= 0 or chunk_size > UPLOAD_MAX_CHUNK_SIZE:
+            return jsonify({"error": f"chunk_size must be between 1 and {UPLOAD_MAX_CHUNK_SIZE} bytes"}), 400
+
+        cleanup_stale_upload_sessions()
+
+        upload_id = uuid.uuid4().hex
+        session_dir = os.path.join(_sessions_root(), upload_id)
+        os.makedirs(os.path.join(session_dir, 'chunks'))
+
+        # Preallocate so chunks can be written at their offset in any order
+        with open(os.path.join(session_dir, 'data.part'), 'wb') as f:
+            f.truncate(total_size)
+
+        session = {
+            "upload_id": upload_id,
+            "file_id": str(file_id),
+            "total_size": total_size,
+            "chunk_size": chunk_size,
+            "chunk_count": (total_size + chunk_size - 1) // chunk_size,
+            "metadata": data.get('metadata') or {},
+            "created_at": time.time()
+        }
+        with open(os.path.join(session_dir, 'session.json'), 'w') as f:
+            json.dump(session, f)
+
+        session['dir'] = session_dir
+        logger.info(f"Started chunked upload {upload_id} for file {file_id} ({total_size} bytes)")
+        return jsonify(_session_status(session)), 201
+
+    except Exception as e:
+        logger.exception(f"Error starting chunked upload: {str(e)}")
+        return jsonify({"error": f"Failed to start upload: {str(e)}"}), 500
+
+
+@app.route('/api/file/uploads/<upload_id>', methods=['GET'])
+def get_chunked_upload(upload_id):
+    """Report which chunks of an upload session have been acknowledged"""
+    session = _load_session(upload_id)
+    if not session:
+        return jsonify({"error": "Upload session not found"}), 404
+    return jsonify(_session_status(session)), 200
+
+
+@app.route('/api/file/uploads/<upload_id>/chunks/<int:index>', methods=['PUT'])
+def put_upload_chunk(upload_id, index):
+    """
+    Write one chunk of an upload session
+    
+    The raw request body is streamed to a scratch file and only copied into
+    the part file at index * chunk_size once its size (and, if an
+    X-Chunk-SHA256 header is sent, its digest) checks out; otherwise the
+    client can retry the same index.
+    
+    Returns:
+    - JSON with the chunk index, its SHA-256 and the session progress
+    """
+    try:
+        session = _load_session(upload_id)
+        if not session:
+            return jsonify({"error": "Upload session not found"}), 404
+        if index < 0 or index >= session['chunk_count']:
+            return jsonify({"error": f"Chunk index must be between 0 and {session['chunk_count'] - 1}"}), 400
+
+        offset, expected_size = _chunk_span(session, index)
+        expected_digest = (request.headers.get('X-Chunk-SHA256') or '').strip().lower()
+
+        # Verify the chunk in a scratch file first, so a rejected re-send
+        # never overwrites an acknowledged chunk in data.part
+        digest = hashlib.sha256()
+        written = 0
+        tmp_path = os.path.join(session['dir'], f"chunk-{index}-{uuid.uuid4().hex}.tmp")
+        try:
+            with open(tmp_path, 'wb') as tmp:
+                while True:
+                    block = request.stream.read(min(UPLOAD_STREAM_BUFFER, expected_size - written + 1))
+                    if not block:
+                        break
+                    written += len(block)
+                    if written > expected_size:
+                        return jsonify({"error": f"Chunk {index} is larger than {expected_size} bytes"}), 400
+                    digest.update(block)
+                    tmp.write(block)
+
+            if written != expected_size:
+                return jsonify({"error": f"Chunk {index} is {written} bytes, expected {expected_size}"}), 400
+
+            chunk_digest = digest.hexdigest()
+            if expected_digest and expected_digest != chunk_digest:
+                logger.warning(f"Checksum mismatch for chunk {index} of upload {upload_id}")
+                return jsonify({"error": "Chunk checksum mismatch", "sha256": chunk_digest}), 422
+
+            # Drop the old acknowledgement while data.part is being rewritten
+            marker_path = os.path.join(session['dir'], 'chunks', str(index))
+            try:
+                os.remove(marker_path)
+            except FileNotFoundError:
+                pass
+            with open(tmp_path, 'rb') as tmp, open(os.path.join(session['dir'], 'data.part'), 'r+b') as f:
+                f.seek(offset)
+                shutil.copyfileobj(tmp, f, UPLOAD_STREAM_BUFFER)
+            with open(marker_path, 'w') as f:
+                f.write(chunk_digest)
+        finally:
+            try:
+                os.remove(tmp_path)
+            except FileNotFoundError:
+                pass
+
+        # Keep active sessions from being treated as stale
+        os.utime(session['dir'])
+
+        status = _session_status(session)
+        status.update({"chunk": index, "sha256": chunk_digest})
+        return jsonify(status), 200
+
+    except Exception as e:
+        logger.exception(f"Error writing chunk {index} of upload {upload_id}: {str(e)}")
+        return jsonify({"error": f"Chunk upload failed: {str(e)}"}), 500
+
+
+@app.route('/api/file/uploads/<upload_id>/commit', methods=['POST'])
+def commit_chunked_upload(upload_id):
+    """
+    Finish an upload session once every chunk has been acknowledged
+    
+    Every chunk is re-checked against the digest recorded when it was
+    acknowledged; chunks that no longer match are reported missing (409).
+    
+    Optional (JSON):
+    - sha256: Digest of the whole file, checked before the file is stored
+    
+    Returns:
+    - JSON with success status, file_id, etag and the session metadata
+    """
+    try:
+        session = _load_session(upload_id)
+        if not session:
+            return jsonify({"error": "Upload session not found"}), 404
+
+        status = _session_status(session)
+        if not status['complete']:
+            return jsonify(dict(status, error="Upload is missing chunks")), 409
+
+        part_path = os.path.join(session['dir'], 'data.part')
+        corrupted = _corrupted_chunks(session, part_path)
+        if corrupted:
+            # Un-acknowledge them so the client sends them again
+            for index in corrupted:
+                os.remove(os.path.join(session['dir'], 'chunks', str(index)))
+            logger.warning(f"Chunks {corrupted} of upload {upload_id} no longer match their digest")
+            return jsonify(dict(_session_status(session), error="Upload is missing chunks")), 409
+
+        etag = compute_file_etag(part_path)
+        expected_digest = ((request.get_json(silent=True) or {}).get('sha256') or '').strip().lower()
+        if expected_digest and expected_digest != etag:
+            return jsonify({"error": "File checksum mismatch", "sha256": etag}), 422
+
+        store_file(part_path, etag, session['file_id'])
+        shutil.rmtree(session['dir'], ignore_errors=True)
+        logger.info(f"Committed chunked upload {upload_id} as file {session['file_id']}")
+
+        return jsonify({
+            "success": True,
+            "file_id": session['file_id'],
+            "etag": etag,
+            "size": session['total_size'],
+            "metadata": session['metadata']
+        }), 200
+
+    except Exception as e:
+        logger.exception(f"Error committing upload {upload_id}: {str(e)}")
+        return jsonify({"error": f"Upload commit failed: {str(e)}"}), 500
+
+
+@app.route('/api/file/uploads/<upload_id>', methods=['DELETE'])
+def abort_chunked_upload(upload_id):
+    """Abort an upload session and discard its chunks"""
+    session = _load_session(upload_id)
+    if not session:
+        return jsonify({"error": "Upload session not found"}), 404
+    shutil.rmtree(session['dir'], ignore_errors=True)
+    logger.info(f"Aborted chunked upload {upload_id}")
+    return jsonify({"success": True}), 200
+
+
 if __name__ == '__main__':
     app.run(host='0.0.0.0', port=5006, debug=False)
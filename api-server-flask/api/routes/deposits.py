@@ -5,7 +5,6 @@ Handles USDT deposits on Ethereum and Stripe credit card deposits
 
 import os
 import uuid
-import requests
 import stripe
 from decimal import Decimal
 from datetime import datetime, timezone, timedelta
@@ -18,12 +17,12 @@ from .auth import token_required
 from ..common.database import get_db_connection, execute_sql
 from ..common.database_context import database_cursor, database_transaction, db
 from ..common.logging_config import setup_logger
+from ..common.deposit_address_pool import claim_deposit_address, generate_deposit_address
 
 # Set up logger
 logger = setup_logger(__name__, 'deposits.log')
 
 # Service configurations
-USDT_SERVICE_URL = os.getenv('USDT_SERVICE_URL', 'http://usdt-api:3100')
 stripe.api_key = os.getenv('STRIPE_API_KEY')
 
 @rest_api.route('/api/v1/deposit/create', methods=['POST'])
@@ -182,31 +181,20 @@ class CreateDeposit(Resource):
                             raise Exception("Failed to create payment session")
                             
                     else:
-                        # Handle USDT deposit (existing logic)
-                        try:
-                            usdt_response = requests.post(
-                                f"{USDT_SERVICE_URL}/zero-balance-address",
-                                json={'deposit_id': deposit_id},
-                                timeout=10
-                            )
-                            
-                            if usdt_response.status_code != 200:
-                                logger.error(f"USDT service error: {usdt_response.text}")
+                        # Handle USDT deposit: take a pre-generated address from the pool
+                        pooled_address = claim_deposit_address(cur, deposit_id)
+                        if pooled_address:
+                            eth_address, address_index = pooled_address
+                        else:
+                            logger.warning(f"Deposit address pool is empty, deriving an address for deposit {deposit_id}")
+                            try:
+                                eth_address, address_index = generate_deposit_address(deposit_id)
+                            except Exception as e:
+                                logger.error(f"Failed to contact USDT service: {str(e)}")
                                 # Delete the deposit record
                                 execute_sql(cur, "DELETE FROM deposit WHERE id = %s", params=(deposit_id,))
                                 # Let the transaction roll back
-                                raise Exception("Failed to generate deposit address")
-                            
-                            usdt_data = usdt_response.json()
-                            eth_address = usdt_data['address']
-                            address_index = usdt_data['index']
-                        
-                        except Exception as e:
-                            logger.error(f"Failed to contact USDT service: {str(e)}")
-                            # Delete the deposit record
-                            execute_sql(cur, "DELETE FROM deposit WHERE id = %s", params=(deposit_id,))
-                            # Let the transaction roll back
-                            raise Exception("Deposit service temporarily unavailable")
+                                raise Exception("Deposit service temporarily unavailable")
                         
                         # Prepare metadata for USDT
                         metadata = {
@@ -249,8 +237,6 @@ class CreateDeposit(Resource):
             except Exception as e:
                 if "temporarily unavailable" in str(e):
                     return {"error": "Deposit service temporarily unavailable"}, 503
-                elif "generate deposit address" in str(e):
-                    return {"error": "Failed to generate deposit address"}, 500
                 else:
                     logger.error(f"Error creating deposit: {str(e)}")
                     return {"error": "Failed to create deposit"}, 500
@@ -1,6 +1,5 @@
 # File operations routes
 import os
-import requests
 import json
 import uuid
 from flask import request
@@ -12,6 +11,7 @@ from .auth import token_required
 from ..common.data_helpers import get_db_connection, execute_sql, Json
 from ..common.database_context import database_cursor, database_transaction, db
 from ..common.logging_config import setup_logger
+from ..common.http_client import get_http_client
 
 # Set up the logger
 logger = setup_logger(__name__, 'files.log')
@@ -25,6 +25,54 @@ else:
     FILE_SERVER_URL = os.environ.get('FILE_SERVER_URL')
     FILE_SERVER_URL_RETRIEVAL = FILE_SERVER_URL
 
+# Pooled keep-alive connections to the file server
+file_server = get_http_client('file_server')
+
+def get_optional_user_id():
+    """
+    Return the ID of the user in the Authorization header, if any
+    
+    Uploads are allowed without an account (onboarding), so an invalid or
+    missing token is not an error; the file is just not attributed to a user.
+    """
+    auth_header = request.headers.get('authorization') or request.headers.get('Authorization')
+    if not auth_header:
+        return None
+    try:
+        import jwt
+        from ..common.config import BaseConfig
+        from ..common.models import Users
+        
+        token = auth_header.split(' ')[1] if ' ' in auth_header else auth_header
+        data = jwt.decode(token, BaseConfig.SECRET_KEY, algorithms=["HS256"])
+        current_user = Users.get_by_email(data["email"])
+        return current_user.id if current_user else None
+    except Exception as e:
+        # Token invalid or not provided, continue without user_id
+        logger.debug(f"No valid auth token for file upload: {str(e)}")
+        return None
+
+
+def store_file_record(file_id, metadata):
+    """
+    Insert the files row for a file the file server has stored
+    
+    Args:
+        file_id: The file server UUID of the file
+        metadata: Metadata dict (original_filename, user_id, ...)
+        
+    Returns:
+        Tuple of (database file_id or None, file URI)
+    """
+    file_uri = f"{FILE_SERVER_URL_RETRIEVAL}/api/file/download?file_id={file_id}"
+    result = db.execute_insert("""
+        INSERT INTO files (uri, metadata)
+        VALUES (%s, %s)
+        RETURNING file_id;
+    """, (file_uri, Json(metadata)))
+    return (result[0] if result else None), file_uri
+
+
 @rest_api.route('/api/v1/files/upload', methods=['POST'])
 class UploadFile(Resource):
     """
@@ -57,23 +105,9 @@ class UploadFile(Resource):
                     return {"error": "Invalid metadata format"}, 400
             
             # Add user_id to metadata if available (optional for onboarding)
-            # Check if user is authenticated by checking Authorization header
-            auth_header = request.headers.get('authorization') or request.headers.get('Authorization')
-            if auth_header:
-                try:
-                    import jwt
-                    from ..common.config import BaseConfig
-                    from ..common.models import Users
-                    
-                    token = auth_header.split(' ')[1] if ' ' in auth_header else auth_header
-                    data = jwt.decode(token, BaseConfig.SECRET_KEY, algorithms=["HS256"])
-                    current_user = Users.get_by_email(data["email"])
-                    if current_user:
-                        metadata['user_id'] = current_user.id
-                except Exception as e:
-                    # Token invalid or not provided, continue without user_id
-                    logger.debug(f"No valid auth token for file upload: {str(e)}")
-                    pass
+            user_id = get_optional_user_id()
+            if user_id:
+                metadata['user_id'] = user_id
             
             metadata['original_filename'] = file.filename
             
@@ -82,7 +116,7 @@ class UploadFile(Resource):
             data = {'file_id': file_id}
             
             logger.info(f"Sending file to file server: {FILE_SERVER_URL}/api/file/upload")
-            file_server_response = requests.post(
+            file_server_response = file_server.post(
                 f"{FILE_SERVER_URL}/api/file/upload",
                 files=files,
                 data=data
@@ -94,18 +128,8 @@ class UploadFile(Resource):
                 return {"error": f"File server error: {file_server_response.text}"}, 500
                 
             # Store file metadata in database
-            # Construct URI to the file
-            file_uri = f"{FILE_SERVER_URL_RETRIEVAL}/api/file/download?file_id={file_id}"
-            
-            # Insert into files table
-            sql = """
-                INSERT INTO files (uri, metadata)
-                VALUES (%s, %s)
-                RETURNING file_id;
-            """
-            
-            result = db.execute_insert(sql, (file_uri, Json(metadata)))
-            db_file_id = result[0] if result else None  # Get the database file_id (different from UUID)
+            # db_file_id is the database file_id (different from UUID)
+            db_file_id, file_uri = store_file_record(file_id, metadata)
             
             if not db_file_id:
                 logger.error("Failed to insert file metadata into database")
@@ -122,6 +146,168 @@ class UploadFile(Resource):
             logger.exception(f"Error during file upload: {str(e)}")
             return {"error": f"File upload failed: {str(e)}"}, 500
 
+class _SizedStream:
+    """
+    File-like wrapper that reports a length, so requests streams the body
+    with a Content-Length instead of buffering it or switching to chunked
+    transfer encoding
+    """
+
+    def __init__(self, stream, length):
+        self._stream = stream
+        self._length = length
+
+    def __len__(self):
+        return self._length
+
+    def read(self, size=-1):
+        return self._stream.read(size)
+
+
+def relay_file_server_response(response):
+    """Return a file server JSON response to the client unchanged"""
+    try:
+        body = response.json()
+    except ValueError:
+        body = {"error": f"File server error: {response.text}"}
+    return body, response.status_code
+
+
+@rest_api.route('/api/v1/files/uploads', methods=['POST'])
+class StartChunkedUpload(Resource):
+    """
+    Start a chunked, resumable upload
+    
+    Clients then PUT each chunk to /api/v1/files/uploads/<upload_id>/chunks/<index>
+    (optionally with an X-Chunk-SHA256 header), can GET the session to see which
+    chunks were acknowledged after an interruption, and finally POST .../commit.
+    """
+    def post(self, request_origin='unknown'):
+        try:
+            data = request.get_json(silent=True) or {}
+            filename = data.get('filename')
+            if not filename:
+                return {"error": "filename is required"}, 400
+            if 'total_size' not in data:
+                return {"error": "total_size is required"}, 400
+            
+            metadata = data.get('metadata') or {}
+            if not isinstance(metadata, dict):
+                return {"error": "Invalid metadata format"}, 400
+            
+            user_id = get_optional_user_id()
+            if user_id:
+                metadata['user_id'] = user_id
+            metadata['original_filename'] = filename
+            
+            # Generate a unique file_id using UUID
+            file_id = str(uuid.uuid4())
+            
+            file_server_response = file_server.post(
+                f"{FILE_SERVER_URL}/api/file/uploads",
+                json={
+                    'file_id': file_id,
+                    'total_size': data.get('total_size'),
+                    'chunk_size': data.get('chunk_size'),
+                    'metadata': metadata
+                }
+            )
+            body, status_code = relay_file_server_response(file_server_response)
+            if status_code == 201:
+                body['uuid'] = file_id
+            return body, status_code
+            
+        except Exception as e:
+            logger.exception(f"Error starting chunked upload: {str(e)}")
+            return {"error": f"Failed to start upload: {str(e)}"}, 500
+
+
+@rest_api.route('/api/v1/files/uploads/<upload_id>', methods=['GET', 'DELETE'])
+class ChunkedUpload(Resource):
+    """
+    Inspect (GET) or abort (DELETE) a chunked upload session
+    """
+    def get(self, upload_id, request_origin='unknown'):
+        try:
+            return relay_file_server_response(
+                file_server.get(f"{FILE_SERVER_URL}/api/file/uploads/{upload_id}")
+            )
+        except Exception as e:
+            logger.exception(f"Error getting upload {upload_id}: {str(e)}")
+            return {"error": f"Failed to get upload: {str(e)}"}, 500
+
+    def delete(self, upload_id, request_origin='unknown'):
+        try:
+            return relay_file_server_response(
+                file_server.delete(f"{FILE_SERVER_URL}/api/file/uploads/{upload_id}")
+            )
+        except Exception as e:
+            logger.exception(f"Error aborting upload {upload_id}: {str(e)}")
+            return {"error": f"Failed to abort upload: {str(e)}"}, 500
+
+
+@rest_api.route('/api/v1/files/uploads/<upload_id>/chunks/<int:index>', methods=['PUT'])
+class UploadChunk(Resource):
+    """
+    Upload one chunk; the raw body is streamed through to the file server
+    """
+    def put(self, upload_id, index, request_origin='unknown'):
+        try:
+            content_length = request.content_length
+            if content_length is None:
+                return {"error": "Content-Length is required"}, 411
+            
+            headers = {'Content-Type': 'application/octet-stream'}
+            if request.headers.get('X-Chunk-SHA256'):
+                headers['X-Chunk-SHA256'] = request.headers['X-Chunk-SHA256']
+            
+            file_server_response = file_server.put(
+                f"{FILE_SERVER_URL}/api/file/uploads/{upload_id}/chunks/{index}",
+                data=_SizedStream(request.stream, content_length),
+                headers=headers
+            )
+            return relay_file_server_response(file_server_response)
+            
+        except Exception as e:
+            logger.exception(f"Error uploading chunk {index} of upload {upload_id}: {str(e)}")
+            return {"error": f"Chunk upload failed: {str(e)}"}, 500
+
+
+@rest_api.route('/api/v1/files/uploads/<upload_id>/commit', methods=['POST'])
+class CommitChunkedUpload(Resource):
+    """
+    Finish a chunked upload and register the file, like /api/v1/files/upload
+    """
+    def post(self, upload_id, request_origin='unknown'):
+        try:
+            data = request.get_json(silent=True) or {}
+            file_server_response = file_server.post(
+                f"{FILE_SERVER_URL}/api/file/uploads/{upload_id}/commit",
+                json={'sha256': data.get('sha256')}
+            )
+            body, status_code = relay_file_server_response(file_server_response)
+            if status_code != 200:
+                return body, status_code
+            
+            file_id = body['file_id']
+            db_file_id, file_uri = store_file_record(file_id, body.get('metadata') or {})
+            if not db_file_id:
+                logger.error("Failed to insert file metadata into database")
+                return {"error": "Failed to save file metadata"}, 500
+            
+            return {
+                "success": True,
+                "file_id": db_file_id,
+                "uuid": file_id,
+                "uri": file_uri,
+                "etag": body.get('etag')
+            }, 200
+            
+        except Exception as e:
+            logger.exception(f"Error committing upload {upload_id}: {str(e)}")
+            return {"error": f"Upload commit failed: {str(e)}"}, 500
+
+
 @rest_api.route('/api/v1/files/<int:file_id>', methods=['GET'])
 class GetFile(Resource):
     """
@@ -259,7 +445,7 @@ class DeleteFile(Resource):
                     
                     if file_uuid and FILE_SERVER_URL:
                         # Delete from file server
-                        delete_response = requests.delete(
+                        delete_response = file_server.delete(
                             f"{FILE_SERVER_URL}/api/file/delete",
                             params={'file_id': file_uuid}
                         )
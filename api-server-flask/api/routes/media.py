@@ -2,14 +2,17 @@
 import os
 import uuid
 import base64
-import requests
 from flask import request, Response
 from flask_restx import Resource
+from werkzeug.http import quote_etag, unquote_etag
 from werkzeug.utils import secure_filename
 
 # Import from our structure
 from .. import rest_api
 from .auth import token_required
+from ..common.cache import SizedLRUCache
+from ..common.http_client import get_http_client
+from ..common.image_variants import VARIANT_FORMATS, VariantError, resolve_width
 from ..common.logging_config import setup_logger
 
 # Set up the logger
@@ -23,7 +26,62 @@ if BRANDING == 'local':
 else:
     FILE_SERVER_URL = os.environ.get('FILE_SERVER_URL')
     FILE_SERVER_URL_RETRIEVAL = FILE_SERVER_URL
+file_server = get_http_client('file_server')
 MAX_FILE_SIZE = 10 * 1024 * 1024  # 10MB
+MEDIA_URI_PREFIX = '/api/v1/media/'
+
+# Media is immutable once uploaded (every upload gets a new media_id), so
+# small hot objects such as avatars and thumbnails are kept in a per-worker
+# LRU bounded by total bytes; larger files are streamed through
+MEDIA_CACHE_MAX_BYTES = int(os.getenv('MEDIA_CACHE_MAX_BYTES', str(64 * 1024 * 1024)))
+MEDIA_CACHE_MAX_OBJECT_BYTES = int(os.getenv('MEDIA_CACHE_MAX_OBJECT_BYTES', str(512 * 1024)))
+MEDIA_CACHE_CONTROL = 'public, max-age=31536000, immutable'
+MEDIA_STREAM_CHUNK_SIZE = 64 * 1024
+
+_media_cache = SizedLRUCache(MEDIA_CACHE_MAX_BYTES, MEDIA_CACHE_MAX_OBJECT_BYTES)
+
+
+def media_headers(media_id, etag=None, content_length=None, vary_accept=False):
+    """Response headers shared by full and 304 media responses"""
+    headers = {
+        'Content-Disposition': f'inline; filename="{media_id}"',
+        'Cache-Control': MEDIA_CACHE_CONTROL
+    }
+    if vary_accept:
+        headers['Vary'] = 'Accept'
+    if etag:
+        headers['ETag'] = quote_etag(etag)
+    if content_length is not None:
+        headers['Content-Length'] = str(content_length)
+    return headers
+
+
+def resolve_variant_request(args, accept):
+    """
+    Work out which image variant a media request wants
+    
+    Args:
+        args: Request query args (w, variant, format)
+        accept: The request's Accept header value
+        
+    Returns:
+        Tuple of (width or None for the original, format, whether the
+        format was negotiated from Accept)
+    """
+    width = resolve_width(args.get('w'), args.get('variant'))
+    if width is None:
+        return None, None, False
+    fmt = args.get('format')
+    if fmt:
+        if fmt not in VARIANT_FORMATS:
+            raise VariantError(f"Unsupported format '{fmt}'")
+        return width, fmt, False
+    return width, ('webp' if 'image/webp' in (accept or '') else 'jpeg'), True
+
+
+def not_modified(etag):
+    """True if the request's If-None-Match already names this ETag"""
+    return bool(etag) and request.if_none_match.contains_weak(etag)
 
 def validate_file_data(file_data):
     """
@@ -52,6 +110,42 @@ def validate_file_data(file_data):
         logger.error(f"Error validating file data: {str(e)}")
         return False, None
 
+def media_path(media_id):
+    """Relative media URI as stored in rows and resolved by the frontend"""
+    return f"{MEDIA_URI_PREFIX}{media_id}"
+
+
+def store_media(file_data):
+    """
+    Upload media bytes to the file server under a new media ID
+    
+    Images also get their WebP variants generated up front.
+    
+    Args:
+        file_data: The file contents (bytes)
+        
+    Returns:
+        str: The new media ID
+        
+    Raises:
+        RuntimeError: If the file server did not store the file
+    """
+    media_id = str(uuid.uuid4())
+    response = file_server.post(
+        f'{FILE_SERVER_URL}/api/file/upload',
+        files={'file': (media_id, file_data, 'application/octet-stream')},
+        data={'file_id': media_id, 'generate_variants': '1'},
+        timeout=30
+    )
+
+    if response.status_code != 200:
+        logger.error(f"File server upload failed: {response.text}")
+        raise RuntimeError("Failed to upload to file server")
+    if not response.json().get('success'):
+        raise RuntimeError("File server upload unsuccessful")
+    return media_id
+
+
 @rest_api.route('/api/v1/media/upload', methods=['POST'])
 class MediaUpload(Resource):
     """
@@ -73,27 +167,12 @@ class MediaUpload(Resource):
                 if not is_valid:
                     return {"error": "Invalid file data or file too large"}, 400
 
-            media_id = str(uuid.uuid4())
+            try:
+                media_id = store_media(file_data)
+            except RuntimeError as e:
+                return {"error": str(e)}, 500
             filename = media_id  # No extension
 
-            files = {'file': (filename, file_data, 'application/octet-stream')}
-            upload_data = {'file_id': media_id}
-
-            response = requests.post(
-                f'{FILE_SERVER_URL}/api/file/upload',
-                files=files,
-                data=upload_data,
-                timeout=30
-            )
-
-            if response.status_code != 200:
-                logger.error(f"File server upload failed: {response.text}")
-                return {"error": "Failed to upload to file server"}, 500
-
-            upload_result = response.json()
-            if not upload_result.get('success'):
-                return {"error": "File server upload unsuccessful"}, 500
-
             media_uri = f'{FILE_SERVER_URL_RETRIEVAL}/api/v1/media/{media_id}'
 
             return {
@@ -113,6 +192,12 @@ class MediaUpload(Resource):
 class MediaRetrieve(Resource):
     """
     Retrieve media files from file server (pass-through)
+    
+    Small files are served from an in-process cache; larger ones are streamed.
+    Responses carry the file's content ETag and If-None-Match returns 304.
+    
+    Images can be requested resized with ?w=<px> or ?variant=thumb|small|medium,
+    optionally with ?format=webp|jpeg|png (WebP by default when accepted).
     """
     def get(self, media_id, request_origin='unknown'):
         try:
@@ -121,13 +206,56 @@ class MediaRetrieve(Resource):
             except ValueError:
                 return {"error": "Invalid media ID format"}, 400
 
-            file_response = requests.get(
-                f'{FILE_SERVER_URL}/api/file/download',
-                params={'file_id': media_id},
-                timeout=30
-            )
+            try:
+                width, fmt, vary_accept = resolve_variant_request(request.args, request.headers.get('Accept'))
+            except (VariantError, ValueError) as e:
+                return {"error": str(e)}, 400
+
+            cache_key = (media_id, width, fmt)
+            cached = _media_cache.get(cache_key)
+            if cached is not None:
+                etag, content_type, content = cached
+                if not_modified(etag):
+                    return Response(status=304, headers=media_headers(media_id, etag, vary_accept=vary_accept))
+                return Response(content, mimetype=content_type,
+                                headers=media_headers(media_id, etag, len(content), vary_accept))
+
+            # Let the file server answer conditional requests without sending bytes
+            proxy_headers = {}
+            if request.headers.get('If-None-Match'):
+                proxy_headers['If-None-Match'] = request.headers['If-None-Match']
+
+            file_response = None
+            if width:
+                file_response = file_server.get(
+                    f'{FILE_SERVER_URL}/api/file/variant',
+                    params={'file_id': media_id, 'width': width, 'format': fmt},
+                    headers=proxy_headers,
+                    stream=True,
+                    timeout=30
+                )
+                if file_response.status_code == 415:
+                    # Not an image (or no image library): serve the original
+                    file_response.close()
+                    file_response = None
+                    cache_key = (media_id, None, None)
+                    vary_accept = False
+
+            if file_response is None:
+                file_response = file_server.get(
+                    f'{FILE_SERVER_URL}/api/file/download',
+                    params={'file_id': media_id},
+                    headers=proxy_headers,
+                    stream=True,
+                    timeout=30
+                )
 
+            etag = unquote_etag(file_response.headers.get('ETag'))[0]
+            if file_response.status_code == 304:
+                file_response.close()
+                return Response(status=304, headers=media_headers(media_id, etag, vary_accept=vary_accept))
             if file_response.status_code == 404:
+                file_response.close()
                 return {"error": "Media not found"}, 404
             elif file_response.status_code != 200:
                 logger.error(f"File server download failed: {file_response.text}")
@@ -135,16 +263,25 @@ class MediaRetrieve(Resource):
 
             # Use content-type from file server if available, else default to octet-stream
             content_type = file_response.headers.get('content-type', 'application/octet-stream')
+            content_length = file_response.headers.get('content-length')
 
-            return Response(
-                file_response.content,
-                mimetype=content_type,
-                headers={
-                    'Content-Disposition': f'inline; filename="{media_id}"',
-                    'Cache-Control': 'public, max-age=31536000',
-                    'Content-Length': str(len(file_response.content))
-                }
-            )
+            if content_length is not None and int(content_length) <= MEDIA_CACHE_MAX_OBJECT_BYTES:
+                content = file_response.content
+                if etag:
+                    _media_cache.set(cache_key, (etag, content_type, content), len(content))
+                return Response(content, mimetype=content_type,
+                                headers=media_headers(media_id, etag, len(content), vary_accept))
+
+            def generate():
+                try:
+                    for chunk in file_response.iter_content(chunk_size=MEDIA_STREAM_CHUNK_SIZE):
+                        if chunk:
+                            yield chunk
+                finally:
+                    file_response.close()
+
+            return Response(generate(), mimetype=content_type,
+                            headers=media_headers(media_id, etag, content_length, vary_accept))
 
         except Exception as e:
             logger.error(f"Error retrieving media {media_id}: {str(e)}")
@@ -153,7 +290,8 @@ class MediaRetrieve(Resource):
 @rest_api.route('/api/v1/media/<media_id>/info', methods=['GET'])
 class MediaInfo(Resource):
     """
-    Get media file information (simplified - just checks if media exists)
+    Get media file information from the file server's stat endpoint,
+    without transferring the file
     """
     def get(self, media_id, request_origin='unknown'):
         try:
@@ -162,24 +300,26 @@ class MediaInfo(Resource):
             except ValueError:
                 return {"error": "Invalid media ID format"}, 400
 
-            file_response = requests.get(
-                f'{FILE_SERVER_URL}/api/file/download',
+            stat_response = file_server.get(
+                f'{FILE_SERVER_URL}/api/file/stat',
                 params={'file_id': media_id},
                 timeout=10
             )
 
-            if file_response.status_code == 404:
+            if stat_response.status_code == 404:
                 return {"error": "Media not found"}, 404
-            elif file_response.status_code != 200:
+            elif stat_response.status_code != 200:
                 return {"error": "File server unavailable"}, 503
 
+            stat = stat_response.json()
             return {
                 "media_id": media_id,
                 "filename": media_id,
-                "size": len(file_response.content),
+                "size": stat.get('size'),
+                "etag": stat.get('etag'),
                 "exists": True
             }, 200
 
         except Exception as e:
             logger.error(f"Error getting media info {media_id}: {str(e)}")
-            return {"error": str(e)}, 500
\ No newline at end of file
+            return {"error": str(e)}, 500
@@ -1,5 +1,6 @@
 # Payment routes
 import os
+import json
 import stripe
 from flask import request
 from flask_restx import Resource
@@ -12,6 +13,7 @@ from ..common.metrics import track_metrics
 from ..common.data_helpers import (
     check_payment, 
     refresh_stripe_payment,
+    process_stripe_event,
     get_searchable,
     create_invoice,
     create_payment,
@@ -32,6 +34,13 @@ from ..common.logging_config import setup_logger
 logger = setup_logger(__name__, 'payment.log')
 
 stripe.api_key = os.getenv('STRIPE_API_KEY')
+# Signing secret of the webhook endpoint (whsec_...); the webhook is disabled without it
+STRIPE_WEBHOOK_SECRET = os.getenv('STRIPE_WEBHOOK_SECRET')
+STRIPE_WEBHOOK_EVENTS = (
+    'checkout.session.completed',
+    'checkout.session.async_payment_succeeded',
+    'checkout.session.expired',
+)
 
 def validate_payment_request(data):
     """Validate payment request data"""
@@ -527,7 +536,7 @@ class CreateBalanceInvoiceV1(Resource):
                 'invoice_id': result['invoice']['id'],
                 'payment_id': result['payment']['id'],
                 'amount': total_amount,
-                'balance_remaining': balance_check['balance'] - total_amount,
+                'balance_remaining': result['balance_remaining'],
                 'status': 'complete'
             }, 200
             
@@ -568,6 +577,47 @@ class UserPaidFiles(Resource):
             return {"error": str(e)}, 500
 
 
+@rest_api.route('/api/v1/stripe/webhook', methods=['POST'])
+class StripeWebhook(Resource):
+    """
+    Receive signed checkout session events from Stripe
+    
+    Events are verified against STRIPE_WEBHOOK_SECRET, recorded once by
+    event ID and applied to the matching invoice or deposit. Stripe retries
+    any delivery that does not get a 2xx response.
+    """
+    @track_metrics('stripe_webhook')
+    def post(self, request_origin='unknown'):
+        if not STRIPE_WEBHOOK_SECRET:
+            logger.error("Stripe webhook called but STRIPE_WEBHOOK_SECRET is not set")
+            return {"error": "Webhook not configured"}, 503
+        
+        payload = request.get_data(as_text=True)
+        try:
+            stripe.WebhookSignature.verify_header(
+                payload, request.headers.get('Stripe-Signature'), STRIPE_WEBHOOK_SECRET,
+                tolerance=stripe.Webhook.DEFAULT_TOLERANCE  # Reject replayed old deliveries
+            )
+            event = json.loads(payload)
+        except stripe.error.SignatureVerificationError as e:
+            logger.warning(f"Rejected Stripe webhook with bad signature: {str(e)}")
+            return {"error": "Invalid signature"}, 400
+        except ValueError:
+            return {"error": "Invalid payload"}, 400
+        
+        if event.get('type') not in STRIPE_WEBHOOK_EVENTS:
+            return {"received": True, "result": "ignored"}, 200
+        
+        try:
+            result = process_stripe_event(event)
+            logger.info(f"Stripe event {event.get('id')} ({event.get('type')}): {result}")
+            return {"received": True, "result": result}, 200
+        except Exception as e:
+            logger.error(f"Error processing Stripe event {event.get('id')}: {str(e)}")
+            # Non-2xx so Stripe redelivers the event
+            return {"error": "Failed to process event"}, 500
+
+
 @rest_api.route('/api/v1/test/complete-payment', methods=['POST']) 
 class TestCompletePayment(Resource):
     """
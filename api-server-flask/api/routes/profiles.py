@@ -18,12 +18,11 @@ from ..common.data_helpers import (
     get_searchable,
     get_downloadable_items_by_user_id,
     get_rewards,
-    get_db_connection,
-    execute_sql,
 )
-from ..common.database_context import db
+from ..common.database_context import db, request_db_session
 from ..common.tag_helpers import get_user_tags
 from ..common.logging_config import setup_logger
+from .media import media_path, store_media
 
 # Set up the logger
 logger = setup_logger(__name__, 'profiles.log')
@@ -40,13 +39,16 @@ def allowed_file(filename):
 
 def validate_and_process_profile_image(image_data):
     """
-    Validate and process profile image from base64 data
+    Validate a profile image from base64 data and store it on the file server
+    
+    Profile rows only keep the media URI; the image itself is served (and
+    resized) by the media endpoint.
     
     Args:
         image_data: Base64 encoded image data (data URL format)
         
     Returns:
-        str: Processed base64 image data or None if validation failed
+        str: Media URI of the stored image or None if validation or upload failed
     """
     try:
         # Handle data URL format (data:image/png;base64,...)
@@ -76,12 +78,7 @@ def validate_and_process_profile_image(image_data):
         if len(image_binary) > MAX_FILE_SIZE:
             raise ValueError("Image file too large (max 5MB)")
         
-        # Return the complete data URL for database storage
-        if image_data.startswith('data:'):
-            return image_data
-        else:
-            # Add data URL prefix if not present (assume PNG)
-            return f"data:image/png;base64,{base64_data}"
+        return media_path(store_media(image_binary))
         
     except Exception as e:
         logger.error(f"Error validating profile image: {str(e)}")
@@ -98,22 +95,14 @@ def get_seller_rating(user_id):
         tuple: (avg_rating, total_ratings)
     """
     try:
-        conn = get_db_connection()
-        cur = conn.cursor()
-        
-        execute_sql(cur, """
+        result = db.fetch_one("""
             SELECT 
-                COALESCE(AVG(r.rating), 0) as avg_rating,
-                COALESCE(COUNT(*), 0) as total_ratings
-            FROM rating r
-            JOIN invoice i ON r.invoice_id = i.id
-            WHERE i.seller_id = %s
+                COALESCE(rating_sum / NULLIF(rating_count, 0), 0) as avg_rating,
+                rating_count as total_ratings
+            FROM seller_rating_stats
+            WHERE seller_id = %s
         """, (user_id,))
         
-        result = cur.fetchone()
-        cur.close()
-        conn.close()
-        
         avg_rating, total_ratings = result if result else (0, 0)
         
         return float(avg_rating) if avg_rating else 0.0, total_ratings or 0
@@ -128,6 +117,7 @@ class GetUserProfile(Resource):
     Get user profile by user ID
     """
     @track_metrics('get_user_profile')
+    @request_db_session
     def get(self, user_id, request_origin='unknown'):
         try:
             # Get the user profile
@@ -163,6 +153,7 @@ class GetMyProfile(Resource):
     """
     @token_required
     @track_metrics('get_my_profile')
+    @request_db_session
     def get(self, current_user, request_origin='unknown'):
         try:
             user_id = current_user.id
@@ -224,6 +215,9 @@ class UpdateMyProfile(Resource):
             
             # Handle profile image
             final_profile_image_url = None
+            if profile_image_url and profile_image_url.startswith('data:'):
+                # Inline images are moved to the file server, never stored in the row
+                profile_image_data, profile_image_url = profile_image_url, None
             if profile_image_url:
                 # URL/URI approach - store the URL directly
                 final_profile_image_url = profile_image_url
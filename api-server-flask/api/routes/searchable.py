@@ -2,8 +2,11 @@
 import os
 import re
 import math
-import requests
-from flask import request
+import json
+import base64
+from datetime import datetime
+from urllib.parse import quote
+from flask import request, Response
 from flask_restx import Resource
 
 import traceback
@@ -25,10 +28,14 @@ from ..common.data_helpers import (
     get_invoice_notes,
     create_invoice_note,
     get_invoices_for_searchable,
-    get_user_all_invoices
+    get_user_all_invoices,
+    get_file_entitlement
 )
-from ..common.database_context import database_cursor, database_transaction, db
+from ..common.database_context import database_cursor, database_transaction, db, request_db_session
 from ..common.tag_helpers import get_searchable_tags, add_searchable_tags
+from ..common.cache import TTLCache
+from ..common.file_storage import ref_relpath
+from ..common.http_client import get_http_client
 from ..common.logging_config import setup_logger
 
 # Set up the logger
@@ -41,6 +48,7 @@ class GetSearchableItem(Resource):
     """
     @token_required
     @track_metrics('get_searchable_item_v2')
+    @request_db_session
     def get(self, current_user, searchable_id, request_origin='unknown'):
         try:
             # Include removed items so they can be viewed via direct URL
@@ -73,9 +81,10 @@ class GetSearchableItem(Resource):
             # Query username and seller rating for this user_id
             result = db.fetch_one("""
                 SELECT u.username,
-                       COALESCE((SELECT AVG(r.rating) FROM rating r JOIN invoice i ON r.invoice_id = i.id WHERE i.seller_id = u.id), 0) as seller_rating,
-                       COALESCE((SELECT COUNT(*) FROM rating r JOIN invoice i ON r.invoice_id = i.id WHERE i.seller_id = u.id), 0) as seller_total_ratings
+                       COALESCE(srs.rating_sum / NULLIF(srs.rating_count, 0), 0) as seller_rating,
+                       COALESCE(srs.rating_count, 0) as seller_total_ratings
                 FROM users u
+                LEFT JOIN seller_rating_stats srs ON srs.seller_id = u.id
                 WHERE u.id = %s
             """, (user_id,))
             
@@ -147,6 +156,96 @@ class CreateSearchable(Resource):
             
             return {"error": str(e), "error_details": error_traceback}, 500
 
+SEARCH_SORT_OPTIONS = ('newest', 'relevance')
+SEARCH_TEXT_CONFIG = 'english'
+# exact: COUNT(*); cached: COUNT(*) reused for SEARCH_COUNT_CACHE_TTL seconds;
+# estimate: planner row estimate; none: skip counting
+SEARCH_COUNT_MODES = ('exact', 'cached', 'estimate', 'none')
+SEARCH_COUNT_CACHE_TTL = int(os.getenv('SEARCH_COUNT_CACHE_TTL', '60'))
+
+_search_count_cache = TTLCache(ttl=SEARCH_COUNT_CACHE_TTL, max_entries=2048)
+
+
+def encode_search_cursor(created_at, searchable_id):
+    """
+    Encode the position after a search result as an opaque keyset cursor.
+
+    Args:
+        created_at: created_at of the last returned searchable
+        searchable_id: searchable_id of the last returned searchable
+
+    Returns:
+        str: URL-safe cursor string
+    """
+    payload = json.dumps({'c': created_at.isoformat(), 'i': searchable_id}, separators=(',', ':'))
+    return base64.urlsafe_b64encode(payload.encode('utf-8')).decode('ascii').rstrip('=')
+
+
+def decode_search_cursor(cursor):
+    """
+    Decode a cursor produced by encode_search_cursor.
+
+    Returns:
+        tuple: (created_at, searchable_id)
+
+    Raises:
+        ValueError: If the cursor is malformed
+    """
+    try:
+        padded = cursor + '=' * (-len(cursor) % 4)
+        payload = json.loads(base64.urlsafe_b64decode(padded.encode('ascii')))
+        return datetime.fromisoformat(payload['c']), int(payload['i'])
+    except Exception:
+        raise ValueError("Invalid cursor")
+
+
+def build_prefix_tsquery(query_term):
+    """
+    Turn free text into a to_tsquery() expression that ANDs every word and
+    prefix-matches each one, so partially typed words still find results.
+
+    Args:
+        query_term: Raw search text from the user
+
+    Returns:
+        str: tsquery text such as 'digit:* & art:*', or '' if there are no words
+    """
+    words = re.findall(r"[^\W_]+", query_term or '')
+    return ' & '.join(f"{word}:*" for word in words)
+
+
+def text_search_condition(cur, query_term):
+    """
+    Build the WHERE condition matching searchables against free text.
+
+    Words are matched through the search vector. A query made only of
+    stopwords ("the", "for a") has no lexemes left after to_tsquery(), and
+    would match nothing, so it falls back to a substring match on the public
+    title and description instead.
+
+    Args:
+        cur: Database cursor
+        query_term: Raw search text from the user
+
+    Returns:
+        tuple: (condition SQL, params, tsquery); condition is None when there is
+        nothing to match and tsquery is None unless the search vector is used
+    """
+    tsquery = build_prefix_tsquery(query_term)
+    if not tsquery:
+        return None, [], None
+
+    execute_sql(cur, f"SELECT numnode(to_tsquery('{SEARCH_TEXT_CONFIG}', %s))", params=(tsquery,))
+    if cur.fetchone()[0] > 0:
+        return f"s.search_vector @@ to_tsquery('{SEARCH_TEXT_CONFIG}', %s)", [tsquery], tsquery
+
+    search_pattern = f"%{query_term.strip()}%"
+    return """(
+        s.searchable_data->'payloads'->'public'->>'title' ILIKE %s
+        OR s.searchable_data->'payloads'->'public'->>'description' ILIKE %s
+    )""", [search_pattern, search_pattern], None
+
+
 @rest_api.route('/api/v1/searchable/search', methods=['GET'])
 class SearchSearchables(Resource):
     """
@@ -154,6 +253,7 @@ class SearchSearchables(Resource):
     """
     @token_required
     @track_metrics('search_searchables_v2')
+    @request_db_session
     def get(self, current_user, request_origin='unknown'):
         try:
             # Parse and validate request parameters
@@ -162,16 +262,22 @@ class SearchSearchables(Resource):
                 return params, 400
             
             # Query database for results with pagination
-            results, total_count = self._query_database(
+            results, total_count, next_cursor, has_more = self._query_database(
                 params['query_term'],
                 params.get('filters', {}),
                 params.get('tag_ids', []),
                 params['page_number'],
-                params['page_size']
+                params['page_size'],
+                params['sort'],
+                params['cursor'],
+                params['count_mode']
             )
             
             # Format and return response
-            return self._format_response(results, params['page_number'], params['page_size'], total_count), 200
+            return self._format_response(
+                results, params['page_number'], params['page_size'], total_count,
+                next_cursor=next_cursor, has_more=has_more, count_mode=params['count_mode']
+            ), 200
             
         except Exception as e:
             logger.error(f"Error in search: {str(e)}")
@@ -188,13 +294,15 @@ class SearchSearchables(Resource):
             page_size = int(request.args.get('page_size', 20))
             filters_param = request.args.get('filters', '{}')
             tags_param = request.args.get('tags', '')
+            sort = request.args.get('sort', 'newest')
+            cursor_param = request.args.get('cursor')
+            count_mode = request.args.get('count', 'exact')
             
             # Location is no longer used
             lat = lng = None
             
             # Parse filters
             try:
-                import json
                 filters = json.loads(filters_param)
             except json.JSONDecodeError:
                 filters = {}
@@ -222,6 +330,21 @@ class SearchSearchables(Resource):
             if page_size < 1 or page_size > 100:
                 page_size = 20
             
+            if sort not in SEARCH_SORT_OPTIONS:
+                return {"error": f"Invalid sort '{sort}', expected one of: {', '.join(SEARCH_SORT_OPTIONS)}"}
+            if count_mode not in SEARCH_COUNT_MODES:
+                return {"error": f"Invalid count '{count_mode}', expected one of: {', '.join(SEARCH_COUNT_MODES)}"}
+            
+            # Keyset cursor replaces page/offset; it follows the newest-first order only
+            cursor = None
+            if cursor_param:
+                if sort != 'newest':
+                    return {"error": "cursor pagination is only supported with sort=newest"}
+                try:
+                    cursor = decode_search_cursor(cursor_param)
+                except ValueError as e:
+                    return {"error": str(e)}
+            
             return {
                 'lat': lat,
                 'lng': lng,
@@ -229,46 +352,61 @@ class SearchSearchables(Resource):
                 'page_number': page_number,
                 'page_size': page_size,
                 'filters': filters,
-                'tag_ids': tag_ids
+                'tag_ids': tag_ids,
+                'sort': sort,
+                'cursor': cursor,
+                'count_mode': count_mode
             }
         except Exception as e:
             return {"error": f"Parameter parsing error: {str(e)}"}
 
 
-    def _query_database(self, query_term, filters={}, tag_ids=[], page_number=1, page_size=20):
-        """Query database for searchable items with pagination and simple text search"""
+    def _query_database(self, query_term, filters={}, tag_ids=[], page_number=1, page_size=20, sort='newest',
+                        cursor=None, count_mode='exact'):
+        """
+        Query database for searchable items with pagination and full-text search.
+
+        Returns:
+            tuple: (items, total_count, next_cursor, has_more); total_count is None for count=none
+        """
         try:
             with database_cursor() as (cur, conn):
-                # Calculate offset for pagination
-                offset = (page_number - 1) * page_size
+                # Calculate offset for pagination; a keyset cursor makes the offset unnecessary
+                offset = 0 if cursor else (page_number - 1) * page_size
                 
-                # Base query with username join and ratings
-                base_query = """
-                    SELECT DISTINCT s.searchable_id, s.type, s.searchable_data, s.user_id, 
-                           u.username, s.created_at,
-                           COALESCE((SELECT AVG(r.rating) FROM rating r JOIN invoice i ON r.invoice_id = i.id WHERE i.searchable_id = s.searchable_id), 0) as avg_rating,
-                           COALESCE((SELECT COUNT(*) FROM rating r JOIN invoice i ON r.invoice_id = i.id WHERE i.searchable_id = s.searchable_id), 0) as total_ratings,
-                           COALESCE((SELECT AVG(r.rating) FROM rating r JOIN invoice i ON r.invoice_id = i.id WHERE i.seller_id = s.user_id), 0) as seller_rating,
-                           COALESCE((SELECT COUNT(*) FROM rating r JOIN invoice i ON r.invoice_id = i.id WHERE i.seller_id = s.user_id), 0) as seller_total_ratings
+                text_condition, text_params, tsquery = text_search_condition(cur, query_term)
+                select_params = []
+                if tsquery:
+                    rank_expr = f"ts_rank(s.search_vector, to_tsquery('{SEARCH_TEXT_CONFIG}', %s))"
+                    select_params.append(tsquery)
+                else:
+                    rank_expr = "0"
+                
+                # Base query with username join and ratings. Every join is on a primary
+                # key, so there are no duplicate rows and no DISTINCT is needed; that
+                # lets the (created_at, searchable_id) index serve ORDER BY ... LIMIT.
+                base_query = f"""
+                    SELECT s.searchable_id, s.type, s.searchable_data, s.user_id, 
+                           u.username, s.created_at, {rank_expr} as relevance,
+                           COALESCE(irs.rating_sum / NULLIF(irs.rating_count, 0), 0) as avg_rating,
+                           COALESCE(irs.rating_count, 0) as total_ratings,
+                           COALESCE(srs.rating_sum / NULLIF(srs.rating_count, 0), 0) as seller_rating,
+                           COALESCE(srs.rating_count, 0) as seller_total_ratings
                     FROM searchables s
                     LEFT JOIN users u ON s.user_id = u.id
+                    LEFT JOIN searchable_rating_stats irs ON irs.searchable_id = s.searchable_id
+                    LEFT JOIN seller_rating_stats srs ON srs.seller_id = s.user_id
                 """
                 
                 # Build WHERE conditions
                 where_conditions = ["s.removed = FALSE"]
                 params = []
                 
-                # Add simple text search condition if query_term exists
-                if query_term:
-                    # Search in title and description using ILIKE (case-insensitive)
-                    where_conditions.append("""
-                        (
-                            s.searchable_data->'payloads'->'public'->>'title' ILIKE %s
-                            OR s.searchable_data->'payloads'->'public'->>'description' ILIKE %s
-                        )
-                    """)
-                    search_pattern = f"%{query_term}%"
-                    params.extend([search_pattern, search_pattern])
+                # Match title, description and tag names through the GIN-indexed search vector
+                # (stopword-only queries fall back to a substring match)
+                if text_condition:
+                    where_conditions.append(text_condition)
+                    params.extend(text_params)
                 
                 # Add user_id filtering if provided in filters
                 # @dev_instrctions: is filters used anywhere?
@@ -291,39 +429,49 @@ class SearchSearchables(Resource):
                 # Combine conditions
                 where_clause = " WHERE " + " AND ".join(where_conditions) if where_conditions else ""
                 
-                # Order by created_at desc
+                # Newest first by default; sort=relevance ranks text matches first.
+                # searchable_id breaks created_at ties so keyset cursors are stable.
                 # @dev_instructions: can we order by rating count then avg_rating?
-                order_clause = "ORDER BY s.created_at DESC"
+                if sort == 'relevance' and tsquery:
+                    order_clause = "ORDER BY relevance DESC, s.created_at DESC, s.searchable_id DESC"
+                else:
+                    order_clause = "ORDER BY s.created_at DESC, s.searchable_id DESC"
                 
-                # Get total count first
-                count_query = f"""
-                    SELECT COUNT(DISTINCT s.searchable_id)
-                    FROM searchables s
-                    {where_clause}
-                """
+                # Get total count first (over the whole result set, not just this page)
+                total_count = self._count_results(cur, where_clause, params, count_mode)
                 
-                execute_sql(cur, count_query, params=params)
-                total_count = cur.fetchone()[0]
+                page_clause = where_clause
+                page_params = list(params)
+                if cursor:
+                    page_clause += " AND (s.created_at, s.searchable_id) < (%s, %s)"
+                    page_params.extend(cursor)
                 
-                # Get paginated results
+                # Get paginated results, with one extra row to tell whether another page exists
                 final_query = f"""
                     {base_query}
-                    {where_clause}
+                    {page_clause}
                     {order_clause}
                     LIMIT %s OFFSET %s
                 """
                 
-                params.extend([page_size, offset])
-                execute_sql(cur, final_query, params=params)
+                execute_sql(cur, final_query, params=select_params + page_params + [page_size + 1, offset])
                 results = cur.fetchall()
                 
+                next_cursor = None
+                has_more = len(results) > page_size
+                if has_more:
+                    results = results[:page_size]
+                    if sort == 'newest':
+                        last_row = results[-1]
+                        next_cursor = encode_search_cursor(last_row[5], last_row[0])
+                
                 # Convert to list format
                 items = []
                 searchable_ids = []
                 searchable_map = {}
                 
                 for result in results:
-                    searchable_id, searchable_type, searchable_data, user_id, username, created_at, avg_rating, total_ratings, seller_rating, seller_total_ratings = result
+                    searchable_id, searchable_type, searchable_data, user_id, username, created_at, relevance, avg_rating, total_ratings, seller_rating, seller_total_ratings = result
                     searchable_ids.append(searchable_id)
                     searchable_map[searchable_id] = {
                         'type': searchable_type,
@@ -331,6 +479,7 @@ class SearchSearchables(Resource):
                         'user_id': user_id,
                         'username': username,
                         'created_at': created_at,
+                        'relevance': float(relevance) if relevance else 0.0,
                         'avg_rating': float(avg_rating) if avg_rating else 0.0,
                         'total_ratings': total_ratings or 0,
                         'seller_rating': float(seller_rating) if seller_rating else 0.0,
@@ -380,20 +529,56 @@ class SearchSearchables(Resource):
                     item_data['seller_rating'] = searchable_info['seller_rating']
                     item_data['seller_total_ratings'] = searchable_info['seller_total_ratings']
                     
-                    # No relevance score with simple LIKE search
+                    if tsquery:
+                        item_data['relevance_score'] = searchable_info['relevance']
                     
                     items.append(item_data)
                 
-                return items, total_count
+                return items, total_count, next_cursor, has_more
             
         except Exception as e:
             logger.error(f"Database query error: {str(e)}")
             raise e
 
 
-    def _format_response(self, results, page_number, page_size, total_count):
+    def _count_results(self, cur, where_clause, params, count_mode):
+        """
+        Count matching searchables according to the requested count mode.
+
+        Returns:
+            int or None: Exact, cached or estimated total; None for count=none
+        """
+        if count_mode == 'none':
+            return None
+        
+        count_sql = f"""
+            SELECT COUNT(*)
+            FROM searchables s
+            {where_clause}
+        """
+        
+        if count_mode == 'estimate':
+            execute_sql(cur, f"EXPLAIN (FORMAT JSON) SELECT 1 FROM searchables s {where_clause}", params=params)
+            plan = cur.fetchone()[0]
+            if isinstance(plan, str):
+                plan = json.loads(plan)
+            return int(plan[0]['Plan']['Plan Rows'])
+        
+        cache_key = (where_clause, tuple(params))
+        if count_mode == 'cached':
+            cached = _search_count_cache.get(cache_key)
+            if cached is not None:
+                return cached
+        
+        execute_sql(cur, count_sql, params=params)
+        total_count = cur.fetchone()[0]
+        _search_count_cache.set(cache_key, total_count)
+        return total_count
+
+    def _format_response(self, results, page_number, page_size, total_count, next_cursor=None, has_more=False,
+                         count_mode='exact'):
         """Format the final response"""
-        total_pages = math.ceil(total_count / page_size)
+        total_pages = math.ceil(total_count / page_size) if total_count is not None else None
         
         return {
             "results": results,
@@ -401,7 +586,10 @@ class SearchSearchables(Resource):
                 "current_page": page_number,
                 "page_size": page_size,
                 "total_count": total_count,
-                "total_pages": total_pages
+                "total_pages": total_pages,
+                "total_count_mode": count_mode,
+                "next_cursor": next_cursor,
+                "has_more": has_more
             }
         }
 
@@ -556,10 +744,9 @@ class SearchableRating(Resource):
         try:
             # Get ratings for this searchable from invoice/payment/rating tables
             sql = """
-                SELECT AVG(r.rating::float) as avg_rating, COUNT(r.rating) as total_ratings
-                FROM rating r
-                JOIN invoice i ON r.invoice_id = i.id
-                WHERE i.searchable_id = %s
+                SELECT rating_sum / NULLIF(rating_count, 0) as avg_rating, rating_count as total_ratings
+                FROM searchable_rating_stats
+                WHERE searchable_id = %s
             """
             
             result = db.fetch_one(sql, (searchable_id,))
@@ -616,10 +803,9 @@ class UserRating(Resource):
         try:
             # Get average rating for all searchables belonging to this terminal
             sql = """
-                SELECT AVG(r.rating::float) as avg_rating, COUNT(r.rating) as total_ratings
-                FROM rating r
-                JOIN invoice i ON r.invoice_id = i.id
-                WHERE i.seller_id = %s
+                SELECT rating_sum / NULLIF(rating_count, 0) as avg_rating, rating_count as total_ratings
+                FROM seller_rating_stats
+                WHERE seller_id = %s
             """
             
             result = db.fetch_one(sql, (user_id,))
@@ -1032,11 +1218,79 @@ class BalanceResource(Resource):
             logger.error(f"Error updating profile for user {current_user.id}: {str(e)}")
             return {"error": str(e)}, 500
 
+# How purchased files are delivered once authorized:
+# accel: X-Accel-Redirect to an internal nginx location serving the storage volume
+# sendfile: X-Sendfile with the absolute path, for Apache/lighttpd style front ends
+# stream: proxy the bytes from the file server through this worker (fallback)
+FILE_DOWNLOAD_MODES = ('accel', 'sendfile', 'stream')
+FILE_DOWNLOAD_MODE = os.getenv('FILE_DOWNLOAD_MODE', 'stream').lower()
+FILE_ACCEL_REDIRECT_PREFIX = os.getenv('FILE_ACCEL_REDIRECT_PREFIX', '/protected-files/')
+FILE_SENDFILE_ROOT = os.getenv('FILE_SENDFILE_ROOT', '/app/storage')
+
+# Conditional/partial request headers passed to the file server, and the
+# response headers and statuses relayed back, when streaming downloads
+FILE_PROXY_REQUEST_HEADERS = ('Range', 'If-Range', 'If-None-Match', 'If-Modified-Since')
+FILE_PROXY_RESPONSE_HEADERS = ('Content-Length', 'Content-Range', 'Accept-Ranges', 'ETag', 'Last-Modified')
+FILE_PROXY_STATUSES = (200, 206, 304, 416)
+file_server = get_http_client('file_server')
+
+if FILE_DOWNLOAD_MODE not in FILE_DOWNLOAD_MODES:
+    logger.warning(f"Unknown FILE_DOWNLOAD_MODE '{FILE_DOWNLOAD_MODE}', falling back to stream")
+    FILE_DOWNLOAD_MODE = 'stream'
+
+
+def build_content_disposition(filename):
+    """
+    Build an attachment Content-Disposition header for filename.
+
+    ASCII names use the plain form; anything else uses RFC 2231 encoding.
+    """
+    try:
+        filename.encode('ascii')
+        return f'attachment; filename="{filename}"'
+    except UnicodeEncodeError:
+        return f"attachment; filename*=UTF-8''{quote(filename, safe='')}"
+
+
+def offloaded_download_response(file_uuid, content_disposition, mode=None):
+    """
+    Build an empty response telling the front-end server to send the stored file.
+
+    Args:
+        file_uuid: The file server ID of the file (its name in the storage volume)
+        content_disposition: Content-Disposition header for the download
+        mode: 'accel' or 'sendfile' (defaults to FILE_DOWNLOAD_MODE)
+
+    Returns:
+        Flask Response, or None if the file cannot be offloaded and should be streamed
+    """
+    mode = mode or FILE_DOWNLOAD_MODE
+    # Same layout the file server's content store uses
+    relpath = ref_relpath(file_uuid)
+    if not relpath:
+        return None
+
+    headers = {'Content-Disposition': content_disposition}
+    if mode == 'accel':
+        headers['X-Accel-Redirect'] = FILE_ACCEL_REDIRECT_PREFIX.rstrip('/') + '/' + relpath
+    elif mode == 'sendfile':
+        file_path = os.path.join(FILE_SENDFILE_ROOT, relpath)
+        if not os.path.isfile(file_path):
+            logger.warning(f"File {relpath} not found under {FILE_SENDFILE_ROOT}, streaming instead")
+            return None
+        headers['X-Sendfile'] = file_path
+    else:
+        return None
+
+    return Response(status=200, content_type='application/octet-stream', headers=headers)
+
+
 @rest_api.route('/api/v1/download-file/<int:searchable_id>/<file_id>', methods=['GET'])
 class DownloadSearchableFile(Resource):
     """
     Download a file from a searchable item after verifying payment
-    Supports both numeric file_id and UUID formats
+    Supports both numeric file_id and UUID formats, and Range/If-Range
+    requests (206 Partial Content) for resumable downloads
     """
     @token_required
     def get(self, current_user, searchable_id, file_id, request_origin='unknown'):
@@ -1044,45 +1298,13 @@ class DownloadSearchableFile(Resource):
             # Get buyer ID from authenticated user
             buyer_id = current_user.id
             
-            # First check if buyer has paid for this file
-            # Query for completed payments for this searchable item by this buyer
-            payment_query = """
-                SELECT p.status, i.metadata
-                FROM payment p
-                JOIN invoice i ON p.invoice_id = i.id
-                WHERE i.searchable_id = %s
-                AND i.buyer_id = %s
-                AND p.status = 'complete'
-            """
-            
-            payments = db.fetch_all(payment_query, (searchable_id, buyer_id))
-            
-            # Check if any payment includes this file
-            has_paid_for_file = False
-            target_file = None
+            # Single indexed lookup against the entitlement table
+            target_file = get_file_entitlement(buyer_id, searchable_id, file_id)
+            has_paid_for_file = target_file is not None
             
             # Convert file_id to string for comparison (handles both int and UUID)
             file_id_str = str(file_id)
             
-            for payment_status, invoice_metadata in payments:
-                if invoice_metadata and 'selections' in invoice_metadata:
-                    for selection in invoice_metadata['selections']:
-                        # Check both 'id' and 'fileId' fields for the numeric file ID
-                        selection_id = str(selection.get('id', ''))
-                        selection_file_id = str(selection.get('fileId', ''))
-                        
-                        # Match either id or fileId field against the requested file_id
-                        if (selection_id == file_id_str or selection_file_id == file_id_str) and selection.get('type') == 'downloadable':
-                            has_paid_for_file = True
-                            # Get file info from invoice metadata
-                            target_file = {
-                                'fileId': selection.get('fileId', selection.get('id')),  # fileId is the numeric ID
-                                'fileName': selection.get('name', 'download')
-                            }
-                            break
-                    if has_paid_for_file:
-                        break
-            
             if not has_paid_for_file:
                 return {"error": "Payment required to download this file"}, 403
             
@@ -1098,9 +1320,9 @@ class DownloadSearchableFile(Resource):
                             target_file['fileName'] = file_info.get('fileName', 'download')
                             break
             
-            # If payment verified, get the file from the file server
+            # Only the streaming fallback talks to the file server
             file_server_url = os.environ.get('FILE_SERVER_URL')
-            if not file_server_url:
+            if FILE_DOWNLOAD_MODE == 'stream' and not file_server_url:
                 return {"error": "File server not configured"}, 500
             
             # Check if file_id is already a UUID (new format)
@@ -1143,29 +1365,47 @@ class DownloadSearchableFile(Resource):
                     # No metadata found, but we can still try to download with the UUID
                     file_metadata = None
             
+            # Use original filename from file metadata instead of searchable fileName
+            original_filename = "download"
+            if file_metadata and isinstance(file_metadata, dict):
+                original_filename = file_metadata.get('original_filename', 'download')
+            elif target_file:
+                # Fallback to searchable fileName if metadata is unavailable
+                original_filename = target_file.get("fileName", "download")
+            content_disposition = build_content_disposition(original_filename)
+            
+            # Authorization is done; let the front-end server send the bytes
+            if FILE_DOWNLOAD_MODE != 'stream':
+                offloaded = offloaded_download_response(file_uuid, content_disposition)
+                if offloaded is not None:
+                    logger.info(f"Offloading file {original_filename} via {FILE_DOWNLOAD_MODE}")
+                    return offloaded
+                if not file_server_url:
+                    return {"error": "File server not configured"}, 500
+            
             # Make request to file server  
             try:
-                download_response = requests.get(
+                # Forward conditional headers so resumed and segmented downloads work
+                proxy_headers = {
+                    name: request.headers[name]
+                    for name in FILE_PROXY_REQUEST_HEADERS
+                    if name in request.headers
+                }
+                download_response = file_server.get(
                     f"{file_server_url}/api/file/download",
                     params={'file_id': file_uuid},
+                    headers=proxy_headers,
                     stream=True
                 )
                 
-                if download_response.status_code != 200:
+                if download_response.status_code not in FILE_PROXY_STATUSES:
                     logger.error(f"File server error: {download_response.text}")
                     return {"error": "Failed to retrieve file from server"}, 500
                 
-                # Return the file content with appropriate headers
-                from flask import Response
-                from urllib.parse import quote
-                
-                # Use original filename from file metadata instead of searchable fileName
-                original_filename = "download"
-                if file_metadata and isinstance(file_metadata, dict):
-                    original_filename = file_metadata.get('original_filename', 'download')
-                elif target_file:
-                    # Fallback to searchable fileName if metadata is unavailable
-                    original_filename = target_file.get("fileName", "download")
+                response_headers = {'Content-Disposition': content_disposition}
+                for name in FILE_PROXY_RESPONSE_HEADERS:
+                    if name in download_response.headers:
+                        response_headers[name] = download_response.headers[name]
                 
                 def generate():
                     for chunk in download_response.iter_content(chunk_size=8192):
@@ -1173,24 +1413,11 @@ class DownloadSearchableFile(Resource):
                             yield chunk
                 logger.info(f"Serving file: {original_filename}")
                 
-                # Handle Unicode filenames properly using RFC 2231 encoding
-                # For ASCII filenames, use simple format. For non-ASCII, use filename*
-                try:
-                    # Try to encode as ASCII
-                    original_filename.encode('ascii')
-                    content_disposition = f'attachment; filename="{original_filename}"'
-                except UnicodeEncodeError:
-                    # Use RFC 2231 encoding for Unicode filenames
-                    encoded_filename = quote(original_filename, safe='')
-                    content_disposition = f"attachment; filename*=UTF-8''{encoded_filename}"
-                
                 response = Response(
                     generate(),
+                    status=download_response.status_code,
                     content_type=download_response.headers.get('content-type', 'application/octet-stream'),
-                    headers={
-                        'Content-Disposition': content_disposition,
-                        'Content-Length': download_response.headers.get('content-length', '')
-                    }
+                    headers=response_headers
                 )
                 
                 return response
@@ -1,10 +1,9 @@
-import threading
 import time
 import logging
 import traceback
-import requests
 import json
 import os
+from concurrent.futures import ThreadPoolExecutor
 from datetime import datetime, timedelta
 from decimal import Decimal
 
@@ -17,10 +16,19 @@ from api.common.data_helpers import (
     get_withdrawals,
     update_payment_status,
     check_payment,
-    refresh_stripe_payment
+    find_user_balance_drift
 )
 from api.common.models import PaymentStatus, PaymentType
-from psycopg2.extras import Json
+from api.common.http_client import get_http_client
+from api.common.stripe_reconciliation import StripeReconciler
+from api.common.rate_limit import RateLimiter
+from api.common.job_notifications import JobNotificationListener
+from api.common.scheduler import Scheduler
+from api.common.usdt_outbox import USDTOutboxDispatcher
+from api.common.deposit_address_pool import replenish_deposit_address_pool
+from api.common.metrics import deposit_check_sweep_duration, deposit_confirmation_latency, deposit_checks
+from psycopg2.extras import Json, execute_values
+from prometheus_client import start_http_server
 
 # Configure logging
 logging.basicConfig(
@@ -30,18 +38,37 @@ logging.basicConfig(
 logger = logging.getLogger('background')
 
 # Configuration
-CHECK_INVOICE_INTERVAL = 1  # Check invoices every 1 second
-WITHDRAWAL_SENDER_INTERVAL = 5  # Process pending withdrawals every 5 seconds
+# Stripe invoices are settled by the /api/v1/stripe/webhook endpoint when it is
+# configured; polling is then only a slow sweep for missed events
+STRIPE_WEBHOOK_ENABLED = bool(os.getenv('STRIPE_WEBHOOK_SECRET'))
+# How often the Stripe reconciler looks for due sessions (each session backs off on its own)
+CHECK_INVOICE_INTERVAL = int(os.getenv('STRIPE_RECONCILE_INTERVAL', '15' if STRIPE_WEBHOOK_ENABLED else '2'))
+# Leave invoices this young to the webhook
+STRIPE_RECONCILE_MIN_AGE_SECONDS = int(os.getenv('STRIPE_RECONCILE_MIN_AGE_SECONDS', '120' if STRIPE_WEBHOOK_ENABLED else '0'))
+WITHDRAWAL_SENDER_INTERVAL = 5  # Process pending withdrawals every 5 seconds while notifications are down
+WITHDRAWAL_SENDER_IDLE_INTERVAL = int(os.getenv('WITHDRAWAL_SENDER_IDLE_INTERVAL', '60'))  # Safety net, also retries stale claims
 STATUS_CHECKER_INTERVAL = 300  # Check delayed withdrawals every 5 minutes
-DEPOSIT_CHECK_INTERVAL = 30  # Check deposits every 30 seconds
-MAX_INVOICE_AGE_HOURS = 24  # Only check invoices created in the last 24 hours
+DEPOSIT_CHECK_INTERVAL = 30  # Check deposits every 30 seconds while any are pending
+# Pending USDT deposits checked at once, and calls per second the checker makes to the USDT service
+DEPOSIT_CHECK_CONCURRENCY = int(os.getenv('DEPOSIT_CHECK_CONCURRENCY', '8'))
+USDT_CHECK_RATE = float(os.getenv('USDT_CHECK_RATE', '10'))
+BALANCE_RECONCILE_INTERVAL = int(os.getenv('BALANCE_RECONCILE_INTERVAL', '3600'))  # Compare balance ledger with history hourly
+DEPOSIT_ADDRESS_POOL_INTERVAL = int(os.getenv('DEPOSIT_ADDRESS_POOL_INTERVAL', '30'))  # Check the deposit address pool every 30 seconds while refilling
+# New withdrawals, deposits and Stripe invoices wake their job through LISTEN/NOTIFY;
+# with nothing in hand a job only polls this often, as a safety net
+JOB_IDLE_POLL_INTERVAL = int(os.getenv('JOB_IDLE_POLL_INTERVAL', '300'))
+# Prometheus metrics of the background jobs are served on this port (0 disables)
+BACKGROUND_METRICS_PORT = int(os.getenv('BACKGROUND_METRICS_PORT', '9105'))
 
 # Timeout settings
-SENDING_TIMEOUT_MINUTES = 5  # Reset 'sending' to 'pending' after 5 minutes
 SENT_TIMEOUT_HOURS = 24  # Mark 'sent' as 'failed' after 24 hours
 
 INFURA_DOMAIN = os.getenv("INFURA_DOMAIN", "")
 USDT_SERVICE_URL = os.getenv('USDT_SERVICE_URL', 'http://usdt-api:3100')
+usdt_service = get_http_client('usdt_api')
+usdt_check_limiter = RateLimiter(USDT_CHECK_RATE)
+stripe_reconciler = StripeReconciler(min_age_seconds=STRIPE_RECONCILE_MIN_AGE_SECONDS)
+job_listener = JobNotificationListener()
 
 if INFURA_DOMAIN == "mainnet.infura.io":
     USDT_DECIMALS = 6
@@ -50,6 +77,8 @@ elif INFURA_DOMAIN == "sepolia.infura.io":
 else:
     raise ValueError("Invalid INFURA_DOMAIN configuration")
 
+usdt_outbox = USDTOutboxDispatcher(decimals=USDT_DECIMALS, service_url=USDT_SERVICE_URL)
+
 
 def decimal_json_encoder(obj):
     """JSON encoder that handles Decimal types"""
@@ -65,222 +94,46 @@ def safe_json_dumps(data):
 
 def check_invoice_payments():
     """
-    Checks for pending invoices and updates their status if paid
+    Checks unsettled Stripe invoices and deposits that are due and settles them
+    
+    With the Stripe webhook enabled this is a reconciliation sweep for missed
+    events; sessions younger than STRIPE_RECONCILE_MIN_AGE_SECONDS are left to
+    the webhook.
+    
+    Returns:
+        Number of Stripe sessions checked
     """
-    logger.info("Starting invoice payment check")
     try:
-        # Get timestamp for filtering (only check recent invoices)
-        cutoff_time = datetime.now() - timedelta(hours=MAX_INVOICE_AGE_HOURS)
-        
-        # Get all invoices from the last 24 hours that don't have completed payments
-        with database_cursor() as (cur, conn):
-            # Query for invoices without completed payments within the time window
-            # Exclude 'balance' type invoices as they are processed instantly
-            execute_sql(cur, """
-                SELECT i.id, i.external_id, i.type, i.searchable_id, i.buyer_id, i.seller_id,
-                       i.amount, i.currency, i.created_at, i.metadata
-                FROM invoice i 
-                LEFT JOIN payment p ON i.id = p.invoice_id AND p.status = %s
-                WHERE i.created_at >= %s
-                AND p.id IS NULL
-                AND i.type != 'balance'
-            """, params=(PaymentStatus.COMPLETE.value, cutoff_time))
-            
-            invoices = cur.fetchall()
-        
-        # Track processed invoices
-        processed_count = 0
-        paid_count = 0
-        
-        for invoice_row in invoices:
-            invoice_id, external_id, invoice_type, searchable_id, buyer_id, seller_id, amount, currency, created_at, metadata = invoice_row
-                
-            # Check payment status for Stripe payments only
-            if invoice_type == 'stripe':
-                try:
-                    session_id = external_id
-                    payment_data = refresh_stripe_payment(session_id)
-                    processed_count += 1
-                    
-                    # If payment is paid, it has been recorded by the helper function
-                    if payment_data.get('status') == 'paid':
-                        paid_count += 1
-                        logger.info(f"Recorded Stripe payment for session {session_id}")
-                        
-                except Exception as e:
-                    logger.error(f"Error checking Stripe payment status for session {external_id}: {str(e)}")
-        
-        logger.info(f"Completed invoice check: processed {processed_count} invoices, recorded {paid_count} payments")
-        
+        return sum(stripe_reconciler.run_once().values())
     except Exception as e:
         logger.error(f"Error in check_invoice_payments: {str(e)}")
         logger.error(traceback.format_exc())
+        raise
 
 
-def is_valid_tx_hash(txhash):
-    """
-    Check if an Ethereum transaction hash is valid.
-    
-    Args:
-        txhash (str): The transaction hash to validate
-        
-    Returns:
-        bool: True if valid, False otherwise
+def process_pending_withdrawals():
     """
-    if not isinstance(txhash, str):
-        return False
-
-    # Remove '0x' prefix if present
-    if txhash.startswith('0x'):
-        txhash = txhash[2:]
+    JOB 1: Dispatch the USDT service requests queued in usdt_outbox
+    Status flow: pending → sending → complete/delayed/error
     
-    # Check if it's exactly 64 characters long
-    if len(txhash) != 64:
-        return False
+    Withdrawals are queued in the outbox by a trigger when they are created.
+    Up to USDT_OUTBOX_CONCURRENCY requests are kept in flight; requests whose
+    outcome is unknown are retried with the same request_id. Safe to run in
+    several background replicas at once.
     
-    # Check if all characters are valid hexadecimal
-    try:
-        int(txhash, 16)
-        return True
-    except ValueError:
-        return False
-
-def process_pending_withdrawals():
-    """
-    JOB 1: Process pending withdrawals by sending them to USDT service
-    Status flow: pending → sending → sent (or back to pending on error)
+    Returns:
+        Number of requests dispatched
     """
     logger.info("Starting withdrawal sender job")
     try:
-        with database_cursor() as (cur, conn):
-            execute_sql(cur, f"""
-                SELECT id, user_id, amount, currency, type, external_id, metadata
-                FROM withdrawal 
-                WHERE status = '{PaymentStatus.PENDING.value}'
-                ORDER BY created_at ASC
-                LIMIT 1
-            """) # do we need "FOR UPDATE" 
-            
-            pending_withdrawals = cur.fetchall()
-        
-        processed_count = 0
-        
-        for withdrawal_row in pending_withdrawals:
-            withdrawal_id, user_id, amount, currency, withdrawal_type, external_id, metadata = withdrawal_row
-            metadata = metadata or {}
-            
-            processed_count += 1
-            
-            try:
-                logger.info(f"Processing pending withdrawal {withdrawal_id} for ${amount} {currency}")
-                
-                
-                if currency.lower() == 'usd':
-                    # Process USDT withdrawal
-                    address = metadata.get('address')
-                    if not address:
-                        pass
-                        # todo: mark as failed
-                        # raise Exception("USDT withdrawal missing address")
-                    
-                    # Call USDT service (convert Decimal amount to float for JSON serialization)
-                    usdt_amount = float(amount) * 10 ** USDT_DECIMALS
-                    response = requests.post('http://usdt-api:3100/send', json={
-                        'to': address,
-                        'amount': usdt_amount,
-                        'request_id': f'withdrawal_{withdrawal_id}'
-                    }, timeout=60)
-                    
-                    response_data = response.json()
-                    logger.info(f"USDT API response for withdrawal {withdrawal_id}: {response_data}")
-                    
-                    with database_transaction() as (cur, conn):
-                        if 'txHash' in response_data and is_valid_tx_hash(response_data.get('txHash')) and 'status' in response_data and response_data.get('status') == 'complete':
-                            # Success - got txHash, mark as 'sent'
-                            tx_hash = response_data.get('txHash')
-
-                            # Preserve existing metadata and add new fields
-                            complete_metadata = metadata.copy()
-                            complete_metadata.update({
-                                'tx_hash': tx_hash,
-                                'complete_timestamp': int(time.time()),
-                                # Ensure important fields are preserved
-                                'address': metadata.get('address'),
-                                'original_amount': metadata.get('original_amount'),
-                                'fee_percentage': metadata.get('fee_percentage'),
-                                'amount_after_fee': metadata.get('amount_after_fee')
-                            })
-                            
-                            cur.execute("""
-                                UPDATE withdrawal 
-                                SET status = %s,
-                                    external_id = %s,
-                                    metadata = %s
-                                WHERE id = %s
-                            """, (PaymentStatus.COMPLETE.value, tx_hash, safe_json_dumps(complete_metadata), withdrawal_id))
-                            
-                            logger.info(f"✅ Withdrawal {withdrawal_id} sent successfully - txHash: {tx_hash}")
-                            
-                        elif 'txHash' in response_data and is_valid_tx_hash(response_data.get('txHash')):
-                            # we should check the status code to be 5xx
-                            tx_hash = response_data.get('txHash')
-                            error = response_data.get('error', 'Unknown error')
-                            logger.error(f"❌ Withdrawal {withdrawal_id} sent but failed with error: {error} - txHash: {tx_hash}")
-                            # Preserve existing metadata and add new fields
-                            sent_metadata = metadata.copy()
-                            sent_metadata.update({
-                                'tx_hash': tx_hash,
-                                'complete_timestamp': int(time.time()),
-                                # Ensure important fields are preserved
-                                'address': metadata.get('address'),
-                                'original_amount': metadata.get('original_amount'),
-                                'fee_percentage': metadata.get('fee_percentage'),
-                                'amount_after_fee': metadata.get('amount_after_fee'),
-                                'error': error
-                            })
-                            
-                            cur.execute("""
-                                UPDATE withdrawal 
-                                SET status = %s,
-                                    external_id = %s,
-                                    metadata = %s
-                                WHERE id = %s
-                            """, (PaymentStatus.DELAYED.value, tx_hash, safe_json_dumps(sent_metadata), withdrawal_id))
-                        else:
-                            # Preserve existing metadata and add error timestamp
-                            error_metadata = metadata.copy()
-
-                            error = response_data.get('error', 'Unknown error')
-                            logger.error(f"❌ Withdrawal {withdrawal_id} sent but failed with error: {error}")
-                            
-                            error_metadata.update({
-                                'error_timestamp': int(time.time()),
-                                # Ensure important fields are preserved
-                                'address': metadata.get('address'),
-                                'original_amount': metadata.get('original_amount'),
-                                'fee_percentage': metadata.get('fee_percentage'),
-                                'amount_after_fee': metadata.get('amount_after_fee'),
-                                'error': error
-                            })
-                            # todo: error should be excluded from balance calculation
-                            cur.execute("""
-                                UPDATE withdrawal 
-                                SET status = %s,
-                                    metadata = %s
-                                WHERE id = %s
-                            """, (PaymentStatus.ERROR.value, safe_json_dumps(error_metadata), withdrawal_id))
-                        
-                else:
-                    raise Exception(f"Unsupported currency for withdrawal: {currency}")
-                
-            except Exception as e:
-                logger.error(f"Error processing withdrawal {withdrawal_id}: {str(e)}")
-        
-        logger.info(f"Withdrawal sender job completed: processed {processed_count} withdrawals")
+        dispatched = usdt_outbox.run_once()
+        logger.info(f"Withdrawal sender job completed: dispatched {dispatched} requests")
+        return dispatched
         
     except Exception as e:
         logger.error(f"Error in process_pending_withdrawals: {str(e)}")
         logger.error(traceback.format_exc())
+        raise
 
 
 def check_delayed_withdrawals():
@@ -319,7 +172,7 @@ def check_delayed_withdrawals():
                     logger.info(f"Checking status of sent withdrawal {withdrawal_id} with tx_hash: {tx_hash}")
                     
                     # Query transaction status from USDT service
-                    response = requests.get(f'http://usdt-api:3100/tx-status/{tx_hash}', timeout=10)
+                    response = usdt_service.get(f'{USDT_SERVICE_URL}/tx-status/{tx_hash}', timeout=10)
                     
                     if response.status_code == 200:
                         tx_status = response.json()
@@ -384,297 +237,308 @@ def check_delayed_withdrawals():
                     # Keep as 'sent' and retry later
         
         logger.info(f"Status checker job completed: checked {checked_count} withdrawals")
+        return checked_count
         
     except Exception as e:
         logger.error(f"Error in check_delayed_withdrawals: {str(e)}")
         logger.error(traceback.format_exc())
+        raise
 
 
-def invoice_check_thread():
-    """Thread function that periodically checks invoice payments"""
-    while True:
-        try:
-            check_invoice_payments()
-        except Exception as e:
-            logger.error(f"Error in invoice check thread: {str(e)}")
-            logger.error(traceback.format_exc())
+def reconcile_user_balances():
+    """
+    Compares the user_balance ledger against the transaction history and
+    reports any user whose stored balance has drifted
+    
+    Returns:
+        Number of drifted users
+    """
+    logger.info("Starting user balance reconciliation")
+    try:
+        drifted = find_user_balance_drift()
         
-        time.sleep(CHECK_INVOICE_INTERVAL)
+        if not drifted:
+            logger.info("User balance reconciliation completed: ledger matches history")
+            return 0
+        
+        for entry in drifted:
+            logger.warning(
+                f"Balance drift for user {entry['user_id']}: ledger={entry['ledger_balance']:.8f} "
+                f"expected={entry['expected_balance']:.8f} drift={entry['drift']:.8f}"
+            )
+        logger.warning(f"User balance reconciliation found {len(drifted)} drifted user(s); "
+                       f"run scripts/reconcile_user_balance.py --fix to repair")
+        return len(drifted)
+        
+    except Exception as e:
+        logger.error(f"Error in reconcile_user_balances: {str(e)}")
+        logger.error(traceback.format_exc())
+        raise
 
 
-def withdrawal_sender_thread():
-    """Thread function that periodically processes pending withdrawals"""
-    while True:
-        try:
-            process_pending_withdrawals()
-        except Exception as e:
-            logger.error(f"Error in withdrawal sender thread: {str(e)}")
-            logger.error(traceback.format_exc())
-        
-        time.sleep(WITHDRAWAL_SENDER_INTERVAL)
+def replenish_deposit_addresses():
+    """
+    Tops up the pool of pre-generated USDT deposit addresses when it runs low
+    
+    Returns:
+        Number of addresses added
+    """
+    try:
+        return replenish_deposit_address_pool()
+    except Exception as e:
+        logger.error(f"Error in replenish_deposit_addresses: {str(e)}")
+        logger.error(traceback.format_exc())
+        raise
 
 
-def deposit_check_thread():
-    """Thread function that periodically checks pending deposits"""
-    while True:
-        try:
-            check_deposit_confirmations()
-        except Exception as e:
-            logger.error(f"Error in deposit check thread: {str(e)}")
-            logger.error(traceback.format_exc())
-        
-        time.sleep(DEPOSIT_CHECK_INTERVAL)
+def usdt_check_get(path):
+    """GET from the USDT service within the deposit checker's shared rate limit"""
+    usdt_check_limiter.acquire()
+    return usdt_service.get(f"{USDT_SERVICE_URL}{path}", timeout=10)
 
 
-def status_checker_thread():
-    """Thread function that periodically checks delayed withdrawals"""
-    while True:
+def check_usdt_deposit(deposit):
+    """
+    Check one pending USDT deposit for an incoming transfer and credit it if found
+    
+    Crediting is written straight away; other outcomes only change metadata
+    (and, on expiry, the status), which the caller writes in one batch.
+    
+    Returns:
+        (result, update) where update is a (deposit_id, status, metadata) tuple or None
+    """
+    deposit_id, user_id, expected_amount, metadata, created_at, external_id, deposit_type = deposit
+    
+    try:
+        # Check if deposit has expired (1 hour for USDT)
+        if datetime.utcnow() - created_at.replace(tzinfo=None) > timedelta(hours=1):
+            logger.info(f"USDT deposit {deposit_id} has expired, marking as failed")
+            metadata['error'] = 'Deposit expired after 1 hour'
+            return 'expired', (deposit_id, 'failed', metadata)
+        
+        eth_address = metadata.get('eth_address')
+        if not eth_address:
+            logger.error(f"Deposit {deposit_id} missing eth_address in metadata")
+            return 'error', None
+        
+        # Check for transactions to the deposit address
+        tx_response = usdt_check_get(f"/transactions/{eth_address}")
+        
+        if tx_response.status_code != 200:
+            logger.error(f"Failed to check transactions for {eth_address}: {tx_response.text}")
+            return 'error', None
+        
+        transactions = tx_response.json().get('transactions', [])
+        
+        if not transactions:
+            # No transactions found, just update checked_at
+            metadata['checked_at'] = datetime.utcnow().isoformat()
+            return 'pending', (deposit_id, 'pending', metadata)
+        
+        # Sort transactions by block number descending to get the latest
+        transactions.sort(key=lambda x: int(x.get('blockNumber', 0)), reverse=True)
+        latest_tx = transactions[0]
+        
+        tx_hash = latest_tx['txHash']
+        tx_value_wei = int(latest_tx['value'])
+        
+        # Check the full transaction status to get accurate amount
         try:
-            check_delayed_withdrawals()
+            tx_status_response = usdt_check_get(f"/tx-status/{tx_hash}")
+            if tx_status_response.status_code == 200:
+                tx_status_data = tx_status_response.json()
+                if 'usdtAmount' in tx_status_data:
+                    tx_value_wei = int(tx_status_data['usdtAmount'])
         except Exception as e:
-            logger.error(f"Error in status checker thread: {str(e)}")
-            logger.error(traceback.format_exc())
+            logger.warning(f"Could not get detailed tx status for {tx_hash}: {e}")
+        
+        tx_amount = Decimal(tx_value_wei) / Decimal(10 ** USDT_DECIMALS)
+        
+        logger.info(f"Deposit {deposit_id}: Found latest transaction {tx_hash} with amount {tx_amount} USDT")
+        
+        with database_transaction() as (cur, conn):
+            # Check if this tx_hash is already used by any deposit
+            execute_sql(cur, """
+                SELECT id FROM deposit 
+                WHERE tx_hash = %s
+            """, params=(tx_hash,))
+            existing_deposit = cur.fetchone()
+            
+            if not existing_deposit:
+                # Transaction is unique, credit this deposit
+                credited_metadata = dict(metadata)
+                credited_metadata['tx_hash'] = tx_hash
+                credited_metadata['tx_from'] = latest_tx['from']
+                credited_metadata['tx_amount'] = str(tx_amount)
+                credited_metadata['tx_block'] = str(latest_tx['blockNumber'])
+                credited_metadata['completed_at'] = datetime.utcnow().isoformat()
+                
+                execute_sql(cur, """
+                    UPDATE deposit 
+                    SET status = 'complete', 
+                        amount = %s,
+                        metadata = %s,
+                        tx_hash = %s
+                    WHERE id = %s AND status = 'pending'
+                """, params=(tx_amount, Json(credited_metadata), tx_hash, deposit_id))
+        
+        if existing_deposit:
+            logger.info(f"Transaction {tx_hash} already credited to deposit {existing_deposit[0]}")
+            metadata['checked_at'] = datetime.utcnow().isoformat()
+            metadata['skipped_tx'] = tx_hash
+            return 'duplicate_tx', (deposit_id, 'pending', metadata)
         
-        time.sleep(STATUS_CHECKER_INTERVAL)
+        deposit_confirmation_latency.observe((datetime.utcnow() - created_at.replace(tzinfo=None)).total_seconds())
+        logger.info(f"Deposit {deposit_id} completed with tx {tx_hash} for {tx_amount} USDT")
+        return 'complete', None
+        
+    except Exception as e:
+        logger.error(f"Error processing deposit {deposit_id}: {str(e)}")
+        logger.error(traceback.format_exc())
+        return 'error', None
+
 
+def save_deposit_check_updates(updates):
+    """
+    Write the status and metadata of checked deposits in one statement
+    
+    Deposits that were credited or otherwise settled since the sweep started
+    are left alone.
+    """
+    if not updates:
+        return
+    with database_transaction() as (cur, conn):
+        execute_values(cur, """
+            UPDATE deposit d
+            SET status = v.status,
+                metadata = v.metadata
+            FROM (VALUES %s) AS v(id, status, metadata)
+            WHERE d.id = v.id AND d.status = 'pending'
+        """, [(deposit_id, status, Json(metadata)) for deposit_id, status, metadata in updates],
+            template="(%s, %s, %s::jsonb)")
 
 
 def check_deposit_confirmations():
-    """Check pending deposits for USDT balance and Stripe payment status"""
+    """
+    Check pending USDT deposits for incoming transfers
+    
+    Deposits are checked DEPOSIT_CHECK_CONCURRENCY at a time, with all calls to
+    the USDT service sharing one USDT_CHECK_RATE limit.
+    Stripe deposits are settled by the webhook and the Stripe reconciler.
+    
+    Returns:
+        Number of pending deposits checked
+    """
+    started = time.monotonic()
     try:
         logger.info("Checking pending deposits...")
         
         with database_cursor() as (cur, conn):
             # Get pending deposits that haven't expired
-            # Stripe deposits don't expire like USDT deposits
             execute_sql(cur, """
                 SELECT id, user_id, amount, metadata, created_at, external_id, type
                 FROM deposit
                 WHERE status = 'pending'
-                AND (
-                    (type = 'usdt' AND created_at > NOW() - INTERVAL '1 hours')
-                    OR (type = 'stripe')
-                )
+                AND type = 'usdt' AND created_at > NOW() - INTERVAL '1 hours'
                 ORDER BY created_at ASC
             """)
             
             pending_deposits = cur.fetchall()
             logger.info(f"Found {len(pending_deposits)} pending deposits to check")
         
-        for deposit in pending_deposits:
-            time.sleep(2) # Reduced delay since we're checking both USDT and Stripe
-            deposit_id, user_id, expected_amount, metadata, created_at, external_id, deposit_type = deposit
-            
-            try:
-                # Handle Stripe deposits
-                if deposit_type == 'stripe':
-                    logger.info(f"Checking Stripe deposit {deposit_id}")
-                    
-                    # Check Stripe payment status
-                    session_id = external_id
-                    if not session_id:
-                        logger.error(f"Stripe deposit {deposit_id} missing session_id")
-                        continue
-                        
-                    payment_data = refresh_stripe_payment(session_id)
-                    
-                    with database_transaction() as (cur, conn):
-                        if payment_data.get('status') == 'paid':
-                            # Payment successful, mark deposit as complete
-                            metadata['completed_at'] = datetime.utcnow().isoformat()
-                            metadata['payment_status'] = 'paid'
-                            
-                            execute_sql(cur, """
-                                UPDATE deposit 
-                                SET status = 'complete',
-                                    metadata = %s
-                                WHERE id = %s
-                            """, params=(Json(metadata), deposit_id))
-                            
-                            logger.info(f"Stripe deposit {deposit_id} completed for ${expected_amount}")
-                            
-                        elif payment_data.get('status') == 'expired':
-                            # Payment session expired
-                            metadata['error'] = 'Payment session expired'
-                            metadata['expired_at'] = datetime.utcnow().isoformat()
-                            
-                            execute_sql(cur, """
-                                UPDATE deposit 
-                                SET status = 'failed',
-                                    metadata = %s
-                                WHERE id = %s
-                            """, params=(Json(metadata), deposit_id))
-                            
-                            logger.info(f"Stripe deposit {deposit_id} expired")
-                
-                # Handle USDT deposits (existing logic)
-                else:
-                    # Check if deposit has expired (1 hour for USDT)
-                    if datetime.utcnow() - created_at.replace(tzinfo=None) > timedelta(hours=1):
-                        logger.info(f"USDT deposit {deposit_id} has expired, marking as failed")
-                        metadata['error'] = 'Deposit expired after 1 hour'
-                        with database_transaction() as (cur, conn):
-                            execute_sql(cur, """
-                                UPDATE deposit 
-                                SET status = 'failed', metadata = %s
-                                WHERE id = %s
-                            """, params=(Json(metadata), deposit_id))
-                        continue
-                    
-                    eth_address = metadata.get('eth_address')
-                    if not eth_address:
-                        logger.error(f"Deposit {deposit_id} missing eth_address in metadata")
-                        continue
-                    
-                    # Check for transactions to the deposit address
-                    logger.info(f"Checking transactions for deposit {deposit_id} at address {eth_address}")
-                    
-                    tx_response = requests.get(
-                        f"{USDT_SERVICE_URL}/transactions/{eth_address}",
-                        timeout=10
-                    )
-                
-                    if tx_response.status_code != 200:
-                        logger.error(f"Failed to check transactions for {eth_address}: {tx_response.text}")
-                        continue
-                    
-                    tx_data = tx_response.json()
-                    transactions = tx_data.get('transactions', [])
-                    
-                    if not transactions:
-                        # No transactions found, just update checked_at
-                        metadata['checked_at'] = datetime.utcnow().isoformat()
-                        with database_transaction() as (cur, conn):
-                            execute_sql(cur, """
-                                UPDATE deposit 
-                                SET metadata = %s
-                                WHERE id = %s
-                            """, params=(Json(metadata), deposit_id))
-                        continue
-                
-                    # Sort transactions by block number descending to get the latest
-                    transactions.sort(key=lambda x: int(x.get('blockNumber', 0)), reverse=True)
-                    latest_tx = transactions[0]
-                    
-                    tx_hash = latest_tx['txHash']
-                    tx_value_wei = int(latest_tx['value'])
-                
-                    # Check the full transaction status to get accurate amount
-                    try:
-                        tx_status_response = requests.get(
-                            f"{USDT_SERVICE_URL}/tx-status/{tx_hash}",
-                            timeout=10
-                        )
-                        if tx_status_response.status_code == 200:
-                            tx_status_data = tx_status_response.json()
-                            if 'usdtAmount' in tx_status_data:
-                                tx_value_wei = int(tx_status_data['usdtAmount'])
-                    except Exception as e:
-                        logger.warning(f"Could not get detailed tx status for {tx_hash}: {e}")
-                    
-                    tx_amount = Decimal(tx_value_wei) / Decimal(10 ** USDT_DECIMALS)
-                    
-                    logger.info(f"Deposit {deposit_id}: Found latest transaction {tx_hash} with amount {tx_amount} USDT")
-                
-                    # Check if this tx_hash is already used by any deposit
-                    with database_cursor() as (cur, conn):
-                        execute_sql(cur, """
-                            SELECT id FROM deposit 
-                            WHERE tx_hash = %s
-                        """, params=(tx_hash,))
-                        
-                        existing_deposit = cur.fetchone()
-                    
-                    if existing_deposit:
-                        logger.info(f"Transaction {tx_hash} already credited to deposit {existing_deposit[0]}")
-                        # Update checked_at and continue
-                        metadata['checked_at'] = datetime.utcnow().isoformat()
-                        metadata['skipped_tx'] = tx_hash
-                        with database_transaction() as (cur, conn):
-                            execute_sql(cur, """
-                                UPDATE deposit 
-                                SET metadata = %s
-                                WHERE id = %s
-                            """, params=(Json(metadata), deposit_id))
-                        continue
-                
-                    # Transaction is unique, credit this deposit
-                    metadata['tx_hash'] = tx_hash
-                    metadata['tx_from'] = latest_tx['from']
-                    metadata['tx_amount'] = str(tx_amount)
-                    metadata['tx_block'] = str(latest_tx['blockNumber'])
-                    metadata['completed_at'] = datetime.utcnow().isoformat()
-                    
-                    with database_transaction() as (cur, conn):
-                        execute_sql(cur, """
-                            UPDATE deposit 
-                            SET status = 'complete', 
-                                amount = %s,
-                                metadata = %s,
-                                tx_hash = %s
-                            WHERE id = %s
-                        """, params=(tx_amount, Json(metadata), tx_hash, deposit_id))
-                    
-                    logger.info(f"Deposit {deposit_id} completed with tx {tx_hash} for {tx_amount} USDT")
-                    
-            except Exception as e:
-                logger.error(f"Error processing deposit {deposit_id}: {str(e)}")
-                logger.error(traceback.format_exc())
+        if not pending_deposits:
+            return 0
+        
+        outcomes = {}
+        updates = []
+        with ThreadPoolExecutor(max_workers=DEPOSIT_CHECK_CONCURRENCY) as executor:
+            for result, update in executor.map(check_usdt_deposit, pending_deposits):
+                outcomes[result] = outcomes.get(result, 0) + 1
+                deposit_checks.labels(result).inc()
+                if update:
+                    updates.append(update)
+        
+        save_deposit_check_updates(updates)
+        logger.info(f"Checked {len(pending_deposits)} deposits in {time.monotonic() - started:.1f}s: {outcomes}")
+        return len(pending_deposits)
             
     except Exception as e:
         logger.error(f"Error in check_deposit_confirmations: {str(e)}")
         logger.error(traceback.format_exc())
+        raise
+    finally:
+        deposit_check_sweep_duration.observe(time.monotonic() - started)
 
 
-def start_background_threads():
-    """Start all background processing threads"""
-    logger.info("Starting background processing threads with optimized timing")
+def build_scheduler():
+    """
+    Register the background jobs
     
-    # Start invoice check thread
-    invoice_thread = threading.Thread(
-        target=invoice_check_thread,
-        daemon=True,
-        name="invoice-check"
+    Jobs woken by database notifications poll on `interval` only while they
+    have work in hand (or notifications are down), otherwise on their idle
+    interval. All jobs except the withdrawal sender, which claims its work
+    with SKIP LOCKED, run on one replica at a time.
+    """
+    scheduler = Scheduler(listener=job_listener)
+    scheduler.register(
+        'stripe_reconcile', check_invoice_payments, CHECK_INVOICE_INTERVAL,
+        idle_interval=JOB_IDLE_POLL_INTERVAL, wake='stripe_checkouts', singleton=True, timeout=300,
+        # Tracked sessions are due on their own schedule
+        busy=lambda checked: stripe_reconciler.tracked > 0
     )
-    invoice_thread.start()
-    
-    # Start withdrawal sender thread
-    sender_thread = threading.Thread(
-        target=withdrawal_sender_thread,
-        daemon=True,
-        name="withdrawal-sender"
+    scheduler.register(
+        'withdrawal_sender', process_pending_withdrawals, WITHDRAWAL_SENDER_INTERVAL,
+        idle_interval=WITHDRAWAL_SENDER_IDLE_INTERVAL, wake='withdrawals', timeout=300,
+        # Each run drains what is due; requests waiting for a retry keep it polling
+        busy=lambda dispatched: usdt_outbox.backlog > 0
     )
-    sender_thread.start()
-    
-    # Start deposit check thread
-    deposit_thread = threading.Thread(
-        target=deposit_check_thread,
-        daemon=True,
-        name="deposit-check"
+    scheduler.register(
+        # Transfers arrive on chain, not through the database, so the checker
+        # keeps polling while deposits are pending
+        'deposit_check', check_deposit_confirmations, DEPOSIT_CHECK_INTERVAL,
+        idle_interval=JOB_IDLE_POLL_INTERVAL, wake='usdt_deposits', singleton=True, timeout=300
     )
-    deposit_thread.start()
-    
-    # Start status checker thread for delayed withdrawals
-    status_thread = threading.Thread(
-        target=status_checker_thread,
-        daemon=True,
-        name="status-checker"
+    scheduler.register(
+        'delayed_withdrawal_check', check_delayed_withdrawals, STATUS_CHECKER_INTERVAL,
+        singleton=True, timeout=300
+    )
+    scheduler.register(
+        'balance_reconcile', reconcile_user_balances, BALANCE_RECONCILE_INTERVAL,
+        singleton=True, timeout=900
     )
-    status_thread.start()
+    scheduler.register(
+        # Woken as deposits take addresses; refills are checked again until one adds nothing
+        'deposit_address_pool', replenish_deposit_addresses, DEPOSIT_ADDRESS_POOL_INTERVAL,
+        idle_interval=JOB_IDLE_POLL_INTERVAL, wake='deposit_address_pool', singleton=True, timeout=300
+    )
+    return scheduler
+
+
+def start_background_jobs():
+    """Start the job scheduler and the notification listener that wakes its jobs"""
+    logger.info("Starting background job scheduler")
+    scheduler = build_scheduler()
+    scheduler.start()
     
-    logger.info("Background threads started:")
-    logger.info(f"  - Invoice checker: every {CHECK_INVOICE_INTERVAL}s")
-    logger.info(f"  - Withdrawal processor: every {WITHDRAWAL_SENDER_INTERVAL}s")
-    logger.info(f"  - Deposit checker: every {DEPOSIT_CHECK_INTERVAL}s")
+    logger.info("Background jobs started:")
+    logger.info(f"  - Invoice checker: on notification, then every {CHECK_INVOICE_INTERVAL}s while sessions are unsettled (Stripe webhook {'enabled' if STRIPE_WEBHOOK_ENABLED else 'disabled'})")
+    logger.info(f"  - Withdrawal processor: on notification, safety net every {WITHDRAWAL_SENDER_IDLE_INTERVAL}s")
+    logger.info(f"  - Deposit checker: on notification, then every {DEPOSIT_CHECK_INTERVAL}s while deposits are pending")
     logger.info(f"  - Delayed withdrawal checker: every {STATUS_CHECKER_INTERVAL}s")
+    logger.info(f"  - Balance reconciliation: every {BALANCE_RECONCILE_INTERVAL}s")
+    logger.info(f"  - Deposit address pool: on notification, safety net every {JOB_IDLE_POLL_INTERVAL}s")
     
-    return [invoice_thread, sender_thread, deposit_thread, status_thread]
+    return scheduler
 
 
 # This will be called when the module is imported
 if __name__ == "__main__":
-    # If run directly, start the threads
-    threads = start_background_threads()
+    if BACKGROUND_METRICS_PORT:
+        start_http_server(BACKGROUND_METRICS_PORT)
+        logger.info(f"Serving background metrics on port {BACKGROUND_METRICS_PORT}")
+    
+    # If run directly, start the jobs
+    scheduler = start_background_jobs()
     
     # Keep the main thread alive
     try:
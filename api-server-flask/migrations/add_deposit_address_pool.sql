@@ -0,0 +1,33 @@
+-- Migration: Pool of pre-generated USDT deposit addresses
+-- Date: 2026-10-17
+-- Requires add_job_notifications.sql
+
+BEGIN;
+
+-- Deposit addresses derived ahead of time by the background service, so that
+-- creating a USDT deposit does not wait for the USDT service. A deposit takes
+-- the oldest available address with SKIP LOCKED, in the transaction that
+-- creates it.
+CREATE TABLE IF NOT EXISTS deposit_address_pool (
+    id SERIAL PRIMARY KEY,
+    address TEXT NOT NULL UNIQUE,
+    address_index BIGINT NOT NULL UNIQUE,
+    status TEXT NOT NULL DEFAULT 'available' CHECK (status IN ('available', 'assigned')),
+    deposit_id INTEGER REFERENCES deposit(id) ON DELETE SET NULL,
+    created_at TIMESTAMP WITH TIME ZONE DEFAULT CURRENT_TIMESTAMP,
+    assigned_at TIMESTAMP WITH TIME ZONE
+);
+
+COMMENT ON COLUMN deposit_address_pool.address_index IS 'HD wallet index the USDT service derived the address from';
+
+-- Available addresses in claim order
+CREATE INDEX IF NOT EXISTS idx_deposit_address_pool_available ON deposit_address_pool(id) WHERE status = 'available';
+
+-- Wake the replenisher as addresses are taken
+DROP TRIGGER IF EXISTS deposit_address_pool_notify ON deposit_address_pool;
+CREATE TRIGGER deposit_address_pool_notify
+    AFTER UPDATE OF status ON deposit_address_pool
+    FOR EACH ROW WHEN (NEW.status = 'assigned')
+    EXECUTE FUNCTION notify_background_job('deposit_address_pool');
+
+COMMIT;
@@ -0,0 +1,120 @@
+-- Migration: Add entitlement table for paid downloadable files
+-- Date: 2026-10-17
+
+BEGIN;
+
+-- Hold payment changes so the backfill and the trigger line up exactly
+LOCK TABLE payment IN SHARE ROW EXCLUSIVE MODE;
+
+-- One row per downloadable file a user has paid for, derived from the
+-- selections of invoices with a completed payment
+CREATE TABLE IF NOT EXISTS entitlement (
+    id SERIAL PRIMARY KEY,
+    user_id INTEGER NOT NULL,
+    searchable_id INTEGER NOT NULL,
+    file_id TEXT NOT NULL,
+    file_name TEXT,
+    listed BOOLEAN NOT NULL DEFAULT TRUE,
+    invoice_id INTEGER NOT NULL,
+    created_at TIMESTAMP WITH TIME ZONE DEFAULT CURRENT_TIMESTAMP
+);
+
+CREATE UNIQUE INDEX IF NOT EXISTS idx_entitlement_user_searchable_file ON entitlement(user_id, searchable_id, file_id);
+
+COMMENT ON TABLE entitlement IS 'Downloadable files a buyer may fetch; kept in sync with completed payments by payment_entitlement trigger';
+COMMENT ON COLUMN entitlement.listed IS 'file_id is the selection''s fileId (or its id when it has no fileId) and is reported as a paid file; false for an id only accepted for downloads';
+
+-- Downloadable file ids granted by one invoice. Selections come in two shapes:
+-- legacy {type: downloadable, id, fileId, name} and allinone {component: downloadable, id}.
+-- Both id and fileId are granted because downloads may be requested by either,
+-- but only fileId (or id when there is no fileId) is listed as a paid file.
+CREATE OR REPLACE FUNCTION invoice_entitled_files(p_metadata JSONB)
+RETURNS TABLE (file_id TEXT, file_name TEXT, listed BOOLEAN) AS $$
+    SELECT DISTINCT ON (ids.file_id) ids.file_id, sel->>'name', ids.listed
+    FROM jsonb_array_elements(
+        CASE WHEN jsonb_typeof(p_metadata->'selections') = 'array'
+             THEN p_metadata->'selections' ELSE '[]'::jsonb END
+    ) AS sel
+    CROSS JOIN LATERAL (VALUES (sel->>'fileId', TRUE),
+                               (sel->>'id', sel->>'fileId' IS NULL)) AS ids(file_id, listed)
+    WHERE (sel->>'type' = 'downloadable' OR sel->>'component' = 'downloadable')
+      AND ids.file_id IS NOT NULL
+    ORDER BY ids.file_id, ids.listed DESC;
+$$ LANGUAGE sql IMMUTABLE;
+
+-- Re-derive a buyer's entitlements for one searchable from its completed payments
+CREATE OR REPLACE FUNCTION refresh_entitlements(p_user_id INTEGER, p_searchable_id INTEGER)
+RETURNS VOID AS $$
+BEGIN
+    DELETE FROM entitlement e
+    WHERE e.user_id = p_user_id
+      AND e.searchable_id = p_searchable_id
+      AND NOT EXISTS (
+          SELECT 1
+          FROM invoice i
+          JOIN payment p ON p.invoice_id = i.id
+          CROSS JOIN LATERAL invoice_entitled_files(i.metadata) f
+          WHERE i.buyer_id = p_user_id
+            AND i.searchable_id = p_searchable_id
+            AND p.status = 'complete'
+            AND f.file_id = e.file_id
+      );
+
+    INSERT INTO entitlement (user_id, searchable_id, file_id, file_name, listed, invoice_id)
+    SELECT DISTINCT ON (f.file_id) i.buyer_id, i.searchable_id, f.file_id, f.file_name, f.listed, i.id
+    FROM invoice i
+    JOIN payment p ON p.invoice_id = i.id
+    CROSS JOIN LATERAL invoice_entitled_files(i.metadata) f
+    WHERE i.buyer_id = p_user_id
+      AND i.searchable_id = p_searchable_id
+      AND p.status = 'complete'
+    ORDER BY f.file_id, f.listed DESC, i.id
+    ON CONFLICT (user_id, searchable_id, file_id) DO UPDATE
+        SET listed = EXCLUDED.listed
+        WHERE entitlement.listed IS DISTINCT FROM EXCLUDED.listed;
+END;
+$$ LANGUAGE plpgsql;
+
+-- Grant on reaching complete; re-derive if a completed payment changes or goes away
+CREATE OR REPLACE FUNCTION payment_entitlement_trigger()
+RETURNS TRIGGER AS $$
+DECLARE
+    inv RECORD;
+BEGIN
+    IF TG_OP IN ('UPDATE', 'DELETE') AND OLD.status = 'complete' THEN
+        SELECT buyer_id, searchable_id INTO inv FROM invoice WHERE id = OLD.invoice_id;
+        IF FOUND THEN
+            PERFORM refresh_entitlements(inv.buyer_id, inv.searchable_id);
+        END IF;
+    END IF;
+    IF TG_OP IN ('INSERT', 'UPDATE') AND NEW.status = 'complete' THEN
+        INSERT INTO entitlement (user_id, searchable_id, file_id, file_name, listed, invoice_id)
+        SELECT i.buyer_id, i.searchable_id, f.file_id, f.file_name, f.listed, i.id
+        FROM invoice i
+        CROSS JOIN LATERAL invoice_entitled_files(i.metadata) f
+        WHERE i.id = NEW.invoice_id
+        ON CONFLICT (user_id, searchable_id, file_id) DO UPDATE
+            SET listed = TRUE
+            WHERE EXCLUDED.listed AND NOT entitlement.listed;
+    END IF;
+    RETURN NULL;
+END;
+$$ LANGUAGE plpgsql;
+
+DROP TRIGGER IF EXISTS payment_entitlement ON payment;
+CREATE TRIGGER payment_entitlement
+    AFTER INSERT OR UPDATE OF status, invoice_id OR DELETE ON payment
+    FOR EACH ROW EXECUTE FUNCTION payment_entitlement_trigger();
+
+-- Backfill from invoices that already have a completed payment
+INSERT INTO entitlement (user_id, searchable_id, file_id, file_name, listed, invoice_id)
+SELECT DISTINCT ON (i.buyer_id, i.searchable_id, f.file_id)
+       i.buyer_id, i.searchable_id, f.file_id, f.file_name, f.listed, i.id
+FROM invoice i
+JOIN payment p ON p.invoice_id = i.id
+CROSS JOIN LATERAL invoice_entitled_files(i.metadata) f
+WHERE p.status = 'complete'
+ORDER BY i.buyer_id, i.searchable_id, f.file_id, f.listed DESC, i.id
+ON CONFLICT (user_id, searchable_id, file_id) DO NOTHING;
+
+COMMIT;
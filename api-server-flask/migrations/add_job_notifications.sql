@@ -0,0 +1,45 @@
+-- Migration: NOTIFY background jobs when withdrawals, deposits and invoices need processing
+-- Date: 2026-10-17
+
+BEGIN;
+
+-- Wake background jobs as soon as they have work. The trigger argument is
+-- the job name, sent as the payload on the background_jobs channel.
+-- NOTIFY is delivered on commit, and identical notifications from one
+-- transaction are folded into one.
+CREATE OR REPLACE FUNCTION notify_background_job()
+RETURNS TRIGGER AS $$
+BEGIN
+    PERFORM pg_notify('background_jobs', TG_ARGV[0]);
+    RETURN NULL;
+END;
+$$ LANGUAGE plpgsql;
+
+-- New withdrawals, and withdrawals handed back to the queue
+DROP TRIGGER IF EXISTS withdrawal_notify_sender ON withdrawal;
+CREATE TRIGGER withdrawal_notify_sender
+    AFTER INSERT OR UPDATE OF status ON withdrawal
+    FOR EACH ROW WHEN (NEW.status = 'pending')
+    EXECUTE FUNCTION notify_background_job('withdrawals');
+
+-- Deposits are inserted first and get their address or checkout session
+-- (external_id) in a follow-up update
+DROP TRIGGER IF EXISTS deposit_notify_usdt ON deposit;
+CREATE TRIGGER deposit_notify_usdt
+    AFTER INSERT OR UPDATE OF status, external_id ON deposit
+    FOR EACH ROW WHEN (NEW.type = 'usdt' AND NEW.status = 'pending')
+    EXECUTE FUNCTION notify_background_job('usdt_deposits');
+
+DROP TRIGGER IF EXISTS deposit_notify_stripe ON deposit;
+CREATE TRIGGER deposit_notify_stripe
+    AFTER INSERT OR UPDATE OF status, external_id ON deposit
+    FOR EACH ROW WHEN (NEW.type = 'stripe' AND NEW.status = 'pending')
+    EXECUTE FUNCTION notify_background_job('stripe_checkouts');
+
+DROP TRIGGER IF EXISTS invoice_notify_stripe ON invoice;
+CREATE TRIGGER invoice_notify_stripe
+    AFTER INSERT ON invoice
+    FOR EACH ROW WHEN (NEW.type = 'stripe')
+    EXECUTE FUNCTION notify_background_job('stripe_checkouts');
+
+COMMIT;
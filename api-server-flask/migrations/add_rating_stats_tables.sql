@@ -0,0 +1,35 @@
+-- Migration: Add precomputed rating stats tables
+-- Date: 2026-10-17
+
+-- Precomputed rating aggregates, maintained incrementally by create_rating
+CREATE TABLE IF NOT EXISTS searchable_rating_stats (
+    searchable_id INTEGER PRIMARY KEY,
+    rating_sum DOUBLE PRECISION NOT NULL DEFAULT 0,
+    rating_count INTEGER NOT NULL DEFAULT 0,
+    updated_at TIMESTAMP WITH TIME ZONE DEFAULT CURRENT_TIMESTAMP
+);
+
+CREATE TABLE IF NOT EXISTS seller_rating_stats (
+    seller_id INTEGER PRIMARY KEY,
+    rating_sum DOUBLE PRECISION NOT NULL DEFAULT 0,
+    rating_count INTEGER NOT NULL DEFAULT 0,
+    updated_at TIMESTAMP WITH TIME ZONE DEFAULT CURRENT_TIMESTAMP
+);
+
+COMMENT ON TABLE searchable_rating_stats IS 'Sum and count of ratings per searchable; average is rating_sum / rating_count';
+COMMENT ON TABLE seller_rating_stats IS 'Sum and count of ratings received per seller; average is rating_sum / rating_count';
+
+-- Backfill from existing ratings (scripts/rebuild_rating_stats.py does the same on demand)
+INSERT INTO searchable_rating_stats (searchable_id, rating_sum, rating_count)
+SELECT i.searchable_id, SUM(r.rating), COUNT(*)
+FROM rating r
+JOIN invoice i ON r.invoice_id = i.id
+GROUP BY i.searchable_id
+ON CONFLICT (searchable_id) DO NOTHING;
+
+INSERT INTO seller_rating_stats (seller_id, rating_sum, rating_count)
+SELECT i.seller_id, SUM(r.rating), COUNT(*)
+FROM rating r
+JOIN invoice i ON r.invoice_id = i.id
+GROUP BY i.seller_id
+ON CONFLICT (seller_id) DO NOTHING;
@@ -0,0 +1,79 @@
+-- Migration: Add full-text search vector to searchables
+-- Date: 2026-10-17
+
+-- Full-text search vector over title, description and tag names
+ALTER TABLE searchables ADD COLUMN IF NOT EXISTS search_vector tsvector;
+
+CREATE OR REPLACE FUNCTION build_searchable_search_vector(p_searchable_id INTEGER, p_data JSONB)
+RETURNS tsvector AS $$
+    SELECT
+        setweight(to_tsvector('english', COALESCE(p_data->'payloads'->'public'->>'title', '')), 'A') ||
+        setweight(to_tsvector('english', COALESCE(p_data->'payloads'->'public'->>'description', '')), 'B') ||
+        setweight(to_tsvector('english', COALESCE((
+            SELECT string_agg(t.name, ' ')
+            FROM searchable_tags st
+            JOIN tags t ON st.tag_id = t.id
+            WHERE st.searchable_id = p_searchable_id
+        ), '')), 'C');
+$$ LANGUAGE sql STABLE;
+
+-- Keep the vector current when the searchable itself changes
+CREATE OR REPLACE FUNCTION searchables_search_vector_trigger()
+RETURNS TRIGGER AS $$
+BEGIN
+    NEW.search_vector := build_searchable_search_vector(NEW.searchable_id, NEW.searchable_data);
+    RETURN NEW;
+END;
+$$ LANGUAGE plpgsql;
+
+DROP TRIGGER IF EXISTS update_searchables_search_vector ON searchables;
+CREATE TRIGGER update_searchables_search_vector
+    BEFORE INSERT OR UPDATE OF searchable_data ON searchables
+    FOR EACH ROW EXECUTE FUNCTION searchables_search_vector_trigger();
+
+-- ...and when tags are attached, detached or renamed
+CREATE OR REPLACE FUNCTION searchable_tags_search_vector_trigger()
+RETURNS TRIGGER AS $$
+DECLARE
+    affected_id INTEGER;
+BEGIN
+    IF TG_OP = 'DELETE' THEN
+        affected_id := OLD.searchable_id;
+    ELSE
+        affected_id := NEW.searchable_id;
+    END IF;
+    UPDATE searchables
+    SET search_vector = build_searchable_search_vector(searchable_id, searchable_data)
+    WHERE searchable_id = affected_id;
+    RETURN NULL;
+END;
+$$ LANGUAGE plpgsql;
+
+DROP TRIGGER IF EXISTS update_search_vector_on_searchable_tags ON searchable_tags;
+CREATE TRIGGER update_search_vector_on_searchable_tags
+    AFTER INSERT OR DELETE ON searchable_tags
+    FOR EACH ROW EXECUTE FUNCTION searchable_tags_search_vector_trigger();
+
+CREATE OR REPLACE FUNCTION tags_search_vector_trigger()
+RETURNS TRIGGER AS $$
+BEGIN
+    UPDATE searchables s
+    SET search_vector = build_searchable_search_vector(s.searchable_id, s.searchable_data)
+    WHERE s.searchable_id IN (SELECT searchable_id FROM searchable_tags WHERE tag_id = NEW.id);
+    RETURN NULL;
+END;
+$$ LANGUAGE plpgsql;
+
+DROP TRIGGER IF EXISTS update_search_vector_on_tag_rename ON tags;
+CREATE TRIGGER update_search_vector_on_tag_rename
+    AFTER UPDATE OF name ON tags
+    FOR EACH ROW WHEN (OLD.name IS DISTINCT FROM NEW.name)
+    EXECUTE FUNCTION tags_search_vector_trigger();
+
+CREATE INDEX IF NOT EXISTS idx_searchables_search_vector ON searchables USING GIN (search_vector);
+
+COMMENT ON COLUMN searchables.search_vector IS 'Weighted tsvector of title (A), description (B) and tag names (C), maintained by triggers';
+
+-- Backfill existing rows
+UPDATE searchables
+SET search_vector = build_searchable_search_vector(searchable_id, searchable_data);
@@ -0,0 +1,7 @@
+-- Migration: Add keyset pagination index for searchable search
+-- Date: 2026-10-17
+
+-- Supports newest-first search pages and keyset cursors on (created_at, searchable_id)
+CREATE INDEX IF NOT EXISTS idx_searchables_active_created_id
+    ON searchables (created_at DESC, searchable_id DESC)
+    WHERE removed = FALSE;
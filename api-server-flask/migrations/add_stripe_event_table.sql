@@ -0,0 +1,23 @@
+-- Migration: Add stripe_event table for webhook ingestion
+-- Date: 2026-10-17
+
+BEGIN;
+
+-- One row per Stripe webhook event received. The unique event_id makes
+-- redelivered events no-ops; processed_at is set once the event has been
+-- applied, so an event whose processing failed is retried on redelivery.
+CREATE TABLE IF NOT EXISTS stripe_event (
+    id SERIAL PRIMARY KEY,
+    event_id TEXT NOT NULL UNIQUE,
+    type TEXT NOT NULL,
+    session_id TEXT,
+    payload JSONB NOT NULL,
+    received_at TIMESTAMP WITH TIME ZONE DEFAULT CURRENT_TIMESTAMP,
+    processed_at TIMESTAMP WITH TIME ZONE,
+    error TEXT
+);
+
+CREATE INDEX IF NOT EXISTS idx_stripe_event_session_id ON stripe_event(session_id);
+CREATE INDEX IF NOT EXISTS idx_stripe_event_unprocessed ON stripe_event(received_at) WHERE processed_at IS NULL;
+
+COMMIT;
@@ -0,0 +1,60 @@
+-- Migration: Transactional outbox for USDT service sends
+-- Date: 2026-10-17
+
+BEGIN;
+
+-- Outbox of requests to the USDT service. A withdrawal's /send request is
+-- inserted by trigger in the same transaction as the withdrawal and then
+-- dispatched by the background service. request_id is the idempotency key
+-- the USDT service dedupes on, so a request can safely be sent more than once.
+CREATE TABLE IF NOT EXISTS usdt_outbox (
+    id SERIAL PRIMARY KEY,
+    request_id TEXT NOT NULL UNIQUE,
+    withdrawal_id INTEGER REFERENCES withdrawal(id),
+    endpoint TEXT NOT NULL DEFAULT '/send',
+    payload JSONB NOT NULL,
+    status TEXT NOT NULL DEFAULT 'pending' CHECK (status IN ('pending', 'dispatching', 'sent', 'failed')),
+    attempts INTEGER NOT NULL DEFAULT 0,
+    next_attempt_at TIMESTAMP WITH TIME ZONE NOT NULL DEFAULT CURRENT_TIMESTAMP,
+    claimed_at TIMESTAMP WITH TIME ZONE,
+    claimed_by TEXT,
+    response JSONB,
+    last_error TEXT,
+    created_at TIMESTAMP WITH TIME ZONE DEFAULT CURRENT_TIMESTAMP,
+    completed_at TIMESTAMP WITH TIME ZONE
+);
+
+COMMENT ON COLUMN usdt_outbox.payload IS 'Request body without request_id; the /send amount is in USD and converted to token units when dispatched';
+COMMENT ON COLUMN usdt_outbox.status IS 'pending (due at next_attempt_at), dispatching (claimed), sent (answered), failed (rejected, nothing sent)';
+
+-- Due requests in order, stale claims, and lookup by withdrawal
+CREATE INDEX IF NOT EXISTS idx_usdt_outbox_due ON usdt_outbox(next_attempt_at) WHERE status = 'pending';
+CREATE INDEX IF NOT EXISTS idx_usdt_outbox_dispatching ON usdt_outbox(claimed_at) WHERE status = 'dispatching';
+CREATE INDEX IF NOT EXISTS idx_usdt_outbox_withdrawal_id ON usdt_outbox(withdrawal_id);
+
+CREATE OR REPLACE FUNCTION enqueue_withdrawal_send()
+RETURNS TRIGGER AS $$
+BEGIN
+    INSERT INTO usdt_outbox (request_id, withdrawal_id, payload)
+    VALUES ('withdrawal_' || NEW.id, NEW.id,
+            jsonb_build_object('to', NEW.metadata->>'address', 'amount', NEW.amount))
+    ON CONFLICT (request_id) DO NOTHING;
+    RETURN NULL;
+END;
+$$ LANGUAGE plpgsql;
+
+DROP TRIGGER IF EXISTS withdrawal_enqueue_send ON withdrawal;
+CREATE TRIGGER withdrawal_enqueue_send
+    AFTER INSERT ON withdrawal
+    FOR EACH ROW WHEN (NEW.status = 'pending')
+    EXECUTE FUNCTION enqueue_withdrawal_send();
+
+-- Queue withdrawals created before the outbox existed. Apply with the
+-- background service stopped, so that no withdrawal is mid-send.
+INSERT INTO usdt_outbox (request_id, withdrawal_id, payload)
+SELECT 'withdrawal_' || id, id, jsonb_build_object('to', metadata->>'address', 'amount', amount)
+FROM withdrawal
+WHERE status IN ('pending', 'sending')
+ON CONFLICT (request_id) DO NOTHING;
+
+COMMIT;
@@ -0,0 +1,183 @@
+-- Migration: Add user_balance ledger maintained by triggers
+-- Date: 2026-10-17
+
+BEGIN;
+
+-- Block balance-affecting writes so the backfill and the triggers line up exactly
+LOCK TABLE invoice, payment, rewards, deposit, withdrawal IN SHARE ROW EXCLUSIVE MODE;
+
+-- Every ledger entry that contributes to a user's USD balance.
+-- Mirrors the rules get_balance_by_currency used to apply on every read.
+CREATE OR REPLACE FUNCTION withdrawal_holds_balance(p_status TEXT)
+RETURNS BOOLEAN AS $$
+    SELECT p_status IN ('pending', 'complete', 'delayed');
+$$ LANGUAGE sql IMMUTABLE;
+
+CREATE OR REPLACE VIEW user_balance_sources AS
+    -- Income from sales (seller earnings after fees)
+    SELECT i.seller_id AS user_id, 'sale' AS source_type, (i.amount - i.fee) AS net_amount
+    FROM invoice i
+    JOIN payment p ON i.id = p.invoice_id
+    WHERE p.status = 'complete' AND i.currency = 'usd'
+    UNION ALL
+    -- Rewards
+    SELECT r.user_id, 'reward', r.amount
+    FROM rewards r
+    WHERE r.currency = 'usd'
+    UNION ALL
+    -- Completed deposits
+    SELECT d.user_id, 'deposit', d.amount
+    FROM deposit d
+    WHERE d.status = 'complete' AND d.currency = 'usd'
+    UNION ALL
+    -- Withdrawals that are in flight or done (negative amounts)
+    SELECT w.user_id, 'withdrawal', -w.amount
+    FROM withdrawal w
+    WHERE withdrawal_holds_balance(w.status) AND w.currency = 'usd'
+    UNION ALL
+    -- Purchases paid from balance (negative amounts)
+    SELECT i.buyer_id, 'balance_payment', -i.amount
+    FROM invoice i
+    JOIN payment p ON i.id = p.invoice_id
+    WHERE p.type = 'balance' AND p.status = 'complete' AND i.currency = 'usd';
+
+-- Materialized USD balance per user, kept current by the triggers below
+CREATE TABLE IF NOT EXISTS user_balance (
+    user_id INTEGER PRIMARY KEY,
+    balance DECIMAL(20,8) NOT NULL DEFAULT 0,
+    currency TEXT NOT NULL DEFAULT 'usd' CHECK (currency = 'usd'),
+    updated_at TIMESTAMP WITH TIME ZONE DEFAULT CURRENT_TIMESTAMP
+);
+
+COMMENT ON TABLE user_balance IS 'Running USD balance per user; equals SUM(net_amount) from user_balance_sources';
+
+CREATE OR REPLACE FUNCTION apply_user_balance_delta(p_user_id INTEGER, p_delta DECIMAL)
+RETURNS VOID AS $$
+BEGIN
+    IF p_user_id IS NULL OR p_delta IS NULL OR p_delta = 0 THEN
+        RETURN;
+    END IF;
+    INSERT INTO user_balance (user_id, balance, updated_at)
+    VALUES (p_user_id, p_delta, CURRENT_TIMESTAMP)
+    ON CONFLICT (user_id) DO UPDATE SET
+        balance = user_balance.balance + EXCLUDED.balance,
+        updated_at = CURRENT_TIMESTAMP;
+END;
+$$ LANGUAGE plpgsql;
+
+-- Payments: sale income for the seller, and a debit for the buyer on balance purchases
+CREATE OR REPLACE FUNCTION payment_user_balance_trigger()
+RETURNS TRIGGER AS $$
+DECLARE
+    inv RECORD;
+BEGIN
+    IF TG_OP IN ('UPDATE', 'DELETE') THEN
+        IF OLD.status = 'complete' THEN
+            SELECT buyer_id, seller_id, amount, fee, currency INTO inv FROM invoice WHERE id = OLD.invoice_id;
+            IF FOUND AND inv.currency = 'usd' THEN
+                PERFORM apply_user_balance_delta(inv.seller_id, -(inv.amount - inv.fee));
+                IF OLD.type = 'balance' THEN
+                    PERFORM apply_user_balance_delta(inv.buyer_id, inv.amount);
+                END IF;
+            END IF;
+        END IF;
+    END IF;
+    IF TG_OP IN ('INSERT', 'UPDATE') THEN
+        IF NEW.status = 'complete' THEN
+            SELECT buyer_id, seller_id, amount, fee, currency INTO inv FROM invoice WHERE id = NEW.invoice_id;
+            IF FOUND AND inv.currency = 'usd' THEN
+                PERFORM apply_user_balance_delta(inv.seller_id, inv.amount - inv.fee);
+                IF NEW.type = 'balance' THEN
+                    PERFORM apply_user_balance_delta(inv.buyer_id, -inv.amount);
+                END IF;
+            END IF;
+        END IF;
+    END IF;
+    RETURN NULL;
+END;
+$$ LANGUAGE plpgsql;
+
+DROP TRIGGER IF EXISTS payment_user_balance ON payment;
+CREATE TRIGGER payment_user_balance
+    AFTER INSERT OR UPDATE OF status, type, invoice_id OR DELETE ON payment
+    FOR EACH ROW EXECUTE FUNCTION payment_user_balance_trigger();
+
+-- Rewards
+CREATE OR REPLACE FUNCTION rewards_user_balance_trigger()
+RETURNS TRIGGER AS $$
+BEGIN
+    IF TG_OP IN ('UPDATE', 'DELETE') THEN
+        IF OLD.currency = 'usd' THEN
+            PERFORM apply_user_balance_delta(OLD.user_id, -OLD.amount);
+        END IF;
+    END IF;
+    IF TG_OP IN ('INSERT', 'UPDATE') THEN
+        IF NEW.currency = 'usd' THEN
+            PERFORM apply_user_balance_delta(NEW.user_id, NEW.amount);
+        END IF;
+    END IF;
+    RETURN NULL;
+END;
+$$ LANGUAGE plpgsql;
+
+DROP TRIGGER IF EXISTS rewards_user_balance ON rewards;
+CREATE TRIGGER rewards_user_balance
+    AFTER INSERT OR UPDATE OF amount, currency, user_id OR DELETE ON rewards
+    FOR EACH ROW EXECUTE FUNCTION rewards_user_balance_trigger();
+
+-- Deposits count once they are complete
+CREATE OR REPLACE FUNCTION deposit_user_balance_trigger()
+RETURNS TRIGGER AS $$
+BEGIN
+    IF TG_OP IN ('UPDATE', 'DELETE') THEN
+        IF OLD.status = 'complete' AND OLD.currency = 'usd' THEN
+            PERFORM apply_user_balance_delta(OLD.user_id, -OLD.amount);
+        END IF;
+    END IF;
+    IF TG_OP IN ('INSERT', 'UPDATE') THEN
+        IF NEW.status = 'complete' AND NEW.currency = 'usd' THEN
+            PERFORM apply_user_balance_delta(NEW.user_id, NEW.amount);
+        END IF;
+    END IF;
+    RETURN NULL;
+END;
+$$ LANGUAGE plpgsql;
+
+DROP TRIGGER IF EXISTS deposit_user_balance ON deposit;
+CREATE TRIGGER deposit_user_balance
+    AFTER INSERT OR UPDATE OF status, amount, currency, user_id OR DELETE ON deposit
+    FOR EACH ROW EXECUTE FUNCTION deposit_user_balance_trigger();
+
+-- Withdrawals hold the balance while pending/delayed/complete and release it on failure
+CREATE OR REPLACE FUNCTION withdrawal_user_balance_trigger()
+RETURNS TRIGGER AS $$
+BEGIN
+    IF TG_OP IN ('UPDATE', 'DELETE') THEN
+        IF withdrawal_holds_balance(OLD.status) AND OLD.currency = 'usd' THEN
+            PERFORM apply_user_balance_delta(OLD.user_id, OLD.amount);
+        END IF;
+    END IF;
+    IF TG_OP IN ('INSERT', 'UPDATE') THEN
+        IF withdrawal_holds_balance(NEW.status) AND NEW.currency = 'usd' THEN
+            PERFORM apply_user_balance_delta(NEW.user_id, -NEW.amount);
+        END IF;
+    END IF;
+    RETURN NULL;
+END;
+$$ LANGUAGE plpgsql;
+
+DROP TRIGGER IF EXISTS withdrawal_user_balance ON withdrawal;
+CREATE TRIGGER withdrawal_user_balance
+    AFTER INSERT OR UPDATE OF status, amount, currency, user_id OR DELETE ON withdrawal
+    FOR EACH ROW EXECUTE FUNCTION withdrawal_user_balance_trigger();
+
+-- Backfill from history
+INSERT INTO user_balance (user_id, balance, updated_at)
+SELECT user_id, SUM(net_amount), CURRENT_TIMESTAMP
+FROM user_balance_sources
+GROUP BY user_id
+ON CONFLICT (user_id) DO UPDATE SET
+    balance = EXCLUDED.balance,
+    updated_at = EXCLUDED.updated_at;
+
+COMMIT;
@@ -0,0 +1,25 @@
+-- Migration: Claim-based withdrawal sending ('sending' status and claim columns)
+-- Date: 2026-10-17
+
+BEGIN;
+
+-- Withdrawals are claimed pending -> sending by a sender before calling the
+-- USDT service, so concurrent senders never pick up the same row
+ALTER TABLE withdrawal DROP CONSTRAINT IF EXISTS withdrawal_status_check;
+ALTER TABLE withdrawal ADD CONSTRAINT withdrawal_status_check
+    CHECK (status IN ('pending', 'sending', 'complete', 'failed', 'delayed', 'error'));
+
+ALTER TABLE withdrawal ADD COLUMN IF NOT EXISTS claimed_at TIMESTAMP WITH TIME ZONE;
+ALTER TABLE withdrawal ADD COLUMN IF NOT EXISTS claimed_by TEXT;
+
+-- Oldest-first claim queue, and lookup of stale claims
+CREATE INDEX IF NOT EXISTS idx_withdrawal_pending_created_at ON withdrawal(created_at) WHERE status = 'pending';
+CREATE INDEX IF NOT EXISTS idx_withdrawal_sending_claimed_at ON withdrawal(claimed_at) WHERE status = 'sending';
+
+-- A withdrawal being sent still holds its amount
+CREATE OR REPLACE FUNCTION withdrawal_holds_balance(p_status TEXT)
+RETURNS BOOLEAN AS $$
+    SELECT p_status IN ('pending', 'sending', 'complete', 'delayed');
+$$ LANGUAGE sql IMMUTABLE;
+
+COMMIT;
@@ -0,0 +1,74 @@
+#!/usr/bin/env python3
+"""
+File storage migration script for Searchable project
+Converts the file server's flat store (UPLOAD_FOLDER/<file_id>) into the
+content-addressed layout: one blob per distinct SHA-256 under blobs/, and a
+hard-linked reference per file_id under refs/.
+
+Files are moved, not copied, so no extra disk space is needed; duplicates
+are freed as they are found. The file server, and nginx for downloads
+offloaded with X-Accel-Redirect (see /protected-files/ in nginx/conf.d),
+fall back to flat files until they are migrated, so this can run while
+they are serving. Re-running is safe.
+
+Run inside the file_server container (where the storage volume is mounted):
+
+Usage:
+    python scripts/migrate_file_storage.py              # migrate
+    python scripts/migrate_file_storage.py --dry-run    # report only
+    python scripts/migrate_file_storage.py --gc         # also drop unreferenced blobs
+"""
+
+import sys
+import os
+import argparse
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+
+from api.common.file_storage import ContentStore
+
+
+def format_bytes(size):
+    for unit in ('B', 'KB', 'MB', 'GB'):
+        if size < 1024:
+            return f"{size:.1f} {unit}"
+        size /= 1024
+    return f"{size:.1f} TB"
+
+
+def migrate_file_storage(root, dry_run=False, gc=False):
+    """Migrate the flat store under root and print a summary"""
+    if not os.path.isdir(root):
+        raise FileNotFoundError(f"Storage directory {root} does not exist")
+
+    store = ContentStore(root)
+    print(f"{'Scanning' if dry_run else 'Migrating'} {root}")
+    stats = store.migrate_flat_store(dry_run=dry_run)
+
+    print(f"Flat files found: {stats['files']}")
+    print(f"Distinct content: {format_bytes(stats['bytes'])}")
+    print(f"Duplicate content: {format_bytes(stats['bytes_deduplicated'])}")
+    if dry_run:
+        print("Dry run: nothing was changed")
+        return
+
+    print(f"Migrated: {stats['migrated']}")
+    if gc:
+        print(f"Unreferenced blobs removed: {store.collect_garbage()}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Convert flat file storage to content-addressed storage")
+    parser.add_argument('--root', default=os.environ.get('UPLOAD_FOLDER', '/app/storage'),
+                        help="Storage directory (defaults to UPLOAD_FOLDER)")
+    parser.add_argument('--dry-run', action='store_true', help="Only report what would be migrated")
+    parser.add_argument('--gc', action='store_true', help="Remove blobs no file_id references")
+    args = parser.parse_args()
+
+    try:
+        migrate_file_storage(args.root, dry_run=args.dry_run, gc=args.gc)
+    except Exception as e:
+        print(f"Error: {str(e)}")
+        import traceback
+        traceback.print_exc()
+        sys.exit(1)
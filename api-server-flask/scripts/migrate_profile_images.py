@@ -0,0 +1,175 @@
+#!/usr/bin/env python3
+"""
+Profile image migration script for Searchable project
+Moves profile images stored inline in user_profile.profile_image_url as
+base64 data URLs to the file server, leaving only the media URI
+(/api/v1/media/<id>) in the row.
+
+Rows are processed in batches ordered by id. Each batch is committed on its
+own, and migrated rows no longer match, so an interrupted run can simply be
+started again (or continued with --start-id). A row changed by its user while
+being migrated is left alone.
+
+Run inside the flask_api container (it can reach both the database and the
+file server):
+
+Usage:
+    python scripts/migrate_profile_images.py                   # migrate everything
+    python scripts/migrate_profile_images.py --dry-run         # report only
+    python scripts/migrate_profile_images.py --batch-size 20 --pause 1
+"""
+
+import sys
+import os
+import time
+import uuid
+import base64
+import argparse
+import psycopg2
+import requests
+
+FILE_SERVER_URL = os.environ.get('FILE_SERVER_URL', 'http://file_server:5006')
+MEDIA_URI_PREFIX = '/api/v1/media/'
+
+
+def get_db_connection():
+    """Get database connection from environment"""
+    # Use the same connection params as the Flask app
+    db_host = os.environ.get('DB_HOST', 'db')
+    db_port = os.environ.get('DB_PORT', '5432')
+    db_name = os.environ.get('DB_NAME', 'searchable')
+    db_user = os.environ.get('DB_USERNAME', 'searchable')
+    db_pass = os.environ.get('DB_PASS', os.environ.get('DB_PASSWORD', ''))
+
+    try:
+        conn = psycopg2.connect(
+            host=db_host,
+            port=db_port,
+            database=db_name,
+            user=db_user,
+            password=db_pass
+        )
+        return conn
+    except Exception as e:
+        print(f"Error connecting to database: {e}")
+        sys.exit(1)
+
+
+def decode_data_url(data_url):
+    """Return the bytes of a base64 data URL"""
+    _, base64_data = data_url.split(',', 1)
+    return base64.b64decode(base64_data)
+
+
+def upload_image(image_binary):
+    """Store image bytes on the file server and return the media URI"""
+    media_id = str(uuid.uuid4())
+    response = requests.post(
+        f"{FILE_SERVER_URL}/api/file/upload",
+        files={'file': (media_id, image_binary, 'application/octet-stream')},
+        data={'file_id': media_id, 'generate_variants': '1'},
+        timeout=60
+    )
+    if response.status_code != 200 or not response.json().get('success'):
+        raise RuntimeError(f"File server upload failed: {response.status_code} {response.text[:200]}")
+    return f"{MEDIA_URI_PREFIX}{media_id}"
+
+
+def migrate_profile_images(batch_size=50, start_id=0, limit=None, dry_run=False, pause=0.0):
+    """Move inline profile images to the file server batch by batch"""
+    conn = get_db_connection()
+    cur = conn.cursor()
+
+    last_id = start_id
+    # Last id of the last committed batch; rows after it may have been rolled back
+    committed_id = start_id
+    migrated = failed = bytes_moved = 0
+    processed = 0
+
+    try:
+        while limit is None or processed < limit:
+            # Only ids here; the (large) images are read one row at a time
+            cur.execute("""
+                SELECT id
+                FROM user_profile
+                WHERE id > %s AND profile_image_url LIKE 'data:%%'
+                ORDER BY id
+                LIMIT %s
+            """, (last_id, batch_size if limit is None else min(batch_size, limit - processed)))
+            ids = [row[0] for row in cur.fetchall()]
+            if not ids:
+                break
+
+            for profile_id in ids:
+                last_id = profile_id
+                processed += 1
+                cur.execute("SELECT profile_image_url FROM user_profile WHERE id = %s", (profile_id,))
+                row = cur.fetchone()
+                if not row or not row[0] or not row[0].startswith('data:'):
+                    continue
+                data_url = row[0]
+
+                try:
+                    image_binary = decode_data_url(data_url)
+                    if dry_run:
+                        print(f"  profile {profile_id}: {len(data_url)} chars -> {len(image_binary)} bytes")
+                        continue
+                    media_uri = upload_image(image_binary)
+                except Exception as e:
+                    failed += 1
+                    print(f"  profile {profile_id}: skipped ({str(e)})")
+                    continue
+
+                # Compare-and-set so a concurrent profile update wins
+                cur.execute("""
+                    UPDATE user_profile
+                    SET profile_image_url = %s, updated_at = CURRENT_TIMESTAMP
+                    WHERE id = %s AND profile_image_url = %s
+                """, (media_uri, profile_id, data_url))
+                if cur.rowcount:
+                    migrated += 1
+                    bytes_moved += len(data_url)
+
+            if not dry_run:
+                conn.commit()
+            committed_id = last_id
+            print(f"Batch done up to id {last_id}: {migrated} migrated, {failed} failed")
+            if pause:
+                time.sleep(pause)
+
+        conn.rollback()
+        print(f"\nProcessed {processed} profile(s); migrated {migrated}, failed {failed}")
+        print(f"Removed {bytes_moved / (1024 * 1024):.1f} MB of inline image data from user_profile")
+        if failed:
+            print("Re-run to retry failed rows")
+    except Exception:
+        conn.rollback()
+        print(f"Stopped at id {last_id}; batch rolled back, resume with --start-id {committed_id}")
+        raise
+    finally:
+        cur.close()
+        conn.close()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Move base64 profile images to the file server")
+    parser.add_argument('--batch-size', type=int, default=50, help="Profiles per batch/commit")
+    parser.add_argument('--start-id', type=int, default=0, help="Only migrate profiles with a larger id")
+    parser.add_argument('--limit', type=int, default=None, help="Stop after this many profiles")
+    parser.add_argument('--pause', type=float, default=0.0, help="Seconds to sleep between batches")
+    parser.add_argument('--dry-run', action='store_true', help="Only report what would be migrated")
+    args = parser.parse_args()
+
+    try:
+        migrate_profile_images(
+            batch_size=args.batch_size,
+            start_id=args.start_id,
+            limit=args.limit,
+            dry_run=args.dry_run,
+            pause=args.pause
+        )
+    except Exception as e:
+        print(f"Error: {str(e)}")
+        import traceback
+        traceback.print_exc()
+        sys.exit(1)
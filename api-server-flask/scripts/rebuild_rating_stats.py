@@ -0,0 +1,118 @@
+#!/usr/bin/env python3
+"""
+Rating stats rebuild script for Searchable project
+Recomputes searchable_rating_stats and seller_rating_stats from the rating table.
+
+create_rating keeps both tables current incrementally; run this after bulk
+edits to ratings/invoices or if the aggregates are suspected to have drifted.
+
+Usage:
+    python scripts/rebuild_rating_stats.py            # rebuild
+    python scripts/rebuild_rating_stats.py --dry-run  # only report drift
+"""
+
+import sys
+import os
+import argparse
+import psycopg2
+
+
+def get_db_connection():
+    """Get database connection from environment"""
+    # Use the same connection params as the Flask app
+    db_host = os.environ.get('DB_HOST', 'db')
+    db_port = os.environ.get('DB_PORT', '5432')
+    db_name = os.environ.get('DB_NAME', 'searchable')
+    db_user = os.environ.get('DB_USERNAME', 'searchable')
+    db_pass = os.environ.get('DB_PASS', os.environ.get('DB_PASSWORD', ''))
+
+    try:
+        conn = psycopg2.connect(
+            host=db_host,
+            port=db_port,
+            database=db_name,
+            user=db_user,
+            password=db_pass
+        )
+        return conn
+    except Exception as e:
+        print(f"Error connecting to database: {e}")
+        sys.exit(1)
+
+
+# (stats table, key column, invoice column)
+STATS_TABLES = [
+    ('searchable_rating_stats', 'searchable_id', 'searchable_id'),
+    ('seller_rating_stats', 'seller_id', 'seller_id'),
+]
+
+
+def count_drift(cur, table, key, invoice_column):
+    """Count keys whose stored aggregate differs from the live rating table"""
+    cur.execute(f"""
+        WITH live AS (
+            SELECT i.{invoice_column} AS key, SUM(r.rating) AS rating_sum, COUNT(*) AS rating_count
+            FROM rating r
+            JOIN invoice i ON r.invoice_id = i.id
+            GROUP BY i.{invoice_column}
+        )
+        SELECT COUNT(*)
+        FROM live
+        FULL OUTER JOIN {table} st ON st.{key} = live.key
+        WHERE COALESCE(live.rating_count, 0) <> COALESCE(st.rating_count, 0)
+           OR ABS(COALESCE(live.rating_sum, 0) - COALESCE(st.rating_sum, 0)) > 1e-9
+    """)
+    return cur.fetchone()[0]
+
+
+def rebuild_rating_stats(dry_run=False):
+    """Rebuild both stats tables in a single transaction"""
+    conn = get_db_connection()
+    cur = conn.cursor()
+
+    try:
+        # Block new ratings while rebuilding so no increment is lost
+        cur.execute("LOCK TABLE rating IN SHARE MODE")
+
+        for table, key, invoice_column in STATS_TABLES:
+            drifted = count_drift(cur, table, key, invoice_column)
+            print(f"{table}: {drifted} row(s) out of date")
+
+            if dry_run:
+                continue
+
+            cur.execute(f"DELETE FROM {table}")
+            cur.execute(f"""
+                INSERT INTO {table} ({key}, rating_sum, rating_count, updated_at)
+                SELECT i.{invoice_column}, SUM(r.rating), COUNT(*), CURRENT_TIMESTAMP
+                FROM rating r
+                JOIN invoice i ON r.invoice_id = i.id
+                GROUP BY i.{invoice_column}
+            """)
+            print(f"{table}: rebuilt {cur.rowcount} row(s)")
+
+        if dry_run:
+            conn.rollback()
+        else:
+            conn.commit()
+            print("Rating stats rebuilt successfully")
+    except Exception:
+        conn.rollback()
+        raise
+    finally:
+        cur.close()
+        conn.close()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Rebuild precomputed rating stats")
+    parser.add_argument('--dry-run', action='store_true', help="Only report drift, do not modify anything")
+    args = parser.parse_args()
+
+    try:
+        rebuild_rating_stats(dry_run=args.dry_run)
+    except Exception as e:
+        print(f"Error: {str(e)}")
+        import traceback
+        traceback.print_exc()
+        sys.exit(1)
@@ -0,0 +1,117 @@
+#!/usr/bin/env python3
+"""
+User balance reconciliation script for Searchable project
+Compares the user_balance ledger with the transaction history
+(user_balance_sources view) and optionally repairs drifted rows.
+
+The background service runs the same comparison periodically and only
+reports; use --fix here to correct the ledger.
+
+Usage:
+    python scripts/reconcile_user_balance.py          # report drift
+    python scripts/reconcile_user_balance.py --fix    # report and repair
+"""
+
+import sys
+import os
+import argparse
+import psycopg2
+
+
+def get_db_connection():
+    """Get database connection from environment"""
+    # Use the same connection params as the Flask app
+    db_host = os.environ.get('DB_HOST', 'db')
+    db_port = os.environ.get('DB_PORT', '5432')
+    db_name = os.environ.get('DB_NAME', 'searchable')
+    db_user = os.environ.get('DB_USERNAME', 'searchable')
+    db_pass = os.environ.get('DB_PASS', os.environ.get('DB_PASSWORD', ''))
+
+    try:
+        conn = psycopg2.connect(
+            host=db_host,
+            port=db_port,
+            database=db_name,
+            user=db_user,
+            password=db_pass
+        )
+        return conn
+    except Exception as e:
+        print(f"Error connecting to database: {e}")
+        sys.exit(1)
+
+
+DRIFT_QUERY = """
+    WITH expected AS (
+        SELECT user_id, SUM(net_amount) AS balance
+        FROM user_balance_sources
+        GROUP BY user_id
+    )
+    SELECT COALESCE(e.user_id, b.user_id) AS user_id,
+           COALESCE(b.balance, 0) AS ledger_balance,
+           COALESCE(e.balance, 0) AS expected_balance
+    FROM expected e
+    FULL OUTER JOIN user_balance b ON b.user_id = e.user_id
+    WHERE COALESCE(b.balance, 0) <> COALESCE(e.balance, 0)
+    ORDER BY ABS(COALESCE(b.balance, 0) - COALESCE(e.balance, 0)) DESC
+"""
+
+
+def reconcile_user_balance(fix=False):
+    """Report, and optionally repair, ledger rows that disagree with history"""
+    conn = get_db_connection()
+    cur = conn.cursor()
+
+    try:
+        if fix:
+            # Freeze balance-affecting writes so the repair is exact
+            cur.execute("LOCK TABLE invoice, payment, rewards, deposit, withdrawal IN SHARE ROW EXCLUSIVE MODE")
+
+        cur.execute(DRIFT_QUERY)
+        drifted = cur.fetchall()
+
+        if not drifted:
+            print("user_balance matches transaction history")
+            conn.rollback()
+            return
+
+        print(f"{len(drifted)} user(s) with balance drift:\n")
+        print(f"{'user_id':>10}  {'ledger':>18}  {'expected':>18}  {'drift':>18}")
+        for user_id, ledger_balance, expected_balance in drifted:
+            print(f"{user_id:>10}  {ledger_balance:>18}  {expected_balance:>18}  {ledger_balance - expected_balance:>18}")
+
+        if not fix:
+            conn.rollback()
+            print("\nRun with --fix to repair")
+            return
+
+        for user_id, _, expected_balance in drifted:
+            cur.execute("""
+                INSERT INTO user_balance (user_id, balance, updated_at)
+                VALUES (%s, %s, CURRENT_TIMESTAMP)
+                ON CONFLICT (user_id) DO UPDATE SET
+                    balance = EXCLUDED.balance,
+                    updated_at = EXCLUDED.updated_at
+            """, (user_id, expected_balance))
+        conn.commit()
+        print(f"\nRepaired {len(drifted)} user balance(s)")
+    except Exception:
+        conn.rollback()
+        raise
+    finally:
+        cur.close()
+        conn.close()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Reconcile user_balance with transaction history")
+    parser.add_argument('--fix', action='store_true', help="Overwrite drifted balances with the recomputed value")
+    args = parser.parse_args()
+
+    try:
+        reconcile_user_balance(fix=args.fix)
+    except Exception as e:
+        print(f"Error: {str(e)}")
+        import traceback
+        traceback.print_exc()
+        sys.exit(1)
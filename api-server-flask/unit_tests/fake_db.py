@@ -0,0 +1,41 @@
+"""
+Fake database connections for unit tests of code using the
+database_cursor / database_transaction context managers
+"""
+
+from contextlib import contextmanager
+from unittest.mock import MagicMock, patch
+
+
+def patch_database(test_case, module, names=('database_cursor', 'database_transaction')):
+    """
+    Make a module's database context managers yield one shared MagicMock cursor
+    for the duration of a test
+
+    Args:
+        test_case: TestCase the patches are undone for on cleanup
+        module: Module whose context managers are patched
+        names: Names of the context managers in that module
+
+    Returns:
+        (cur, statements): the cursor, and the SQL of every statement executed
+        on it with whitespace collapsed
+    """
+    cur = MagicMock()
+    statements = []
+    cur.execute.side_effect = lambda sql, params=None: statements.append(' '.join(sql.split()))
+
+    @contextmanager
+    def fake_context():
+        yield cur, MagicMock()
+
+    for name in names:
+        patcher = patch.object(module, name, fake_context)
+        patcher.start()
+        test_case.addCleanup(patcher.stop)
+    return cur, statements
+
+
+def executed_params(cur):
+    """Parameters of every statement executed on a patched cursor, in order"""
+    return [call[0][1] if len(call[0]) > 1 else None for call in cur.execute.call_args_list]
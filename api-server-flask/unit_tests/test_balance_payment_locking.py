@@ -0,0 +1,64 @@
+"""
+Unit tests for the row-locked balance debit in create_balance_invoice_and_payment
+"""
+
+import os
+import sys
+import unittest
+from datetime import datetime
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+
+from api.common import payment_helpers
+from unit_tests.fake_db import executed_params, patch_database
+
+
+class TestBalancePaymentLocking(unittest.TestCase):
+
+    def setUp(self):
+        self.cur, self.statements = patch_database(self, payment_helpers, names=('database_transaction',))
+
+    def test_balance_row_is_locked_before_anything_is_written(self):
+        now = datetime.now()
+        self.cur.fetchall.return_value = [(1, 25.0), (2, 3.0)]
+        self.cur.fetchone.side_effect = [
+            (10, 1, 2, 3, 5.0, 0, 'usd', 'balance', 'balance_x', now, {}),
+            (20, 10, 5.0, 0, 'usd', 'balance', 'balance_x', 'complete', now, {}),
+        ]
+
+        result = payment_helpers.create_balance_invoice_and_payment(1, 2, 3, 5.0, 'usd')
+
+        self.assertIn('FOR UPDATE', self.statements[1])
+        self.assertTrue(self.statements[1].startswith('SELECT user_id, balance FROM user_balance'))
+        self.assertTrue(self.statements[2].startswith('INSERT INTO invoice'))
+        self.assertTrue(self.statements[3].startswith('INSERT INTO payment'))
+        self.assertEqual(result['balance_remaining'], 20.0)
+        self.assertEqual(result['invoice']['id'], 10)
+        self.assertEqual(result['payment']['status'], 'complete')
+
+    def test_insufficient_balance_raises_without_writing(self):
+        self.cur.fetchall.return_value = [(1, 4.0)]
+
+        with self.assertRaises(ValueError):
+            payment_helpers.create_balance_invoice_and_payment(1, 2, 3, 5.0, 'usd')
+
+        self.assertFalse(any(s.startswith('INSERT INTO invoice') for s in self.statements))
+        self.assertFalse(any(s.startswith('INSERT INTO payment') for s in self.statements))
+
+    def test_buyer_and_seller_rows_are_locked_in_user_id_order(self):
+        # A seller with a lower id than the buyer is still locked first, so two
+        # users paying each other at once take the locks in the same order
+        self.cur.fetchall.return_value = [(2, 0.0), (5, 4.0)]
+
+        with self.assertRaises(ValueError):
+            payment_helpers.create_balance_invoice_and_payment(5, 2, 3, 5.0, 'usd')
+
+        upsert_params, lock_params = executed_params(self.cur)[:2]
+        self.assertEqual(upsert_params, ([2, 5],))
+        self.assertEqual(lock_params, ([2, 5],))
+        self.assertIn('ORDER BY id', self.statements[0])
+        self.assertIn('ORDER BY user_id FOR UPDATE', self.statements[1])
+
+
+if __name__ == '__main__':
+    unittest.main()
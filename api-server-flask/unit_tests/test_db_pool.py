@@ -0,0 +1,167 @@
+"""
+Unit tests for the database connection pool
+Uses fake connections so no database is required
+"""
+
+import os
+import sys
+import threading
+import time
+import unittest
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+
+from psycopg2.extensions import TRANSACTION_STATUS_IDLE, TRANSACTION_STATUS_INTRANS, TRANSACTION_STATUS_UNKNOWN
+
+from api.common.database import ConnectionPool, PoolTimeoutError
+
+
+class FakeCursor:
+    def __init__(self, conn):
+        self.conn = conn
+
+    def execute(self, sql, params=None):
+        if self.conn.fail_ping:
+            raise Exception("server closed the connection unexpectedly")
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+
+class FakeConnection:
+    def __init__(self):
+        self.closed = 0
+        self.autocommit = False
+        self.status = TRANSACTION_STATUS_IDLE
+        self.rollbacks = 0
+        self.fail_ping = False
+
+    def cursor(self):
+        return FakeCursor(self)
+
+    def get_transaction_status(self):
+        return self.status
+
+    def rollback(self):
+        self.rollbacks += 1
+        self.status = TRANSACTION_STATUS_IDLE
+
+    def close(self):
+        self.closed = 1
+
+
+class TestConnectionPool(unittest.TestCase):
+
+    def setUp(self):
+        self.created = []
+
+        def factory():
+            conn = FakeConnection()
+            self.created.append(conn)
+            return conn
+
+        self.factory = factory
+
+    def make_pool(self, **kwargs):
+        params = dict(min_size=0, max_size=2, timeout=0.2,
+                      connection_factory=self.factory, healthcheck_idle_seconds=30)
+        params.update(kwargs)
+        return ConnectionPool(**params)
+
+    def test_reuses_returned_connection(self):
+        pool = self.make_pool()
+        conn = pool.getconn()
+        pool.putconn(conn)
+        self.assertIs(pool.getconn(), conn)
+        self.assertEqual(len(self.created), 1)
+
+    def test_prefills_min_size(self):
+        pool = self.make_pool(min_size=2)
+        self.assertEqual(len(self.created), 2)
+        self.assertEqual(pool.stats()['idle'], 2)
+
+    def test_times_out_when_exhausted(self):
+        pool = self.make_pool(max_size=1)
+        pool.getconn()
+        started = time.monotonic()
+        with self.assertRaises(PoolTimeoutError):
+            pool.getconn(timeout=0.1)
+        self.assertGreaterEqual(time.monotonic() - started, 0.1)
+
+    def test_waiter_receives_released_connection(self):
+        pool = self.make_pool(max_size=1, timeout=2)
+        conn = pool.getconn()
+        result = {}
+
+        def waiter():
+            result['conn'] = pool.getconn()
+
+        thread = threading.Thread(target=waiter)
+        thread.start()
+        time.sleep(0.05)
+        pool.putconn(conn)
+        thread.join(1)
+        self.assertIs(result.get('conn'), conn)
+
+    def test_putconn_rolls_back_open_transaction(self):
+        pool = self.make_pool()
+        conn = pool.getconn()
+        conn.status = TRANSACTION_STATUS_INTRANS
+        conn.autocommit = True
+        pool.putconn(conn)
+        self.assertEqual(conn.rollbacks, 1)
+        self.assertFalse(conn.autocommit)
+
+    def test_broken_connection_is_replaced(self):
+        pool = self.make_pool()
+        conn = pool.getconn()
+        pool.putconn(conn)
+        conn.status = TRANSACTION_STATUS_UNKNOWN
+        replacement = pool.getconn()
+        self.assertIsNot(replacement, conn)
+        self.assertTrue(conn.closed)
+
+    def test_stale_connection_failing_ping_is_replaced(self):
+        pool = self.make_pool(healthcheck_idle_seconds=0)
+        conn = pool.getconn()
+        pool.putconn(conn)
+        conn.fail_ping = True
+        replacement = pool.getconn()
+        self.assertIsNot(replacement, conn)
+        self.assertEqual(pool.stats()['in_use'], 1)
+
+    def test_discard_frees_slot(self):
+        pool = self.make_pool(max_size=1)
+        conn = pool.getconn()
+        pool.putconn(conn, discard=True)
+        self.assertTrue(conn.closed)
+        self.assertIsNot(pool.getconn(timeout=0.1), conn)
+
+    def test_concurrent_checkouts_never_exceed_max_size(self):
+        pool = self.make_pool(max_size=3, timeout=5)
+        peak = {'value': 0}
+        lock = threading.Lock()
+
+        def worker():
+            for _ in range(20):
+                conn = pool.getconn()
+                with lock:
+                    peak['value'] = max(peak['value'], pool.stats()['in_use'])
+                pool.putconn(conn)
+
+        threads = [threading.Thread(target=worker) for _ in range(8)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        self.assertLessEqual(peak['value'], 3)
+        self.assertLessEqual(len(self.created), 3)
+        self.assertEqual(pool.stats()['in_use'], 0)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,69 @@
+"""
+Unit tests for the pre-generated deposit address pool
+"""
+
+import os
+import sys
+import unittest
+from unittest.mock import MagicMock, patch
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+
+from api.common import deposit_address_pool
+from api.common.deposit_address_pool import claim_deposit_address, replenish_deposit_address_pool
+from api.common.metrics import deposit_address_pool_claims
+from unit_tests.fake_db import patch_database
+
+
+class TestDepositAddressPool(unittest.TestCase):
+
+    def setUp(self):
+        self.cur, self.statements = patch_database(self, deposit_address_pool)
+
+        self.execute_values = MagicMock()
+        self.generate = MagicMock(side_effect=lambda: (f"0x{self.generate.call_count:040x}", self.generate.call_count))
+        for name, mock in (('execute_values', self.execute_values), ('generate_deposit_address', self.generate)):
+            patcher = patch.object(deposit_address_pool, name, mock)
+            patcher.start()
+            self.addCleanup(patcher.stop)
+
+    def test_claim_takes_an_available_address_without_waiting_on_locks(self):
+        misses_before = deposit_address_pool_claims.labels('miss')._value.get()
+        self.cur.fetchone.return_value = ('0xabc', 1234)
+        self.assertEqual(claim_deposit_address(self.cur, 7), ('0xabc', 1234))
+        self.assertIn("FOR UPDATE SKIP LOCKED", self.statements[0])
+        self.cur.execute.assert_called_once()
+        self.assertEqual(self.cur.execute.call_args[0][1], (7,))
+
+        self.cur.fetchone.return_value = None
+        self.assertIsNone(claim_deposit_address(self.cur, 8))
+        self.assertEqual(deposit_address_pool_claims.labels('miss')._value.get() - misses_before, 1)
+
+    def test_pool_above_low_water_is_left_alone(self):
+        self.cur.fetchone.return_value = (deposit_address_pool.DEPOSIT_ADDRESS_POOL_LOW_WATER,)
+        self.assertEqual(replenish_deposit_address_pool(), 0)
+        self.generate.assert_not_called()
+        self.execute_values.assert_not_called()
+
+    def test_pool_below_low_water_is_refilled_to_target(self):
+        available = deposit_address_pool.DEPOSIT_ADDRESS_POOL_LOW_WATER - 1
+        wanted = deposit_address_pool.DEPOSIT_ADDRESS_POOL_TARGET - available
+        self.cur.fetchone.return_value = (available,)
+        self.cur.rowcount = wanted
+
+        self.assertEqual(replenish_deposit_address_pool(), wanted)
+        self.assertEqual(self.generate.call_count, wanted)
+        self.execute_values.assert_called_once()
+        inserted = self.execute_values.call_args[0][2]
+        self.assertEqual(len(set(inserted)), wanted)
+
+    def test_refill_fails_when_no_address_could_be_derived(self):
+        self.cur.fetchone.return_value = (0,)
+        self.generate.side_effect = Exception("USDT service error")
+        with self.assertRaises(Exception):
+            replenish_deposit_address_pool()
+        self.execute_values.assert_not_called()
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,96 @@
+"""
+Unit tests for the concurrent USDT deposit checker in background.py
+"""
+
+import os
+import sys
+import threading
+import time
+import unittest
+from datetime import datetime, timedelta
+from unittest.mock import MagicMock, patch
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+os.environ.setdefault('INFURA_DOMAIN', 'sepolia.infura.io')
+
+import background
+from unit_tests.fake_db import patch_database
+
+
+def pending_deposit(deposit_id, age_minutes=5):
+    created_at = datetime.utcnow() - timedelta(minutes=age_minutes)
+    return (deposit_id, 1, 10, {'eth_address': f"0x{deposit_id:040x}"}, created_at, None, 'usdt')
+
+
+def usdt_response(payload):
+    response = MagicMock()
+    response.status_code = 200
+    response.json.return_value = payload
+    return response
+
+
+class TestDepositConfirmation(unittest.TestCase):
+
+    def setUp(self):
+        self.cur, self.statements = patch_database(self, background)
+        self.cur.fetchone.return_value = None
+
+    def test_deposits_are_checked_concurrently_and_written_in_one_batch(self):
+        self.cur.fetchall.return_value = [pending_deposit(i) for i in range(1, 17)]
+        in_flight = []
+        peak = [0]
+        lock = threading.Lock()
+
+        def slow_get(path):
+            with lock:
+                in_flight.append(path)
+                peak[0] = max(peak[0], len(in_flight))
+            time.sleep(0.05)
+            with lock:
+                in_flight.remove(path)
+            return usdt_response({'transactions': []})
+
+        with patch.object(background, 'usdt_check_get', side_effect=slow_get), \
+                patch.object(background, 'DEPOSIT_CHECK_CONCURRENCY', 8), \
+                patch.object(background, 'save_deposit_check_updates') as save:
+            started = time.monotonic()
+            background.check_deposit_confirmations()
+            elapsed = time.monotonic() - started
+
+        self.assertGreater(peak[0], 1)
+        self.assertLessEqual(peak[0], 8)
+        self.assertLess(elapsed, 16 * 0.05)
+        save.assert_called_once()
+        updates = save.call_args[0][0]
+        self.assertEqual(sorted(update[0] for update in updates), list(range(1, 17)))
+        self.assertTrue(all(update[1] == 'pending' and 'checked_at' in update[2] for update in updates))
+
+    def test_found_transfer_credits_deposit(self):
+        transfer = {'txHash': '0xabc', 'value': '2500000', 'from': '0xfrom', 'blockNumber': '7'}
+        responses = {
+            '/transactions/': usdt_response({'transactions': [transfer]}),
+            '/tx-status/': usdt_response({'usdtAmount': '2500000'}),
+        }
+
+        def get(path):
+            return next(response for prefix, response in responses.items() if path.startswith(prefix))
+
+        with patch.object(background, 'usdt_check_get', side_effect=get):
+            result, update = background.check_usdt_deposit(pending_deposit(3))
+
+        self.assertEqual((result, update), ('complete', None))
+        self.assertTrue(self.statements[0].startswith('SELECT id FROM deposit WHERE tx_hash'))
+        self.assertIn("SET status = 'complete'", self.statements[1])
+        self.assertIn("AND status = 'pending'", self.statements[1])
+
+    def test_expired_deposit_is_failed_without_calling_usdt_service(self):
+        with patch.object(background, 'usdt_check_get') as get:
+            result, update = background.check_usdt_deposit(pending_deposit(4, age_minutes=61))
+
+        get.assert_not_called()
+        self.assertEqual(result, 'expired')
+        self.assertEqual(update[:2], (4, 'failed'))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,62 @@
+"""
+Unit tests for handing purchased file downloads off to the front-end server
+"""
+
+import os
+import sys
+import tempfile
+import unittest
+from unittest.mock import patch
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+
+from api.routes import searchable
+from api.routes.searchable import build_content_disposition, offloaded_download_response
+
+
+class TestContentDisposition(unittest.TestCase):
+
+    def test_ascii_filename(self):
+        self.assertEqual(build_content_disposition('song.mp3'), 'attachment; filename="song.mp3"')
+
+    def test_unicode_filename_is_rfc2231_encoded(self):
+        self.assertEqual(build_content_disposition('歌.mp3'),
+                         "attachment; filename*=UTF-8''%E6%AD%8C.mp3")
+
+
+class TestOffloadedDownloadResponse(unittest.TestCase):
+
+    def test_accel_redirect_points_at_internal_location(self):
+        response = offloaded_download_response('abc-123', 'attachment; filename="a.bin"', mode='accel')
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.headers['X-Accel-Redirect'], '/protected-files/refs/ab/c-/abc-123')
+        self.assertEqual(response.headers['Content-Disposition'], 'attachment; filename="a.bin"')
+        self.assertEqual(response.get_data(), b'')
+
+    def test_accel_redirect_cannot_escape_storage(self):
+        response = offloaded_download_response('../../etc/passwd', 'attachment', mode='accel')
+
+        self.assertEqual(response.headers['X-Accel-Redirect'], '/protected-files/refs/et/c_/etc_passwd')
+
+    def test_sendfile_uses_absolute_path(self):
+        with tempfile.TemporaryDirectory() as storage:
+            ref_path = os.path.join(storage, 'refs', 'ab', 'c-', 'abc-123')
+            os.makedirs(os.path.dirname(ref_path))
+            open(ref_path, 'wb').close()
+            with patch.object(searchable, 'FILE_SENDFILE_ROOT', storage):
+                response = offloaded_download_response('abc-123', 'attachment', mode='sendfile')
+
+        self.assertEqual(response.headers['X-Sendfile'], ref_path)
+
+    def test_sendfile_missing_file_falls_back_to_streaming(self):
+        with tempfile.TemporaryDirectory() as storage:
+            with patch.object(searchable, 'FILE_SENDFILE_ROOT', storage):
+                self.assertIsNone(offloaded_download_response('abc-123', 'attachment', mode='sendfile'))
+
+    def test_stream_mode_is_not_offloaded(self):
+        self.assertIsNone(offloaded_download_response('abc-123', 'attachment', mode='stream'))
+
+
+if __name__ == '__main__':
+    unittest.main()
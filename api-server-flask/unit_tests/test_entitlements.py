@@ -0,0 +1,50 @@
+"""
+Unit tests for the entitlement lookups used by download authorization
+"""
+
+import os
+import sys
+import unittest
+from unittest.mock import patch
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+
+from api.common import data_helpers
+
+
+class TestFileEntitlement(unittest.TestCase):
+
+    def setUp(self):
+        data_helpers._entitlement_cache.clear()
+
+    @patch('api.common.data_helpers.db')
+    def test_entitled_file_is_cached(self, mock_db):
+        mock_db.fetch_one.return_value = ('42', 'song.mp3')
+
+        first = data_helpers.get_file_entitlement(7, 3, 42)
+        second = data_helpers.get_file_entitlement(7, 3, '42')
+
+        self.assertEqual(first, {'fileId': '42', 'fileName': 'song.mp3'})
+        self.assertEqual(second, first)
+        self.assertEqual(mock_db.fetch_one.call_count, 1)
+        self.assertEqual(mock_db.fetch_one.call_args[0][1], (7, 3, '42'))
+
+    @patch('api.common.data_helpers.db')
+    def test_missing_entitlement_is_not_cached(self, mock_db):
+        mock_db.fetch_one.side_effect = [None, ('42', None)]
+
+        self.assertIsNone(data_helpers.get_file_entitlement(7, 3, 42))
+        # A payment completing in between must be visible immediately
+        self.assertEqual(data_helpers.get_file_entitlement(7, 3, 42), {'fileId': '42', 'fileName': None})
+
+    @patch('api.common.data_helpers.db')
+    def test_paid_files_is_a_set_of_file_ids(self, mock_db):
+        mock_db.fetch_all.return_value = [('1',), ('2',)]
+
+        self.assertEqual(data_helpers.get_user_paid_files(7, 3), {'1', '2'})
+        # Selection ids only accepted for downloads are not reported as paid files
+        self.assertIn("AND listed", mock_db.fetch_all.call_args[0][0])
+
+
+if __name__ == '__main__':
+    unittest.main()
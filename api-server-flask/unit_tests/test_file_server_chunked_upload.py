@@ -0,0 +1,140 @@
+"""
+Unit tests for the chunked, resumable upload protocol of the file server
+"""
+
+import hashlib
+import os
+import sys
+import tempfile
+import time
+import unittest
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+
+_storage = tempfile.mkdtemp()
+os.environ.setdefault('UPLOAD_FOLDER', _storage)
+
+from api import file_server
+
+
+class TestChunkedUpload(unittest.TestCase):
+
+    CHUNK = 1000
+
+    def setUp(self):
+        self.storage = tempfile.TemporaryDirectory()
+        self.addCleanup(self.storage.cleanup)
+        file_server.app.config['UPLOAD_FOLDER'] = self.storage.name
+        self.client = file_server.app.test_client()
+        self.content = os.urandom(2 * self.CHUNK + 345)
+
+    def start(self, **overrides):
+        body = {'file_id': 'abc-123', 'total_size': len(self.content),
+                'chunk_size': self.CHUNK, 'metadata': {'original_filename': 'a.bin'}}
+        body.update(overrides)
+        return self.client.post('/api/file/uploads', json=body)
+
+    def put_chunk(self, upload_id, index, data=None, checksum=True):
+        if data is None:
+            data = self.content[index * self.CHUNK:(index + 1) * self.CHUNK]
+        headers = {'X-Chunk-SHA256': hashlib.sha256(data).hexdigest()} if checksum else {}
+        return self.client.put(f'/api/file/uploads/{upload_id}/chunks/{index}', data=data, headers=headers)
+
+    def test_out_of_order_chunks_and_commit(self):
+        started = self.start()
+        self.assertEqual(started.status_code, 201)
+        upload_id = started.json['upload_id']
+        self.assertEqual(started.json['chunk_count'], 3)
+
+        for index in (2, 0, 1):
+            self.assertEqual(self.put_chunk(upload_id, index).status_code, 200)
+
+        committed = self.client.post(f'/api/file/uploads/{upload_id}/commit',
+                                     json={'sha256': hashlib.sha256(self.content).hexdigest()})
+        self.assertEqual(committed.status_code, 200)
+        self.assertEqual(committed.json['metadata'], {'original_filename': 'a.bin'})
+        with open(file_server.get_store().locate('abc-123'), 'rb') as f:
+            self.assertEqual(f.read(), self.content)
+        self.assertEqual(self.client.get(f'/api/file/uploads/{upload_id}').status_code, 404)
+
+    def test_resume_reports_missing_chunks(self):
+        upload_id = self.start().json['upload_id']
+        self.put_chunk(upload_id, 0)
+
+        status = self.client.get(f'/api/file/uploads/{upload_id}').json
+        self.assertEqual(status['received_chunks'], [0])
+        self.assertEqual(status['next_chunk'], 1)
+
+        premature = self.client.post(f'/api/file/uploads/{upload_id}/commit')
+        self.assertEqual(premature.status_code, 409)
+
+    def test_bad_checksum_is_not_acknowledged(self):
+        upload_id = self.start().json['upload_id']
+        data = self.content[:self.CHUNK]
+
+        response = self.client.put(f'/api/file/uploads/{upload_id}/chunks/0', data=data,
+                                   headers={'X-Chunk-SHA256': '0' * 64})
+        self.assertEqual(response.status_code, 422)
+        self.assertEqual(self.client.get(f'/api/file/uploads/{upload_id}').json['received_chunks'], [])
+
+    def test_wrong_chunk_size_is_rejected(self):
+        upload_id = self.start().json['upload_id']
+
+        self.assertEqual(self.put_chunk(upload_id, 0, data=b'x' * (self.CHUNK + 1)).status_code, 400)
+        self.assertEqual(self.put_chunk(upload_id, 2, data=b'x' * 10, checksum=False).status_code, 400)
+        self.assertEqual(self.put_chunk(upload_id, 3, data=b'x', checksum=False).status_code, 400)
+
+    def test_rejected_resend_keeps_acknowledged_chunk(self):
+        upload_id = self.start().json['upload_id']
+        for index in range(3):
+            self.put_chunk(upload_id, index)
+
+        rejected = self.client.put(f'/api/file/uploads/{upload_id}/chunks/0', data=b'',
+                                   headers={'X-Chunk-SHA256': '0' * 64})
+        self.assertEqual(rejected.status_code, 400)
+        mismatched = self.client.put(f'/api/file/uploads/{upload_id}/chunks/0', data=b'y' * self.CHUNK,
+                                     headers={'X-Chunk-SHA256': '0' * 64})
+        self.assertEqual(mismatched.status_code, 422)
+
+        committed = self.client.post(f'/api/file/uploads/{upload_id}/commit', json={})
+        self.assertEqual(committed.status_code, 200)
+        with open(file_server.get_store().locate('abc-123'), 'rb') as f:
+            self.assertEqual(f.read(), self.content)
+
+    def test_commit_rechecks_chunk_digests(self):
+        upload_id = self.start().json['upload_id']
+        for index in range(3):
+            self.put_chunk(upload_id, index)
+        # Simulate a partial write that left the part file out of step with its markers
+        with open(os.path.join(file_server._session_dir(upload_id), 'data.part'), 'r+b') as f:
+            f.seek(self.CHUNK + 10)
+            f.write(b'corrupt')
+
+        committed = self.client.post(f'/api/file/uploads/{upload_id}/commit', json={})
+        self.assertEqual(committed.status_code, 409)
+        self.assertEqual(committed.json['received_chunks'], [0, 2])
+
+        self.put_chunk(upload_id, 1)
+        committed = self.client.post(f'/api/file/uploads/{upload_id}/commit', json={})
+        self.assertEqual(committed.status_code, 200)
+        with open(file_server.get_store().locate('abc-123'), 'rb') as f:
+            self.assertEqual(f.read(), self.content)
+
+    def test_invalid_sessions(self):
+        self.assertEqual(self.start(total_size=0).status_code, 400)
+        self.assertEqual(self.start(file_id='').status_code, 400)
+        self.assertEqual(self.client.get('/api/file/uploads/../../etc').status_code, 404)
+        self.assertEqual(self.client.get('/api/file/uploads/not-a-uuid').status_code, 404)
+
+    def test_stale_sessions_are_cleaned_up(self):
+        upload_id = self.start().json['upload_id']
+        session_dir = file_server._session_dir(upload_id)
+        old = time.time() - 2 * file_server.UPLOAD_SESSION_TTL
+        os.utime(session_dir, (old, old))
+
+        self.assertEqual(file_server.cleanup_stale_upload_sessions(), 1)
+        self.assertFalse(os.path.exists(session_dir))
+
+
+if __name__ == '__main__':
+    unittest.main()
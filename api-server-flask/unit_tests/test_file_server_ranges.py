@@ -0,0 +1,89 @@
+"""
+Unit tests for conditional and partial downloads from the file server
+"""
+
+import hashlib
+import os
+import sys
+import tempfile
+import unittest
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+
+_storage = tempfile.mkdtemp()
+os.environ.setdefault('UPLOAD_FOLDER', _storage)
+
+from api import file_server
+
+
+class TestFileServerRanges(unittest.TestCase):
+
+    def setUp(self):
+        self.storage = tempfile.TemporaryDirectory()
+        self.addCleanup(self.storage.cleanup)
+        file_server.app.config['UPLOAD_FOLDER'] = self.storage.name
+        self.content = bytes(range(256)) * 40
+        with open(os.path.join(self.storage.name, 'abc-123'), 'wb') as f:
+            f.write(self.content)
+        self.etag = f'"{hashlib.sha256(self.content).hexdigest()}"'
+        self.client = file_server.app.test_client()
+
+    def download(self, **headers):
+        return self.client.get('/api/file/download?file_id=abc-123', headers=headers)
+
+    def test_full_download_has_strong_content_etag(self):
+        response = self.download()
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.data, self.content)
+        self.assertEqual(response.headers['ETag'], self.etag)
+        self.assertEqual(response.headers['Accept-Ranges'], 'bytes')
+
+    def test_range_returns_partial_content(self):
+        response = self.download(Range='bytes=100-199')
+
+        self.assertEqual(response.status_code, 206)
+        self.assertEqual(response.data, self.content[100:200])
+        self.assertEqual(response.headers['Content-Range'], f'bytes 100-199/{len(self.content)}')
+
+    def test_if_range_with_stale_etag_returns_whole_file(self):
+        response = self.download(Range='bytes=100-199', **{'If-Range': '"stale"'})
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.data, self.content)
+
+    def test_if_range_with_current_etag_resumes(self):
+        response = self.download(Range='bytes=10000-', **{'If-Range': self.etag})
+
+        self.assertEqual(response.status_code, 206)
+        self.assertEqual(response.data, self.content[10000:])
+
+    def test_unsatisfiable_range(self):
+        response = self.download(Range='bytes=999999-')
+
+        self.assertEqual(response.status_code, 416)
+
+    def test_if_none_match_returns_not_modified(self):
+        response = self.download(**{'If-None-Match': self.etag})
+
+        self.assertEqual(response.status_code, 304)
+
+    def test_stat_describes_file_without_body(self):
+        response = self.client.get('/api/file/stat?file_id=abc-123')
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json['size'], len(self.content))
+        self.assertEqual(f'"{response.json["etag"]}"', self.etag)
+        self.assertEqual(self.client.get('/api/file/stat?file_id=missing').status_code, 404)
+
+    def test_etag_changes_when_file_is_rewritten(self):
+        path = os.path.join(self.storage.name, 'abc-123')
+        first = file_server.compute_file_etag(path)
+        with open(path, 'ab') as f:
+            f.write(b'more')
+
+        self.assertNotEqual(file_server.compute_file_etag(path), first)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,103 @@
+"""
+Unit tests for the content-addressed file store
+"""
+
+import hashlib
+import io
+import os
+import sys
+import tempfile
+import unittest
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+
+from api.common.file_storage import ContentStore, blob_relpath, ref_relpath
+
+
+class TestContentStore(unittest.TestCase):
+
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(self.tmp.cleanup)
+        self.store = ContentStore(self.tmp.name)
+
+    def put(self, file_id, content):
+        tmp_path, digest, size = self.store.write_stream(io.BytesIO(content))
+        self.assertEqual(size, len(content))
+        self.store.ingest(tmp_path, digest, file_id)
+        return digest
+
+    def read(self, file_id):
+        with open(self.store.locate(file_id), 'rb') as f:
+            return f.read()
+
+    def test_layout_fans_out(self):
+        self.assertEqual(ref_relpath('0f3a9c-uuid'), os.path.join('refs', '0f', '3a', '0f3a9c-uuid'))
+        self.assertEqual(blob_relpath('abcdef'), os.path.join('blobs', 'ab', 'cd', 'abcdef'))
+        self.assertIsNone(ref_relpath('..'))
+
+    def test_identical_uploads_share_one_blob(self):
+        digest = self.put('file-a', b'same bytes')
+        self.assertEqual(digest, hashlib.sha256(b'same bytes').hexdigest())
+        self.put('file-b', b'same bytes')
+
+        self.assertEqual(self.store.refcount(digest), 2)
+        self.assertEqual(os.stat(self.store.locate('file-a')).st_ino,
+                         os.stat(self.store.locate('file-b')).st_ino)
+        self.assertEqual(os.listdir(os.path.join(self.tmp.name, '.tmp')), [])
+
+    def test_blob_is_removed_with_its_last_reference(self):
+        digest = self.put('file-a', b'shared')
+        self.put('file-b', b'shared')
+
+        self.assertTrue(self.store.delete('file-a'))
+        self.assertEqual(self.store.refcount(digest), 1)
+        self.assertEqual(self.read('file-b'), b'shared')
+
+        self.assertTrue(self.store.delete('file-b', digest=digest))
+        self.assertFalse(os.path.exists(self.store.blob_path(digest)))
+        self.assertFalse(self.store.delete('file-b'))
+
+    def test_overwriting_a_file_id_releases_the_old_blob(self):
+        old_digest = self.put('file-a', b'first')
+        self.put('file-a', b'second')
+
+        self.assertEqual(self.read('file-a'), b'second')
+        self.assertEqual(self.store.refcount(old_digest), 0)
+
+    def test_migrate_flat_store(self):
+        for name, content in (('one', b'dup'), ('two', b'dup'), ('three', b'unique')):
+            with open(os.path.join(self.tmp.name, name), 'wb') as f:
+                f.write(content)
+        os.makedirs(os.path.join(self.tmp.name, '.uploads'))
+
+        dry_run = self.store.migrate_flat_store(dry_run=True)
+        self.assertEqual(dry_run['migrated'], 0)
+        self.assertEqual(dry_run['bytes_deduplicated'], 3)
+        self.assertTrue(os.path.isfile(os.path.join(self.tmp.name, 'one')))
+
+        stats = self.store.migrate_flat_store()
+        self.assertEqual((stats['files'], stats['migrated']), (3, 3))
+        self.assertFalse(os.path.exists(os.path.join(self.tmp.name, 'one')))
+        self.assertEqual(self.read('two'), b'dup')
+        self.assertEqual(self.store.refcount(hashlib.sha256(b'dup').hexdigest()), 2)
+        self.assertEqual(self.store.migrate_flat_store()['files'], 0)
+
+    def test_legacy_flat_files_are_still_readable(self):
+        with open(os.path.join(self.tmp.name, 'old-file'), 'wb') as f:
+            f.write(b'legacy')
+
+        self.assertEqual(self.read('old-file'), b'legacy')
+        self.assertTrue(self.store.delete('old-file'))
+        self.assertIsNone(self.store.locate('old-file'))
+
+    def test_collect_garbage_removes_unreferenced_blobs(self):
+        digest = self.put('file-a', b'orphan')
+        os.unlink(self.store.ref_path('file-a'))
+
+        self.assertEqual(self.store.collect_garbage(), 1)
+        self.assertEqual(self.store.refcount(digest), 0)
+
+
+if __name__ == '__main__':
+    unittest.main()
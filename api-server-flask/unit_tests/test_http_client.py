@@ -0,0 +1,106 @@
+"""
+Unit tests for the pooled internal HTTP client (retries and circuit breaker)
+"""
+
+import io
+import os
+import sys
+import unittest
+from unittest.mock import MagicMock, patch
+
+import requests
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+
+from api.common.http_client import CircuitBreaker, CircuitOpenError, HTTPClient, get_http_client
+
+
+def make_response(status_code):
+    response = MagicMock()
+    response.status_code = status_code
+    return response
+
+
+class TestHTTPClient(unittest.TestCase):
+
+    def setUp(self):
+        self.client = HTTPClient('test_upstream', retries=2, breaker=CircuitBreaker(failure_threshold=3, reset_timeout=60))
+        self.session = MagicMock()
+        self.client._session = self.session
+        self.client._session_pid = os.getpid()
+        sleep_patcher = patch('api.common.http_client.time.sleep')
+        self.sleep = sleep_patcher.start()
+        self.addCleanup(sleep_patcher.stop)
+
+    def test_idempotent_calls_are_retried(self):
+        self.session.request.side_effect = [
+            requests.exceptions.ConnectionError('refused'),
+            make_response(503),
+            make_response(200),
+        ]
+
+        response = self.client.get('http://upstream/thing')
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(self.session.request.call_count, 3)
+        self.assertEqual(self.sleep.call_count, 2)
+        self.assertEqual(self.client.breaker.state, CircuitBreaker.CLOSED)
+
+    def test_post_is_not_retried(self):
+        self.session.request.side_effect = requests.exceptions.ConnectionError('refused')
+
+        with self.assertRaises(requests.exceptions.ConnectionError):
+            self.client.post('http://upstream/send', json={})
+        self.assertEqual(self.session.request.call_count, 1)
+
+    def test_streamed_body_is_not_retried(self):
+        self.session.request.return_value = make_response(502)
+
+        response = self.client.put('http://upstream/chunk', data=io.BytesIO(b'abc'))
+
+        self.assertEqual(response.status_code, 502)
+        self.assertEqual(self.session.request.call_count, 1)
+
+    def test_default_timeout_is_applied(self):
+        self.session.request.return_value = make_response(200)
+
+        self.client.get('http://upstream/thing')
+
+        self.assertEqual(self.session.request.call_args.kwargs['timeout'], self.client.timeout)
+
+    def test_circuit_opens_and_fails_fast(self):
+        self.session.request.side_effect = requests.exceptions.Timeout('slow')
+
+        with self.assertRaises(requests.exceptions.Timeout):
+            self.client.get('http://upstream/thing')
+        self.assertEqual(self.client.breaker.state, CircuitBreaker.OPEN)
+
+        with self.assertRaises(CircuitOpenError):
+            self.client.get('http://upstream/thing')
+        self.assertEqual(self.session.request.call_count, 3)
+
+    def test_shared_client_per_upstream(self):
+        self.assertIs(get_http_client('file_server'), get_http_client('file_server'))
+        self.assertIsNot(get_http_client('file_server'), get_http_client('usdt_api'))
+
+
+class TestCircuitBreaker(unittest.TestCase):
+
+    @patch('api.common.http_client.time.monotonic')
+    def test_half_open_allows_a_single_trial(self, monotonic):
+        monotonic.return_value = 100.0
+        breaker = CircuitBreaker(failure_threshold=1, reset_timeout=10)
+        breaker.record_failure()
+        self.assertFalse(breaker.allow())
+
+        monotonic.return_value = 111.0
+        self.assertTrue(breaker.allow())
+        self.assertFalse(breaker.allow())
+
+        breaker.record_success()
+        self.assertEqual(breaker.state, CircuitBreaker.CLOSED)
+        self.assertTrue(breaker.allow())
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,90 @@
+"""
+Unit tests for image variant selection and generation
+"""
+
+import io
+import os
+import sys
+import unittest
+import uuid
+from unittest.mock import MagicMock, patch
+
+from flask import Flask
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+
+from api.common import image_variants
+from api.common.image_variants import VariantError, resolve_width, variant_file_id
+from api.routes import media
+
+
+class TestResolveWidth(unittest.TestCase):
+
+    def test_named_variants(self):
+        self.assertEqual(resolve_width(variant='thumb'), 64)
+        self.assertEqual(resolve_width(variant='medium'), 1024)
+        with self.assertRaises(VariantError):
+            resolve_width(variant='huge')
+
+    def test_widths_round_up_to_a_fixed_size(self):
+        self.assertEqual(resolve_width('50'), 64)
+        self.assertEqual(resolve_width(256), 256)
+        self.assertEqual(resolve_width(300), 1024)
+
+    def test_large_or_missing_width_means_original(self):
+        self.assertIsNone(resolve_width(5000))
+        self.assertIsNone(resolve_width())
+
+    def test_variant_file_id(self):
+        self.assertEqual(variant_file_id('abc', 256, 'webp'), 'abc__w256.webp')
+
+
+class TestVariantRequest(unittest.TestCase):
+
+    def test_webp_is_negotiated_from_accept(self):
+        self.assertEqual(media.resolve_variant_request({'w': '200'}, 'image/webp,*/*'), (256, 'webp', True))
+        self.assertEqual(media.resolve_variant_request({'w': '200'}, 'image/png'), (256, 'jpeg', True))
+
+    def test_explicit_format_is_not_negotiated(self):
+        self.assertEqual(media.resolve_variant_request({'variant': 'thumb', 'format': 'png'}, ''), (64, 'png', False))
+        with self.assertRaises(VariantError):
+            media.resolve_variant_request({'variant': 'thumb', 'format': 'gif'}, '')
+
+    @patch('api.routes.media.file_server.get')
+    def test_unconvertible_media_falls_back_to_original(self, mock_get):
+        media._media_cache.clear()
+        variant, original = MagicMock(status_code=415), MagicMock(status_code=200)
+        original.headers = {'ETag': '"orig"', 'content-type': 'application/pdf', 'content-length': '3'}
+        original.content = b'pdf'
+        mock_get.side_effect = [variant, original]
+
+        with Flask(__name__).test_request_context('/?variant=small'):
+            response = media.MediaRetrieve().get(str(uuid.uuid4()))
+
+        self.assertEqual(response.get_data(), b'pdf')
+        self.assertIn('/api/file/variant', mock_get.call_args_list[0][0][0])
+        self.assertIn('/api/file/download', mock_get.call_args_list[1][0][0])
+
+
+@unittest.skipUnless(image_variants.variants_supported(), "Pillow is not installed")
+class TestGenerateVariant(unittest.TestCase):
+
+    def test_resizes_and_encodes_webp(self):
+        from PIL import Image
+        source = io.BytesIO()
+        Image.new('RGB', (2000, 1000), 'red').save(source, 'PNG')
+        source.seek(0)
+
+        content, mimetype = image_variants.generate_variant(source, 256, 'webp')
+
+        self.assertEqual(mimetype, 'image/webp')
+        with Image.open(io.BytesIO(content)) as result:
+            self.assertEqual(result.size, (256, 128))
+
+    def test_non_image_raises(self):
+        with self.assertRaises(VariantError):
+            image_variants.generate_variant(io.BytesIO(b'not an image'), 64, 'webp')
+
+
+if __name__ == '__main__':
+    unittest.main()
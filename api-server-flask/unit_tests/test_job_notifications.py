@@ -0,0 +1,104 @@
+"""
+Unit tests for the LISTEN/NOTIFY job wake-ups
+"""
+
+import os
+import socket
+import sys
+import threading
+import time
+import unittest
+from collections import namedtuple
+from unittest.mock import MagicMock
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+
+from api.common.job_notifications import JobNotificationListener
+
+Notify = namedtuple('Notify', ['pid', 'channel', 'payload'])
+
+
+class FakeListenConnection:
+    """psycopg2-like connection whose notifications are pushed through a socketpair"""
+
+    def __init__(self):
+        self._read, self._write = socket.socketpair()
+        self.notifies = []
+        self._pending = []
+        self.executed = []
+        self.closed = False
+
+    def fileno(self):
+        return self._read.fileno()
+
+    def set_isolation_level(self, level):
+        pass
+
+    def cursor(self):
+        cur = MagicMock()
+        cur.__enter__.return_value = cur
+        cur.execute.side_effect = self.executed.append
+        return cur
+
+    def send(self, payload):
+        self._pending.append(Notify(1, 'background_jobs', payload))
+        self._write.send(b'x')
+
+    def poll(self):
+        self._read.recv(1024)
+        if self._pending == ['disconnect']:
+            raise ConnectionError("server closed the connection")
+        self.notifies.extend(self._pending)
+        self._pending = []
+
+    def disconnect(self):
+        self._pending = ['disconnect']
+        self._write.send(b'x')
+
+    def close(self):
+        self.closed = True
+        self._read.close()
+        self._write.close()
+
+
+class TestJobNotificationListener(unittest.TestCase):
+
+    def test_wait_times_out_without_notification(self):
+        listener = JobNotificationListener()
+        self.assertFalse(listener.wait('withdrawals', 0.01))
+
+    def test_notification_wakes_only_its_job(self):
+        conn = FakeListenConnection()
+        listener = JobNotificationListener(connection_factory=lambda: conn)
+        # Registered jobs get the catch-up wake-up sent on connect
+        listener._event('withdrawals')
+        listener._event('usdt_deposits')
+        errors = []
+
+        def listen():
+            try:
+                listener._listen()
+            except ConnectionError as e:
+                errors.append(e)
+
+        thread = threading.Thread(target=listen, daemon=True)
+        thread.start()
+        self.assertTrue(listener.wait('withdrawals', 1))
+        self.assertTrue(listener.wait('usdt_deposits', 1))
+        self.assertEqual(conn.executed, ['LISTEN background_jobs;'])
+
+        started = time.monotonic()
+        conn.send('withdrawals')
+        self.assertTrue(listener.wait('withdrawals', 1))
+        self.assertLess(time.monotonic() - started, 0.5)
+        self.assertFalse(listener.wait('usdt_deposits', 0.05))
+
+        conn.disconnect()
+        thread.join(1)
+        self.assertFalse(thread.is_alive())
+        self.assertEqual(len(errors), 1)
+        self.assertTrue(conn.closed)
+
+
+if __name__ == '__main__':
+    unittest.main()
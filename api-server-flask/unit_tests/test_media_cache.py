@@ -0,0 +1,112 @@
+"""
+Unit tests for media pass-through caching and conditional responses
+"""
+
+import os
+import sys
+import unittest
+import uuid
+from unittest.mock import MagicMock, patch
+
+from flask import Flask
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+
+from api.common.cache import SizedLRUCache
+from api.routes import media
+
+
+class TestSizedLRUCache(unittest.TestCase):
+
+    def test_evicts_least_recently_used_by_size(self):
+        cache = SizedLRUCache(max_bytes=10)
+        cache.set('a', 'A', 4)
+        cache.set('b', 'B', 4)
+        cache.get('a')
+        cache.set('c', 'C', 4)
+
+        self.assertEqual(cache.get('a'), 'A')
+        self.assertIsNone(cache.get('b'))
+        self.assertEqual(cache.total_bytes, 8)
+
+    def test_oversized_entries_are_not_cached(self):
+        cache = SizedLRUCache(max_bytes=100, max_entry_bytes=10)
+
+        self.assertFalse(cache.set('big', 'x', 11))
+        self.assertEqual(len(cache), 0)
+
+    def test_replacing_a_key_updates_the_total(self):
+        cache = SizedLRUCache(max_bytes=100)
+        cache.set('a', 'A', 40)
+        cache.set('a', 'AA', 10)
+
+        self.assertEqual(cache.total_bytes, 10)
+
+
+def file_server_response(status_code, content=b'', etag='abc'):
+    response = MagicMock()
+    response.status_code = status_code
+    response.headers = {'ETag': f'"{etag}"', 'content-type': 'image/png',
+                        'content-length': str(len(content))}
+    response.content = content
+    response.iter_content.return_value = [content]
+    return response
+
+
+class TestMediaRetrieve(unittest.TestCase):
+
+    def setUp(self):
+        media._media_cache.clear()
+        self.app = Flask(__name__)
+        self.media_id = str(uuid.uuid4())
+
+    def retrieve(self, **headers):
+        with self.app.test_request_context(headers=headers):
+            response = media.MediaRetrieve().get(self.media_id)
+            return response
+
+    @patch('api.routes.media.file_server.get')
+    def test_small_media_is_cached_with_etag(self, mock_get):
+        mock_get.return_value = file_server_response(200, b'png-bytes')
+
+        first = self.retrieve()
+        second = self.retrieve()
+
+        self.assertEqual(first.get_data(), b'png-bytes')
+        self.assertEqual(second.get_data(), b'png-bytes')
+        self.assertEqual(second.headers['ETag'], '"abc"')
+        self.assertEqual(mock_get.call_count, 1)
+
+    @patch('api.routes.media.file_server.get')
+    def test_if_none_match_returns_304_from_cache(self, mock_get):
+        mock_get.return_value = file_server_response(200, b'png-bytes')
+        self.retrieve()
+
+        response = self.retrieve(**{'If-None-Match': '"abc"'})
+
+        self.assertEqual(response.status_code, 304)
+        self.assertEqual(response.get_data(), b'')
+
+    @patch('api.routes.media.file_server.get')
+    def test_file_server_304_is_relayed(self, mock_get):
+        mock_get.return_value = file_server_response(304)
+
+        response = self.retrieve(**{'If-None-Match': '"abc"'})
+
+        self.assertEqual(response.status_code, 304)
+        self.assertEqual(mock_get.call_args[1]['headers'], {'If-None-Match': '"abc"'})
+
+    @patch('api.routes.media.file_server.get')
+    def test_large_media_is_streamed_not_cached(self, mock_get):
+        content = b'x' * (media.MEDIA_CACHE_MAX_OBJECT_BYTES + 1)
+        mock_get.return_value = file_server_response(200, content)
+
+        response = self.retrieve()
+
+        self.assertEqual(response.get_data(), content)
+        self.assertEqual(len(media._media_cache), 0)
+        self.assertTrue(mock_get.call_args[1]['stream'])
+
+
+if __name__ == '__main__':
+    unittest.main()
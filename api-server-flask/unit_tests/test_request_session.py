@@ -0,0 +1,82 @@
+"""
+Unit tests for the request-scoped database session
+"""
+
+import os
+import sys
+import unittest
+from unittest.mock import MagicMock, patch
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+
+from flask import Flask
+
+from api.common import database_context
+from api.common.database_context import (
+    RequestSession,
+    begin_request_session,
+    database_cursor,
+    end_request_session,
+)
+
+
+class TestRequestSession(unittest.TestCase):
+
+    def setUp(self):
+        self.app = Flask(__name__)
+        self.conn = MagicMock()
+        self.conn.closed = 0
+        checkout = patch.object(database_context, 'checkout_connection', return_value=self.conn)
+        release = patch.object(database_context, 'release_connection')
+        self.checkout = checkout.start()
+        self.release = release.start()
+        self.addCleanup(checkout.stop)
+        self.addCleanup(release.stop)
+
+    def test_cursors_share_one_connection(self):
+        with self.app.test_request_context():
+            begin_request_session()
+            with database_cursor() as (_, first):
+                pass
+            with database_cursor() as (_, second):
+                pass
+            self.assertIs(first, second)
+            self.assertEqual(self.checkout.call_count, 1)
+            self.release.assert_not_called()
+            end_request_session()
+        self.release.assert_called_once_with(self.conn)
+
+    def test_snapshot_is_opened_once(self):
+        session = RequestSession()
+        session.cursor()
+        session.cursor()
+        snapshot_cursor = self.conn.cursor.return_value.__enter__.return_value
+        snapshot_cursor.execute.assert_called_once_with(RequestSession.SNAPSHOT_SQL)
+
+    def test_failure_restarts_snapshot(self):
+        with self.app.test_request_context():
+            session = begin_request_session()
+            with self.assertRaises(ValueError):
+                with database_cursor():
+                    raise ValueError("boom")
+            self.conn.rollback.assert_called_once()
+            self.assertFalse(session._in_transaction)
+            end_request_session()
+
+    def test_auto_commit_bypasses_session(self):
+        with self.app.test_request_context():
+            begin_request_session()
+            with database_cursor(auto_commit=True):
+                pass
+            self.release.assert_called_once_with(self.conn, discard=False)
+            end_request_session()
+
+    def test_without_session_uses_own_connection(self):
+        with self.app.test_request_context():
+            with database_cursor():
+                pass
+        self.release.assert_called_once_with(self.conn, discard=False)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,103 @@
+"""
+Unit tests for the background job scheduler
+"""
+
+import os
+import sys
+import threading
+import time
+import unittest
+from concurrent.futures import ThreadPoolExecutor
+from unittest.mock import MagicMock
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+
+from api.common.metrics import background_job_failures, background_job_items, background_job_skipped, background_job_timeouts
+from api.common.scheduler import Scheduler, advisory_lock_key
+
+
+def metric_value(metric, job):
+    return metric.labels(job)._value.get()
+
+
+class TestScheduler(unittest.TestCase):
+
+    def test_advisory_lock_key_is_stable_signed_int4(self):
+        self.assertEqual(advisory_lock_key('deposit_check'), advisory_lock_key('deposit_check'))
+        self.assertNotEqual(advisory_lock_key('deposit_check'), advisory_lock_key('balance_reconcile'))
+        for name in ('deposit_check', 'balance_reconcile', 'stripe_reconcile', 'x' * 100):
+            self.assertTrue(-2 ** 31 <= advisory_lock_key(name) < 2 ** 31)
+
+    def test_singleton_run_is_skipped_when_lock_is_held_elsewhere(self):
+        scheduler = Scheduler()
+        func = MagicMock(return_value=3)
+        job = scheduler.register('test_locked_job', func, 1, singleton=True)
+        job.lock = MagicMock()
+        job.lock.acquire.return_value = False
+        skipped_before = metric_value(background_job_skipped, 'test_locked_job')
+
+        self.assertEqual(scheduler.run_job(job), (True, None))
+        func.assert_not_called()
+        job.lock.release.assert_not_called()
+        self.assertEqual(metric_value(background_job_skipped, 'test_locked_job') - skipped_before, 1)
+
+        job.lock.acquire.return_value = True
+        self.assertEqual(scheduler.run_job(job), (False, 3))
+        job.lock.release.assert_called_once()
+        self.assertEqual(metric_value(background_job_items, 'test_locked_job'), 3)
+
+    def test_failures_and_timeouts_are_counted(self):
+        scheduler = Scheduler()
+        failing = scheduler.register('test_failing_job', MagicMock(side_effect=RuntimeError("boom")), 1)
+        self.assertEqual(scheduler.run_job(failing), (False, None))
+        self.assertEqual(metric_value(background_job_failures, 'test_failing_job'), 1)
+
+        slow = scheduler.register('test_slow_job', lambda: time.sleep(0.1) or 1, 1, timeout=0.01)
+        with ThreadPoolExecutor(max_workers=1) as executor:
+            # Reported as overdue, but still waited for
+            self.assertEqual(scheduler.run_job(slow, executor), (False, 1))
+        self.assertEqual(metric_value(background_job_timeouts, 'test_slow_job'), 1)
+
+    def test_runs_never_overlap_and_wake_up_starts_next_run(self):
+        listener = MagicMock()
+        listener.listening = True
+        listener.start.return_value = None
+        woken = threading.Event()
+        listener.wait.side_effect = lambda job, timeout: woken.wait(timeout) or woken.clear()
+        running = []
+        overlaps = []
+        runs = []
+
+        def job_func():
+            if running:
+                overlaps.append(True)
+            running.append(True)
+            time.sleep(0.02)
+            running.pop()
+            runs.append(time.monotonic())
+            return 0
+
+        scheduler = Scheduler(listener=listener)
+        job = scheduler.register('test_woken_job', job_func, 0.01, idle_interval=60, wake='test_jobs', jitter=0)
+        scheduler.start()
+        try:
+            deadline = time.monotonic() + 1
+            while not runs and time.monotonic() < deadline:
+                time.sleep(0.005)
+            # Idle now: the next run only happens when woken
+            time.sleep(0.05)
+            self.assertEqual(len(runs), 1)
+            woken.set()
+            while len(runs) < 2 and time.monotonic() < deadline:
+                time.sleep(0.005)
+            self.assertEqual(len(runs), 2)
+            listener.wait.assert_called_with('test_jobs', 60)
+        finally:
+            scheduler.stop()
+            woken.set()
+        self.assertEqual(overlaps, [])
+        self.assertEqual(job.next_delay(busy=True), 0.01)
+
+
+if __name__ == '__main__':
+    unittest.main()
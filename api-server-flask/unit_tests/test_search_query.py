@@ -0,0 +1,98 @@
+"""
+Unit tests for search query construction helpers
+"""
+
+import os
+import sys
+import time
+import unittest
+from datetime import datetime, timezone
+from unittest.mock import MagicMock
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+
+from api.common.cache import TTLCache
+from api.routes.searchable import build_prefix_tsquery, decode_search_cursor, encode_search_cursor, text_search_condition
+
+
+class TestBuildPrefixTsquery(unittest.TestCase):
+
+    def test_words_are_anded_with_prefix_match(self):
+        self.assertEqual(build_prefix_tsquery("digital art"), "digital:* & art:*")
+
+    def test_tsquery_operators_are_stripped(self):
+        self.assertEqual(build_prefix_tsquery("photo & !(x) | 'y':*"), "photo:* & x:* & y:*")
+
+    def test_empty_and_punctuation_only(self):
+        self.assertEqual(build_prefix_tsquery(""), "")
+        self.assertEqual(build_prefix_tsquery(None), "")
+        self.assertEqual(build_prefix_tsquery("  !?  "), "")
+
+    def test_unicode_words_are_kept(self):
+        self.assertEqual(build_prefix_tsquery("café 音乐"), "café:* & 音乐:*")
+
+
+class TestTextSearchCondition(unittest.TestCase):
+
+    def cursor(self, lexemes):
+        cur = MagicMock()
+        cur.fetchone.return_value = (lexemes,)
+        return cur
+
+    def test_words_use_the_search_vector(self):
+        condition, params, tsquery = text_search_condition(self.cursor(3), "digital art")
+        self.assertIn("search_vector @@ to_tsquery", condition)
+        self.assertEqual(params, ["digital:* & art:*"])
+        self.assertEqual(tsquery, "digital:* & art:*")
+
+    def test_stopwords_only_fall_back_to_substring_match(self):
+        condition, params, tsquery = text_search_condition(self.cursor(0), " the ")
+        self.assertIn("ILIKE", condition)
+        self.assertEqual(params, ["%the%", "%the%"])
+        self.assertIsNone(tsquery)
+
+    def test_no_words_match_everything(self):
+        cur = self.cursor(0)
+        self.assertEqual(text_search_condition(cur, "  !?  "), (None, [], None))
+        cur.execute.assert_not_called()
+
+
+class TestSearchCursor(unittest.TestCase):
+
+    def test_round_trip(self):
+        created_at = datetime(2025, 3, 1, 12, 30, 45, 123456, tzinfo=timezone.utc)
+        cursor = encode_search_cursor(created_at, 42)
+        self.assertEqual(decode_search_cursor(cursor), (created_at, 42))
+
+    def test_cursor_is_url_safe(self):
+        cursor = encode_search_cursor(datetime(2025, 1, 1, tzinfo=timezone.utc), 7)
+        self.assertRegex(cursor, r'^[A-Za-z0-9_-]+$')
+
+    def test_garbage_is_rejected(self):
+        for bad in ('', 'not-a-cursor', encode_search_cursor(datetime.now(), 1)[:-4]):
+            with self.assertRaises(ValueError):
+                decode_search_cursor(bad)
+
+
+class TestTTLCache(unittest.TestCase):
+
+    def test_entries_expire(self):
+        cache = TTLCache(ttl=0.05)
+        cache.set('k', 1)
+        self.assertEqual(cache.get('k'), 1)
+        time.sleep(0.06)
+        self.assertIsNone(cache.get('k'))
+
+    def test_least_recently_used_is_evicted(self):
+        cache = TTLCache(ttl=60, max_entries=2)
+        cache.set('a', 1)
+        cache.set('b', 2)
+        cache.get('a')
+        cache.set('c', 3)
+        self.assertEqual(cache.get('a'), 1)
+        self.assertIsNone(cache.get('b'))
+        self.assertEqual(len(cache), 2)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,69 @@
+"""
+Unit tests for SQL statement fingerprinting and per-request query stats
+"""
+
+import os
+import sys
+import unittest
+from unittest.mock import MagicMock
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+
+from flask import Flask
+
+from api.common.database import execute_sql, get_request_query_stats, normalize_sql, sql_fingerprint
+
+
+class TestSqlFingerprint(unittest.TestCase):
+
+    def test_placeholders_and_literals_are_normalized(self):
+        self.assertEqual(
+            normalize_sql("SELECT *\n  FROM t WHERE a = %s AND b = 'x''y' AND c > 10"),
+            "SELECT * FROM t WHERE a = ? AND b = ? AND c > ?"
+        )
+
+    def test_in_lists_collapse_regardless_of_length(self):
+        short = sql_fingerprint("SELECT 1 FROM t WHERE id IN (%s)")
+        long = sql_fingerprint("SELECT 1 FROM t WHERE id IN (%s, %s, %s)")
+        self.assertEqual(short[1], long[1])
+
+    def test_named_placeholders(self):
+        self.assertEqual(normalize_sql("UPDATE t SET a = %(a)s"), "UPDATE t SET a = ?")
+
+    def test_operation_is_first_keyword(self):
+        self.assertEqual(sql_fingerprint("  insert into t values (%s)")[0], "INSERT")
+
+    def test_different_statements_differ(self):
+        self.assertNotEqual(sql_fingerprint("SELECT a FROM t")[1], sql_fingerprint("SELECT b FROM t")[1])
+
+
+class TestExecuteSql(unittest.TestCase):
+
+    def test_counts_queries_per_request(self):
+        app = Flask(__name__)
+        cursor = MagicMock()
+        cursor.rowcount = 3
+        with app.test_request_context():
+            execute_sql(cursor, "SELECT 1")
+            execute_sql(cursor, "SELECT %s", (1,))
+            count, seconds = get_request_query_stats()
+        self.assertEqual(count, 2)
+        self.assertGreaterEqual(seconds, 0.0)
+
+    def test_failed_statement_still_recorded_and_raised(self):
+        app = Flask(__name__)
+        cursor = MagicMock()
+        cursor.execute.side_effect = RuntimeError("boom")
+        with app.test_request_context():
+            with self.assertRaises(RuntimeError):
+                execute_sql(cursor, "SELECT 1")
+            self.assertEqual(get_request_query_stats()[0], 1)
+
+    def test_commit_when_requested(self):
+        cursor, connection = MagicMock(), MagicMock()
+        execute_sql(cursor, "UPDATE t SET a = 1", commit=True, connection=connection)
+        connection.commit.assert_called_once()
+
+
+if __name__ == '__main__':
+    unittest.main()
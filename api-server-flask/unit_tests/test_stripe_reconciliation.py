@@ -0,0 +1,97 @@
+"""
+Unit tests for the adaptive Stripe reconciliation schedule and rate limiter
+"""
+
+import os
+import sys
+import time
+import unittest
+from datetime import datetime, timezone
+from unittest.mock import patch
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+
+from api.common import stripe_reconciliation
+from api.common.rate_limit import RateLimiter
+from api.common.stripe_reconciliation import StripeReconciler, next_check_delay
+
+
+def pending_row(kind, record_id, age_seconds, now):
+    created_at = datetime.fromtimestamp(now - age_seconds, tz=timezone.utc)
+    return (kind, record_id, f"cs_{kind}_{record_id}", created_at)
+
+
+class TestNextCheckDelay(unittest.TestCase):
+
+    def test_backs_off_with_age_within_bounds(self):
+        self.assertEqual(next_check_delay(0), stripe_reconciliation.STRIPE_RECONCILE_MIN_DELAY)
+        self.assertEqual(next_check_delay(600), 300)
+        self.assertEqual(next_check_delay(10 ** 6), stripe_reconciliation.STRIPE_RECONCILE_MAX_DELAY)
+
+
+class TestStripeReconciler(unittest.TestCase):
+
+    def setUp(self):
+        self.reconciler = StripeReconciler(workers=2, rate=1000)
+        self.now = time.time()
+
+    def test_new_sessions_are_due_and_settled_ones_are_dropped(self):
+        self.reconciler.sync([pending_row('invoice', 1, 60, self.now), pending_row('deposit', 2, 60, self.now)], self.now)
+        self.assertEqual(len(self.reconciler.due(self.now)), 2)
+
+        self.reconciler.sync([pending_row('deposit', 2, 60, self.now)], self.now)
+        self.assertEqual([item.record_id for item in self.reconciler.due(self.now)], [2])
+
+    @patch('api.common.stripe_reconciliation.complete_stripe_deposit', return_value=True)
+    @patch('api.common.stripe_reconciliation.expire_stripe_checkout', return_value=True)
+    @patch('api.common.stripe_reconciliation.refresh_stripe_payment')
+    def test_run_once_settles_and_reschedules(self, refresh, expire, complete_deposit):
+        statuses = {
+            'cs_invoice_1': {'status': 'unpaid', 'session_status': 'open'},
+            'cs_invoice_2': {'status': 'unpaid', 'session_status': 'expired'},
+            'cs_deposit_3': {'status': 'paid', 'session_status': 'complete'},
+        }
+        refresh.side_effect = lambda session_id: statuses[session_id]
+        pending = [
+            pending_row('invoice', 1, 600, self.now),
+            pending_row('invoice', 2, 90000, self.now),
+            pending_row('deposit', 3, 30, self.now),
+        ]
+
+        with patch.object(self.reconciler, 'load_pending', return_value=pending):
+            outcomes = self.reconciler.run_once()
+
+        self.assertEqual(outcomes, {'pending': 1, 'expired': 1, 'paid': 1})
+        expire.assert_called_once_with('cs_invoice_2')
+        complete_deposit.assert_called_once_with('cs_deposit_3')
+
+        # Only the open session is still tracked, next due after half its age
+        remaining = list(self.reconciler._items.values())
+        self.assertEqual([item.record_id for item in remaining], [1])
+        self.assertAlmostEqual(remaining[0].next_check_at - time.time(), 300, delta=5)
+
+        # Nothing is due on the next tick, so Stripe is not called again
+        refresh.reset_mock()
+        with patch.object(self.reconciler, 'load_pending', return_value=pending[:1]):
+            self.assertEqual(self.reconciler.run_once(), {})
+        refresh.assert_not_called()
+
+
+class TestRateLimiter(unittest.TestCase):
+
+    def test_limits_rate_after_burst(self):
+        limiter = RateLimiter(rate=50, burst=2)
+        started = time.monotonic()
+        for _ in range(7):
+            limiter.acquire()
+        # 2 immediate, then 5 more at 50/s
+        self.assertGreaterEqual(time.monotonic() - started, 0.09)
+
+    def test_timeout(self):
+        limiter = RateLimiter(rate=1, burst=1)
+        self.assertTrue(limiter.acquire(timeout=0))
+        self.assertFalse(limiter.acquire(timeout=0.01))
+
+
+if __name__ == '__main__':
+    unittest.main()
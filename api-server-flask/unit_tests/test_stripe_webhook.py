@@ -0,0 +1,130 @@
+"""
+Unit tests for Stripe webhook verification and idempotent event processing
+"""
+
+import hashlib
+import hmac
+import json
+import os
+import sys
+import time
+import unittest
+from unittest.mock import patch
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+
+from api import app
+from api.common import data_helpers
+
+TEST_SECRET = 'whsec_test_secret'
+
+
+def sign(payload, secret=TEST_SECRET, timestamp=None):
+    """Stripe-Signature header for a payload, as Stripe computes it"""
+    timestamp = int(timestamp or time.time())
+    signature = hmac.new(secret.encode('utf-8'), f"{timestamp}.{payload}".encode('utf-8'), hashlib.sha256).hexdigest()
+    return f"t={timestamp},v1={signature}"
+
+
+def checkout_event(event_type='checkout.session.completed', event_id='evt_1', session_id='cs_test_1'):
+    return {
+        'id': event_id,
+        'type': event_type,
+        'data': {'object': {'id': session_id, 'payment_status': 'paid', 'amount_total': 1035}},
+    }
+
+
+@patch('api.routes.payment.STRIPE_WEBHOOK_SECRET', TEST_SECRET)
+class TestStripeWebhookRoute(unittest.TestCase):
+
+    def setUp(self):
+        self.client = app.test_client()
+
+    def post(self, payload, signature):
+        return self.client.post('/api/v1/stripe/webhook', data=payload,
+                                headers={'Stripe-Signature': signature, 'Content-Type': 'application/json'})
+
+    @patch('api.routes.payment.process_stripe_event', return_value='invoice')
+    def test_signed_event_is_processed(self, process_event):
+        payload = json.dumps(checkout_event())
+
+        response = self.post(payload, sign(payload))
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.get_json()['result'], 'invoice')
+        process_event.assert_called_once_with(checkout_event())
+
+    @patch('api.routes.payment.process_stripe_event')
+    def test_bad_signature_is_rejected(self, process_event):
+        payload = json.dumps(checkout_event())
+
+        response = self.post(payload, sign(payload, secret='whsec_other'))
+
+        self.assertEqual(response.status_code, 400)
+        process_event.assert_not_called()
+
+    @patch('api.routes.payment.process_stripe_event')
+    def test_stale_signature_is_rejected(self, process_event):
+        payload = json.dumps(checkout_event())
+
+        response = self.post(payload, sign(payload, timestamp=time.time() - 3600))
+
+        self.assertEqual(response.status_code, 400)
+        process_event.assert_not_called()
+
+    @patch('api.routes.payment.process_stripe_event')
+    def test_unhandled_event_types_are_acknowledged(self, process_event):
+        payload = json.dumps(checkout_event(event_type='customer.created'))
+
+        response = self.post(payload, sign(payload))
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.get_json()['result'], 'ignored')
+        process_event.assert_not_called()
+
+    @patch('api.routes.payment.process_stripe_event', side_effect=RuntimeError('db down'))
+    def test_processing_failure_asks_for_redelivery(self, process_event):
+        payload = json.dumps(checkout_event())
+
+        response = self.post(payload, sign(payload))
+
+        self.assertEqual(response.status_code, 500)
+
+
+class TestProcessStripeEvent(unittest.TestCase):
+
+    @patch('api.common.data_helpers.apply_stripe_checkout_event')
+    @patch('api.common.data_helpers.db')
+    def test_already_processed_event_is_not_applied_again(self, db, apply_event):
+        db.execute_insert.return_value = ('2026-10-17T00:00:00',)
+
+        self.assertEqual(data_helpers.process_stripe_event(checkout_event()), 'duplicate')
+        apply_event.assert_not_called()
+
+    @patch('api.common.data_helpers.apply_stripe_checkout_event', return_value='invoice')
+    @patch('api.common.data_helpers.db')
+    def test_new_event_is_applied_and_marked_processed(self, db, apply_event):
+        db.execute_insert.return_value = (None,)
+
+        self.assertEqual(data_helpers.process_stripe_event(checkout_event()), 'invoice')
+        apply_event.assert_called_once_with('checkout.session.completed', checkout_event()['data']['object'])
+        self.assertIn('processed_at = CURRENT_TIMESTAMP', db.execute_update.call_args[0][0])
+
+    @patch('api.common.data_helpers.complete_stripe_deposit', return_value=True)
+    @patch('api.common.data_helpers.record_stripe_payment', return_value=False)
+    def test_completed_session_without_invoice_completes_deposit(self, record_payment, complete_deposit):
+        session = checkout_event()['data']['object']
+
+        self.assertEqual(data_helpers.apply_stripe_checkout_event('checkout.session.completed', session), 'deposit')
+        complete_deposit.assert_called_once_with('cs_test_1')
+
+    @patch('api.common.data_helpers.record_stripe_payment')
+    def test_unpaid_completed_session_is_ignored(self, record_payment):
+        session = dict(checkout_event()['data']['object'], payment_status='unpaid')
+
+        self.assertEqual(data_helpers.apply_stripe_checkout_event('checkout.session.completed', session), 'ignored')
+        record_payment.assert_not_called()
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,91 @@
+"""
+Unit tests for the USDT outbox dispatcher
+"""
+
+import os
+import sys
+import unittest
+from unittest.mock import MagicMock
+
+import requests
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+
+from api.common import usdt_outbox
+from api.common.usdt_outbox import USDTOutboxDispatcher, classify_send_response, retry_delay
+from unit_tests.fake_db import executed_params, patch_database
+
+TX_HASH = '0x' + 'ab' * 32
+
+
+def send_response(status_code, payload):
+    response = MagicMock()
+    response.status_code = status_code
+    response.json.return_value = payload
+    return response
+
+
+class TestUSDTOutbox(unittest.TestCase):
+
+    def setUp(self):
+        self.cur, self.statements = patch_database(self, usdt_outbox, names=('database_transaction',))
+        self.cur.rowcount = 1
+        self.cur.fetchone.return_value = ({'address': '0xabc', 'note': 'kept'},)
+
+        self.client = MagicMock()
+        self.dispatcher = USDTOutboxDispatcher(decimals=6, service_url='http://usdt', client=self.client)
+        self.row = (7, 'withdrawal_42', 42, '/send', {'to': '0xabc', 'amount': '2.5'}, 1)
+
+    def test_classify_send_response(self):
+        self.assertEqual(classify_send_response(200, {'status': 'complete', 'txHash': TX_HASH}), 'complete')
+        self.assertEqual(classify_send_response(500, {'status': 'delayed', 'txHash': TX_HASH}), 'delayed')
+        self.assertEqual(classify_send_response(400, {'error': 'Invalid address'}), 'rejected')
+        for status_code in (408, 429, 500, 502):
+            self.assertEqual(classify_send_response(status_code, {'error': 'x'}), 'retry')
+        self.assertEqual(classify_send_response(200, {'status': 'pending', 'txHash': 'nope'}), 'retry')
+
+    def test_retry_delay_backs_off_up_to_the_max(self):
+        self.assertEqual(retry_delay(1), usdt_outbox.USDT_OUTBOX_RETRY_BASE)
+        self.assertEqual(retry_delay(2), usdt_outbox.USDT_OUTBOX_RETRY_BASE * 2)
+        self.assertEqual(retry_delay(50), usdt_outbox.USDT_OUTBOX_RETRY_MAX)
+
+    def test_complete_send_is_recorded_with_the_withdrawal(self):
+        self.client.post.return_value = send_response(200, {'status': 'complete', 'txHash': TX_HASH})
+
+        self.assertEqual(self.dispatcher.dispatch(self.row), 'complete')
+        _, kwargs = self.client.post.call_args
+        self.assertEqual(kwargs['json'], {'to': '0xabc', 'amount': 2500000.0, 'request_id': 'withdrawal_42'})
+
+        params = executed_params(self.cur)
+        self.assertIn("claimed_by = %s", self.statements[0])
+        self.assertEqual(params[0][0], 'sent')
+        self.assertTrue(self.statements[-1].startswith('UPDATE withdrawal'))
+        self.assertEqual(params[-1][:2], ('complete', TX_HASH))
+        self.assertEqual(params[-1][2].adapted['note'], 'kept')
+
+    def test_unknown_outcome_is_retried_and_withdrawal_left_sending(self):
+        self.client.post.side_effect = requests.exceptions.ReadTimeout("read timed out")
+
+        self.assertEqual(self.dispatcher.dispatch(self.row), 'retry')
+        self.assertEqual(len(self.statements), 1)
+        self.assertIn("SET status = 'pending'", self.statements[0])
+        self.assertEqual(executed_params(self.cur)[0][1], retry_delay(1))
+
+    def test_rejected_send_releases_the_withdrawal(self):
+        self.client.post.return_value = send_response(400, {'error': 'Invalid address'})
+
+        self.assertEqual(self.dispatcher.dispatch(self.row), 'rejected')
+        params = executed_params(self.cur)
+        self.assertEqual(params[0][0], 'failed')
+        self.assertEqual(params[-1][0], 'error')
+
+    def test_response_is_not_recorded_without_the_claim(self):
+        self.client.post.return_value = send_response(200, {'status': 'complete', 'txHash': TX_HASH})
+        self.cur.rowcount = 0
+
+        self.assertEqual(self.dispatcher.dispatch(self.row), 'duplicate')
+        self.assertEqual(len(self.statements), 1)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,70 @@
+#!/usr/bin/env python3
+"""
+Local stand-in for Stripe's webhook delivery.
+
+Builds checkout.session.* events and posts them to /api/v1/stripe/webhook
+signed with a test secret, exactly as Stripe signs them, so the webhook can
+be exercised without a Stripe account. The API must run with the same
+STRIPE_WEBHOOK_SECRET.
+"""
+
+import hashlib
+import hmac
+import json
+import os
+import time
+import uuid
+
+import requests
+from config import API_BASE_URL, REQUEST_TIMEOUT
+
+STRIPE_WEBHOOK_SECRET = os.getenv('STRIPE_WEBHOOK_SECRET')
+
+
+class FakeStripeWebhook:
+    """Sends signed Stripe events to the API"""
+
+    def __init__(self, secret=None, url=None):
+        self.secret = secret or STRIPE_WEBHOOK_SECRET
+        self.url = url or f"{API_BASE_URL}/v1/stripe/webhook"
+
+    def checkout_event(self, session_id, event_type='checkout.session.completed',
+                       payment_status='paid', amount_total=0, event_id=None):
+        """Build a checkout session event like the ones Stripe sends"""
+        return {
+            'id': event_id or f"evt_test_{uuid.uuid4().hex}",
+            'object': 'event',
+            'type': event_type,
+            'created': int(time.time()),
+            'livemode': False,
+            'data': {
+                'object': {
+                    'id': session_id,
+                    'object': 'checkout.session',
+                    'payment_status': payment_status,
+                    'status': 'expired' if event_type == 'checkout.session.expired' else 'complete',
+                    'amount_total': amount_total,
+                    'currency': 'usd',
+                }
+            }
+        }
+
+    def signature(self, payload, timestamp=None, secret=None):
+        """Stripe-Signature header value for a payload"""
+        timestamp = int(timestamp or time.time())
+        signed = f"{timestamp}.{payload}".encode('utf-8')
+        digest = hmac.new((secret or self.secret).encode('utf-8'), signed, hashlib.sha256).hexdigest()
+        return f"t={timestamp},v1={digest}"
+
+    def send(self, event, timestamp=None, secret=None):
+        """POST an event to the webhook and return the response"""
+        payload = json.dumps(event)
+        return requests.post(
+            self.url,
+            data=payload,
+            headers={
+                'Content-Type': 'application/json',
+                'Stripe-Signature': self.signature(payload, timestamp, secret),
+            },
+            timeout=REQUEST_TIMEOUT
+        )
@@ -0,0 +1,122 @@
+#!/usr/bin/env python3
+
+import os
+import time
+import uuid
+import concurrent.futures
+import requests
+from config import API_BASE_URL, TEST_EMAIL_DOMAIN, DEFAULT_PASSWORD, REQUEST_TIMEOUT
+from api_client import APIClient
+from db_helpers import execute_db_command
+
+
+class TestConcurrentBalancePurchases:
+    """
+    Fire many balance purchases for one buyer in parallel and verify that the
+    row-locked debit never lets the balance go negative, while reporting throughput
+    """
+
+    def setup_method(self):
+        """Setup test fixtures"""
+        self.test_id = str(uuid.uuid4())[:8]
+        self.password = DEFAULT_PASSWORD
+
+        # Configuration
+        self.num_purchases = int(os.getenv('CONCURRENT_PURCHASE_COUNT', '20'))
+        self.concurrency = int(os.getenv('CONCURRENT_PURCHASE_WORKERS', '10'))
+        self.price = float(os.getenv('CONCURRENT_PURCHASE_PRICE', '1.0'))
+        # Fund only half of the purchases so the lock has to reject the rest
+        self.funded_purchases = self.num_purchases // 2
+        self.funding = self.funded_purchases * self.price
+
+        print(f"\n🧪 Concurrent Balance Purchase Configuration:")
+        print(f"   Purchases: {self.num_purchases} (funded for {self.funded_purchases})")
+        print(f"   Workers: {self.concurrency}")
+        print(f"   Price: ${self.price} USD")
+        print(f"   API Base URL: {API_BASE_URL}")
+
+    def _register(self, role):
+        client = APIClient()
+        username = f"conc_{role}_{self.test_id}"
+        email = f"{username}@{TEST_EMAIL_DOMAIN}"
+        register_response = client.register_user(username, email, self.password)
+        assert register_response.get('success'), f"Failed to register {role}: {register_response}"
+        login_response = client.login_user(email, self.password)
+        assert login_response.get('success'), f"Failed to login {role}: {login_response}"
+        user_id = register_response.get('userID') or login_response.get('user', {}).get('_id')
+        return client, user_id
+
+    def _purchase(self, token, searchable_id):
+        """Issue one balance purchase on its own connection"""
+        started = time.time()
+        response = requests.post(
+            f"{API_BASE_URL}/v1/create-balance-invoice",
+            json={
+                "searchable_id": searchable_id,
+                "invoice_type": "balance",
+                "selections": [{"amount": self.price, "type": "direct"}]
+            },
+            headers={'authorization': token},
+            timeout=REQUEST_TIMEOUT
+        )
+        return response.status_code, response.json(), time.time() - started
+
+    def test_parallel_purchases_never_overdraw(self):
+        """Main benchmark: N parallel purchases against a balance that covers N/2"""
+
+        # Step 1: Seller lists a direct-payment item
+        print(f"\n📝 Step 1: Creating seller and item")
+        seller, _ = self._register('seller')
+        create_response = seller.create_searchable({
+            "payloads": {
+                "private": {},
+                "public": {
+                    "title": f"Concurrency Test Item {self.test_id}",
+                    "description": "Item used to benchmark concurrent balance purchases",
+                    "type": "direct",
+                    "defaultAmount": self.price
+                }
+            }
+        })
+        searchable_id = create_response.get('searchable_id') or create_response.get('searchableID')
+        assert searchable_id, f"Failed to create searchable: {create_response}"
+
+        # Step 2: Fund the buyer with a reward
+        print(f"\n💰 Step 2: Funding buyer with ${self.funding}")
+        buyer, buyer_id = self._register('buyer')
+        execute_db_command(
+            f"INSERT INTO rewards (amount, currency, user_id, metadata) "
+            f"VALUES ({self.funding}, 'usd', {int(buyer_id)}, '{{\"source\": \"concurrency_test\"}}');"
+        )
+        initial_balance = buyer.get_balance()['balance']['usd']
+        assert abs(initial_balance - self.funding) < 1e-6, f"Unexpected starting balance {initial_balance}"
+
+        # Step 3: Fire all purchases at once
+        print(f"\n🚀 Step 3: Submitting {self.num_purchases} purchases with {self.concurrency} workers")
+        started = time.time()
+        with concurrent.futures.ThreadPoolExecutor(max_workers=self.concurrency) as executor:
+            futures = [executor.submit(self._purchase, buyer.token, searchable_id) for _ in range(self.num_purchases)]
+            results = [future.result() for future in futures]
+        elapsed = time.time() - started
+
+        succeeded = [r for r in results if r[0] == 200]
+        rejected = [r for r in results if r[0] == 400]
+        errors = [r for r in results if r[0] not in (200, 400)]
+        latencies = sorted(r[2] for r in results)
+
+        # Step 4: Report and verify
+        final_balance = buyer.get_balance()['balance']['usd']
+        print(f"\n📊 Step 4: Results")
+        print(f"   Succeeded: {len(succeeded)}, rejected: {len(rejected)}, errors: {len(errors)}")
+        print(f"   Throughput: {len(results) / elapsed:.1f} requests/s over {elapsed:.2f}s")
+        print(f"   Latency p50: {latencies[len(latencies) // 2] * 1000:.0f}ms, "
+              f"max: {latencies[-1] * 1000:.0f}ms")
+        print(f"   Final balance: ${final_balance}")
+
+        assert not errors, f"Unexpected errors: {errors[:3]}"
+        assert len(succeeded) == self.funded_purchases, \
+            f"Expected exactly {self.funded_purchases} purchases to succeed, got {len(succeeded)}"
+        assert final_balance >= 0, f"Balance overdrawn: {final_balance}"
+        assert abs(final_balance - (self.funding - len(succeeded) * self.price)) < 1e-6
+        for status_code, body, _ in rejected:
+            assert 'Insufficient balance' in body.get('error', ''), body
@@ -0,0 +1,79 @@
+#!/usr/bin/env python3
+"""
+Integration tests for the Stripe webhook, driven by a local fake that signs
+events with the test STRIPE_WEBHOOK_SECRET
+"""
+
+import uuid
+import pytest
+from api_client import APIClient
+from config import TEST_EMAIL_DOMAIN, DEFAULT_PASSWORD
+from stripe_webhook_fake import FakeStripeWebhook, STRIPE_WEBHOOK_SECRET
+
+
+@pytest.mark.skipif(not STRIPE_WEBHOOK_SECRET, reason="STRIPE_WEBHOOK_SECRET not set")
+class TestStripeWebhook:
+    """Checkout session events settle deposits once, however often they are delivered"""
+
+    @classmethod
+    def setup_class(cls):
+        cls.client = APIClient()
+        cls.test_id = str(uuid.uuid4())[:8]
+        cls.stripe = FakeStripeWebhook()
+
+        username = f"webhook_{cls.test_id}"
+        email = f"{username}@{TEST_EMAIL_DOMAIN}"
+        register_resp = cls.client.register(username, email, DEFAULT_PASSWORD)
+        assert register_resp.get('success'), f"Registration failed: {register_resp}"
+        login_resp = cls.client.login_user(email, DEFAULT_PASSWORD)
+        assert login_resp.get('success'), f"Login failed: {login_resp}"
+
+    def _create_deposit(self, amount):
+        response = self.client.create_deposit(
+            amount=amount,
+            type='stripe',
+            success_url='https://example.com/success',
+            cancel_url='https://example.com/cancel'
+        )
+        assert 'session_id' in response, f"Failed to create deposit: {response}"
+        return response
+
+    def _usd_balance(self):
+        return float(self.client.get_balance()['balance'].get('usd', 0))
+
+    def test_01_bad_signature_is_rejected(self):
+        deposit = self._create_deposit('10.00')
+        event = self.stripe.checkout_event(deposit['session_id'])
+
+        response = self.stripe.send(event, secret='whsec_wrong')
+
+        assert response.status_code == 400
+        assert self.client.get_deposit_status(deposit['deposit_id'])['status'] == 'pending'
+
+    def test_02_completed_event_settles_deposit_once(self):
+        initial_balance = self._usd_balance()
+        deposit = self._create_deposit('25.00')
+        event = self.stripe.checkout_event(deposit['session_id'], amount_total=2588)
+
+        response = self.stripe.send(event)
+        assert response.status_code == 200, response.text
+        assert response.json()['result'] == 'deposit'
+        assert self.client.get_deposit_status(deposit['deposit_id'])['status'] == 'complete'
+        assert abs(self._usd_balance() - (initial_balance + 25.0)) < 1e-6
+
+        # Stripe delivers at least once: a redelivery must not credit again
+        response = self.stripe.send(event)
+        assert response.status_code == 200, response.text
+        assert response.json()['result'] == 'duplicate'
+        assert abs(self._usd_balance() - (initial_balance + 25.0)) < 1e-6
+
+    def test_03_expired_event_fails_deposit(self):
+        deposit = self._create_deposit('15.00')
+        event = self.stripe.checkout_event(deposit['session_id'], event_type='checkout.session.expired',
+                                           payment_status='unpaid')
+
+        response = self.stripe.send(event)
+
+        assert response.status_code == 200, response.text
+        assert response.json()['result'] == 'expired'
+        assert self.client.get_deposit_status(deposit['deposit_id'])['status'] == 'failed'
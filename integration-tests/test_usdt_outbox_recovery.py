@@ -0,0 +1,123 @@
+#!/usr/bin/env python3
+"""
+Crash recovery of the USDT outbox dispatcher.
+
+Queues one withdrawal, starts a dispatcher (the background module's
+process_pending_withdrawals in its own process) against a slow local stub of
+the USDT service and kills it while the /send is in flight. Once the claim has
+expired a second dispatcher resends the request with the same request_id.
+Verifies the withdrawal completes with a single transfer.
+
+Opt-in, for the same reasons as test_withdrawal_sender_throughput.py; stop the
+regular background service and export its settings (.env) first:
+
+    USDT_OUTBOX_RECOVERY_TEST=1 pytest test_usdt_outbox_recovery.py -s
+"""
+
+import os
+import signal
+import subprocess
+import sys
+import time
+import uuid
+
+import pytest
+from config import TEST_EMAIL_DOMAIN, DEFAULT_PASSWORD
+from api_client import APIClient
+from db_helpers import execute_db_command
+from usdt_api_stub import StubUSDTService
+
+API_SERVER_DIR = os.path.join(os.path.dirname(__file__), '..', 'api-server-flask')
+
+
+@pytest.mark.skipif(not os.getenv('USDT_OUTBOX_RECOVERY_TEST'), reason="USDT_OUTBOX_RECOVERY_TEST not set")
+class TestUSDTOutboxRecovery:
+
+    def setup_method(self):
+        """Setup test fixtures"""
+        self.test_id = str(uuid.uuid4())[:8]
+        self.usdt = StubUSDTService(latency=3)
+
+    def teardown_method(self):
+        self.usdt.close()
+
+    def _dispatcher(self):
+        env = dict(os.environ)
+        env.update({
+            'DB_HOST': os.getenv('BENCH_DB_HOST', 'localhost'),
+            'DB_PORT': os.getenv('BENCH_DB_PORT', '5433'),
+            'DB_NAME': os.getenv('BENCH_DB_NAME', 'searchable'),
+            'DB_USERNAME': os.getenv('BENCH_DB_USERNAME', 'searchable'),
+            'DB_PASS': os.getenv('BENCH_DB_PASS', os.getenv('DB_PASS', '')),
+            'USDT_SERVICE_URL': self.usdt.url,
+        })
+        return subprocess.Popen(
+            [sys.executable, '-c', 'import background; background.process_pending_withdrawals()'],
+            cwd=API_SERVER_DIR, env=env,
+            stdout=subprocess.DEVNULL, stderr=subprocess.PIPE, text=True
+        )
+
+    def _query(self, sql):
+        result = execute_db_command(f"COPY ({sql}) TO STDOUT;")
+        return [line.split('\t') for line in result.stdout.strip().splitlines()]
+
+    def test_killed_dispatcher_is_recovered_without_double_send(self):
+        # Step 1: Fund a user and queue a withdrawal
+        print(f"\n📝 Step 1: Queueing a withdrawal")
+        client = APIClient()
+        username = f"outbox_{self.test_id}"
+        email = f"{username}@{TEST_EMAIL_DOMAIN}"
+        register_response = client.register_user(username, email, DEFAULT_PASSWORD)
+        assert register_response.get('success'), f"Failed to register: {register_response}"
+        login_response = client.login_user(email, DEFAULT_PASSWORD)
+        user_id = int(register_response.get('userID') or login_response.get('user', {}).get('_id'))
+
+        execute_db_command(
+            f"INSERT INTO rewards (amount, currency, user_id, metadata) "
+            f"VALUES (5, 'usd', {user_id}, '{{\"source\": \"outbox_recovery_test\"}}');"
+        )
+        execute_db_command(
+            f"INSERT INTO withdrawal (user_id, amount, fee, currency, type, metadata) "
+            f"VALUES ({user_id}, 5.0, 0, 'usd', 'bank_transfer', "
+            f"'{{\"address\": \"0x000000000000000000000000000000000000dEaD\"}}');"
+        )
+        [[withdrawal_id]] = self._query(f"SELECT id FROM withdrawal WHERE user_id = {user_id}")
+        request_id = f"withdrawal_{withdrawal_id}"
+        assert self._query(f"SELECT status FROM usdt_outbox WHERE request_id = '{request_id}'") == [['pending']]
+
+        # Step 2: Kill the dispatcher while the send is in flight
+        print(f"\n💥 Step 2: Killing the dispatcher mid-send")
+        dispatcher = self._dispatcher()
+        deadline = time.time() + 30
+        while request_id not in self.usdt.request_ids and time.time() < deadline:
+            time.sleep(0.05)
+        assert request_id in self.usdt.request_ids, "The dispatcher never sent the request"
+        dispatcher.send_signal(signal.SIGKILL)
+        dispatcher.wait()
+
+        assert self._query(
+            f"SELECT o.status, w.status FROM usdt_outbox o JOIN withdrawal w ON w.id = o.withdrawal_id "
+            f"WHERE o.request_id = '{request_id}'"
+        ) == [['dispatching', 'sending']]
+
+        # Step 3: Expire the claim and run a fresh dispatcher
+        print(f"\n🔁 Step 3: Recovering with a second dispatcher")
+        execute_db_command(
+            f"UPDATE usdt_outbox SET claimed_at = NOW() - interval '1 hour' WHERE request_id = '{request_id}';"
+        )
+        dispatcher = self._dispatcher()
+        _, stderr = dispatcher.communicate(timeout=60)
+        assert dispatcher.returncode == 0, stderr[-2000:]
+
+        # Step 4: Verify
+        [[outbox_status, attempts, withdrawal_status, tx_hash]] = self._query(
+            f"SELECT o.status, o.attempts, w.status, w.external_id FROM usdt_outbox o "
+            f"JOIN withdrawal w ON w.id = o.withdrawal_id WHERE o.request_id = '{request_id}'"
+        )
+        print(f"\n📊 Step 4: Outbox {outbox_status} after {attempts} attempts, withdrawal {withdrawal_status}")
+
+        assert outbox_status == 'sent'
+        assert int(attempts) == 2
+        assert withdrawal_status == 'complete'
+        assert self.usdt.request_ids.count(request_id) == 2
+        assert self.usdt.transfers == {request_id: tx_hash}
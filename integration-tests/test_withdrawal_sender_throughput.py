@@ -0,0 +1,125 @@
+#!/usr/bin/env python3
+"""
+Throughput benchmark for the withdrawal sender (the USDT outbox dispatcher).
+
+Queues N pending withdrawals, then runs R sender replicas (the background
+module's process_pending_withdrawals, each in its own process) against a local
+stub of the USDT service. Verifies every withdrawal is sent exactly once and
+reports withdrawals/s.
+
+Opt-in, since it talks to the database directly and the regular background
+service must be stopped so it does not compete for the queue. The replicas
+inherit this process's environment, so export the background service's
+settings (.env) first:
+
+    WITHDRAWAL_SENDER_BENCH=1 pytest test_withdrawal_sender_throughput.py -s
+"""
+
+import os
+import subprocess
+import sys
+import time
+import uuid
+
+import pytest
+from config import TEST_EMAIL_DOMAIN, DEFAULT_PASSWORD
+from api_client import APIClient
+from db_helpers import execute_db_command
+from usdt_api_stub import StubUSDTService
+
+API_SERVER_DIR = os.path.join(os.path.dirname(__file__), '..', 'api-server-flask')
+
+
+@pytest.mark.skipif(not os.getenv('WITHDRAWAL_SENDER_BENCH'), reason="WITHDRAWAL_SENDER_BENCH not set")
+class TestWithdrawalSenderThroughput:
+
+    def setup_method(self):
+        """Setup test fixtures"""
+        self.test_id = str(uuid.uuid4())[:8]
+
+        # Configuration
+        self.num_withdrawals = int(os.getenv('WITHDRAWAL_BENCH_COUNT', '200'))
+        self.replicas = int(os.getenv('WITHDRAWAL_BENCH_REPLICAS', '3'))
+        self.concurrency = int(os.getenv('WITHDRAWAL_BENCH_CONCURRENCY', '4'))
+        self.send_latency = float(os.getenv('WITHDRAWAL_BENCH_SEND_LATENCY', '0.05'))
+
+        print(f"\n🧪 Withdrawal Sender Benchmark Configuration:")
+        print(f"   Withdrawals: {self.num_withdrawals}")
+        print(f"   Replicas: {self.replicas} x {self.concurrency} concurrent sends")
+        print(f"   Stub send latency: {self.send_latency * 1000:.0f}ms")
+
+        self.usdt = StubUSDTService(self.send_latency)
+
+    def teardown_method(self):
+        self.usdt.close()
+
+    def _sender_env(self):
+        env = dict(os.environ)
+        env.update({
+            'DB_HOST': os.getenv('BENCH_DB_HOST', 'localhost'),
+            'DB_PORT': os.getenv('BENCH_DB_PORT', '5433'),
+            'DB_NAME': os.getenv('BENCH_DB_NAME', 'searchable'),
+            'DB_USERNAME': os.getenv('BENCH_DB_USERNAME', 'searchable'),
+            'DB_PASS': os.getenv('BENCH_DB_PASS', os.getenv('DB_PASS', '')),
+            'USDT_SERVICE_URL': self.usdt.url,
+            'USDT_OUTBOX_CONCURRENCY': str(self.concurrency),
+        })
+        return env
+
+    def _withdrawal_statuses(self, user_id):
+        result = execute_db_command(
+            f"COPY (SELECT id, status FROM withdrawal WHERE user_id = {int(user_id)}) TO STDOUT;"
+        )
+        return dict(line.split('\t') for line in result.stdout.strip().splitlines())
+
+    def test_replicas_send_each_withdrawal_once(self):
+        # Step 1: Fund a user and queue the withdrawals
+        print(f"\n📝 Step 1: Queueing {self.num_withdrawals} withdrawals")
+        client = APIClient()
+        username = f"wsend_{self.test_id}"
+        email = f"{username}@{TEST_EMAIL_DOMAIN}"
+        register_response = client.register_user(username, email, DEFAULT_PASSWORD)
+        assert register_response.get('success'), f"Failed to register: {register_response}"
+        login_response = client.login_user(email, DEFAULT_PASSWORD)
+        user_id = register_response.get('userID') or login_response.get('user', {}).get('_id')
+
+        execute_db_command(
+            f"INSERT INTO rewards (amount, currency, user_id, metadata) "
+            f"VALUES ({self.num_withdrawals}, 'usd', {int(user_id)}, '{{\"source\": \"withdrawal_bench\"}}');"
+        )
+        execute_db_command(
+            f"INSERT INTO withdrawal (user_id, amount, fee, currency, type, metadata) "
+            f"SELECT {int(user_id)}, 1.0, 0, 'usd', 'bank_transfer', "
+            f"'{{\"address\": \"0x000000000000000000000000000000000000dEaD\"}}' "
+            f"FROM generate_series(1, {self.num_withdrawals});"
+        )
+        withdrawal_ids = set(self._withdrawal_statuses(user_id))
+        assert len(withdrawal_ids) == self.num_withdrawals
+
+        # Step 2: Run the sender replicas side by side
+        print(f"\n🚀 Step 2: Running {self.replicas} sender replicas")
+        started = time.time()
+        replicas = [
+            subprocess.Popen(
+                [sys.executable, '-c', 'import background; background.process_pending_withdrawals()'],
+                cwd=API_SERVER_DIR, env=self._sender_env(),
+                stdout=subprocess.DEVNULL, stderr=subprocess.PIPE, text=True
+            )
+            for _ in range(self.replicas)
+        ]
+        for replica in replicas:
+            _, stderr = replica.communicate(timeout=600)
+            assert replica.returncode == 0, stderr[-2000:]
+        elapsed = time.time() - started
+
+        # Step 3: Report and verify
+        statuses = self._withdrawal_statuses(user_id)
+        sent_ids = [rid for rid in self.usdt.request_ids if rid.split('_')[-1] in withdrawal_ids]
+        print(f"\n📊 Step 3: Results")
+        print(f"   Sent: {len(sent_ids)} in {elapsed:.2f}s")
+        print(f"   Throughput: {len(sent_ids) / elapsed:.1f} withdrawals/s")
+
+        assert len(sent_ids) == len(set(sent_ids)), "A withdrawal was dispatched more than once"
+        assert len(self.usdt.transfers) == len(sent_ids)
+        assert set(rid.split('_')[-1] for rid in sent_ids) == withdrawal_ids
+        assert set(statuses.values()) == {'complete'}, f"Unfinished withdrawals: {statuses}"
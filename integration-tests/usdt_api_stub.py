@@ -0,0 +1,68 @@
+"""
+Local stand-in for the USDT service (tether_on_eth) used by the withdrawal
+sender tests.
+
+Answers /send like the real service: a transfer is made once per request_id,
+and a repeated request_id gets the recorded result (waiting for the original
+send if it is still in progress) instead of a second transfer.
+"""
+
+import json
+import threading
+import time
+import uuid
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+
+class StubUSDTService:
+    """Records every /send and answers after a configurable latency"""
+
+    def __init__(self, latency):
+        self.latency = latency
+        # Every request_id received, repeats included
+        self.request_ids = []
+        # request_id -> txHash of every transfer actually made
+        self.transfers = {}
+        self._results = {}
+        self._lock = threading.Lock()
+        stub = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def do_POST(self):
+                body = json.loads(self.rfile.read(int(self.headers.get('Content-Length', 0))))
+                payload = json.dumps(stub.send(body.get('request_id'))).encode()
+                self.send_response(200)
+                self.send_header('Content-Type', 'application/json')
+                self.send_header('Content-Length', str(len(payload)))
+                self.end_headers()
+                self.wfile.write(payload)
+
+            def log_message(self, *args):
+                pass
+
+        self.server = ThreadingHTTPServer(('127.0.0.1', 0), Handler)
+        self.url = f"http://127.0.0.1:{self.server.server_address[1]}"
+        threading.Thread(target=self.server.serve_forever, daemon=True).start()
+
+    def send(self, request_id):
+        with self._lock:
+            self.request_ids.append(request_id)
+            result = self._results.get(request_id)
+            first = result is None
+            if first:
+                result = self._results[request_id] = {'done': threading.Event()}
+
+        if not first:
+            result['done'].wait()
+            return dict(result['response'], deduplicated=True)
+
+        time.sleep(self.latency)
+        tx_hash = '0x' + uuid.uuid4().hex * 2
+        with self._lock:
+            self.transfers[request_id] = tx_hash
+        result['response'] = {'status': 'complete', 'txHash': tx_hash}
+        result['done'].set()
+        return result['response']
+
+    def close(self):
+        self.server.shutdown()
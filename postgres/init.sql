@@ -13,6 +13,10 @@ CREATE INDEX IF NOT EXISTS idx_searchables_user_id ON searchables(user_id);
 CREATE INDEX IF NOT EXISTS idx_searchables_removed ON searchables(removed);
 CREATE INDEX IF NOT EXISTS idx_searchables_created_at ON searchables(created_at DESC);
 CREATE INDEX IF NOT EXISTS idx_searchables_user_id_removed ON searchables(user_id, removed);
+-- Supports newest-first search pages and keyset cursors on (created_at, searchable_id)
+CREATE INDEX IF NOT EXISTS idx_searchables_active_created_id
+    ON searchables (created_at DESC, searchable_id DESC)
+    WHERE removed = FALSE;
 
 
 CREATE TABLE IF NOT EXISTS files (
@@ -503,4 +507,546 @@ CREATE TABLE IF NOT EXISTS feedback (
 );
 
 CREATE INDEX idx_feedback_user_id ON feedback(user_id);
-CREATE INDEX idx_feedback_created_at ON feedback(created_at DESC);
\ No newline at end of file
+CREATE INDEX idx_feedback_created_at ON feedback(created_at DESC);
+
+-- ===================================
+-- FULL-TEXT SEARCH
+-- ===================================
+
+-- Full-text search vector over title, description and tag names
+ALTER TABLE searchables ADD COLUMN IF NOT EXISTS search_vector tsvector;
+
+CREATE OR REPLACE FUNCTION build_searchable_search_vector(p_searchable_id INTEGER, p_data JSONB)
+RETURNS tsvector AS $$
+    SELECT
+        setweight(to_tsvector('english', COALESCE(p_data->'payloads'->'public'->>'title', '')), 'A') ||
+        setweight(to_tsvector('english', COALESCE(p_data->'payloads'->'public'->>'description', '')), 'B') ||
+        setweight(to_tsvector('english', COALESCE((
+            SELECT string_agg(t.name, ' ')
+            FROM searchable_tags st
+            JOIN tags t ON st.tag_id = t.id
+            WHERE st.searchable_id = p_searchable_id
+        ), '')), 'C');
+$$ LANGUAGE sql STABLE;
+
+-- Keep the vector current when the searchable itself changes
+CREATE OR REPLACE FUNCTION searchables_search_vector_trigger()
+RETURNS TRIGGER AS $$
+BEGIN
+    NEW.search_vector := build_searchable_search_vector(NEW.searchable_id, NEW.searchable_data);
+    RETURN NEW;
+END;
+$$ LANGUAGE plpgsql;
+
+DROP TRIGGER IF EXISTS update_searchables_search_vector ON searchables;
+CREATE TRIGGER update_searchables_search_vector
+    BEFORE INSERT OR UPDATE OF searchable_data ON searchables
+    FOR EACH ROW EXECUTE FUNCTION searchables_search_vector_trigger();
+
+-- ...and when tags are attached, detached or renamed
+CREATE OR REPLACE FUNCTION searchable_tags_search_vector_trigger()
+RETURNS TRIGGER AS $$
+DECLARE
+    affected_id INTEGER;
+BEGIN
+    IF TG_OP = 'DELETE' THEN
+        affected_id := OLD.searchable_id;
+    ELSE
+        affected_id := NEW.searchable_id;
+    END IF;
+    UPDATE searchables
+    SET search_vector = build_searchable_search_vector(searchable_id, searchable_data)
+    WHERE searchable_id = affected_id;
+    RETURN NULL;
+END;
+$$ LANGUAGE plpgsql;
+
+DROP TRIGGER IF EXISTS update_search_vector_on_searchable_tags ON searchable_tags;
+CREATE TRIGGER update_search_vector_on_searchable_tags
+    AFTER INSERT OR DELETE ON searchable_tags
+    FOR EACH ROW EXECUTE FUNCTION searchable_tags_search_vector_trigger();
+
+CREATE OR REPLACE FUNCTION tags_search_vector_trigger()
+RETURNS TRIGGER AS $$
+BEGIN
+    UPDATE searchables s
+    SET search_vector = build_searchable_search_vector(s.searchable_id, s.searchable_data)
+    WHERE s.searchable_id IN (SELECT searchable_id FROM searchable_tags WHERE tag_id = NEW.id);
+    RETURN NULL;
+END;
+$$ LANGUAGE plpgsql;
+
+DROP TRIGGER IF EXISTS update_search_vector_on_tag_rename ON tags;
+CREATE TRIGGER update_search_vector_on_tag_rename
+    AFTER UPDATE OF name ON tags
+    FOR EACH ROW WHEN (OLD.name IS DISTINCT FROM NEW.name)
+    EXECUTE FUNCTION tags_search_vector_trigger();
+
+CREATE INDEX IF NOT EXISTS idx_searchables_search_vector ON searchables USING GIN (search_vector);
+
+COMMENT ON COLUMN searchables.search_vector IS 'Weighted tsvector of title (A), description (B) and tag names (C), maintained by triggers';
+
+
+-- ===================================
+-- RATING STATS
+-- ===================================
+
+-- Precomputed rating aggregates, maintained incrementally by create_rating
+CREATE TABLE IF NOT EXISTS searchable_rating_stats (
+    searchable_id INTEGER PRIMARY KEY,
+    rating_sum DOUBLE PRECISION NOT NULL DEFAULT 0,
+    rating_count INTEGER NOT NULL DEFAULT 0,
+    updated_at TIMESTAMP WITH TIME ZONE DEFAULT CURRENT_TIMESTAMP
+);
+
+CREATE TABLE IF NOT EXISTS seller_rating_stats (
+    seller_id INTEGER PRIMARY KEY,
+    rating_sum DOUBLE PRECISION NOT NULL DEFAULT 0,
+    rating_count INTEGER NOT NULL DEFAULT 0,
+    updated_at TIMESTAMP WITH TIME ZONE DEFAULT CURRENT_TIMESTAMP
+);
+
+COMMENT ON TABLE searchable_rating_stats IS 'Sum and count of ratings per searchable; average is rating_sum / rating_count';
+COMMENT ON TABLE seller_rating_stats IS 'Sum and count of ratings received per seller; average is rating_sum / rating_count';
+
+
+-- ===================================
+-- USER BALANCE LEDGER
+-- ===================================
+
+-- Every ledger entry that contributes to a user's USD balance.
+-- Mirrors the rules get_balance_by_currency used to apply on every read.
+CREATE OR REPLACE FUNCTION withdrawal_holds_balance(p_status TEXT)
+RETURNS BOOLEAN AS $$
+    SELECT p_status IN ('pending', 'complete', 'delayed');
+$$ LANGUAGE sql IMMUTABLE;
+
+CREATE OR REPLACE VIEW user_balance_sources AS
+    -- Income from sales (seller earnings after fees)
+    SELECT i.seller_id AS user_id, 'sale' AS source_type, (i.amount - i.fee) AS net_amount
+    FROM invoice i
+    JOIN payment p ON i.id = p.invoice_id
+    WHERE p.status = 'complete' AND i.currency = 'usd'
+    UNION ALL
+    -- Rewards
+    SELECT r.user_id, 'reward', r.amount
+    FROM rewards r
+    WHERE r.currency = 'usd'
+    UNION ALL
+    -- Completed deposits
+    SELECT d.user_id, 'deposit', d.amount
+    FROM deposit d
+    WHERE d.status = 'complete' AND d.currency = 'usd'
+    UNION ALL
+    -- Withdrawals that are in flight or done (negative amounts)
+    SELECT w.user_id, 'withdrawal', -w.amount
+    FROM withdrawal w
+    WHERE withdrawal_holds_balance(w.status) AND w.currency = 'usd'
+    UNION ALL
+    -- Purchases paid from balance (negative amounts)
+    SELECT i.buyer_id, 'balance_payment', -i.amount
+    FROM invoice i
+    JOIN payment p ON i.id = p.invoice_id
+    WHERE p.type = 'balance' AND p.status = 'complete' AND i.currency = 'usd';
+
+-- Materialized USD balance per user, kept current by the triggers below
+CREATE TABLE IF NOT EXISTS user_balance (
+    user_id INTEGER PRIMARY KEY,
+    balance DECIMAL(20,8) NOT NULL DEFAULT 0,
+    currency TEXT NOT NULL DEFAULT 'usd' CHECK (currency = 'usd'),
+    updated_at TIMESTAMP WITH TIME ZONE DEFAULT CURRENT_TIMESTAMP
+);
+
+COMMENT ON TABLE user_balance IS 'Running USD balance per user; equals SUM(net_amount) from user_balance_sources';
+
+CREATE OR REPLACE FUNCTION apply_user_balance_delta(p_user_id INTEGER, p_delta DECIMAL)
+RETURNS VOID AS $$
+BEGIN
+    IF p_user_id IS NULL OR p_delta IS NULL OR p_delta = 0 THEN
+        RETURN;
+    END IF;
+    INSERT INTO user_balance (user_id, balance, updated_at)
+    VALUES (p_user_id, p_delta, CURRENT_TIMESTAMP)
+    ON CONFLICT (user_id) DO UPDATE SET
+        balance = user_balance.balance + EXCLUDED.balance,
+        updated_at = CURRENT_TIMESTAMP;
+END;
+$$ LANGUAGE plpgsql;
+
+-- Payments: sale income for the seller, and a debit for the buyer on balance purchases
+CREATE OR REPLACE FUNCTION payment_user_balance_trigger()
+RETURNS TRIGGER AS $$
+DECLARE
+    inv RECORD;
+BEGIN
+    IF TG_OP IN ('UPDATE', 'DELETE') THEN
+        IF OLD.status = 'complete' THEN
+            SELECT buyer_id, seller_id, amount, fee, currency INTO inv FROM invoice WHERE id = OLD.invoice_id;
+            IF FOUND AND inv.currency = 'usd' THEN
+                PERFORM apply_user_balance_delta(inv.seller_id, -(inv.amount - inv.fee));
+                IF OLD.type = 'balance' THEN
+                    PERFORM apply_user_balance_delta(inv.buyer_id, inv.amount);
+                END IF;
+            END IF;
+        END IF;
+    END IF;
+    IF TG_OP IN ('INSERT', 'UPDATE') THEN
+        IF NEW.status = 'complete' THEN
+            SELECT buyer_id, seller_id, amount, fee, currency INTO inv FROM invoice WHERE id = NEW.invoice_id;
+            IF FOUND AND inv.currency = 'usd' THEN
+                PERFORM apply_user_balance_delta(inv.seller_id, inv.amount - inv.fee);
+                IF NEW.type = 'balance' THEN
+                    PERFORM apply_user_balance_delta(inv.buyer_id, -inv.amount);
+                END IF;
+            END IF;
+        END IF;
+    END IF;
+    RETURN NULL;
+END;
+$$ LANGUAGE plpgsql;
+
+DROP TRIGGER IF EXISTS payment_user_balance ON payment;
+CREATE TRIGGER payment_user_balance
+    AFTER INSERT OR UPDATE OF status, type, invoice_id OR DELETE ON payment
+    FOR EACH ROW EXECUTE FUNCTION payment_user_balance_trigger();
+
+-- Rewards
+CREATE OR REPLACE FUNCTION rewards_user_balance_trigger()
+RETURNS TRIGGER AS $$
+BEGIN
+    IF TG_OP IN ('UPDATE', 'DELETE') THEN
+        IF OLD.currency = 'usd' THEN
+            PERFORM apply_user_balance_delta(OLD.user_id, -OLD.amount);
+        END IF;
+    END IF;
+    IF TG_OP IN ('INSERT', 'UPDATE') THEN
+        IF NEW.currency = 'usd' THEN
+            PERFORM apply_user_balance_delta(NEW.user_id, NEW.amount);
+        END IF;
+    END IF;
+    RETURN NULL;
+END;
+$$ LANGUAGE plpgsql;
+
+DROP TRIGGER IF EXISTS rewards_user_balance ON rewards;
+CREATE TRIGGER rewards_user_balance
+    AFTER INSERT OR UPDATE OF amount, currency, user_id OR DELETE ON rewards
+    FOR EACH ROW EXECUTE FUNCTION rewards_user_balance_trigger();
+
+-- Deposits count once they are complete
+CREATE OR REPLACE FUNCTION deposit_user_balance_trigger()
+RETURNS TRIGGER AS $$
+BEGIN
+    IF TG_OP IN ('UPDATE', 'DELETE') THEN
+        IF OLD.status = 'complete' AND OLD.currency = 'usd' THEN
+            PERFORM apply_user_balance_delta(OLD.user_id, -OLD.amount);
+        END IF;
+    END IF;
+    IF TG_OP IN ('INSERT', 'UPDATE') THEN
+        IF NEW.status = 'complete' AND NEW.currency = 'usd' THEN
+            PERFORM apply_user_balance_delta(NEW.user_id, NEW.amount);
+        END IF;
+    END IF;
+    RETURN NULL;
+END;
+$$ LANGUAGE plpgsql;
+
+DROP TRIGGER IF EXISTS deposit_user_balance ON deposit;
+CREATE TRIGGER deposit_user_balance
+    AFTER INSERT OR UPDATE OF status, amount, currency, user_id OR DELETE ON deposit
+    FOR EACH ROW EXECUTE FUNCTION deposit_user_balance_trigger();
+
+-- Withdrawals hold the balance while pending/delayed/complete and release it on failure
+CREATE OR REPLACE FUNCTION withdrawal_user_balance_trigger()
+RETURNS TRIGGER AS $$
+BEGIN
+    IF TG_OP IN ('UPDATE', 'DELETE') THEN
+        IF withdrawal_holds_balance(OLD.status) AND OLD.currency = 'usd' THEN
+            PERFORM apply_user_balance_delta(OLD.user_id, OLD.amount);
+        END IF;
+    END IF;
+    IF TG_OP IN ('INSERT', 'UPDATE') THEN
+        IF withdrawal_holds_balance(NEW.status) AND NEW.currency = 'usd' THEN
+            PERFORM apply_user_balance_delta(NEW.user_id, -NEW.amount);
+        END IF;
+    END IF;
+    RETURN NULL;
+END;
+$$ LANGUAGE plpgsql;
+
+DROP TRIGGER IF EXISTS withdrawal_user_balance ON withdrawal;
+CREATE TRIGGER withdrawal_user_balance
+    AFTER INSERT OR UPDATE OF status, amount, currency, user_id OR DELETE ON withdrawal
+    FOR EACH ROW EXECUTE FUNCTION withdrawal_user_balance_trigger();
+
+
+-- ===================================
+-- PAID FILE ENTITLEMENTS
+-- ===================================
+
+-- One row per downloadable file a user has paid for, derived from the
+-- selections of invoices with a completed payment
+CREATE TABLE IF NOT EXISTS entitlement (
+    id SERIAL PRIMARY KEY,
+    user_id INTEGER NOT NULL,
+    searchable_id INTEGER NOT NULL,
+    file_id TEXT NOT NULL,
+    file_name TEXT,
+    listed BOOLEAN NOT NULL DEFAULT TRUE,
+    invoice_id INTEGER NOT NULL,
+    created_at TIMESTAMP WITH TIME ZONE DEFAULT CURRENT_TIMESTAMP
+);
+
+CREATE UNIQUE INDEX IF NOT EXISTS idx_entitlement_user_searchable_file ON entitlement(user_id, searchable_id, file_id);
+
+COMMENT ON TABLE entitlement IS 'Downloadable files a buyer may fetch; kept in sync with completed payments by payment_entitlement trigger';
+COMMENT ON COLUMN entitlement.listed IS 'file_id is the selection''s fileId (or its id when it has no fileId) and is reported as a paid file; false for an id only accepted for downloads';
+
+-- Downloadable file ids granted by one invoice. Selections come in two shapes:
+-- legacy {type: downloadable, id, fileId, name} and allinone {component: downloadable, id}.
+-- Both id and fileId are granted because downloads may be requested by either,
+-- but only fileId (or id when there is no fileId) is listed as a paid file.
+CREATE OR REPLACE FUNCTION invoice_entitled_files(p_metadata JSONB)
+RETURNS TABLE (file_id TEXT, file_name TEXT, listed BOOLEAN) AS $$
+    SELECT DISTINCT ON (ids.file_id) ids.file_id, sel->>'name', ids.listed
+    FROM jsonb_array_elements(
+        CASE WHEN jsonb_typeof(p_metadata->'selections') = 'array'
+             THEN p_metadata->'selections' ELSE '[]'::jsonb END
+    ) AS sel
+    CROSS JOIN LATERAL (VALUES (sel->>'fileId', TRUE),
+                               (sel->>'id', sel->>'fileId' IS NULL)) AS ids(file_id, listed)
+    WHERE (sel->>'type' = 'downloadable' OR sel->>'component' = 'downloadable')
+      AND ids.file_id IS NOT NULL
+    ORDER BY ids.file_id, ids.listed DESC;
+$$ LANGUAGE sql IMMUTABLE;
+
+-- Re-derive a buyer's entitlements for one searchable from its completed payments
+CREATE OR REPLACE FUNCTION refresh_entitlements(p_user_id INTEGER, p_searchable_id INTEGER)
+RETURNS VOID AS $$
+BEGIN
+    DELETE FROM entitlement e
+    WHERE e.user_id = p_user_id
+      AND e.searchable_id = p_searchable_id
+      AND NOT EXISTS (
+          SELECT 1
+          FROM invoice i
+          JOIN payment p ON p.invoice_id = i.id
+          CROSS JOIN LATERAL invoice_entitled_files(i.metadata) f
+          WHERE i.buyer_id = p_user_id
+            AND i.searchable_id = p_searchable_id
+            AND p.status = 'complete'
+            AND f.file_id = e.file_id
+      );
+
+    INSERT INTO entitlement (user_id, searchable_id, file_id, file_name, listed, invoice_id)
+    SELECT DISTINCT ON (f.file_id) i.buyer_id, i.searchable_id, f.file_id, f.file_name, f.listed, i.id
+    FROM invoice i
+    JOIN payment p ON p.invoice_id = i.id
+    CROSS JOIN LATERAL invoice_entitled_files(i.metadata) f
+    WHERE i.buyer_id = p_user_id
+      AND i.searchable_id = p_searchable_id
+      AND p.status = 'complete'
+    ORDER BY f.file_id, f.listed DESC, i.id
+    ON CONFLICT (user_id, searchable_id, file_id) DO UPDATE
+        SET listed = EXCLUDED.listed
+        WHERE entitlement.listed IS DISTINCT FROM EXCLUDED.listed;
+END;
+$$ LANGUAGE plpgsql;
+
+-- Grant on reaching complete; re-derive if a completed payment changes or goes away
+CREATE OR REPLACE FUNCTION payment_entitlement_trigger()
+RETURNS TRIGGER AS $$
+DECLARE
+    inv RECORD;
+BEGIN
+    IF TG_OP IN ('UPDATE', 'DELETE') AND OLD.status = 'complete' THEN
+        SELECT buyer_id, searchable_id INTO inv FROM invoice WHERE id = OLD.invoice_id;
+        IF FOUND THEN
+            PERFORM refresh_entitlements(inv.buyer_id, inv.searchable_id);
+        END IF;
+    END IF;
+    IF TG_OP IN ('INSERT', 'UPDATE') AND NEW.status = 'complete' THEN
+        INSERT INTO entitlement (user_id, searchable_id, file_id, file_name, listed, invoice_id)
+        SELECT i.buyer_id, i.searchable_id, f.file_id, f.file_name, f.listed, i.id
+        FROM invoice i
+        CROSS JOIN LATERAL invoice_entitled_files(i.metadata) f
+        WHERE i.id = NEW.invoice_id
+        ON CONFLICT (user_id, searchable_id, file_id) DO UPDATE
+            SET listed = TRUE
+            WHERE EXCLUDED.listed AND NOT entitlement.listed;
+    END IF;
+    RETURN NULL;
+END;
+$$ LANGUAGE plpgsql;
+
+DROP TRIGGER IF EXISTS payment_entitlement ON payment;
+CREATE TRIGGER payment_entitlement
+    AFTER INSERT OR UPDATE OF status, invoice_id OR DELETE ON payment
+    FOR EACH ROW EXECUTE FUNCTION payment_entitlement_trigger();
+
+-- ===================================
+-- STRIPE WEBHOOK EVENTS
+-- ===================================
+
+-- One row per Stripe webhook event received. The unique event_id makes
+-- redelivered events no-ops; processed_at is set once the event has been
+-- applied, so an event whose processing failed is retried on redelivery.
+CREATE TABLE IF NOT EXISTS stripe_event (
+    id SERIAL PRIMARY KEY,
+    event_id TEXT NOT NULL UNIQUE,
+    type TEXT NOT NULL,
+    session_id TEXT,
+    payload JSONB NOT NULL,
+    received_at TIMESTAMP WITH TIME ZONE DEFAULT CURRENT_TIMESTAMP,
+    processed_at TIMESTAMP WITH TIME ZONE,
+    error TEXT
+);
+
+CREATE INDEX IF NOT EXISTS idx_stripe_event_session_id ON stripe_event(session_id);
+CREATE INDEX IF NOT EXISTS idx_stripe_event_unprocessed ON stripe_event(received_at) WHERE processed_at IS NULL;
+
+-- ===================================
+-- WITHDRAWAL CLAIMING
+-- ===================================
+
+-- Withdrawals are claimed pending -> sending by a sender before calling the
+-- USDT service, so concurrent senders never pick up the same row
+ALTER TABLE withdrawal DROP CONSTRAINT IF EXISTS withdrawal_status_check;
+ALTER TABLE withdrawal ADD CONSTRAINT withdrawal_status_check
+    CHECK (status IN ('pending', 'sending', 'complete', 'failed', 'delayed', 'error'));
+
+ALTER TABLE withdrawal ADD COLUMN IF NOT EXISTS claimed_at TIMESTAMP WITH TIME ZONE;
+ALTER TABLE withdrawal ADD COLUMN IF NOT EXISTS claimed_by TEXT;
+
+-- Oldest-first claim queue, and lookup of stale claims
+CREATE INDEX IF NOT EXISTS idx_withdrawal_pending_created_at ON withdrawal(created_at) WHERE status = 'pending';
+CREATE INDEX IF NOT EXISTS idx_withdrawal_sending_claimed_at ON withdrawal(claimed_at) WHERE status = 'sending';
+
+-- A withdrawal being sent still holds its amount
+CREATE OR REPLACE FUNCTION withdrawal_holds_balance(p_status TEXT)
+RETURNS BOOLEAN AS $$
+    SELECT p_status IN ('pending', 'sending', 'complete', 'delayed');
+$$ LANGUAGE sql IMMUTABLE;
+
+-- ===================================
+-- BACKGROUND JOB NOTIFICATIONS
+-- ===================================
+
+-- Wake background jobs as soon as they have work. The trigger argument is
+-- the job name, sent as the payload on the background_jobs channel.
+-- NOTIFY is delivered on commit, and identical notifications from one
+-- transaction are folded into one.
+CREATE OR REPLACE FUNCTION notify_background_job()
+RETURNS TRIGGER AS $$
+BEGIN
+    PERFORM pg_notify('background_jobs', TG_ARGV[0]);
+    RETURN NULL;
+END;
+$$ LANGUAGE plpgsql;
+
+-- New withdrawals, and withdrawals handed back to the queue
+DROP TRIGGER IF EXISTS withdrawal_notify_sender ON withdrawal;
+CREATE TRIGGER withdrawal_notify_sender
+    AFTER INSERT OR UPDATE OF status ON withdrawal
+    FOR EACH ROW WHEN (NEW.status = 'pending')
+    EXECUTE FUNCTION notify_background_job('withdrawals');
+
+-- Deposits are inserted first and get their address or checkout session
+-- (external_id) in a follow-up update
+DROP TRIGGER IF EXISTS deposit_notify_usdt ON deposit;
+CREATE TRIGGER deposit_notify_usdt
+    AFTER INSERT OR UPDATE OF status, external_id ON deposit
+    FOR EACH ROW WHEN (NEW.type = 'usdt' AND NEW.status = 'pending')
+    EXECUTE FUNCTION notify_background_job('usdt_deposits');
+
+DROP TRIGGER IF EXISTS deposit_notify_stripe ON deposit;
+CREATE TRIGGER deposit_notify_stripe
+    AFTER INSERT OR UPDATE OF status, external_id ON deposit
+    FOR EACH ROW WHEN (NEW.type = 'stripe' AND NEW.status = 'pending')
+    EXECUTE FUNCTION notify_background_job('stripe_checkouts');
+
+DROP TRIGGER IF EXISTS invoice_notify_stripe ON invoice;
+CREATE TRIGGER invoice_notify_stripe
+    AFTER INSERT ON invoice
+    FOR EACH ROW WHEN (NEW.type = 'stripe')
+    EXECUTE FUNCTION notify_background_job('stripe_checkouts');
+
+-- ===================================
+-- USDT SERVICE OUTBOX
+-- ===================================
+
+-- Outbox of requests to the USDT service. A withdrawal's /send request is
+-- inserted by trigger in the same transaction as the withdrawal and then
+-- dispatched by the background service. request_id is the idempotency key
+-- the USDT service dedupes on, so a request can safely be sent more than once.
+CREATE TABLE IF NOT EXISTS usdt_outbox (
+    id SERIAL PRIMARY KEY,
+    request_id TEXT NOT NULL UNIQUE,
+    withdrawal_id INTEGER REFERENCES withdrawal(id),
+    endpoint TEXT NOT NULL DEFAULT '/send',
+    payload JSONB NOT NULL,
+    status TEXT NOT NULL DEFAULT 'pending' CHECK (status IN ('pending', 'dispatching', 'sent', 'failed')),
+    attempts INTEGER NOT NULL DEFAULT 0,
+    next_attempt_at TIMESTAMP WITH TIME ZONE NOT NULL DEFAULT CURRENT_TIMESTAMP,
+    claimed_at TIMESTAMP WITH TIME ZONE,
+    claimed_by TEXT,
+    response JSONB,
+    last_error TEXT,
+    created_at TIMESTAMP WITH TIME ZONE DEFAULT CURRENT_TIMESTAMP,
+    completed_at TIMESTAMP WITH TIME ZONE
+);
+
+COMMENT ON COLUMN usdt_outbox.payload IS 'Request body without request_id; the /send amount is in USD and converted to token units when dispatched';
+COMMENT ON COLUMN usdt_outbox.status IS 'pending (due at next_attempt_at), dispatching (claimed), sent (answered), failed (rejected, nothing sent)';
+
+-- Due requests in order, stale claims, and lookup by withdrawal
+CREATE INDEX IF NOT EXISTS idx_usdt_outbox_due ON usdt_outbox(next_attempt_at) WHERE status = 'pending';
+CREATE INDEX IF NOT EXISTS idx_usdt_outbox_dispatching ON usdt_outbox(claimed_at) WHERE status = 'dispatching';
+CREATE INDEX IF NOT EXISTS idx_usdt_outbox_withdrawal_id ON usdt_outbox(withdrawal_id);
+
+CREATE OR REPLACE FUNCTION enqueue_withdrawal_send()
+RETURNS TRIGGER AS $$
+BEGIN
+    INSERT INTO usdt_outbox (request_id, withdrawal_id, payload)
+    VALUES ('withdrawal_' || NEW.id, NEW.id,
+            jsonb_build_object('to', NEW.metadata->>'address', 'amount', NEW.amount))
+    ON CONFLICT (request_id) DO NOTHING;
+    RETURN NULL;
+END;
+$$ LANGUAGE plpgsql;
+
+DROP TRIGGER IF EXISTS withdrawal_enqueue_send ON withdrawal;
+CREATE TRIGGER withdrawal_enqueue_send
+    AFTER INSERT ON withdrawal
+    FOR EACH ROW WHEN (NEW.status = 'pending')
+    EXECUTE FUNCTION enqueue_withdrawal_send();
+
+-- ===================================
+-- DEPOSIT ADDRESS POOL
+-- ===================================
+
+-- Deposit addresses derived ahead of time by the background service, so that
+-- creating a USDT deposit does not wait for the USDT service. A deposit takes
+-- the oldest available address with SKIP LOCKED, in the transaction that
+-- creates it.
+CREATE TABLE IF NOT EXISTS deposit_address_pool (
+    id SERIAL PRIMARY KEY,
+    address TEXT NOT NULL UNIQUE,
+    address_index BIGINT NOT NULL UNIQUE,
+    status TEXT NOT NULL DEFAULT 'available' CHECK (status IN ('available', 'assigned')),
+    deposit_id INTEGER REFERENCES deposit(id) ON DELETE SET NULL,
+    created_at TIMESTAMP WITH TIME ZONE DEFAULT CURRENT_TIMESTAMP,
+    assigned_at TIMESTAMP WITH TIME ZONE
+);
+
+COMMENT ON COLUMN deposit_address_pool.address_index IS 'HD wallet index the USDT service derived the address from';
+
+-- Available addresses in claim order
+CREATE INDEX IF NOT EXISTS idx_deposit_address_pool_available ON deposit_address_pool(id) WHERE status = 'available';
+
+-- Wake the replenisher as addresses are taken
+DROP TRIGGER IF EXISTS deposit_address_pool_notify ON deposit_address_pool;
+CREATE TRIGGER deposit_address_pool_notify
+    AFTER UPDATE OF status ON deposit_address_pool
+    FOR EACH ROW WHEN (NEW.status = 'assigned')
+    EXECUTE FUNCTION notify_background_job('deposit_address_pool');
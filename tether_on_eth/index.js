@@ -2,6 +2,8 @@ require('dotenv').config();
 const express = require('express');
 const { Web3 } = require('web3');
 const cors = require('cors');
+const fs = require('fs');
+const path = require('path');
 const HDWallet = require('./hdWallet');
 
 const app = express();
@@ -230,6 +232,84 @@ app.post('/receive', (req, res) => {
 });
 
 
+// Idempotent sends: a /send with a request_id is recorded in an append-only
+// log together with its signed transaction before the transaction is
+// broadcast. A retried request_id returns the stored result, joins the send
+// still in progress, or rebroadcasts the same signed transaction (same nonce),
+// so a caller retrying after a timeout or crash never pays twice.
+const SEND_LOG_PATH = process.env.SEND_LOG_PATH || path.join(__dirname, 'data', 'send-log.jsonl');
+const sendLog = new Map();          // request_id -> latest record
+const sendsInFlight = new Map();    // request_id -> promise of the send result
+let sendLogFd = null;
+
+function openSendLog() {
+  fs.mkdirSync(path.dirname(SEND_LOG_PATH), { recursive: true });
+  if (fs.existsSync(SEND_LOG_PATH)) {
+    for (const line of fs.readFileSync(SEND_LOG_PATH, 'utf8').split('\n')) {
+      if (!line.trim()) continue;
+      try {
+        const record = JSON.parse(line);
+        sendLog.set(record.request_id, record);
+      } catch (error) {
+        console.warn(`Skipping unreadable send log line: ${line.substring(0, 80)}`);
+      }
+    }
+  }
+  sendLogFd = fs.openSync(SEND_LOG_PATH, 'a');
+  console.log(`Send log ${SEND_LOG_PATH}: ${sendLog.size} request(s) recorded`);
+}
+
+function recordSend(request_id, fields) {
+  const record = { ...sendLog.get(request_id), ...fields, request_id, updated_at: Date.now() };
+  sendLog.set(request_id, record);
+  // Written and flushed before the caller goes on to broadcast
+  fs.writeSync(sendLogFd, JSON.stringify(record) + '\n');
+  fs.fsyncSync(sendLogFd);
+  return record;
+}
+
+function sendResult(receipt) {
+  return {
+    status: 'complete',
+    txHash: receipt.transactionHash,
+    blockNumber: receipt.blockNumber,
+    gasUsed: receipt.gasUsed,
+    ReceiptStatus: receipt.status,
+  };
+}
+
+class SendError extends Error {
+  constructor(message, statusCode, txHash = null) {
+    super(message);
+    this.statusCode = statusCode;
+    this.txHash = txHash;
+  }
+}
+
+// Finish a send whose transaction an earlier attempt already signed
+async function resumeSend(request_id, record) {
+  console.log(`[${request_id}] Resuming send of previously signed tx ${record.txHash}`);
+  await rateLimit();
+  const existingReceipt = await web3.eth.getTransactionReceipt(record.txHash).catch(() => null);
+  if (existingReceipt) {
+    const result = sendResult(existingReceipt);
+    recordSend(request_id, { status: 'complete', result });
+    return result;
+  }
+  try {
+    await rateLimit();
+    const receipt = await web3.eth.sendSignedTransaction(record.rawTransaction);
+    const result = sendResult(receipt);
+    recordSend(request_id, { status: 'complete', result });
+    return result;
+  } catch (error) {
+    // Typically already known to the node, or mined since: either way the
+    // transaction can be followed through /tx-status
+    console.warn(`[${request_id}] Rebroadcast of ${record.txHash} failed: ${error.message}`);
+    return { status: 'pending', txHash: record.txHash, request_id };
+  }
+}
+
 app.post('/send', async (req, res) => {
   const { to, amount, request_id: provided_request_id } = req.body;
   const request_id = provided_request_id || `req_${Math.random().toString(36).substring(2, 15)}${Date.now().toString(36)}`;
@@ -245,12 +325,12 @@ app.post('/send', async (req, res) => {
       if (retryCount === 0) {
         if (!web3.utils.isAddress(to)) {
           console.error(`[${request_id}] Invalid recipient address: ${to}`);
-          throw new Error('Invalid recipient address');
+          throw new SendError('Invalid recipient address', 400);
         }
         
         if (!amount || amount <= 0) {
           console.error(`[${request_id}] Invalid amount: ${amount}`);
-          throw new Error('Invalid amount - must be greater than zero');
+          throw new SendError('Invalid amount - must be greater than zero', 400);
         }
       }
       
@@ -286,19 +366,20 @@ app.post('/send', async (req, res) => {
       signedTx = await web3.eth.accounts.signTransaction(txObject, process.env.PRIVATE_KEY);
       txHash = signedTx.transactionHash;
       console.log(`[${request_id}] Transaction signed, hash: ${txHash}`);
+      if (provided_request_id) {
+        recordSend(request_id, { status: 'signed', to, amount, txHash, rawTransaction: signedTx.rawTransaction });
+      }
 
       await rateLimit();
       console.log(`[${request_id}] Broadcasting signed transaction...`);
       const receipt = await web3.eth.sendSignedTransaction(signedTx.rawTransaction);
       console.log(`[${request_id}] Transaction broadcast complete to address ${to} - Receipt:`, receipt);
       
-      return { 
-        status: 'complete',
-        txHash: receipt.transactionHash,
-        blockNumber: receipt.blockNumber,
-        gasUsed: receipt.gasUsed,
-        ReceiptStatus: receipt.status,
-      };
+      const result = sendResult(receipt);
+      if (provided_request_id) {
+        recordSend(request_id, { status: 'complete', result });
+      }
+      return result;
       
     } catch (error) {
       // Check if it's a nonce too low error
@@ -313,16 +394,37 @@ app.post('/send', async (req, res) => {
     }
   }
   
+  async function executeSend() {
+    const previous = sendLog.get(request_id);
+    if (previous && previous.status === 'complete') {
+      console.log(`[${request_id}] Duplicate send request, returning recorded result`);
+      return { ...previous.result, deduplicated: true };
+    }
+    if (previous && previous.rawTransaction) {
+      return resumeSend(request_id, previous);
+    }
+    return executeTransfer();
+  }
+  
   try {
-    const result = await executeTransfer();
+    let result;
+    if (!provided_request_id) {
+      result = await executeTransfer();
+    } else {
+      // A retry arriving while the original is still sending waits for its result
+      if (!sendsInFlight.has(request_id)) {
+        sendsInFlight.set(request_id, executeSend().finally(() => sendsInFlight.delete(request_id)));
+      }
+      result = await sendsInFlight.get(request_id);
+    }
     res.json(result);
   } catch (error) {
     console.error(`[${request_id}] USDT Transfer Error:`, error);
-    res.status(500).json({ 
+    res.status(error.statusCode || 500).json({ 
       error: error.message,
       stack: error.stack,
       request_id: request_id,
-      txHash: txHash
+      txHash: error.txHash || txHash || (sendLog.get(request_id) || {}).txHash || null
     });
   }
 });
@@ -745,6 +847,8 @@ app.get('/transactions/:address', async (req, res) => {
   }
 });
 
+openSendLog();
+
 app.listen(process.env.PORT, () => {
   console.log(`🚀 USDT Service running on port ${process.env.PORT}`);
   console.log('⚡ Concurrency optimizations active:');
@@ -756,5 +860,6 @@ app.listen(process.env.PORT, () => {
   console.log('   - 30s request timeout protection');
   console.log('   - Rate limiting protection (500ms intervals)');
   console.log('   - Retry logic for nonce errors');
+  console.log('   - Idempotent /send by request_id');
   console.log('💰 Ready for concurrent USDT transfers');
 }); 
\ No newline at end of file